@@ -1,5 +1,7 @@
 from pathfinder.navmesh.navmesh_bvh import NavmeshBVH
-from pathfinder.navmesh.navmesh_node import NavmeshNode
+from pathfinder.navmesh.navmesh_grid import NavmeshGrid
+from pathfinder.navmesh.navmesh_data import NavmeshData
+from explorer_app.utilities import read_level_data
 import random
 import time
 
@@ -23,16 +25,18 @@ def grid_benchmark():
             polygons.append(m * (i + 1) + j + 1)
             polygons.append(m * i + j + 1)
             index += 1
-    # create nodes list
-    nodes = []
+    # create navmesh arrays
+    polygons_list = []
     index = 0
     for i in range(len(sizes)):
-        nodes.append(NavmeshNode(vertices, i, polygons[index:index + sizes[i]]))
+        polygons_list.append(polygons[index:index + sizes[i]])
         index += sizes[i]
+    data = NavmeshData(vertices, polygons_list)
+    print("navmesh arrays:", data.get_memory_size(), "bytes")
 
     # create bvh-tree
     start_time = time.time()
-    tree = NavmeshBVH(nodes)
+    tree = NavmeshBVH(data)
     print("generate time:", time.time() - start_time, "seconds")
 
     # start random sampling
@@ -41,8 +45,50 @@ def grid_benchmark():
     for s in range(samples_count):
         # generate random point
         point = (random.uniform(0.0, (n - 1) * grid_size), 0.0, random.uniform(0.0, (m - 1) * grid_size))
-        sample_node = tree.sample(point)
+        sample_index = tree.sample(point)
     print("make", samples_count, "samples:", time.time() - start_time, "seconds")
 
+    # the same for the grid of polygons
+    start_time = time.time()
+    grid = NavmeshGrid(data)
+    print("grid generate time:", time.time() - start_time, "seconds")
+    start_time = time.time()
+    for s in range(samples_count):
+        point = (random.uniform(0.0, (n - 1) * grid_size), 0.0, random.uniform(0.0, (m - 1) * grid_size))
+        sample_index = grid.sample(point)
+    print("grid make", samples_count, "samples:", time.time() - start_time, "seconds")
+
+
+def index_benchmark(file_path: str = "level_polygons.txt", samples_count: int = 10000):
+    '''Compare NavmeshBVH and NavmeshGrid (uniform grid of polygons) for the level from the file
+    both structures should return the same polygons for the same points
+    '''
+    vertices, polygons = read_level_data(file_path)
+    data = NavmeshData(vertices, polygons)
+    x_min = min(v[0] for v in vertices)
+    x_max = max(v[0] for v in vertices)
+    z_min = min(v[2] for v in vertices)
+    z_max = max(v[2] for v in vertices)
+    y = sum(v[1] for v in vertices) / len(vertices)
+    points = [(random.uniform(x_min, x_max), y, random.uniform(z_min, z_max)) for s in range(samples_count)]
+
+    start_time = time.time()
+    tree = NavmeshBVH(data)
+    print("bvh generate time:", time.time() - start_time, "seconds")
+    start_time = time.time()
+    grid = NavmeshGrid(data)
+    print("grid generate time:", time.time() - start_time, "seconds,", grid)
+
+    start_time = time.time()
+    tree_samples = [tree.sample(point) for point in points]
+    print("bvh make", samples_count, "samples:", time.time() - start_time, "seconds")
+    start_time = time.time()
+    grid_samples = [grid.sample(point) for point in points]
+    print("grid make", samples_count, "samples:", time.time() - start_time, "seconds")
+    print("different samples:", sum(1 for a, b in zip(tree_samples, grid_samples) if a != b))
+    print("bvh quality:", tree.get_quality_report(points[:1000]))
+    print("grid quality:", grid.get_quality_report(points[:1000]))
+
 if __name__ == "__main__":
     grid_benchmark()
+    index_benchmark()
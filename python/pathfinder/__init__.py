@@ -1,8 +1,13 @@
-from typing import Tuple, List, Optional
+from typing import Tuple, List, Optional, Dict, Set, Union, Any
 import math
 import time
+import threading
 import struct
 from pathfinder.navmesh import Navmesh
+from pathfinder.navmesh.navmesh_flow import FlowField
+from pathfinder.navmesh.navmesh_pool import PathQueryPool
+from pathfinder.navmesh.navmesh_tiles import TiledNavmesh, write_tiles
+from pathfinder.navmesh.navmesh_batch import pack_points, pack_heights, get_points_count, to_pairs_list
 import pathfinder.pyrvo as rvo
 
 
@@ -126,7 +131,14 @@ class PathFinder(object):
                  update_path_find: float = 1.0,
                  continuous_moving: bool = False,
                  move_agents: bool = True,
-                 snap_to_navmesh: bool = False):
+                 snap_to_navmesh: bool = False,
+                 path_cache_size: int = 0,
+                 use_flow_fields: bool = False,
+                 cluster_size: Optional[float] = None,
+                 landmarks_count: int = 0,
+                 bvh_builder: str = "median",
+                 polygons_index: str = "bvh",
+                 navmesh: Optional[Union[Navmesh, TiledNavmesh]] = None):
         '''Init pathfinder object by setting vertices and polygons of the navmesh
         If vertices or polygons are not defined, then navigation mesh is not created. In this case you can only simulate RVO on infinite plane without obstacles
 
@@ -141,64 +153,35 @@ class PathFinder(object):
             continuous_moving - if True then agents always move to destination point
             move_agents - if True then move agents in RVO algorithm, if False then only calulate velocities
             snap_to_navmesh - if True then calculate closest position on the navmesh for each agent and move it to this position
+            path_cache_size - how many polygon corridors store in the navmesh path cache, 0 disables the cache
+            use_flow_fields - if True then agents with destinations in the same polygon share one flow field to this polygon
+                              instead of searching the path in the graph for each agent
+            cluster_size - if defined, then the navmesh build hierarchical graph with clusters of this size (in XZ-plane)
+                           it accelerates long-distance searches in large navigation meshes
+            landmarks_count - the number of landmarks in each group for ALT heuristic of A* algorithm, 0 disables it
+            bvh_builder - the method for building bvh-trees of the navmesh: median or sah (better for navmeshes with several floors)
+            polygons_index - the structure for finding polygons of points: bvh or grid (uniform grid in XZ-plane, faster for nearly planar navmeshes)
+            navmesh - already created navigation mesh (for example, loaded by Navmesh.load_snapshot)
+                      if it defined, then vertices, polygons and navmesh parameters are ignored
+                      it can be TiledNavmesh, in this case groups are global groups of the tiled navmesh, tiles are loaded when agents need it
+                      flow fields, navmesh edits, snapshots and landmarks are not supported for the tiled navmesh
 
         Example of the simple square grid with two 4-sided polygons
             vertices = [(1.0, 0.0, 1.0), (-1.0, 0.0, 1.0), (-1.0, 0.0, -1.0), (1.0, 0.0, -1.0), (0.0, 0.0, 1.0), (0.0, 0.0, -1.0)]
             polygons = [[0, 3, 5, 4], [4, 5, 2, 1]]
         '''
         self._navmesh_boundary: List[List[List[Tuple[int, int]]]] = []  # each value in the array corresponds to one group
-        if vertices is None or polygons is None:
+        if navmesh is not None:
+            self._navmesh = navmesh
+        elif vertices is None or polygons is None:
             self._navmesh = None
         else:
-            self._navmesh = Navmesh(vertices, polygons)
-            # calculate boundary for rvo obstacles
-            # we should build boundary for each group
+            self._navmesh = Navmesh(vertices, polygons, path_cache_size=path_cache_size, cluster_size=cluster_size, landmarks_count=landmarks_count, bvh_builder=bvh_builder, polygons_index=polygons_index)
+        if self._navmesh is not None:
             # boundary for a group is array of chains (without final edge)
             # each chain is array of int-pairs
-            groups_count = self._navmesh.get_groups_count()
-            for g_index in range(groups_count):
-                group_polygons = self._navmesh.get_group_polygons(g_index)
-                # collect all edges
-                all_edges = []
-                for p in group_polygons:
-                    # p is an array of polygon vertex indices
-                    for i in range(len(p)):
-                        all_edges.append((p[i], p[i + 1 if i + 1 < len(p) else 0]))
-                # next we should find boundary edges
-                boundary_edges = []
-                for e in all_edges:
-                    if (e[1], e[0]) not in all_edges:
-                        boundary_edges.append(e)
-                # next we should order edges in cycles
-                boundary_chains = []
-                current_chain = [boundary_edges.pop(-1)]
-                while len(boundary_edges) > 0:
-                    # next find the edge with the same start as the end of e
-                    e = current_chain[-1]
-                    is_find = False
-                    i = 0
-                    while not is_find:
-                        f = boundary_edges[i]
-                        if f[0] == e[1]:
-                            is_find = True
-                        else:
-                            i += 1
-                        if i >= len(boundary_edges):
-                            is_find = True
-                    if i >= len(boundary_edges):
-                        # we fails to find the next edge
-                        # drop this chain
-                        current_chain = [boundary_edges.pop(-1)]
-                    else:
-                        f = boundary_edges.pop(i)
-                        if f[1] == current_chain[0][0]:
-                            # this is the last edge in the cycles of the chain, does not add it
-                            boundary_chains.append(current_chain)
-                            if len(boundary_edges) > 0:
-                                current_chain = [boundary_edges.pop(-1)]
-                        else:
-                            current_chain.append(f)
-                self._navmesh_boundary.append(boundary_chains)
+            for g_index in range(self._navmesh.get_groups_count()):
+                self._navmesh_boundary.append(self._navmesh.get_group_boundary(g_index))
         # next create rvo simulators
         # memorize default agent parameters
         self._neighbor_dist: float = neighbor_dist
@@ -211,6 +194,9 @@ class PathFinder(object):
         self._continuous_moving: bool = continuous_moving
         self._move_agents: bool = move_agents
         self._snap_to_navmesh: bool = snap_to_navmesh
+        self._use_flow_fields: bool = use_flow_fields and not isinstance(self._navmesh, TiledNavmesh)
+        self._flow_fields: Dict[int, FlowField] = {}  # key - target polygon index, value - flow field to this polygon
+        self._flow_fields_users: Dict[int, int] = {}  # key - target polygon index, value - the number of agents, which use the field
         self._last_path_find_update: float = time.time()
         # create separate simulator for each group
         self._simulators = []
@@ -225,42 +211,14 @@ class PathFinder(object):
             self._simulators.append(group_simulator)
 
         # calculate boundary for rvo
-        # we should shift all edges of the navmesh boundary into agent radius value
-        shift_value: float = 1.0 * agent_radius
-        self._obstacles: List[List[Tuple[float, float]]] = []
-        if vertices is not None:
+        self._obstacles: List[List[List[Tuple[float, float]]]] = []  # for each group store shifted boundary chains
+        self._obstacles_indexes: List[List[int]] = []  # for each group store indexes of obstacles in the simulator, the same order as chains
+        if self._navmesh is not None:
             for group_index in range(len(self._navmesh_boundary)):
-                boundary: List[List[Tuple[int, int]]] = self._navmesh_boundary[group_index]
-                for chain in boundary:
-                    chain_vertices = []
-                    for edge in chain:
-                        chain_vertices.append((vertices[edge[0]][0], vertices[edge[0]][2]))  # ignore y-coordinate
-                    chain_vertices.append((vertices[chain[-1][1]][0], vertices[chain[-1][1]][2]))
-
-                    shifted_chain = []
-                    for i in range(len(chain) + 1):
-                        pre_point = chain_vertices[i - 1 if i - 1 >= 0 else -1]
-                        point = chain_vertices[i]
-                        post_point = chain_vertices[i + 1 if i + 1 < len(chain_vertices) else 0]
-                        a1 = (point[0] - pre_point[0], point[1] - pre_point[1])
-                        a2 = (point[0] - post_point[0], point[1] - post_point[1])
-                        l1 = math.sqrt(a1[0]**2 + a1[1]**2)
-                        l2 = math.sqrt(a2[0]**2 + a2[1]**2)
-                        a1 = (a1[0] / l1, a1[1] / l1)
-                        a2 = (a2[0] / l2, a2[1] / l2)
-                        n1 = (-a1[1], a1[0])
-                        n2 = (a2[1], -a2[0])
-                        # calculate new position as intersection point between two lines (original edges, shifted along normals)
-                        if abs(a1[1] * a2[0] - a1[0] * a2[1]) < 0.0001:
-                            # edges are parallel, simply shift along n1
-                            new_point = (point[0] + n1[0]*shift_value, point[1] + n1[1]*shift_value)
-                        else:
-                            t = (a2[0]*(post_point[1] + n2[1]*shift_value - pre_point[1] - n1[1]*shift_value) + a2[1]*(pre_point[0] + n1[0]*shift_value - post_point[0] - n2[0]*shift_value)) / (a1[1] * a2[0] - a1[0] * a2[1])
-                            new_point = (pre_point[0] + n1[0]*shift_value + a1[0] * t, pre_point[1] + n1[1]*shift_value + a1[1] * t)
-                        shifted_chain.append(new_point)
-                    # set obstacle
-                    rvo.add_obstacle(self._simulators[group_index], shifted_chain)
-                    self._obstacles.append(shifted_chain)
+                self._obstacles.append([])
+                self._obstacles_indexes.append([])
+                for chain in self._navmesh_boundary[group_index]:
+                    self._add_chain_obstacle(group_index, self._get_shifted_chain(chain))
                 rvo.process_obstacles(self._simulators[group_index])
 
         self._agent_id = 0  # use this value for adding the new agent
@@ -273,12 +231,58 @@ class PathFinder(object):
         self._agents_height: List[List[float]] = []  # store here y-height of the path points
         self._agents_group: List[int] = []  # store here group of an each agent, position of the value in the array is agent index in total list of ids
         self._agents_group_id: List[List[int]] = []  # for each group store ids of agents in the current simulator
+        self._agents_flow_field: List[int] = []  # store here target polygon of the flow field, used by agent, or -1
+        self._agents_polygon: List[int] = []  # store here the last known polygon of the agent (or -1), it is the start of the move along the navmesh surface
+        self._agents_y: List[float] = []  # store here the height of the agent, it is updated when agents are snapped to the navmesh
         for g in range(self._groups_count):
             self._agents_group_id.append([])  # init by emty arrays
         self._agents_id: List[int] = []  # plain list of ids of all agents, index of the id allows to find agent data in other arrays
         self._agents_to_delete: List[int] = []  # store here agent ids we need to delete before update step
         self._last_update_time = time.time()
 
+    def _add_chain_obstacle(self, group_index: int, shifted_chain: List[Tuple[float, float]]):
+        '''add shifted boundary chain to the simulator of the group, process_obstacles should be called after it
+        '''
+        self._obstacles_indexes[group_index].append(rvo.add_obstacle(self._simulators[group_index], shifted_chain))
+        self._obstacles[group_index].append(shifted_chain)
+
+    def _get_shifted_chain(self, chain: List[Tuple[int, int]]) -> List[Tuple[float, float]]:
+        '''create rvo obstacle from the boundary chain
+
+        Return:
+            array of 2d-points of the chain, shifted outside by the agent radius
+        '''
+        # we should shift all edges of the navmesh boundary into agent radius value
+        shift_value: float = 1.0 * self._agent_radius
+        vertices = self._navmesh.get_vertices()
+        chain_vertices = []
+        for edge in chain:
+            chain_vertices.append((vertices[edge[0]][0], vertices[edge[0]][2]))  # ignore y-coordinate
+        chain_vertices.append((vertices[chain[-1][1]][0], vertices[chain[-1][1]][2]))
+
+        shifted_chain = []
+        for i in range(len(chain) + 1):
+            pre_point = chain_vertices[i - 1 if i - 1 >= 0 else -1]
+            point = chain_vertices[i]
+            post_point = chain_vertices[i + 1 if i + 1 < len(chain_vertices) else 0]
+            a1 = (point[0] - pre_point[0], point[1] - pre_point[1])
+            a2 = (point[0] - post_point[0], point[1] - post_point[1])
+            l1 = math.sqrt(a1[0]**2 + a1[1]**2)
+            l2 = math.sqrt(a2[0]**2 + a2[1]**2)
+            a1 = (a1[0] / l1, a1[1] / l1)
+            a2 = (a2[0] / l2, a2[1] / l2)
+            n1 = (-a1[1], a1[0])
+            n2 = (a2[1], -a2[0])
+            # calculate new position as intersection point between two lines (original edges, shifted along normals)
+            if abs(a1[1] * a2[0] - a1[0] * a2[1]) < 0.0001:
+                # edges are parallel, simply shift along n1
+                new_point = (point[0] + n1[0]*shift_value, point[1] + n1[1]*shift_value)
+            else:
+                t = (a2[0]*(post_point[1] + n2[1]*shift_value - pre_point[1] - n1[1]*shift_value) + a2[1]*(pre_point[0] + n1[0]*shift_value - post_point[0] - n2[0]*shift_value)) / (a1[1] * a2[0] - a1[0] * a2[1])
+                new_point = (pre_point[0] + n1[0]*shift_value + a1[0] * t, pre_point[1] + n1[1]*shift_value + a1[1] * t)
+            shifted_chain.append(new_point)
+        return shifted_chain
+
     def add_agent(self, position: Tuple[float, float, float], radius: float, speed: float) -> int:
         '''return agent id
 
@@ -286,6 +290,7 @@ class PathFinder(object):
         '''
         is_add = True
         add_group = 0
+        add_polygon = -1
         if self._navmesh is not None:
             node = self._navmesh.sample_polygon(position)
             if node is None:
@@ -293,6 +298,8 @@ class PathFinder(object):
             else:
                 # get valid group of the polygon
                 add_group = node.get_group()
+                if isinstance(self._navmesh, Navmesh):
+                    add_polygon = node.get_index()
         if is_add:
             add_position = (position[0], position[2])  # use only x and z coordinate
             rvo.add_agent(self._simulators[add_group],
@@ -312,6 +319,9 @@ class PathFinder(object):
             self._agents_height.append([])
             self._agents_group.append(add_group)
             self._agents_group_id[add_group].append(self._agent_id)
+            self._agents_flow_field.append(-1)
+            self._agents_polygon.append(add_polygon)
+            self._agents_y.append(position[1])
 
             self._agents_id.append(self._agent_id)
             self._agent_id += 1
@@ -322,7 +332,7 @@ class PathFinder(object):
         self._agents_to_delete.append(agent_id)
 
     def get_obstacles_points(self) -> List[List[Tuple[float, float]]]:
-        return self._obstacles
+        return [obstacle for group_obstacles in self._obstacles for obstacle in group_obstacles]
 
     def _to_direction(self, from_point: Tuple[float, float], to_point: Tuple[float, float]) -> Tuple[float, float]:
         '''create direction unit vector from one point to the other in 2d
@@ -338,9 +348,53 @@ class PathFinder(object):
         '''Calculate the path from current agent position to the destination position
         '''
         p = self.get_agent_position(agent_id)
-        a_path = self.search_path((p[0], 0.0, p[1]), position)
+        agent_index = self._get_agent_inner_index(agent_id)
+        if agent_index > -1:
+            self._release_flow_field(agent_index)
+        if self._use_flow_fields and self._navmesh is not None and agent_index > -1:
+            field = self._acquire_flow_field(agent_index, position)
+            a_path = [] if field is None else self._navmesh.search_path_in_field(field, (p[0], 0.0, p[1]), position)
+            if len(a_path) == 0:
+                # the agent will not move, so, it does not need the field
+                self._release_flow_field(agent_index)
+        else:
+            a_path = self.search_path((p[0], 0.0, p[1]), position)
         self._set_agent_path(agent_id, a_path)  # set raw 3-float tuples path
 
+    def _acquire_flow_field(self, agent_index: int, position: Tuple[float, float, float]) -> Optional[FlowField]:
+        '''return flow field to the polygon with a given position and increase the number of it users
+        the field is created, if it does not exist
+        '''
+        node = self._navmesh.sample_polygon(position)
+        if node is None:
+            return None
+        target = node.get_index()
+        if target not in self._flow_fields:
+            field = self._navmesh.create_flow_field(target)
+            if field is None:
+                return None
+            self._flow_fields[target] = field
+            self._flow_fields_users[target] = 0
+        self._flow_fields_users[target] += 1
+        self._agents_flow_field[agent_index] = target
+        return self._flow_fields[target]
+
+    def _release_flow_field(self, agent_index: int):
+        '''decrease the number of users of the flow field, used by the agent, and delete the field, if there are no other users
+        '''
+        target = self._agents_flow_field[agent_index]
+        if target > -1:
+            self._agents_flow_field[agent_index] = -1
+            self._flow_fields_users[target] -= 1
+            if self._flow_fields_users[target] <= 0:
+                self._flow_fields.pop(target)
+                self._flow_fields_users.pop(target)
+
+    def get_flow_fields_count(self) -> int:
+        '''return the number of flow fields, which are used by agents
+        '''
+        return len(self._flow_fields)
+
     def _set_agent_path(self, agent_id: int, path: List[Tuple[float, float, float]]):
         agent_index = self._get_agent_inner_index(agent_id)
         if agent_index  > -1:
@@ -400,6 +454,10 @@ class PathFinder(object):
                 group_index = self._agents_group[agent_inner_index]
                 agent_in_group_index = self._get_agent_group_index(agent_id, self._agents_group_id[group_index])
                 # delete
+                self._release_flow_field(agent_inner_index)
+                self._agents_flow_field.pop(agent_inner_index)
+                self._agents_polygon.pop(agent_inner_index)
+                self._agents_y.pop(agent_inner_index)
                 self._agents_height.pop(agent_inner_index)
                 self._agents_target_direction.pop(agent_inner_index)
                 self._agents_target_index.pop(agent_inner_index)
@@ -443,7 +501,16 @@ class PathFinder(object):
                             # there are other targets in the path
                             # try to switch to the enxt target point
                             next_target: Tuple[float, float] = self._agents_targets[agent_inner_index][agent_target_index + 1]
+                            # obstacles of the simulator are shifted by the agent radius, so this test keeps the clearance from walls
                             is_next_visible: bool = rvo.query_visibility(sim, current_position, next_target)
+                            agent_polygon: int = self._agents_polygon[agent_inner_index]
+                            if is_next_visible and self._snap_to_navmesh and isinstance(self._navmesh, Navmesh) and agent_polygon > -1:
+                                # the polygon of the agent is known, so also trace the segment through navmesh polygons
+                                # it uses only connected polygons, so it rejects targets, visible only through other levels of the navmesh
+                                walk_hit = self._navmesh.walkability_raycast((current_position[0], self._agents_y[agent_inner_index], current_position[1]),
+                                                                             (next_target[0], 0.0, next_target[1]),
+                                                                             agent_polygon)
+                                is_next_visible = walk_hit is not None and not walk_hit[0]
                             if is_next_visible:
                                 # the next target point is visible, switch to it
                                 self._agents_target_index[agent_inner_index] += 1
@@ -457,12 +524,24 @@ class PathFinder(object):
                         self._agents_activity[agent_inner_index] = False
                         # also clear the path
                         self._agents_path[agent_inner_index] = []
+                        self._release_flow_field(agent_inner_index)
                     else:
                         # try to update the path
                         if update_path and len(self._agents_targets[agent_inner_index]) > 0:
                             target_position = self._agents_targets[agent_inner_index][-1]
-                            # set the height of the start point the height of the start of the current segment
-                            a_path = self.search_path((current_position[0], self._agents_height[agent_inner_index][self._agents_target_index[agent_inner_index]], current_position[1]), (target_position[0], self._agents_height[agent_inner_index][-1], target_position[1]))
+                            if self._snap_to_navmesh and self._agents_polygon[agent_inner_index] > -1:
+                                # the agent is snapped to the known polygon, so it height is the exact height of the surface
+                                path_start = (current_position[0], self._agents_y[agent_inner_index], current_position[1])
+                            else:
+                                # set the height of the start point the height of the start of the current segment
+                                path_start = (current_position[0], self._agents_height[agent_inner_index][self._agents_target_index[agent_inner_index]], current_position[1])
+                            path_finish = (target_position[0], self._agents_height[agent_inner_index][-1], target_position[1])
+                            agent_field = self._agents_flow_field[agent_inner_index]
+                            if agent_field > -1:
+                                # the agent follows the flow field, so, we need only the funnel along it
+                                a_path = self._navmesh.search_path_in_field(self._flow_fields[agent_field], path_start, path_finish)
+                            else:
+                                a_path = self.search_path(path_start, path_finish)
                             self._set_agent_path(agent_id, a_path)  # set raw 3-float tuples path
                         if not should_deactivate:
                             to_vector = (target[0] - current_position[0], target[1] - current_position[1])
@@ -473,6 +552,8 @@ class PathFinder(object):
                     rvo.set_agent_pref_velocity(sim, agent_index, (0.0, 0.0))
             else:
                 rvo.set_agent_pref_velocity(sim, agent_index, (0.0, 0.0))
+        # positions before the simulation are start points of agents moves along the navmesh surface
+        surface_starts: List[Tuple[float, float]] = self.get_all_agents_positions() if self._snap_to_navmesh and isinstance(self._navmesh, Navmesh) else []
         # simulate in each group
         for sim in self._simulators:
             rvo.simulate(sim, delta_time, self._move_agents)
@@ -483,13 +564,20 @@ class PathFinder(object):
                 sim = self._simulators[group_index]
                 agent_in_group_index = self._get_agent_group_index(agent_id, self._agents_group_id[group_index])
                 agent_position = rvo.get_agent_position(sim, agent_in_group_index)  # return 2d-position
-                # sample navmesh
+                agent_polygon = self._agents_polygon[agent_index]
+                if agent_polygon > -1 and len(surface_starts) > 0:
+                    # move from the previous position inside the known polygon, the move is clipped by boundary edges of the navmesh
+                    # it gives the polygon and the height of the new position, so the search of the closest point is not needed
+                    start = surface_starts[agent_index]
+                    move = self._navmesh.move_along_surface(agent_polygon, (start[0], 0.0, start[1]), (agent_position[0], 0.0, agent_position[1]))
+                    if move is not None:
+                        move_position, self._agents_polygon[agent_index] = move
+                        self._agents_y[agent_index] = move_position[1]
+                        rvo.set_agent_position(sim, agent_in_group_index, (move_position[0], move_position[2]))
+                        continue
+                # the polygon of the agent is unknown (or the navmesh is tiled), so sample navmesh
                 # before we should find proper y-coordinate of the agent
                 # from rvo we obtain only 2d-position
-
-                # TODO: may be we should store the proportion of the path segment for each agent
-                # and then find the proper height by linear interpolation between height of the path segment endpoints
-
                 # use height of the end point of the current segment in the path
                 agent_heights = self._agents_height[agent_index]
                 agent_target = self._agents_target_index[agent_index]
@@ -497,7 +585,18 @@ class PathFinder(object):
                     y_height = agent_heights[agent_target]
                 else:
                     y_height = 0.0
-                sample_position = self._navmesh.sample((agent_position[0], y_height, agent_position[1]))
+                if isinstance(self._navmesh, Navmesh):
+                    # start from the polygon of the previous update, the agent moves only a bit, so it is in the same or neighbor polygon
+                    sample_hit = self._navmesh.sample_from_hint((agent_position[0], y_height, agent_position[1]), self._agents_polygon[agent_index])
+                    sample_position = None
+                    if sample_hit is not None:
+                        sample_position = sample_hit[0]
+                        self._agents_y[agent_index] = sample_position[1]
+                        if sample_hit[1] > -1:
+                            # if the agent is outside of the navmesh, then keep the previous polygon, it is near the snapped position
+                            self._agents_polygon[agent_index] = sample_hit[1]
+                else:
+                    sample_position = self._navmesh.sample((agent_position[0], y_height, agent_position[1]))
                 if sample_position:
                     # sample is not None
                     # set agent position
@@ -550,6 +649,12 @@ class PathFinder(object):
         agent_index = self._get_agent_group_index(agent_id, self._agents_group_id[agent_group])
         return rvo.get_agent_position(self._simulators[agent_group], agent_index)
 
+    def get_agent_height(self, agent_id: int) -> float:
+        '''return y-coordinate of the agent
+        if snap_to_navmesh is True, then it is the height of the navmesh surface at the agent position after the last update, in other case it is the height of the initial position
+        '''
+        return self._agents_y[self._get_agent_inner_index(agent_id)]
+
     def get_agents_count(self) -> int:
         return len(self._agents_id)
 
@@ -573,13 +678,15 @@ class PathFinder(object):
     def search_path(self,
                     start: Tuple[float, float, float],
                     finish: Tuple[float, float, float],
-                    length_limit_coefficient: Optional[float] = None) -> List[Tuple[float, float, float]]:
+                    length_limit_coefficient: Optional[float] = None,
+                    any_angle: bool = False) -> List[Tuple[float, float, float]]:
         '''Search the path between start and finish points in the navigation mesh
 
         Input:
             start - 3-tuple (x, y, z) of the start point
             finish - 3-tuple (x, y, z) of the finish point
             length_limit_coefficient - float or None (by default), shoulw be >= 1.0
+            any_angle - if True, then use Polyanya any-angle search, which returns the shortest path by one search (length_limit_coefficient is ignored)
 
         Return:
             array in the form [(x1, y1, z1), (x2, y2, z2), ...] with coordinates of points, which form the output path
@@ -594,9 +701,261 @@ class PathFinder(object):
         if self._navmesh is None:
             return [start, finish]
         else:
-            return self._navmesh.search_path(start, finish, length_limit_coefficient)
+            return self._navmesh.search_path(start, finish, length_limit_coefficient, any_angle)
+
+    def search_paths(self, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[List[Tuple[float, float, float]]]:
+        '''Search pathes for several pairs of start and finish points at once
+
+        Input:
+            pairs - array of 2-tuples (start, finish), each point is a 3-tuple (x, y, z)
+
+        Return:
+            array of pathes in the same order as input pairs, each path in the same format as in search_path method
+            pairs with the common destination polygon share the graph search, so it faster than call search_path for each pair
+        '''
+        if self._navmesh is None:
+            return [[start, finish] for start, finish in pairs]
+        else:
+            return self._navmesh.search_paths(pairs)
+
+    def are_reachable(self, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[bool]:
+        '''Check for several pairs (start, finish), is there a path between points, without searching the path
+
+        Return:
+            array of boolean values in the same order as input pairs
+            if navmesh is not created, then all values are True
+        '''
+        if self._navmesh is None:
+            return [True] * len(pairs)
+        else:
+            return self._navmesh.are_reachable(pairs)
+
+    def save_landmarks(self, file_path: str):
+        '''save precalculated landmarks of the navmesh into binary file
+        '''
+        if self._navmesh:
+            self._navmesh.save_landmarks(file_path)
+
+    def save_snapshot(self, file_path: str):
+        '''save all derived data of the navmesh into binary file
+        the file can be loaded by Navmesh.load_snapshot and passed to the PathFinder constructor
+        '''
+        if self._navmesh:
+            self._navmesh.save_snapshot(file_path)
+
+    def load_landmarks(self, file_path: str):
+        '''load landmarks of the navmesh from binary file, created by save_landmarks method
+        '''
+        if self._navmesh:
+            self._navmesh.load_landmarks(file_path)
+
+    def get_last_search_stats(self) -> Tuple[int, int]:
+        '''return 2-tuple (abstract, refined) with the number of expanded nodes in the hierarchical abstract graph
+        and in the polygons graph during the last path search
+        if the navmesh is not created, return (0, 0)
+        '''
+        if self._navmesh:
+            return self._navmesh.get_last_search_stats()
+        else:
+            return (0, 0)
+
+    def get_path_cache_stats(self) -> Tuple[int, int]:
+        '''return 2-tuple (hits, misses) of the navmesh path cache
+        if the navmesh is not created, return (0, 0)
+        '''
+        if self._navmesh:
+            return self._navmesh.get_path_cache_stats()
+        else:
+            return (0, 0)
+
+    def get_navmesh_tile_stats(self) -> Tuple[int, int, int]:
+        '''return 3-tuple (hits, misses, evictions) of tile loads for the tiled navmesh
+        if the navmesh is not tiled, return (0, 0, 0)
+        '''
+        if isinstance(self._navmesh, TiledNavmesh):
+            return self._navmesh.get_tile_stats()
+        else:
+            return (0, 0, 0)
+
+    def get_build_timings(self) -> Dict[str, float]:
+        '''return dictionary with times (in seconds) of navmesh construction phases
+        if the navmesh is not created, return empty dictionary
+        '''
+        if self._navmesh:
+            return self._navmesh.get_build_timings()
+        else:
+            return {}
+
+    def prewarm_navmesh(self, in_background: bool = True) -> Optional[threading.Thread]:
+        '''create all lazy navmesh structures (graphs of polygon groups and triangles bvh)
+        if in_background is True, then structures are created in the separate thread, and the method returns this thread
+        '''
+        if self._navmesh:
+            return self._navmesh.prewarm(in_background)
+        else:
+            return None
+
+    def get_navmesh_memory_report(self) -> Dict[str, Tuple[int, int]]:
+        '''return dictionary with the number of created objects and its approximate memory size (in bytes) for each navmesh structure
+        if the navmesh is not created, return empty dictionary
+        '''
+        if self._navmesh:
+            return self._navmesh.get_memory_report()
+        else:
+            return {}
+
+    def get_bvh_quality_report(self, points: List[Tuple[float, float, float]]) -> Dict[str, Dict[str, float]]:
+        '''return the quality of navmesh bvh-trees for the given query points (see Navmesh.get_bvh_quality_report)
+        if the navmesh is not created or it is tiled, return empty dictionary
+        '''
+        if isinstance(self._navmesh, Navmesh):
+            return self._navmesh.get_bvh_quality_report(points)
+        else:
+            return {}
+
+    def add_polygons(self, vertices: List[Tuple[float, float, float]], polygons: List[List[int]]) -> List[int]:
+        '''add new polygons to the navigation mesh without rebuilding it (for example, opened passage)
 
-    def sample(self, point: Tuple[float, float, float], is_slow: bool = False) -> Optional[Tuple[float, float, float]]:
+        Input:
+            vertices - coordinates of new vertices, they get indexes after all existing vertices of the navmesh
+            polygons - new polygons, vertex indexes can refer to existing and new vertices
+
+        Return:
+            indexes of new polygons, or empty array if the navmesh is not created
+        '''
+        if self._navmesh is None:
+            return []
+        new_polygons = self._navmesh.add_polygons(vertices, polygons)
+        self._apply_navmesh_edit()
+        return new_polygons
+
+    def remove_polygons(self, polygons: List[int]):
+        '''remove polygons from the navigation mesh (for example, destroyed floor), indexes of other polygons are not changed
+        '''
+        if self._navmesh:
+            self._navmesh.remove_polygons(polygons)
+            self._apply_navmesh_edit()
+
+    def disable_polygons(self, polygons: List[int]):
+        '''temporary exclude polygons from the navigation mesh (for example, closed doors or other temporary blockers)
+        '''
+        if self._navmesh:
+            self._navmesh.disable_polygons(polygons)
+            self._apply_navmesh_edit()
+
+    def enable_polygons(self, polygons: List[int]):
+        '''return back polygons, disabled by disable_polygons method
+        '''
+        if self._navmesh:
+            self._navmesh.enable_polygons(polygons)
+            self._apply_navmesh_edit()
+
+    def _apply_navmesh_edit(self):
+        '''update simulators after the navmesh edit
+        only groups, changed by the edit, are processed: obstacles of these groups are created again,
+        agents of these groups are moved to simulators of new groups and flow fields over these groups are deleted
+        '''
+        changed_groups = self._navmesh.get_last_edit_groups()
+        # create simulators for new groups
+        while len(self._simulators) < self._navmesh.get_groups_count():
+            self._simulators.append(rvo.create_simulator(neighbor_dist=self._neighbor_dist,
+                                                         max_neighbors=self._max_neighbors,
+                                                         time_horizon=self._time_horizon,
+                                                         time_horizon_obst=self._time_horizon_obst,
+                                                         radius=self._agent_radius,
+                                                         max_speed=self._max_speed))
+            self._agents_group_id.append([])
+            self._navmesh_boundary.append([])
+            self._obstacles.append([])
+            self._obstacles_indexes.append([])
+        self._groups_count = len(self._simulators)
+        # the navmesh creates only chains near edited polygons, other chains are the same objects (may be moved to other groups)
+        # so, only obstacles of changed chains are removed from simulators and added to them, other obstacles are not touched
+        # and shifted obstacles of moved chains are reused
+        shifted_chains: Dict[int, Tuple[List[Tuple[int, int]], List[Tuple[float, float]]]] = {}
+        for group_index in changed_groups:
+            for chain, obstacle in zip(self._navmesh_boundary[group_index], self._obstacles[group_index]):
+                shifted_chains[id(chain)] = (chain, obstacle)
+        for group_index in changed_groups:
+            boundary: List[List[Tuple[int, int]]] = self._navmesh.get_group_boundary(group_index)
+            boundary_ids: Set[int] = set(id(chain) for chain in boundary)
+            kept_chains: Dict[int, Tuple[List[Tuple[float, float]], int]] = {}
+            for chain, obstacle, obstacle_index in zip(self._navmesh_boundary[group_index], self._obstacles[group_index], self._obstacles_indexes[group_index]):
+                if id(chain) in boundary_ids:
+                    kept_chains[id(chain)] = (obstacle, obstacle_index)
+                else:
+                    rvo.remove_obstacle(self._simulators[group_index], obstacle_index)
+            self._navmesh_boundary[group_index] = boundary
+            self._obstacles[group_index] = []
+            self._obstacles_indexes[group_index] = []
+            for chain in boundary:
+                if id(chain) in kept_chains:
+                    obstacle, obstacle_index = kept_chains[id(chain)]
+                    self._obstacles[group_index].append(obstacle)
+                    self._obstacles_indexes[group_index].append(obstacle_index)
+                else:
+                    self._add_chain_obstacle(group_index, shifted_chains[id(chain)][1] if id(chain) in shifted_chains else self._get_shifted_chain(chain))
+            rvo.process_obstacles(self._simulators[group_index])
+        # move agents into simulators of new groups
+        changed_set = set(changed_groups)
+        for agent_index, agent_id in enumerate(self._agents_id):
+            group_index = self._agents_group[agent_index]
+            if group_index in changed_set:
+                position = self.get_agent_position(agent_id, agent_index)
+                new_group: int = -1
+                if self._snap_to_navmesh and self._agents_polygon[agent_index] > -1:
+                    # the height of the agent is exact, so locate it from the previous polygon (it can be disabled, then the bvh is used)
+                    polygon: int = self._navmesh.locate_from_hint((position[0], self._agents_y[agent_index], position[1]), self._agents_polygon[agent_index])
+                    self._agents_polygon[agent_index] = polygon
+                    if polygon > -1:
+                        new_group = self._navmesh.get_polygon_group(polygon)
+                else:
+                    agent_heights = self._agents_height[agent_index]
+                    agent_target = self._agents_target_index[agent_index]
+                    y_height = agent_heights[agent_target] if agent_target < len(agent_heights) else 0.0
+                    node = self._navmesh.sample_polygon((position[0], y_height, position[1]))
+                    if node is not None:
+                        new_group = node.get_group()
+                if new_group > -1 and new_group != group_index:
+                    self._move_agent_to_group(agent_index, new_group)
+        # flow fields are calculated for old graphs of groups, so agents should use usual path search
+        for target in [t for t, field in self._flow_fields.items() if field.get_group() in changed_set]:
+            self._flow_fields.pop(target)
+            self._flow_fields_users.pop(target)
+            for agent_index in range(len(self._agents_flow_field)):
+                if self._agents_flow_field[agent_index] == target:
+                    self._agents_flow_field[agent_index] = -1
+        # pathes of agents should be updated at the next update call
+        self._last_path_find_update = 0.0
+
+    def _move_agent_to_group(self, agent_index: int, new_group: int):
+        '''move the agent from the simulator of the current group to the simulator of other group
+        '''
+        agent_id = self._agents_id[agent_index]
+        old_group = self._agents_group[agent_index]
+        old_sim = self._simulators[old_group]
+        index_in_group = self._get_agent_group_index(agent_id, self._agents_group_id[old_group])
+        rvo.add_agent(self._simulators[new_group],
+                      position=rvo.get_agent_position(old_sim, index_in_group),
+                      neighbor_dist=rvo.get_agent_neighbor_dist(old_sim, index_in_group),
+                      max_neighbors=rvo.get_agent_max_neighbors(old_sim, index_in_group),
+                      time_horizon=rvo.get_agent_time_horizon(old_sim, index_in_group),
+                      time_horizon_obst=rvo.get_agent_time_horizon_obst(old_sim, index_in_group),
+                      radius=rvo.get_agent_radius(old_sim, index_in_group),
+                      max_speed=rvo.get_agent_max_speed(old_sim, index_in_group),
+                      velocity=rvo.get_agent_velocity(old_sim, index_in_group))
+        rvo.delete_agent(old_sim, [index_in_group])
+        self._agents_group_id[old_group].pop(index_in_group)
+        self._agents_group_id[new_group].append(agent_id)
+        self._agents_group[agent_index] = new_group
+
+    def clear_path_cache(self):
+        '''remove all stored corridors from the navmesh path cache
+        '''
+        if self._navmesh:
+            self._navmesh.clear_path_cache()
+
+    def sample(self, point: Tuple[float, float, float], is_slow: bool = False, max_distance: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
         '''return coordinates of the point inside navmesh (if it presented), closest to the input one
         if it fails to find the closest point or the navmesh is not initialized, return None
 
@@ -604,12 +963,13 @@ class PathFinder(object):
             point - coordinates of the input point
             is_slow - set True to find closest point in all triangles of the navmesh,
                       set False to use BVH and skip triangles in bounding boxes far away from the input point
+            max_distance - if defined, then find closest point in all triangles closer than this distance, is_slow is ignored
 
         Output:
             coordinates of the closest point or None
         '''
         if self._navmesh:
-            return self._navmesh.sample(point, is_slow)
+            return self._navmesh.sample(point, is_slow, max_distance)
         else:
             return None
 
@@ -628,3 +988,113 @@ class PathFinder(object):
             return self._navmesh.raycast(origin, direction)
         else:
             return None
+
+    def raycast_hit(self, origin: Tuple[float, float, float],
+                    direction: Tuple[float, float, float],
+                    max_distance: Optional[float] = None,
+                    any_hit: bool = False) -> Optional[Tuple[Tuple[float, float, float], float, int]]:
+        '''return 3-tuple (intersection point, distance from the origin, polygon index) for the ray and the navigation mesh
+        if navmesh is not defined or the ray does not intersect it, then return None
+
+        Input:
+            origin - coordinates of the point in the ray
+            direction - coordinates of the ray direction
+            max_distance - if defined, then only intersections closer than this distance are found
+            any_hit - if True, then return the first found intersection instead of the closest one (enough for visibility tests)
+        '''
+        if self._navmesh:
+            return self._navmesh.raycast_hit(origin, direction, max_distance, any_hit)
+        else:
+            return None
+
+    def locate_from_hint(self, point: Tuple[float, float, float], polygon: int) -> int:
+        '''return index of the polygon with the point, the search starts from the hint polygon and walks across portals (see Navmesh.locate_from_hint)
+        if navmesh is not defined or it is tiled, then return -1
+        '''
+        if isinstance(self._navmesh, Navmesh):
+            return self._navmesh.locate_from_hint(point, polygon)
+        else:
+            return -1
+
+    def move_along_surface(self, polygon: int, start: Tuple[float, float, float], end: Tuple[float, float, float]) -> Optional[Tuple[Tuple[float, float, float], int]]:
+        '''move the point from the start position in the given polygon to the end position, constrained by the navmesh (see Navmesh.move_along_surface)
+        return 2-tuple (new position, polygon index) or None, if navmesh is not defined or it is tiled
+        '''
+        if isinstance(self._navmesh, Navmesh):
+            return self._navmesh.move_along_surface(polygon, start, end)
+        else:
+            return None
+
+    def get_height(self, x: float, z: float, hint_polygon: Optional[int] = None) -> Optional[float]:
+        '''return y-coordinate of the navmesh surface at the point (x, z), calculated from the plane of the polygon with this point (see Navmesh.get_height)
+        return None, if the point is outside of the navmesh, or if navmesh is not defined or it is tiled
+        '''
+        if isinstance(self._navmesh, Navmesh):
+            return self._navmesh.get_height(x, z, hint_polygon)
+        else:
+            return None
+
+    def get_heights(self, points: Any, hint_polygons: Optional[List[int]] = None) -> Tuple[Any, Any]:
+        '''return heights of the navmesh surface for the batch of points (x, z) (see Navmesh.get_heights)
+
+        Input:
+            points - numpy array with the shape (n, 2) or any sequence of pairs (x, z)
+            hint_polygons - indexes of hint polygons for each point, -1 for points without the hint
+
+        Output:
+            2-tuple (heights, polygons), polygons are -1 for points without the answer (and for all points, if navmesh is not defined or it is tiled)
+            with numpy these are arrays with the shape (n, ), without numpy - lists of floats and ints
+        '''
+        if isinstance(self._navmesh, Navmesh):
+            return self._navmesh.get_heights(points, hint_polygons)
+        else:
+            count: int = len(to_pairs_list(points))
+            return pack_heights([0.0] * count, [-1] * count)
+
+    def get_all_agents_heights(self) -> List[float]:
+        '''return heights of the navmesh surface at positions of all agents, ordered by ids
+        polygons of agents from the last update are used as hints, for agents outside of the navmesh (and for tiled navmesh) return stored heights (as in get_agent_height)
+        '''
+        if not isinstance(self._navmesh, Navmesh):
+            return list(self._agents_y)
+        heights, polygons = self._navmesh.get_heights(self.get_all_agents_positions(), self._agents_polygon)
+        return [float(heights[i]) if polygons[i] > -1 else self._agents_y[i] for i in range(len(self._agents_y))]
+
+    def walkability_raycast(self, start: Tuple[float, float, float], end: Tuple[float, float, float], polygon: int = -1, clearance: float = 0.0) -> Optional[Tuple[bool, float, Optional[Tuple[Tuple[float, float, float], Tuple[float, float, float]]], int]]:
+        '''trace the segment from start to end through navmesh polygons across portals (see Navmesh.walkability_raycast)
+        return 4-tuple (is hit, t, hit edge, polygon index) or None, if the start point is outside of the navmesh, or navmesh is not defined or it is tiled
+        '''
+        if isinstance(self._navmesh, Navmesh):
+            return self._navmesh.walkability_raycast(start, end, polygon, clearance)
+        else:
+            return None
+
+    def sample_many(self, points: Any, is_slow: bool = False, max_distance: Optional[float] = None) -> Tuple[Any, Any]:
+        '''return closest points inside navmesh for the batch of points, parameters is_slow and max_distance are the same as in sample method
+        if numpy is installed, then queries are vectorized for large batches
+
+        Input:
+            points - numpy array with the shape (n, 3) or any sequence of 3-tuples
+
+        Output:
+            2-tuple (closest points, mask), mask is False for points without the answer (and for all points, if the navmesh is not initialized)
+            with numpy these are arrays with shapes (n, 3) and (n, ), without numpy - lists of 3-tuples and bools
+        '''
+        if self._navmesh:
+            return self._navmesh.sample_many(points, is_slow, max_distance)
+        else:
+            return pack_points([None] * get_points_count(points))
+
+    def raycast_many(self, origins: Any, directions: Any) -> Tuple[Any, Any]:
+        '''return closest intersections of the navigation mesh and the batch of rays
+
+        Input:
+            origins, directions - numpy arrays with the shape (n, 3) or any sequences of 3-tuples with the same length
+
+        Output:
+            2-tuple (intersection points, mask) in the same form as the output of sample_many method
+        '''
+        if self._navmesh:
+            return self._navmesh.raycast_many(origins, directions)
+        else:
+            return pack_points([None] * get_points_count(origins))
@@ -1,86 +1,982 @@
+import sys
 import math
-from typing import List, Tuple, Optional
+import time
+import threading
+import struct
+from array import array
+from collections import OrderedDict, deque
+from typing import List, Tuple, Optional, Dict, Set, Any, Union, Sequence
 from pathfinder.navmesh.navmesh_graph import NavmeshGraph
 from pathfinder.navmesh.navmesh_node import NavmeshNode
-from pathfinder.navmesh.navmesh_bvh import NavmeshBVH
-from pathfinder.navmesh.navmesh_triangle import TrianglesBVH, polygons_to_triangles
+from pathfinder.navmesh.navmesh_data import NavmeshData
+from pathfinder.navmesh.navmesh_bvh import NavmeshBVH, BVH_LEAF_SIZE
+from pathfinder.navmesh.navmesh_grid import NavmeshGrid
+from pathfinder.navmesh.navmesh_triangle import Triangle, TrianglesBVH, polygons_to_triangles
+from pathfinder.navmesh.navmesh_flow import FlowField
+from pathfinder.navmesh.navmesh_hierarchy import NavmeshHierarchy
+from pathfinder.navmesh.navmesh_polyanya import PolyanyaSearch
+from pathfinder.navmesh.navmesh_snapshot import write_snapshot, read_snapshot
+from pathfinder.navmesh.navmesh_batch import np, BATCH_MIN_SIZE, to_pairs_list, pack_heights, get_planes_heights
+
+LANDMARKS_MAGIC = b"NMLM"
+LANDMARKS_VERSION = 1
+POLYGONS_INDEXES = ("bvh", "grid")
+LOCATE_MAX_STEPS = 8  # the number of polygons, visited by the walk from the hint polygon before fallback to the bvh
+MOVE_MAX_POLYGONS = 48  # the maximum number of polygons, visited by move_along_surface
 
 
 class Navmesh:
-    def __init__(self, vertices: List[Tuple[float, float, float]], polygons: List[List[int]]):
+    def __init__(self,
+                 vertices: List[Tuple[float, float, float]],
+                 polygons: List[List[int]],
+                 path_cache_size: int = 0,
+                 cluster_size: Optional[float] = None,
+                 landmarks_count: int = 0,
+                 bvh_builder: str = "median",
+                 bvh_leaf_size: int = BVH_LEAF_SIZE,
+                 polygons_index: str = "bvh",
+                 grid_cell_size: Optional[float] = None):
+        '''Create navigation mesh from polygonal description
+
+        Input:
+            vertices - array of vertex coordinates [(x1, y1, z1), (x2, y2, z2), ...]
+            polygons - array of polygon vertex indexes [[i11, i12, ..., i1n], [i21, i22, ...], ...]
+            path_cache_size - maximum number of polygon corridors stored in the path cache, 0 disables the cache
+            cluster_size - if defined, then build hierarchical abstraction of the polygons graph
+                           polygons are clustered by square cells with this size in XZ-plane
+                           long-distance searches use the abstract graph of clusters and then refine the path only in visited clusters
+            landmarks_count - the number of landmarks in each group for ALT heuristic, 0 means that only straight-line heuristic is used
+                              precalculated landmarks can be saved by save_landmarks and loaded by load_landmarks methods
+            bvh_builder - the method for building polygons and triangles bvh-trees: median (split by the mean of centers in XZ-plane, one polygon in each leaf)
+                          or sah (binned surface area heuristic along all axes), sah is slower to build, but it is better for layered navmeshes
+                          use get_bvh_quality_report method to compare trees
+            bvh_leaf_size - the maximum number of polygons (or triangles) in the leaf for sah builder
+            polygons_index - the structure for finding the polygon with the point: bvh (NavmeshBVH) or grid (uniform grid of cells in XZ-plane)
+                             grid is faster for nearly planar navmeshes, polygons of overlapped floors are in the same cells
+            grid_cell_size - the size of the grid cell, if None, then it is calculated by the average size of polygons
+        '''
+        if polygons_index not in POLYGONS_INDEXES:
+            raise ValueError("unknown polygons index " + str(polygons_index) + ", it should be one of " + str(POLYGONS_INDEXES))
         self._vertices: List[Tuple[float, float, float]] = vertices
         self._polygons: List[List[int]] = polygons
-        self._graphs: List[NavmeshGraph] = []  # graph, where vertices are centers of polygons, edges are pairs of two incident (by edge only!) polygons
-        self._nodes: List[NavmeshNode] = []
+        self._graphs: List[Optional[NavmeshGraph]] = []  # graph, where vertices are centers of polygons, edges are pairs of two incident (by edge only!) polygons
+        self._landmarks_count: int = landmarks_count
+        self._removed_polygons: Set[int] = set()  # indexes of polygons, removed by remove_polygons method
+        self._disabled_polygons: Set[int] = set()  # indexes of polygons, temporary disabled by disable_polygons method
+        self._build_timings: Dict[str, float] = {}  # key - the name of construction phase, value - time in seconds
+        phase_time: float = time.time()
+        self._data: NavmeshData = NavmeshData(vertices, polygons)  # all polygons data in plain arrays
         self._groups: List[List[int]] = []  # each group is an array of node indexes with the same group index
+        phase_time = self._finish_build_phase("data", phase_time)
 
-        vertex_map: List[List[int]] = [[] for v in range(len(vertices))]  # index - vertex index, value - array of incident polygons
-        for p_index in range(len(polygons)):
-            # iterate throw polygons
-            for p_v_index in polygons[p_index]:
-                # add polygon index to the array of corresponding vertices
-                vertex_map[p_v_index].append(p_index)
-            # create the node
-            self._nodes.append(NavmeshNode(vertices, p_index, polygons[p_index]))
-
-        # next we can use vertex_map for define neighbors of each polygon
-        for node in self._nodes:
-            node_vertices: List[int] = node.get_vertex_indexes()
-            # for each vertex of the node (polygon) we should get indexes of incident polygons and take intersections of each sequential pair
-            for v_num in range(len(node_vertices)):
-                u: int = node_vertices[v_num]
-                v: int = node_vertices[v_num + 1 if v_num < len(node_vertices) - 1 else 0]
-                intersection: List[int] = self._get_intersection(vertex_map[u], vertex_map[v])
-                if len(intersection) == 0:
-                    print("[Something wrong] Intersection of polygons, incident to vertices " + str(u) + " and " + str(v) + " are empty")
-                elif len(intersection) == 2:
-                    # in principle, other cases are impossible
-                    node_index: int = node.get_index()
-                    if node_index not in intersection:
-                        print("[Something wrong] Polygon " + str(node_index) + " does not contained in the neighborhood of two incident vertices")
-                    else:
-                        for i in intersection:
-                            if i != node_index:
-                                node.add_neighbor(i, self._vertices[u], self._vertices[v])
-                elif len(intersection) > 2:
-                    print("[Something wrong] Intersection of polygons, incident to vertices " + str(u) + " and " + str(v) + " contains " + str(len(intersection)) + " items " + str(intersection))
+        # map from undirected edge to corners of polygons with this edge
+        edge_map: Dict[Tuple[int, int], List[int]] = self._build_edge_map()
+        # next we can use edge_map for define neighbors of each polygon
+        # corner indexes are increasing, so we can find the polygon of the corner by sequential enumeration
+        corner_polygons: List[int] = [node_index for node_index in range(len(polygons)) for _ in range(len(polygons[node_index]))]
+        for edge_key, corners in edge_map.items():
+            if len(corners) == 2:
+                # in principle, other cases are impossible
+                a: int = corner_polygons[corners[0]]
+                b: int = corner_polygons[corners[1]]
+                if a == b:
+                    print("[Something wrong] Polygon " + str(a) + " contains the edge " + str(edge_key) + " twice")
+                elif b in self._data.get_neighbors(a):
+                    print("[Something wrong] Try to add neighbor node " + str(b) + " to the " + str(a) + ", but this node already exists")
+                else:
+                    self._data.set_corner_neighbor(corners[0], b)
+                    self._data.set_corner_neighbor(corners[1], a)
+            elif len(corners) > 2:
+                print("[Something wrong] Edge " + str(edge_key) + " is incident to " + str(len(corners)) + " polygons " + str([corner_polygons[c] for c in corners]))
+        phase_time = self._finish_build_phase("adjacency", phase_time)
 
         # define groups
-        for node in self._nodes:
-            g: int = node.get_group()
-            if g == -1:
-                # if we get the first polygon with undefined group
-                new_group: List[int] = []  # start new group array
-                new_index: int = len(self._groups)  # generate the next group index
-                node.set_group(new_index, new_group, self._nodes)  # start recursive provess
-                self._groups.append(new_group)
-
-        # finally, define the graph
-        # one graph for each group
+        for node_index in range(len(polygons)):
+            if self._data.get_group(node_index) == -1:
+                # if we get the first polygon with undefined group, then start new group
+                self._groups.append(self._label_group(node_index, len(self._groups)))
+        phase_time = self._finish_build_phase("groups", phase_time)
+
+        # graphs of groups are created at the first use
+        self._graphs = [None] * len(self._groups)
+        self._graphs_arrays: List[Optional[Dict[str, array]]] = [None] * len(self._groups)  # arrays for graphs, loaded from the snapshot
+
+        # boundary of each group, used for rvo obstacles
+        self._boundary: List[List[List[Tuple[int, int]]]] = [self._build_group_boundary(group_index) for group_index in range(len(self._groups))]
+        self._finish_build_phase("boundary", phase_time)
+        self._init_queries(path_cache_size, cluster_size, bvh_builder, bvh_leaf_size, polygons_index, grid_cell_size)
+
+    def _build_edge_map(self) -> Dict[Tuple[int, int], List[int]]:
+        '''Return the map from undirected edge to corners of polygons with this edge
+        key - pair (u, v) of vertex indexes with u < v, value - array of corner indexes (in plain array of all corners)
+        removed polygons are skipped
+        '''
+        edge_map: Dict[Tuple[int, int], List[int]] = {}
+        for node_index in range(self._data.get_polygons_count()):
+            if node_index not in self._removed_polygons:
+                corners_start, corners_end = self._data.get_polygon_range(node_index)
+                for corner in range(corners_start, corners_end):
+                    edge_key: Tuple[int, int] = self._get_corner_edge(corner, corners_start, corners_end)
+                    if edge_key in edge_map:
+                        edge_map[edge_key].append(corner)
+                    else:
+                        edge_map[edge_key] = [corner]
+        return edge_map
+
+    def _get_corner_edge(self, corner: int, corners_start: int, corners_end: int) -> Tuple[int, int]:
+        '''Return the pair (u, v) with u < v of vertex indexes of the edge from the corner to the next one
+        '''
+        u: int = self._data.get_corner_vertex(corner)
+        v: int = self._data.get_corner_vertex(corner + 1 if corner < corners_end - 1 else corners_start)
+        return (u, v) if u < v else (v, u)
+
+    def _label_group(self, start: int, group_index: int) -> List[int]:
+        '''Set the group index for all polygons without group, connected with the start polygon, and return these polygons
+        '''
+        new_group: List[int] = []
+        # traverse all polygons, connected with the current one, by using explicit stack (so, long corridors does not overflow recursion)
+        # neighbors are pushed in reverse order, so polygons are labeled in the depth-first order
+        stack: List[int] = [start]
+        while len(stack) > 0:
+            polygon: int = stack.pop()
+            if self._data.get_group(polygon) == -1:
+                self._data.set_group(polygon, group_index)
+                new_group.append(polygon)
+                neighbors: List[int] = self._data.get_neighbors(polygon)
+                for i in range(len(neighbors) - 1, -1, -1):
+                    if self._data.get_group(neighbors[i]) == -1:
+                        stack.append(neighbors[i])
+        return new_group
+
+    def _build_graph(self, group_index: int) -> NavmeshGraph:
+        '''Create the graph for the group, where vertices are polygons and edges connect polygons with common edge
+        '''
+        graph_arrays: Optional[Dict[str, array]] = self._graphs_arrays[group_index]
+        if graph_arrays is not None:
+            self._graphs_arrays[group_index] = None
+            return NavmeshGraph.from_arrays(graph_arrays)
+        graph_edges: List[Tuple[int, int]] = []  # each graph is an aray of pairs (n1, n2), where n1 and n2 are node (=polygon) indexes and n1 < n2
+        graph_edges_set: Set[Tuple[int, int]] = set()
+        graph_verts_set: Set[int] = set()
+        for node_index in self._groups[group_index]:
+            for other_node in self._data.get_neighbors(node_index):
+                edge: Tuple[int, int] = (node_index, other_node) if node_index < other_node else (other_node, node_index)
+                # if this edge is new, add it to the graph
+                if edge not in graph_edges_set:
+                    graph_edges_set.add(edge)
+                    graph_edges.append(edge)
+                    graph_verts_set.update(edge)
+        # next we should get all graph node indexes, sort it and get it centers
+        graph_verts: List[int] = sorted(graph_verts_set)
+        graph: NavmeshGraph = NavmeshGraph([self._data.get_center(i) for i in graph_verts], graph_verts, graph_edges)
+        if self._landmarks_count > 0:
+            graph.build_landmarks(self._landmarks_count)
+        return graph
+
+    def _get_graph(self, group_index: int) -> NavmeshGraph:
+        '''Return the graph of the group, create it if it does not exist
+        '''
+        graph: Optional[NavmeshGraph] = self._graphs[group_index]
+        if graph is None:
+            with self._build_lock:
+                graph = self._graphs[group_index]
+                if graph is None:
+                    phase_time: float = time.time()
+                    graph = self._build_graph(group_index)
+                    self._graphs[group_index] = graph
+                    self._build_timings["graphs"] = self._build_timings.get("graphs", 0.0) + time.time() - phase_time
+        return graph
+
+    def _get_triangles_bvh(self) -> TrianglesBVH:
+        '''Return triangles bvh, create it if it does not exist
+        '''
+        triangles_bvh: Optional[TrianglesBVH] = self._triangles_bvh
+        if triangles_bvh is None:
+            with self._build_lock:
+                triangles_bvh = self._triangles_bvh
+                if triangles_bvh is None:
+                    phase_time: float = time.time()
+                    triangles = polygons_to_triangles(self._vertices, self._get_active_polygons())
+                    triangles_bvh = TrianglesBVH(triangles, builder=self._bvh_builder, leaf_size=self._bvh_leaf_size)
+                    self._triangles_bvh = triangles_bvh
+                    self._finish_build_phase("triangles_bvh", phase_time)
+        return triangles_bvh
+
+    def _get_hierarchy(self) -> Optional[NavmeshHierarchy]:
+        '''Return hierarchical abstraction of polygons graph, or None, if the cluster size is not defined
+        after edits of the navmesh the hierarchy is created again at the first use
+        '''
+        if self._cluster_size is not None and self._hierarchy is None:
+            with self._build_lock:
+                if self._hierarchy is None:
+                    phase_time: float = time.time()
+                    self._hierarchy = NavmeshHierarchy(self._data, self._cluster_size)
+                    self._finish_build_phase("hierarchy", phase_time)
+        return self._hierarchy
+
+    def prewarm(self, in_background: bool = True) -> Optional[threading.Thread]:
+        '''Create all lazy structures (graphs of all groups and triangles bvh)
+
+        Input:
+            in_background - if True, then structures are created in the separate daemon thread
+                            queries can be used at the same time, they wait only for the structure they need
+
+        Output:
+            started thread or None, if in_background is False
+        '''
+        if in_background:
+            thread: threading.Thread = threading.Thread(target=self._prewarm, daemon=True)
+            thread.start()
+            return thread
+        self._prewarm()
+        return None
+
+    def _prewarm(self):
+        for group_index in range(len(self._graphs)):
+            self._get_graph(group_index)
+        self._get_triangles_bvh()
+
+    def get_memory_report(self) -> Dict[str, Tuple[int, int]]:
+        '''Return dictionary with information about all navmesh structures
+        key - the name of the structure, value - 2-tuple (materialized, bytes)
+        materialized is the number of created objects: 0 or 1 for all structures except graphs, for graphs - the number of created graphs
+        bytes is approximate memory size of created objects (arrays, mapped from the snapshot, are not included)
+        '''
+        built_graphs: List[NavmeshGraph] = [graph for graph in self._graphs if graph is not None]
+        # lists, which are not created yet from the snapshot arrays, are not created by the report
+        shared: Tuple[object, ...] = (self, self._data, self.__dict__.get("_vertices"), self.__dict__.get("_polygons"))
+        groups: Optional[List[List[int]]] = self.__dict__.get("_groups")
+        boundary: Optional[List[List[List[Tuple[int, int]]]]] = self.__dict__.get("_boundary")
+        return {"data": (1, _get_object_size(self._data)),
+                "groups": (0 if groups is None else 1, _get_object_size(groups, shared)),
+                "boundary": (0 if boundary is None else 1, _get_object_size(boundary, shared)),
+                "graphs": (len(built_graphs), sum(_get_object_size(graph, shared) for graph in built_graphs)),
+                "hierarchy": (0 if self._hierarchy is None else 1, _get_object_size(self._hierarchy, shared)),
+                "edge_map": (0 if self._edge_map is None else 1, _get_object_size(self._edge_map, shared)),
+                "polyanya": (0 if self._polyanya is None else 1, _get_object_size(self._polyanya, shared)),
+                "path_cache": (len(self._path_cache), _get_object_size(self._path_cache, shared)),
+                "bvh": (1, _get_object_size(self._bvh, shared)),
+                "triangles_bvh": (0 if self._triangles_bvh is None else 1, _get_object_size(self._triangles_bvh, shared))}
+
+    def get_bvh_quality_report(self, points: List[Tuple[float, float, float]]) -> Dict[str, Dict[str, float]]:
+        '''Return the quality of polygons and triangles bvh-trees
+        it allows to compare builders (median or sah) for the same navmesh on the set of typical query points
+
+        Input:
+            points - array of points for point queries
+
+        Output:
+            dictionary with keys bvh and triangles_bvh, values are dictionaries with keys
+            nodes, leafs, max_depth, average_depth, average_leaf_size, average_overlap (of children aabbs), visited_nodes and visited_items (per query)
+            triangles bvh is created, if it does not exist
+            if the navmesh use the grid as polygons index, then the value for bvh key is the grid report (see NavmeshGrid.get_quality_report)
+        '''
+        return {"bvh": self._bvh.get_quality_report(points),
+                "triangles_bvh": self._get_triangles_bvh().get_quality_report(points)}
+
+    def _init_queries(self, path_cache_size: int, cluster_size: Optional[float], bvh_builder: str, bvh_leaf_size: int,
+                      polygons_index: str = "bvh",
+                      grid_cell_size: Optional[float] = None,
+                      bvh_arrays: Optional[Dict[str, Any]] = None,
+                      grid_arrays: Optional[Dict[str, Any]] = None,
+                      hierarchy_arrays: Optional[Dict[str, Any]] = None):
+        '''Create objects for path and point queries, which are not stored in the snapshot
+        bvh, grid or hierarchy is created from arrays, if they are defined (loaded from the snapshot)
+        '''
+        phase_time: float = time.time()
+        self._build_lock: threading.Lock = threading.Lock()  # used for creating lazy structures from different threads
+        self._polyanya: Optional[PolyanyaSearch] = None  # create it at the first any-angle search
+        self._cluster_size: Optional[float] = cluster_size
+        self._hierarchy: Optional[NavmeshHierarchy] = None
+        if hierarchy_arrays is not None:
+            self._hierarchy = NavmeshHierarchy.from_arrays(self._data, hierarchy_arrays)
+        elif cluster_size is not None:
+            self._hierarchy = NavmeshHierarchy(self._data, cluster_size)
+        phase_time = self._finish_build_phase("hierarchy", phase_time)
+        self._edge_map: Optional[Dict[Tuple[int, int], List[int]]] = None  # created at the first edit of the navmesh
+        self._edge_chains: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        self._chain_groups: Dict[int, int] = {}
+        self._last_edit_groups: List[int] = []
+        self._last_search_stats: Tuple[int, int] = (0, 0)
+
+        # cache of graph pathes between polygons, key - (start node, finish node, length limit coefficient)
+        # the most recently used pathes are at the end of the dictionary
+        self._path_cache: OrderedDict = OrderedDict()
+        self._path_cache_size: int = path_cache_size
+        self._path_cache_hits: int = 0
+        self._path_cache_misses: int = 0
+
+        # build the polygons index, both structures have the same interface (sample, insert, remove, get_arrays and get_quality_report)
+        self._bvh_builder: str = bvh_builder
+        self._bvh_leaf_size: int = bvh_leaf_size
+        self._bvh: Union[NavmeshBVH, NavmeshGrid]
+        if grid_arrays is not None:
+            self._bvh = NavmeshGrid.from_arrays(self._data, grid_arrays)
+        elif bvh_arrays is not None:
+            self._bvh = NavmeshBVH.from_arrays(self._data, bvh_arrays)
+        elif polygons_index == "grid":
+            self._bvh = NavmeshGrid(self._data, self._get_active_polygon_indexes(), grid_cell_size)
+        else:
+            self._bvh = NavmeshBVH(self._data, self._get_active_polygon_indexes(), bvh_builder, bvh_leaf_size)
+        self._finish_build_phase("bvh", phase_time)
+
+        # triangles bvh is created at the first sample or raycast query
+        self._triangles_bvh: Optional[TrianglesBVH] = None
+        # numpy copies of polygon planes are created at the first vectorized get_heights call
+        self._planes_arrays: Optional[Dict[str, Any]] = None
+        # vertices of boundary edges, they are used by walkability_raycast with positive clearance
+        self._boundary_vertices: Optional[Set[int]] = None
+
+    def _finish_build_phase(self, name: str, start_time: float) -> float:
+        '''Store the time of the construction phase and return the start time for the next phase
+        '''
+        end_time: float = time.time()
+        self._build_timings[name] = end_time - start_time
+        return end_time
+
+    def get_build_timings(self) -> Dict[str, float]:
+        '''Return the dictionary with times (in seconds) of navmesh construction phases
+        keys are: data, adjacency, groups, boundary, hierarchy, bvh
+        if the navmesh is loaded from the snapshot, then the first four keys are replaced by the key snapshot
+        graphs and triangles bvh are created at the first use, so keys graphs (total time for all created graphs) and triangles_bvh appear after it
+        '''
+        return dict(self._build_timings)
+
+    def _build_group_boundary(self, group_index: int) -> List[List[Tuple[int, int]]]:
+        '''Find boundary edges of the group and order it in chains
+
+        Output:
+            array of chains (without final edge), each chain is an array of pairs of vertex indexes
+        '''
+        group_polygons: List[List[int]] = self.get_group_polygons(group_index)
+        # collect all edges
+        all_edges: List[Tuple[int, int]] = []
+        for p in group_polygons:
+            # p is an array of polygon vertex indices
+            for i in range(len(p)):
+                all_edges.append((p[i], p[i + 1 if i + 1 < len(p) else 0]))
+        # next we should find boundary edges
+        all_edges_set: Set[Tuple[int, int]] = set(all_edges)
+        boundary_edges: List[Tuple[int, int]] = [e for e in all_edges if (e[1], e[0]) not in all_edges_set]
+        return self._link_boundary_chains(boundary_edges)
+
+    def _link_boundary_chains(self, boundary_edges: List[Tuple[int, int]]) -> List[List[Tuple[int, int]]]:
+        '''Order boundary edges in chains
+
+        Output:
+            array of chains (without final edge), each chain is an array of pairs of vertex indexes
+        '''
+        if len(boundary_edges) == 0:
+            return []
+        # next we should order edges in cycles
+        # for each vertex store indexes of boundary edges, started at this vertex, in increasing order
+        # each step use the first unused edge, which continue the chain, or the last unused edge, if we should start new chain
+        starts: Dict[int, List[int]] = {}
+        for edge_index in range(len(boundary_edges) - 1, -1, -1):
+            starts.setdefault(boundary_edges[edge_index][0], []).append(edge_index)  # reversed, so the first edge is at the end
+        is_used: List[bool] = [False] * len(boundary_edges)
+        unused_count: int = len(boundary_edges)
+        last_unused: int = len(boundary_edges) - 1
+
+        def take_edge(edge_index: int) -> Tuple[int, int]:
+            nonlocal unused_count
+            is_used[edge_index] = True
+            unused_count -= 1
+            return boundary_edges[edge_index]
+
+        def take_last() -> Tuple[int, int]:
+            nonlocal last_unused
+            while is_used[last_unused]:
+                last_unused -= 1
+            return take_edge(last_unused)
+
+        boundary_chains: List[List[Tuple[int, int]]] = []
+        current_chain: List[Tuple[int, int]] = [take_last()]
+        while unused_count > 0:
+            # next find the edge with the same start as the end of e
+            e: Tuple[int, int] = current_chain[-1]
+            candidates: List[int] = starts.get(e[1], [])
+            while len(candidates) > 0 and is_used[candidates[-1]]:
+                candidates.pop()
+            if len(candidates) == 0:
+                # we fails to find the next edge
+                # drop this chain
+                current_chain = [take_last()]
+            else:
+                f: Tuple[int, int] = take_edge(candidates.pop())
+                if f[1] == current_chain[0][0]:
+                    # this is the last edge in the cycles of the chain, does not add it
+                    boundary_chains.append(current_chain)
+                    if unused_count > 0:
+                        current_chain = [take_last()]
+                else:
+                    current_chain.append(f)
+        return boundary_chains
+
+    def get_group_boundary(self, group_index: int) -> List[List[Tuple[int, int]]]:
+        '''Return boundary of the group as array of chains, each chain is an array of pairs of vertex indexes
+        the last edge of each chain (from the end of the last pair to the start of the first pair) is omitted
+        '''
+        return self._boundary[group_index] if group_index < len(self._boundary) else []
+
+    def get_vertices(self) -> List[Tuple[float, float, float]]:
+        return self._vertices
+
+    def get_data(self) -> NavmeshData:
+        '''Return plain arrays of all polygons (include removed and disabled), it is used by other navmesh modules (for example, tiles)
+        '''
+        return self._data
+
+    def get_polygons_count(self) -> int:
+        '''Return the number of polygons in the navigation mesh, including removed and disabled polygons
+        '''
+        return self._data.get_polygons_count()
+
+    def get_polygon_group(self, polygon: int) -> int:
+        '''Return the index of the group (connected component) of the polygon
+        '''
+        return self._data.get_group(polygon)
+
+    def is_polygon_active(self, polygon: int) -> bool:
+        '''Return True, if the polygon is not removed and not disabled
+        '''
+        return polygon not in self._removed_polygons and polygon not in self._disabled_polygons
+
+    def _get_active_polygon_indexes(self) -> Optional[List[int]]:
+        '''Return indexes of all active polygons, or None, if all polygons are active
+        '''
+        if len(self._removed_polygons) == 0 and len(self._disabled_polygons) == 0:
+            return None
+        return [p for p in range(self._data.get_polygons_count()) if self.is_polygon_active(p)]
+
+    def _get_active_polygons(self) -> List[List[int]]:
+        '''Return all polygons, where removed and disabled polygons are replaced by empty arrays (so, indexes of polygons are the same)
+        '''
+        if len(self._removed_polygons) == 0 and len(self._disabled_polygons) == 0:
+            return self._polygons
+        return [polygon if self.is_polygon_active(p) else [] for p, polygon in enumerate(self._polygons)]
+
+    def add_polygons(self, vertices: List[Tuple[float, float, float]], polygons: List[List[int]]) -> List[int]:
+        '''Add new polygons to the navigation mesh without rebuilding it
+
+        Only adjacency of new polygons and groups of it neighbors are updated, bvh-trees are refitted
+        The first edit of the navmesh create editable copies of input arrays and the map of polygon edges
+
+        Input:
+            vertices - coordinates of new vertices, they get indexes after all existing vertices
+            polygons - new polygons, vertex indexes can refer to existing and new vertices
+
+        Output:
+            indexes of new polygons
+        '''
+        with self._build_lock:
+            self._prepare_edit()
+            for vertex in vertices:
+                self._data.add_vertex(vertex)
+                self._vertices.append(vertex)
+            new_polygons: List[int] = []
+            for polygon in polygons:
+                polygon_index: int = self._data.add_polygon(polygon)
+                self._polygons.append(list(polygon))
+                self._add_polygon_edges(polygon_index)
+                new_polygons.append(polygon_index)
+            self._activate_polygons(new_polygons)
+        return new_polygons
+
+    def remove_polygons(self, polygons: List[int]):
+        '''Remove polygons from the navigation mesh, indexes of other polygons are not changed
+        removed polygons can not be enabled again
+        '''
+        with self._build_lock:
+            self._prepare_edit()
+            to_remove: List[int] = [p for p in set(polygons) if p not in self._removed_polygons]
+            self._deactivate_polygons([p for p in to_remove if p not in self._disabled_polygons])
+            for polygon in to_remove:
+                self._removed_polygons.add(polygon)
+                self._disabled_polygons.discard(polygon)
+                self._remove_polygon_edges(polygon)
+
+    def disable_polygons(self, polygons: List[int]):
+        '''Temporary exclude polygons from the navigation mesh (for example, closed doors), it can be returned back by enable_polygons
+        '''
+        with self._build_lock:
+            self._prepare_edit()
+            to_disable: List[int] = [p for p in set(polygons) if self.is_polygon_active(p)]
+            self._deactivate_polygons(to_disable)
+            self._disabled_polygons.update(to_disable)
+
+    def enable_polygons(self, polygons: List[int]):
+        '''Return back polygons, disabled by disable_polygons method
+        '''
+        with self._build_lock:
+            self._prepare_edit()
+            to_enable: List[int] = [p for p in set(polygons) if p in self._disabled_polygons]
+            self._disabled_polygons.difference_update(to_enable)
+            self._activate_polygons(to_enable)
+
+    def get_last_edit_groups(self) -> List[int]:
+        '''Return indexes of groups, changed by the last edit (add, remove, disable or enable polygons)
+        it contains groups with changed polygons, groups, which become empty, and new groups
+        '''
+        return self._last_edit_groups
+
+    def _prepare_edit(self):
+        '''Create all data, required for navmesh edits: editable arrays and the map of polygon edges
+        it is called only once, before the first edit
+        '''
+        if self._edge_map is None:
+            self._data.make_editable()
+            self._vertices = list(self._vertices)
+            self._polygons = list(self._polygons)
+            self._edge_map = self._build_edge_map()
+            # map from boundary edge (including final edges) to the chain, and from the chain id to the group index
+            self._edge_chains = {}
+            self._chain_groups = {}
+            for group_index, chains in enumerate(self._boundary):
+                for chain in chains:
+                    self._chain_groups[id(chain)] = group_index
+                    for edge in self._get_chain_edges(chain):
+                        self._edge_chains[edge] = chain
+
+    def _add_polygon_edges(self, polygon: int):
+        corners_start, corners_end = self._data.get_polygon_range(polygon)
+        for corner in range(corners_start, corners_end):
+            self._edge_map.setdefault(self._get_corner_edge(corner, corners_start, corners_end), []).append(corner)
+
+    def _remove_polygon_edges(self, polygon: int):
+        corners_start, corners_end = self._data.get_polygon_range(polygon)
+        for corner in range(corners_start, corners_end):
+            edge_key: Tuple[int, int] = self._get_corner_edge(corner, corners_start, corners_end)
+            corners: List[int] = self._edge_map.get(edge_key, [])
+            if corner in corners:
+                corners.remove(corner)
+                if len(corners) == 0:
+                    self._edge_map.pop(edge_key)
+
+    def _link_polygon(self, polygon: int):
+        '''Connect the polygon with active polygons, which have the same edges
+        '''
+        self._boundary_vertices = None
+        corners_start, corners_end = self._data.get_polygon_range(polygon)
+        for corner in range(corners_start, corners_end):
+            others: List[int] = [c for c in self._edge_map.get(self._get_corner_edge(corner, corners_start, corners_end), []) if c != corner and self.is_polygon_active(self._data.get_corner_polygon(c))]
+            if len(others) == 1:
+                # more than two polygons with the same edge are impossible in the correct navmesh, so skip this case
+                other_polygon: int = self._data.get_corner_polygon(others[0])
+                if other_polygon != polygon and self._data.get_corner_neighbor(others[0]) == -1 and other_polygon not in self._data.get_neighbors(polygon):
+                    self._data.set_corner_neighbor(corner, other_polygon)
+                    self._data.set_corner_neighbor(others[0], polygon)
+
+    def _unlink_polygon(self, polygon: int):
+        '''Disconnect the polygon from all it neighbors
+        '''
+        self._boundary_vertices = None
+        corners_start, corners_end = self._data.get_polygon_range(polygon)
+        for corner in range(corners_start, corners_end):
+            other_polygon: int = self._data.get_corner_neighbor(corner)
+            if other_polygon > -1:
+                other_start, other_end = self._data.get_polygon_range(other_polygon)
+                for other_corner in range(other_start, other_end):
+                    if self._data.get_corner_neighbor(other_corner) == polygon:
+                        self._data.set_corner_neighbor(other_corner, -1)
+                self._data.set_corner_neighbor(corner, -1)
+
+    def _get_polygon_triangles(self, polygon: int) -> List[Triangle]:
+        vertices: List[int] = self._polygons[polygon]
+        return [Triangle([self._vertices[vertices[0]], self._vertices[vertices[i]], self._vertices[vertices[i + 1]]], polygon) for i in range(1, len(vertices) - 1)]
+
+    def _activate_polygons(self, polygons: List[int]):
+        '''Connect polygons with neighbors, add it to groups of neighbors and to bvh-trees
+
+        if polygons connect several groups, then the largest group takes polygons of other groups
+        so, the time is proportional to the number of polygons and the size of smaller groups
+        '''
+        for polygon in polygons:
+            self._link_polygon(polygon)
+            self._bvh.insert(polygon)
+            if self._triangles_bvh is not None:
+                for triangle in self._get_polygon_triangles(polygon):
+                    self._triangles_bvh.insert(triangle)
+        changed: Set[int] = set()
+        moved_chains: List[Tuple[List[Tuple[int, int]], int]] = []  # pairs (chain, new group)
+        touched: Set[int] = set(polygons)  # polygons with changed edges
+        for polygon in polygons:
+            if self._data.get_group(polygon) == -1:
+                # label new polygons, connected with the current one, by new group index
+                new_index: int = len(self._groups)
+                component: List[int] = self._label_group(polygon, new_index)
+                groups: Set[int] = set()
+                for p in component:
+                    for other in self._data.get_neighbors(p):
+                        touched.add(other)
+                        if self._data.get_group(other) != new_index:
+                            groups.add(self._data.get_group(other))
+                if len(groups) == 0:
+                    # polygons are not connected with existing groups, so they form the new group
+                    self._add_group(component)
+                    changed.add(new_index)
+                else:
+                    # merge all groups into the largest one
+                    target: int = max(sorted(groups), key=lambda g: len(self._groups[g]))
+                    for group_index in sorted(groups):
+                        if group_index != target:
+                            for p in self._groups[group_index]:
+                                self._data.set_group(p, target)
+                            self._groups[target].extend(self._groups[group_index])
+                            self._groups[group_index] = []
+                            moved_chains.extend((chain, target) for chain in self._boundary[group_index])
+                    for p in component:
+                        self._data.set_group(p, target)
+                    self._groups[target].extend(component)
+                    changed.update(groups)
+        self._finish_edit(changed, touched, moved_chains, [])
+
+    def _deactivate_polygons(self, polygons: List[int]):
+        '''Disconnect polygons from neighbors, remove it from groups and bvh-trees, separate parts of groups move to new groups
+        '''
+        seeds: Dict[int, List[int]] = {}  # key - group index, value - neighbors of deactivated polygons
+        touched: Set[int] = set(polygons)
+        for polygon in polygons:
+            group_index: int = self._data.get_group(polygon)
+            neighbors: List[int] = self._data.get_neighbors(polygon)
+            seeds.setdefault(group_index, []).extend(neighbors)
+            touched.update(neighbors)
+            self._unlink_polygon(polygon)
+            self._data.set_group(polygon, -1)
+            self._bvh.remove(polygon)
+            if self._triangles_bvh is not None:
+                for triangle in self._get_polygon_triangles(polygon):
+                    self._triangles_bvh.remove(triangle)
+        changed: Set[int] = set()
+        moved: List[int] = []  # polygons of separated parts
+        for group_index in sorted(seeds):
+            self._groups[group_index] = [p for p in self._groups[group_index] if self._data.get_group(p) == group_index]
+            changed.add(group_index)
+            parts: List[List[int]] = self._split_group([p for p in seeds[group_index] if self._data.get_group(p) == group_index])
+            if len(parts) > 0:
+                separated: Set[int] = set()
+                for part in parts:
+                    changed.add(self._add_group(part))
+                    separated.update(part)
+                    moved.extend(part)
+                self._groups[group_index] = [p for p in self._groups[group_index] if p not in separated]
+        self._finish_edit(changed, touched, [], moved)
+
+    def _add_group(self, polygons: List[int]) -> int:
+        '''Add new group with given polygons and return it index
+        '''
+        group_index: int = len(self._groups)
+        for polygon in polygons:
+            self._data.set_group(polygon, group_index)
+        self._groups.append(polygons)
+        self._graphs.append(None)
+        self._graphs_arrays.append(None)
+        self._boundary.append([])
+        return group_index
+
+    def _split_group(self, seeds: List[int]) -> List[List[int]]:
+        '''Find parts of the group, which are not connected after deactivation of polygons
+
+        Breadth-first searches from all seeds (neighbors of deactivated polygons) run in parallel, one polygon per step
+        When two searches meet each other, they are merged. When the search is finished before merging with others,
+        it contains the whole separated part. The last unfinished search is the main part of the group.
+        So, the time is proportional to the size of separated parts, but not to the size of the whole group
+
+        Output:
+            array of separated parts, each part is an array of polygon indexes, the main part is not included
+        '''
+        seeds = list(dict.fromkeys(seeds))
+        if len(seeds) < 2:
+            return []
+        owners: Dict[int, int] = {}  # key - polygon, value - index of the search, which visit it
+        parents: List[int] = list(range(len(seeds)))  # merged searches
+        queues: List[deque] = []
+        visited: List[List[int]] = []
+        for search_index, seed in enumerate(seeds):
+            owners[seed] = search_index
+            queues.append(deque([seed]))
+            visited.append([seed])
+
+        def find(search_index: int) -> int:
+            while parents[search_index] != search_index:
+                parents[search_index] = parents[parents[search_index]]
+                search_index = parents[search_index]
+            return search_index
+
+        alive: List[int] = list(range(len(seeds)))
+        finished: List[List[int]] = []
+        while len(alive) > 1:
+            next_alive: List[int] = []
+            for search_index in alive:
+                if find(search_index) != search_index:
+                    # this search is merged with other
+                    continue
+                queue: deque = queues[search_index]
+                if len(queue) == 0:
+                    finished.append(visited[search_index])
+                    continue
+                polygon: int = queue.popleft()
+                for other in self._data.get_neighbors(polygon):
+                    owner: Optional[int] = owners.get(other)
+                    if owner is None:
+                        owners[other] = search_index
+                        queue.append(other)
+                        visited[search_index].append(other)
+                    else:
+                        owner = find(owner)
+                        if owner != search_index:
+                            parents[owner] = search_index
+                            queue.extend(queues[owner])
+                            visited[search_index].extend(visited[owner])
+                next_alive.append(search_index)
+            alive = [i for i in next_alive if find(i) == i]
+        if len(alive) == 0:
+            # all searches are finished, so the largest part stay in the group
+            finished.remove(max(finished, key=len))
+        return finished
+
+    def _finish_edit(self, changed: Set[int], touched: Set[int], moved_chains: List[Tuple[List[Tuple[int, int]], int]], moved: List[int]):
+        '''Update boundaries and all dependent data of changed groups
+
+        Input:
+            changed - indexes of changed groups
+            touched - polygons with changed edges (edited polygons and it neighbors), boundary chains with edges of these polygons are created again
+            moved_chains - pairs (chain, group), chains of merged groups, which should be moved to the given group
+            moved - polygons, which are moved to other groups without edits, chains with it edges are moved to the group of polygons
+        '''
+        chain_groups: Dict[int, int] = self._chain_groups
+        edge_chains: Dict[Tuple[int, int], List[Tuple[int, int]]] = self._edge_chains
+        removed: Dict[int, Set[int]] = {}  # key - group index, value - ids of chains, which should be removed from the group
+        added: Dict[int, List[List[Tuple[int, int]]]] = {}  # key - group index, value - chains, which should be added to the group
+
+        def move_chain(chain: List[Tuple[int, int]], group_index: int):
+            removed.setdefault(chain_groups[id(chain)], set()).add(id(chain))
+            added.setdefault(group_index, []).append(chain)
+            chain_groups[id(chain)] = group_index
+
+        # chains with edges of touched polygons should be created again
+        touched_chains: Dict[int, List[Tuple[int, int]]] = {}
+        for polygon in touched:
+            corners_start, corners_end = self._data.get_polygon_range(polygon)
+            for corner in range(corners_start, corners_end):
+                u: int = self._data.get_corner_vertex(corner)
+                v: int = self._data.get_corner_vertex(corner + 1 if corner < corners_end - 1 else corners_start)
+                for edge in ((u, v), (v, u)):
+                    chain: Optional[List[Tuple[int, int]]] = edge_chains.get(edge)
+                    if chain is not None:
+                        touched_chains[id(chain)] = chain
+        for chain, group_index in moved_chains:
+            if id(chain) not in touched_chains:
+                move_chain(chain, group_index)
+        # chains of moved polygons are moved to new groups, if all edges of the chain are in one group
+        for polygon in moved:
+            corners_start, corners_end = self._data.get_polygon_range(polygon)
+            for corner in range(corners_start, corners_end):
+                if self._data.get_corner_neighbor(corner) == -1:
+                    u = self._data.get_corner_vertex(corner)
+                    v = self._data.get_corner_vertex(corner + 1 if corner < corners_end - 1 else corners_start)
+                    chain = edge_chains.get((u, v))
+                    if chain is not None and id(chain) not in touched_chains and chain_groups[id(chain)] != self._data.get_group(polygon):
+                        chain_edge_groups: Set[int] = set(self._get_boundary_edge_group(edge) for edge in self._get_chain_edges(chain))
+                        if len(chain_edge_groups) == 1:
+                            move_chain(chain, self._data.get_group(polygon))
+                        else:
+                            touched_chains[id(chain)] = chain
+        # collect edges of touched chains and new boundary edges of touched polygons
+        pool: Dict[Tuple[int, int], None] = {}
+        for chain in touched_chains.values():
+            removed.setdefault(chain_groups.pop(id(chain)), set()).add(id(chain))
+            for edge in self._get_chain_edges(chain):
+                pool[edge] = None
+                edge_chains.pop(edge, None)
+        for polygon in touched:
+            if self.is_polygon_active(polygon):
+                corners_start, corners_end = self._data.get_polygon_range(polygon)
+                for corner in range(corners_start, corners_end):
+                    if self._data.get_corner_neighbor(corner) == -1:
+                        pool[(self._data.get_corner_vertex(corner), self._data.get_corner_vertex(corner + 1 if corner < corners_end - 1 else corners_start))] = None
+        group_edges: Dict[int, List[Tuple[int, int]]] = {}
+        for edge in pool:
+            group_index: int = self._get_boundary_edge_group(edge)
+            if group_index > -1:
+                group_edges.setdefault(group_index, []).append(edge)
+        for group_index, edges in group_edges.items():
+            for chain in self._link_boundary_chains(edges):
+                added.setdefault(group_index, []).append(chain)
+                chain_groups[id(chain)] = group_index
+                for edge in self._get_chain_edges(chain):
+                    edge_chains[edge] = chain
+        # update boundary lists of groups, each list is replaced by the new one
+        for group_index in set(removed) | set(added):
+            ids: Set[int] = removed.get(group_index, set())
+            self._boundary[group_index] = [c for c in self._boundary[group_index] if id(c) not in ids] + added.get(group_index, [])
+            changed.add(group_index)
+
+        for group_index in changed:
+            self._graphs[group_index] = None
+            self._graphs_arrays[group_index] = None
+        self._last_edit_groups = sorted(changed)
+        # all other structures are created again at the first use
+        self._hierarchy = None
+        self._polyanya = None
+        self.clear_path_cache()
+
+    def _get_chain_edges(self, chain: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        '''Return all edges of the boundary chain, including the final edge
+        '''
+        return chain + [(chain[-1][1], chain[0][0])]
+
+    def _get_boundary_edge_group(self, edge: Tuple[int, int]) -> int:
+        '''Return the group of the active polygon with the given boundary edge (ordered as in the polygon), or -1, if the edge is not boundary
+        '''
+        for corner in self._edge_map.get((edge[0], edge[1]) if edge[0] < edge[1] else (edge[1], edge[0]), []):
+            if self._data.get_corner_vertex(corner) == edge[0] and self._data.get_corner_neighbor(corner) == -1:
+                polygon: int = self._data.get_corner_polygon(corner)
+                if self.is_polygon_active(polygon):
+                    return self._data.get_group(polygon)
+        return -1
+
+    def save_snapshot(self, file_path: str):
+        '''Save all derived data of the navmesh (polygon arrays, adjacency, groups, graphs with landmarks, boundary, polygons bvh or grid,
+        triangles bvh and the hierarchy, if the cluster size is defined) into binary file
+
+        The file can be loaded by Navmesh.load_snapshot without any calculations.
+        It is a container with named sections, see write_snapshot function in navmesh_snapshot module for the format description
+        '''
+        write_snapshot(file_path, self._get_snapshot_sections())
+
+    def _get_snapshot_sections(self) -> Dict[str, Any]:
+        '''Return all arrays, saved into the snapshot, key - the name of the section
+        '''
+        sections: Dict[str, Any] = {}
+        for name, values in self._data.get_arrays().items():
+            sections["data." + name] = values
+        group_offsets: array = array("i", [0])
+        group_polygons: array = array("i")
         for group in self._groups:
-            graph_edges: List[Tuple[int, int]] = []  # each graph is an aray of pairs (n1, n2), where n1 and n2 are node (=polygon) indexes and n1 < n2
-            for node_index in group:
-                node_neighbors: List[int] = self._nodes[node_index].get_neighbord()
-                for other_node in node_neighbors:
-                    edge: Tuple[int, int] = (node_index, other_node) if node_index < other_node else (other_node, node_index)
-                    # if this edge is new, add it to the graph
-                    if edge not in graph_edges:
-                        graph_edges.append(edge)
-            # next we should get all graph node indexes, sort it and get it centers
-            graph_verts: List[int] = []
-            for edge in graph_edges:
-                for i in range(2):
-                    if edge[i] not in graph_verts:
-                        graph_verts.append(edge[i])
-            graph_verts.sort()
-            self._graphs.append(NavmeshGraph([self._nodes[i].get_center() for i in graph_verts], graph_verts, graph_edges))
-
-        # build bvh
-        self._bvh: NavmeshBVH = NavmeshBVH(self._nodes)
-
-        # build triangles bvh
-        triangles = polygons_to_triangles(vertices, polygons)
-        self._triangles_bvh: TrianglesBVH = TrianglesBVH(triangles)
+            group_polygons.extend(group)
+            group_offsets.append(len(group_polygons))
+        sections["groups.offsets"] = group_offsets
+        sections["groups.polygons"] = group_polygons
+        for graph_index in range(len(self._graphs)):
+            for name, values in self._get_graph(graph_index).get_arrays().items():
+                sections["graph." + str(graph_index) + "." + name] = values
+        # boundary chains in CSR form: chains of the i-th group are in the interval [group_offsets[i], group_offsets[i + 1])
+        # edges of the j-th chain are in the interval [chain_offsets[j], chain_offsets[j + 1]), each edge is two values in the edges array
+        boundary_group_offsets: array = array("i", [0])
+        boundary_chain_offsets: array = array("i", [0])
+        boundary_edges: array = array("i")
+        for chains in self._boundary:
+            for chain in chains:
+                for edge in chain:
+                    boundary_edges.extend(edge)
+                boundary_chain_offsets.append(len(boundary_edges) // 2)
+            boundary_group_offsets.append(len(boundary_chain_offsets) - 1)
+        sections["boundary.group_offsets"] = boundary_group_offsets
+        sections["boundary.chain_offsets"] = boundary_chain_offsets
+        sections["boundary.edges"] = boundary_edges
+        # polygons, removed or disabled by navmesh edits
+        sections["edit.removed"] = array("i", sorted(self._removed_polygons))
+        sections["edit.disabled"] = array("i", sorted(self._disabled_polygons))
+        prefix: str = "grid." if isinstance(self._bvh, NavmeshGrid) else "bvh."
+        for name, values in self._bvh.get_arrays().items():
+            sections[prefix + name] = values
+        for name, values in self._get_triangles_bvh().get_arrays().items():
+            sections["triangles." + name] = values
+        hierarchy: Optional[NavmeshHierarchy] = self._get_hierarchy()
+        if hierarchy is not None:
+            for name, values in hierarchy.get_arrays().items():
+                sections["hierarchy." + name] = values
+        return sections
+
+    @staticmethod
+    def load_snapshot(file_path: str,
+                      path_cache_size: int = 0,
+                      cluster_size: Optional[float] = None,
+                      bvh_builder: str = "median",
+                      bvh_leaf_size: int = BVH_LEAF_SIZE,
+                      polygons_index: str = "bvh",
+                      grid_cell_size: Optional[float] = None) -> "Navmesh":
+        '''Create navigation mesh from the file, created by save_snapshot method
+
+        Arrays are used directly from the memory mapped file, so loading does not depend on the navmesh size
+        lists of vertices, polygons, groups and boundary chains are created from arrays at the first use
+        path_cache_size, cluster_size, bvh_builder and bvh_leaf_size parameters are the same as in the constructor
+        both bvh trees (or the grid) are stored in the snapshot, so bvh parameters are used only for trees, created after navmesh edits
+        and polygons_index, grid_cell_size are ignored
+        the hierarchy is used from the snapshot, if it was saved with the same cluster size, otherwise it is created again
+        landmarks are stored in the snapshot, if they were calculated for the saved navmesh
+        '''
+        phase_time: float = time.time()
+        sections, snapshot_map = read_snapshot(file_path)
+        return Navmesh._from_snapshot_sections(sections, snapshot_map, phase_time, path_cache_size, cluster_size, bvh_builder, bvh_leaf_size)
+
+    @staticmethod
+    def _from_snapshot_sections(sections: Dict[str, Any],
+                                snapshot_map: Any,
+                                phase_time: float,
+                                path_cache_size: int = 0,
+                                cluster_size: Optional[float] = None,
+                                bvh_builder: str = "median",
+                                bvh_leaf_size: int = BVH_LEAF_SIZE) -> "Navmesh":
+        '''Create navigation mesh from sections of the snapshot, which are views of the snapshot_map object (mapped file or shared memory block)
+        the navmesh keeps the reference to snapshot_map, so it is alive while views are used
+        '''
+        navmesh: Navmesh = Navmesh.__new__(Navmesh)
+        navmesh._build_timings = {}
+        navmesh._snapshot_map = snapshot_map
+        navmesh._snapshot_sections = sections
+        navmesh._data = NavmeshData.from_arrays(_get_sections(sections, "data."))
+        groups_count: int = len(sections["groups.offsets"]) - 1
+        navmesh._graphs = [None] * groups_count
+        navmesh._graphs_arrays = []
+        navmesh._landmarks_count = 0
+        for graph_index in range(groups_count):
+            prefix: str = "graph." + str(graph_index) + "."
+            navmesh._graphs_arrays.append(_get_sections(sections, prefix))
+            # graphs, created after edits, should contain the same number of landmarks
+            navmesh._landmarks_count = max(navmesh._landmarks_count, len(navmesh._graphs_arrays[-1]["landmarks"]))
+        navmesh._removed_polygons = set(sections["edit.removed"].tolist())
+        navmesh._disabled_polygons = set(sections["edit.disabled"].tolist())
+        navmesh._finish_build_phase("snapshot", phase_time)
+        bvh_arrays: Dict[str, Any] = _get_sections(sections, "bvh.")
+        grid_arrays: Dict[str, Any] = _get_sections(sections, "grid.")
+        hierarchy_arrays: Dict[str, Any] = _get_sections(sections, "hierarchy.")
+        navmesh._init_queries(path_cache_size, cluster_size, bvh_builder, bvh_leaf_size, "bvh", None,
+                              bvh_arrays if len(bvh_arrays) > 0 else None,
+                              grid_arrays if len(grid_arrays) > 0 else None,
+                              hierarchy_arrays if len(hierarchy_arrays) > 0 and hierarchy_arrays["cluster_size"][0] == cluster_size else None)
+        navmesh._triangles_bvh = TrianglesBVH.from_arrays(_get_sections(sections, "triangles."))
+        return navmesh
+
+    def __getattr__(self, name: str) -> Any:
+        '''Create lists of vertices, polygons, groups and boundary chains from arrays of the loaded snapshot at the first access
+        this method is called only for attributes, which are not defined yet
+        '''
+        sections: Optional[Dict[str, Any]] = self.__dict__.get("_snapshot_sections")
+        if sections is None or name not in ("_vertices", "_polygons", "_groups", "_boundary"):
+            raise AttributeError("'Navmesh' object has no attribute '" + name + "'")
+        value: Any
+        if name == "_vertices":
+            value = self._data.get_vertices()
+        elif name == "_polygons":
+            value = self._data.get_polygons()
+        elif name == "_groups":
+            group_offsets: List[int] = sections["groups.offsets"].tolist()
+            group_polygons: List[int] = sections["groups.polygons"].tolist()
+            value = [group_polygons[group_offsets[i]:group_offsets[i + 1]] for i in range(len(group_offsets) - 1)]
+        else:
+            boundary_group_offsets: List[int] = sections["boundary.group_offsets"].tolist()
+            boundary_chain_offsets: List[int] = sections["boundary.chain_offsets"].tolist()
+            boundary_edges: List[int] = sections["boundary.edges"].tolist()
+            value = []
+            for group_index in range(len(boundary_group_offsets) - 1):
+                chains: List[List[Tuple[int, int]]] = []
+                for chain_index in range(boundary_group_offsets[group_index], boundary_group_offsets[group_index + 1]):
+                    chains.append([(boundary_edges[2 * e], boundary_edges[2 * e + 1]) for e in range(boundary_chain_offsets[chain_index], boundary_chain_offsets[chain_index + 1])])
+                value.append(chains)
+        setattr(self, name, value)
+        return value
 
     def get_groups_count(self) -> int:
         '''Return the number of polygon groups (connected components) in the navigation mesh
@@ -94,29 +990,392 @@ class Navmesh:
             group: List[int] = self._groups[group_index]
             polygons: List[List[int]] = []
             for p_index in group:
-                polygons.append(self._nodes[p_index].get_polygon())
+                polygons.append(self._data.get_polygon(p_index))
             return polygons
         else:
             return []
 
+    def save_landmarks(self, file_path: str):
+        '''Save landmarks of all groups into binary file
+
+        The file starts from 4 bytes "NMLM", 32 bit integer format version and 32 bit integer with the number of groups
+        Then for each group it contains 32 bit integers with the number of landmarks and the number of graph vertices,
+        names of landmark vertices (32 bit integers) and distances from each landmark to all vertices (64 bit floats)
+
+        Byte order is big-endian
+        '''
+        with open(file_path, "wb") as file:
+            file.write(LANDMARKS_MAGIC)
+            file.write(struct.pack(">ii", LANDMARKS_VERSION, len(self._graphs)))
+            for graph_index in range(len(self._graphs)):
+                graph: NavmeshGraph = self._get_graph(graph_index)
+                landmarks, distances = graph.get_landmarks()
+                file.write(struct.pack(">ii", len(landmarks), graph.get_vertex_count()))
+                file.write(struct.pack(">" + str(len(landmarks)) + "i", *landmarks))
+                for d in distances:
+                    file.write(struct.pack(">" + str(len(d)) + "d", *d))
+
+    def load_landmarks(self, file_path: str):
+        '''Load landmarks, saved by save_landmarks method for the same navigation mesh
+        '''
+        with open(file_path, "rb") as file:
+            if file.read(4) != LANDMARKS_MAGIC:
+                raise ValueError("file " + file_path + " does not contain navmesh landmarks")
+            version, groups_count = struct.unpack(">ii", file.read(8))
+            if version != LANDMARKS_VERSION:
+                raise ValueError("unsupported landmarks format version " + str(version))
+            if groups_count != len(self._graphs):
+                raise ValueError("landmarks are saved for " + str(groups_count) + " groups, but the navmesh contains " + str(len(self._graphs)) + " groups")
+            for graph_index in range(len(self._graphs)):
+                graph = self._get_graph(graph_index)
+                landmarks_count, vertex_count = struct.unpack(">ii", file.read(8))
+                landmarks: List[int] = list(struct.unpack(">" + str(landmarks_count) + "i", file.read(4 * landmarks_count)))
+                distances: List[array] = [array("d", struct.unpack(">" + str(vertex_count) + "d", file.read(8 * vertex_count))) for i in range(landmarks_count)]
+                graph.set_landmarks(landmarks, distances)
+        self.clear_path_cache()
+
     def sample_polygon(self, position: Tuple[float, float, float]) -> Optional[NavmeshNode]:
         '''return node, close to the given point, or None, if it outside of the navmesh
         '''
-        return self._bvh.sample(position)
+        polygon: int = self._bvh.sample(position)
+        return NavmeshNode(self._data, polygon) if polygon > -1 else None
+
+    def locate_from_hint(self, point: Tuple[float, float, float], polygon: int, max_steps: int = LOCATE_MAX_STEPS) -> int:
+        '''return index of the polygon, which contains the point, or -1, if it outside of the navmesh
 
-    def sample(self, point: Tuple[float, float, float], is_slow: bool = False) -> Optional[Tuple[float, float, float]]:
+        The search starts from the hint polygon (for example, the polygon of the agent at the previous frame) and walks across portals
+        in the direction to the point. If the walk comes to the boundary edge or does not find the polygon after max_steps,
+        then the polygon is found by the bvh (as in sample_polygon). So, for points near the hint it takes only several polygon tests
+
+        Input:
+            point - coordinates of the input point
+            polygon - index of the hint polygon, if it is -1 or not active, then the bvh is used
+            max_steps - the maximum number of polygons in the walk
+
+        Output:
+            polygon index or -1
+        '''
+        located: int = self._walk_to_point(point, polygon, max_steps)
+        return located if located > -1 else self._bvh.sample(point)
+
+    def sample_from_hint(self, point: Tuple[float, float, float], polygon: int, max_steps: int = LOCATE_MAX_STEPS) -> Optional[Tuple[Tuple[float, float, float], int]]:
+        '''return 2-tuple (closest point on the navmesh, polygon index) for the point near the hint polygon, or None
+
+        The polygon is found by locate_from_hint, and the closest point is calculated only for triangles of this polygon
+        If the point is outside of the navmesh, then it is sampled by the triangles bvh (as in sample method) and the polygon index is -1
+        '''
+        located: int = self.locate_from_hint(point, polygon, max_steps)
+        if located > -1:
+            closest: Optional[Tuple[float, float, float]] = self._get_triangles_bvh().get_polygon_closest_point(point, located)
+            if closest is not None:
+                return (closest, located)
+        sample: Optional[Tuple[float, float, float]] = self._get_triangles_bvh().sample(point)
+        return (sample, -1) if sample is not None else None
+
+    def _walk_to_point(self, point: Tuple[float, float, float], polygon: int, max_steps: int) -> int:
+        '''return the polygon with the point, found by the walk across portals from the given polygon, or -1, if the walk fails
+        '''
+        if polygon < 0 or polygon >= self._data.get_polygons_count() or not self.is_polygon_active(polygon):
+            return -1
+        data: NavmeshData = self._data
+        for _ in range(max_steps):
+            corner: int = data.get_exit_corner(polygon, point)
+            if corner == -1:
+                return polygon
+            # neighbors of removed and disabled polygons are unlinked, so the walk is only over active polygons
+            polygon = data.get_corner_neighbor(corner)
+            if polygon == -1:
+                return -1
+        return -1
+
+    def move_along_surface(self, polygon: int,
+                           start: Tuple[float, float, float],
+                           end: Tuple[float, float, float],
+                           max_polygons: int = MOVE_MAX_POLYGONS) -> Optional[Tuple[Tuple[float, float, float], int]]:
+        '''move the point from the start position in the given polygon to the end position, constrained by the navmesh surface
+
+        Polygons are visited across portals in XZ-plane, only portals near the segment from start to end are used
+        (closer than the half of the segment length to it middle point). If the end point is inside the visited polygon, then it is the result,
+        in other case the result is the closest point to the end on boundary edges of visited polygons, so the point slides along walls
+        The height of the result is calculated by the plane of the polygon
+
+        Input:
+            polygon - index of the polygon, which contains the start point (for example, the polygon of the agent at the previous frame)
+            start, end - coordinates of points, only x and z are used
+            max_polygons - the maximum number of visited polygons
+
+        Output:
+            2-tuple (new position, polygon index) or None, if the start polygon is not active
+        '''
+        if polygon < 0 or polygon >= self._data.get_polygons_count() or not self.is_polygon_active(polygon):
+            return None
+        data: NavmeshData = self._data
+        end_x: float = end[0]
+        end_z: float = end[2]
+        center_x: float = (start[0] + end_x) / 2.0
+        center_z: float = (start[2] + end_z) / 2.0
+        radius_squared: float = ((end_x - start[0])**2 + (end_z - start[2])**2) / 4.0 + 0.000001
+        best_x: float = start[0]
+        best_z: float = start[2]
+        best_polygon: int = polygon
+        best_distance: float = float("inf")
+        visited: Set[int] = {polygon}
+        queue: deque = deque([polygon])
+        while queue:
+            current: int = queue.popleft()
+            start_corner, end_corner = data.get_polygon_range(current)
+            points: List[Tuple[float, float, float]] = data.get_polygon_coordinates(current)
+            if self._is_inside_2d(points, end_x, end_z):
+                best_x = end_x
+                best_z = end_z
+                best_polygon = current
+                break
+            for i in range(len(points)):
+                a: Tuple[float, float, float] = points[i]
+                b: Tuple[float, float, float] = points[(i + 1) % len(points)]
+                neighbor: int = data.get_corner_neighbor(start_corner + i)
+                if neighbor == -1:
+                    # the wall, the point can slide along it
+                    x, z, distance = self._get_segment_closest_2d(a, b, end_x, end_z)
+                    if distance < best_distance:
+                        best_x = x
+                        best_z = z
+                        best_polygon = current
+                        best_distance = distance
+                elif neighbor not in visited and len(visited) < max_polygons:
+                    # skip portals, which are far from the segment
+                    if self._get_segment_closest_2d(a, b, center_x, center_z)[2] <= radius_squared:
+                        visited.add(neighbor)
+                        queue.append(neighbor)
+        return ((best_x, self._get_polygon_height(best_polygon, best_x, best_z), best_z), best_polygon)
+
+    def walkability_raycast(self, start: Tuple[float, float, float],
+                            end: Tuple[float, float, float],
+                            polygon: int = -1,
+                            clearance: float = 0.0) -> Optional[Tuple[bool, float, Optional[Tuple[Tuple[float, float, float], Tuple[float, float, float]]], int]]:
+        '''check is the segment from start to end is walkable, i.e. it does not cross boundary edges of the navmesh
+
+        The segment is traced in XZ-plane through polygons across portals: for each polygon find the edge, where the segment leaves it,
+        if this edge is a portal, then continue from the neighbor polygon, in other case it is the hit. So, the cost is proportional
+        to the number of crossed polygons, and the walk is over connected polygons only, so it is correct for multi-level navmeshes
+
+        Input:
+            start, end - coordinates of points, only x and z of the end point are used
+            polygon - index of the polygon, which contains the start point, if it is -1, then the polygon is found by the bvh
+            clearance - if positive, then portals with boundary vertices (wall corners), closer than this value to the segment, are also hits
+
+        Output:
+            4-tuple (is hit, t, hit edge, polygon index) or None, if the start point is outside of the navmesh
+            t is the segment parameter of the hit (from 0.0 to 1.0) and the hit edge is the pair of edge vertex coordinates,
+            if there is no hit, then t is 1.0, the edge is None and the polygon contains the end point
+            in other case the polygon is the last polygon before the hit
+        '''
+        if polygon == -1:
+            polygon = self._bvh.sample(start)
+        if polygon < 0 or polygon >= self._data.get_polygons_count() or not self.is_polygon_active(polygon):
+            return None
+        data: NavmeshData = self._data
+        start_x: float = start[0]
+        start_z: float = start[2]
+        dx: float = end[0] - start_x
+        dz: float = end[2] - start_z
+        # each polygon is crossed at most once, so the number of steps is limited by the number of polygons
+        for _ in range(data.get_polygons_count()):
+            start_corner, end_corner = data.get_polygon_range(polygon)
+            points: List[Tuple[float, float, float]] = data.get_polygon_coordinates(polygon)
+            center: Tuple[float, float, float] = data.get_center(polygon)
+            exit_t: float = float("inf")
+            exit_index: int = -1
+            for i in range(len(points)):
+                a: Tuple[float, float, float] = points[i]
+                b: Tuple[float, float, float] = points[(i + 1) % len(points)]
+                ex: float = b[0] - a[0]
+                ez: float = b[2] - a[2]
+                # the sign of the cross product for the inner side of the edge
+                side: float = ex * (center[2] - a[2]) - ez * (center[0] - a[0])
+                start_cross: float = ex * (start_z - a[2]) - ez * (start_x - a[0])
+                delta: float = ex * dz - ez * dx  # change of the cross product along the segment
+                if side * delta < 0.0:
+                    # the segment goes outside through this edge
+                    t: float = -start_cross / delta
+                    if t < exit_t:
+                        exit_t = t
+                        exit_index = i
+            if exit_index == -1 or exit_t >= 1.0:
+                return (False, 1.0, None, polygon)
+            neighbor: int = data.get_corner_neighbor(start_corner + exit_index)
+            if neighbor == -1:
+                return (True, max(exit_t, 0.0), (points[exit_index], points[(exit_index + 1) % len(points)]), polygon)
+            if clearance > 0.0:
+                boundary_vertices: Set[int] = self._get_boundary_vertices()
+                for i in (exit_index, (exit_index + 1) % len(points)):
+                    if data.get_corner_vertex(start_corner + i) in boundary_vertices and self._get_segment_closest_2d(start, end, points[i][0], points[i][2])[2] < clearance * clearance:
+                        return (True, max(exit_t, 0.0), (points[exit_index], points[(exit_index + 1) % len(points)]), polygon)
+            polygon = neighbor
+        return None
+
+    def _get_boundary_vertices(self) -> Set[int]:
+        '''return the set of vertices on boundary edges of active polygons, it is created at the first call after the edit
+        '''
+        boundary_vertices: Optional[Set[int]] = self._boundary_vertices
+        if boundary_vertices is None:
+            data: NavmeshData = self._data
+            boundary_vertices = set()
+            for polygon in range(data.get_polygons_count()):
+                if self.is_polygon_active(polygon):
+                    start_corner, end_corner = data.get_polygon_range(polygon)
+                    for corner in range(start_corner, end_corner):
+                        if data.get_corner_neighbor(corner) == -1:
+                            boundary_vertices.add(data.get_corner_vertex(corner))
+                            boundary_vertices.add(data.get_corner_vertex(corner + 1 if corner < end_corner - 1 else start_corner))
+            self._boundary_vertices = boundary_vertices
+        return boundary_vertices
+
+    def _is_inside_2d(self, points: List[Tuple[float, float, float]], x: float, z: float) -> bool:
+        '''return True, if the point (x, z) is inside the convex polygon (or on it boundary) in XZ-plane, the orientation of the polygon can be any
+        '''
+        sign: float = 0.0
+        for i in range(len(points)):
+            a: Tuple[float, float, float] = points[i]
+            b: Tuple[float, float, float] = points[(i + 1) % len(points)]
+            cross: float = (b[0] - a[0]) * (z - a[2]) - (b[2] - a[2]) * (x - a[0])
+            if cross > 0.000001:
+                if sign < 0.0:
+                    return False
+                sign = 1.0
+            elif cross < -0.000001:
+                if sign > 0.0:
+                    return False
+                sign = -1.0
+        return True
+
+    def _get_segment_closest_2d(self, a: Tuple[float, float, float], b: Tuple[float, float, float], x: float, z: float) -> Tuple[float, float, float]:
+        '''return 3-tuple (x, z, squared distance) with the point of the segment ab in XZ-plane, closest to the point (x, z)
+        '''
+        d_x: float = b[0] - a[0]
+        d_z: float = b[2] - a[2]
+        length: float = d_x * d_x + d_z * d_z
+        t: float = 0.0 if length < 0.000000001 else max(0.0, min(1.0, ((x - a[0]) * d_x + (z - a[2]) * d_z) / length))
+        c_x: float = a[0] + t * d_x
+        c_z: float = a[2] + t * d_z
+        return (c_x, c_z, (c_x - x)**2 + (c_z - z)**2)
+
+    def _get_polygon_height(self, polygon: int, x: float, z: float) -> float:
+        '''return y-coordinate of the point (x, z) on the plane of the polygon (defined by it center and normal)
+        for vertical polygons return the height of the center
+        '''
+        c: Tuple[float, float, float] = self._data.get_center(polygon)
+        n: Tuple[float, float, float] = self._data.get_normal(polygon)
+        if abs(n[1]) < 0.000001:
+            return c[1]
+        return c[1] - ((x - c[0]) * n[0] + (z - c[2]) * n[2]) / n[1]
+
+    def get_height(self, x: float, z: float, hint_polygon: Optional[int] = None) -> Optional[float]:
+        '''return y-coordinate of the navmesh surface at the point (x, z), or None, if the point is outside of the navmesh
+
+        The polygon is located by the walk from the hint polygon (as in locate_from_hint), and the height is calculated
+        from the plane of this polygon (defined by it center and normal), so it is exact for planar polygons.
+        Without the hint (or if the walk fails) the polygon is found by the vertical ray from the top of the navmesh,
+        so for multi-level navmeshes the upper level is used. Pass the hint to get the height at the other level
+
+        Input:
+            x, z - coordinates of the point in XZ-plane
+            hint_polygon - index of the polygon near the point (for example, the polygon of the agent at the previous frame)
+
+        Output:
+            height of the navmesh or None
+        '''
+        polygon: int = self._locate_xz(x, z, -1 if hint_polygon is None else hint_polygon)
+        return self._get_polygon_height(polygon, x, z) if polygon > -1 else None
+
+    def get_heights(self, points: Any, hint_polygons: Optional[Sequence[int]] = None) -> Tuple[Any, Any]:
+        '''return heights of the navmesh surface for all input points, each height is the same as the result of get_height method
+
+        Points with hints are located by walks from hint polygons, all other points (and points with failed walks) are located by
+        one batch of vertical rays (vectorized, if numpy is installed), and then planes of polygons are evaluated at once
+
+        Input:
+            points - numpy array with the shape (n, 2) or any sequence of pairs (x, z)
+            hint_polygons - indexes of hint polygons for each point, -1 for points without the hint
+
+        Output:
+            2-tuple (heights, polygons), heights are 0.0 and polygons are -1 for points outside of the navmesh
+            returned polygons can be used as hints for next calls
+            if numpy is installed, then these are arrays with the shape (n, ), in other case - lists of floats and ints
+        '''
+        pairs: List[Tuple[float, float]] = to_pairs_list(points)
+        if hint_polygons is not None and len(hint_polygons) != len(pairs):
+            raise ValueError("The number of hint polygons " + str(len(hint_polygons)) + " is not equal to the number of points " + str(len(pairs)))
+        polygons: List[int] = [-1] * len(pairs) if hint_polygons is None else [self._locate_xz_from_hint(x, z, int(hint)) for (x, z), hint in zip(pairs, hint_polygons)]
+        # all points without the hint (or with failed walks) are located by one batch of vertical rays
+        missed: List[int] = [i for i, polygon in enumerate(polygons) if polygon == -1]
+        top: Optional[float] = self._get_rays_top()
+        if len(missed) > 0 and top is not None:
+            _, _, ray_polygons = self._get_triangles_bvh().raycast_hit_many([(pairs[i][0], top, pairs[i][1]) for i in missed], [(0.0, -1.0, 0.0)] * len(missed))
+            for i, polygon in zip(missed, ray_polygons.tolist() if np is not None else ray_polygons):
+                polygons[i] = polygon
+        if np is None or len(pairs) < BATCH_MIN_SIZE:
+            return pack_heights([self._get_polygon_height(polygon, x, z) if polygon > -1 else 0.0 for (x, z), polygon in zip(pairs, polygons)], polygons)
+        arrays: Dict[str, Any] = self._get_planes_arrays()
+        polygons_array = np.array(polygons, dtype=np.int64)
+        found = polygons_array > -1
+        indexes = np.where(found, polygons_array, 0)
+        xz = np.array(pairs, dtype=np.float64).reshape(-1, 2)
+        heights_array = get_planes_heights(xz[:, 0], xz[:, 1], arrays["centers"][indexes], arrays["normals"][indexes])
+        return (np.where(found, heights_array, 0.0), polygons_array)
+
+    def _locate_xz(self, x: float, z: float, hint_polygon: int) -> int:
+        '''return the polygon, which contains the point (x, z) in XZ-plane, or -1
+
+        at first try the hint polygon and it neighborhood, then the vertical ray from the top of the navmesh
+        '''
+        polygon: int = self._locate_xz_from_hint(x, z, hint_polygon)
+        if polygon > -1:
+            return polygon
+        top: Optional[float] = self._get_rays_top()
+        if top is None:
+            return -1
+        hit: Optional[Tuple[Tuple[float, float, float], float, int]] = self._get_triangles_bvh().raycast_hit((x, top, z), (0.0, -1.0, 0.0))
+        return hit[2] if hit is not None else -1
+
+    def _locate_xz_from_hint(self, x: float, z: float, hint_polygon: int) -> int:
+        '''return the polygon with the point (x, z), found by locate_from_hint at the height of the hint plane, or -1
+        '''
+        if hint_polygon > -1 and hint_polygon < self._data.get_polygons_count() and self.is_polygon_active(hint_polygon):
+            return self.locate_from_hint((x, self._get_polygon_height(hint_polygon, x, z), z), hint_polygon)
+        return -1
+
+    def _get_rays_top(self) -> Optional[float]:
+        '''return y-coordinate above the navmesh for origins of vertical rays, or None, if the navmesh is empty
+        '''
+        aabb: Tuple[float, float, float, float, float, float] = self._get_triangles_bvh().get_aabb()
+        return aabb[4] + 1.0 if aabb[4] >= aabb[1] else None
+
+    def _get_planes_arrays(self) -> Dict[str, Any]:
+        '''return numpy copies of centers and normals of polygons, they are used by get_heights method
+        '''
+        arrays: Optional[Dict[str, Any]] = self._planes_arrays
+        if arrays is None or len(arrays["centers"]) != self._data.get_polygons_count():
+            data_arrays: Dict[str, Any] = self._data.get_arrays()
+            arrays = {"centers": np.array(data_arrays["centers"], dtype=np.float64).reshape(-1, 3),
+                      "normals": np.array(data_arrays["normals"], dtype=np.float64).reshape(-1, 3)}
+            self._planes_arrays = arrays
+        return arrays
+
+    def sample(self, point: Tuple[float, float, float], is_slow: bool = False, max_distance: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
         '''return coordinates of the point inside navmesh, closest to the input one
         if it fails to find the closest point, return None
 
         Input:
             point - coordinates of the input point
-            is_slow - set True to find closest point in all triangles of the navmesh,
+            is_slow - set True to find closest point in all triangles of the navmesh (by branch and bound traversal of the BVH, so any point gets the answer),
                       set False to use BVH and skip triangles in bounding boxes far away from the input point
+            max_distance - if defined, then find closest point in all triangles closer than this distance, is_slow is ignored
 
         Output:
             coordinates of the closest point or None
         '''
-        return self._triangles_bvh.sample(point, is_slow)
+        return self._get_triangles_bvh().sample(point, is_slow, max_distance)
 
     def raycast(self, origin: Tuple[float, float, float], direction: Tuple[float, float, float]) -> Optional[Tuple[float, float, float]]:
         '''return coordinates of the intersection of the navigation mesh and the ray with a given origina and direction
@@ -127,20 +1386,63 @@ class Navmesh:
             direction - coordinates of the ray direction
 
         Output:
-            coordinates of the intersection point or None, if the ray does not intersect the navigation mesh
+            coordinates of the intersection point, closest to the origin, or None, if the ray does not intersect the navigation mesh
         '''
-        return self._triangles_bvh.raycast(origin, direction)
+        return self._get_triangles_bvh().raycast(origin, direction)
+
+    def raycast_hit(self, origin: Tuple[float, float, float],
+                    direction: Tuple[float, float, float],
+                    max_distance: Optional[float] = None,
+                    any_hit: bool = False) -> Optional[Tuple[Tuple[float, float, float], float, int]]:
+        '''return the intersection of the navigation mesh and the ray together with the distance and the polygon index
+
+        Input:
+            origin - coordinates of the point in the ray
+            direction - coordinates of the ray direction
+            max_distance - if defined, then only intersections closer than this distance to the origin are found
+            any_hit - if True, then return the first found intersection instead of the closest one, it is faster for visibility tests
+
+        Output:
+            3-tuple (intersection point, distance from the origin, polygon index) or None, if the ray does not intersect the navigation mesh
+        '''
+        return self._get_triangles_bvh().raycast_hit(origin, direction, max_distance, any_hit)
+
+    def sample_many(self, points: Any, is_slow: bool = False, max_distance: Optional[float] = None) -> Tuple[Any, Any]:
+        '''return closest points inside navmesh for all input points, parameters is_slow and max_distance are the same as in sample method
+
+        Input:
+            points - numpy array with the shape (n, 3) or any sequence of 3-tuples
+
+        Output:
+            2-tuple (closest points, mask), mask is False for points without the answer
+            if numpy is installed, then these are arrays with shapes (n, 3) and (n, ), in other case - lists of 3-tuples and bools
+        '''
+        return self._get_triangles_bvh().sample_many(points, is_slow, max_distance)
+
+    def raycast_many(self, origins: Any, directions: Any) -> Tuple[Any, Any]:
+        '''return closest intersections of rays with the navigation mesh
+
+        Input:
+            origins, directions - numpy arrays with the shape (n, 3) or any sequences of 3-tuples with the same length
+
+        Output:
+            2-tuple (intersection points, mask) in the same form as the output of sample_many method
+        '''
+        return self._get_triangles_bvh().raycast_many(origins, directions)
 
     def search_path(self,
                     start: Tuple[float, float, float],
                     finish: Tuple[float, float, float],
-                    length_limit_coefficient: Optional[float] = None) -> List[Tuple[float, float, float]]:
+                    length_limit_coefficient: Optional[float] = None,
+                    any_angle: bool = False) -> List[Tuple[float, float, float]]:
         '''Search the path between start and finish points in the navigation mesh
 
         Input:
             start - 3-tuple (x, y, z) of the start point
             finish - 3-tuple (x, y, z) of the finish point
             length_limit_coefficient - float or None (by default), shoulw be >= 1.0
+            any_angle - if True, then use Polyanya algorithm, which returns the shortest path (in XZ-plane) by one search
+                        length_limit_coefficient is ignored in this case
 
         Return:
             array in the form [(x1, y1, z1), (x2, y2, z2), ...] with coordinates of points, which form the output path
@@ -152,91 +1454,25 @@ class Navmesh:
             use parameter length_limit_coefficient carefully, because it can leads to the combinatorial explosion
         '''
         # find nodes indexes for start and end point
-        start_node: Optional[NavmeshNode] = self._bvh.sample(start)
-        finish_node: Optional[NavmeshNode] = self._bvh.sample(finish)
-        if start_node is not None and finish_node is not None:
+        start_index: int = self._bvh.sample(start)
+        finish_index: int = self._bvh.sample(finish)
+        if start_index > -1 and finish_index > -1:
             # check are nodes in one group
-            start_index: int = start_node.get_index()
-            finish_index: int = finish_node.get_index()
             group_index: int = self._get_nodes_group_index(start_index, finish_index)
-            if group_index > -1:
-                graph: NavmeshGraph = self._graphs[group_index]
-                # find path between nodes in the graph
-                graph_min_path: List[int] = graph.search(start_index, finish_index)
-
-                # next all pathes in the graph with allowed length
-                graph_collects = [graph_min_path] if length_limit_coefficient is None else graph.collect_pathes(graph_min_path, length_limit_coefficient)
-                to_return = []
-                min_length = float("inf")
+            if group_index > -1 and any_angle:
+                if self._polyanya is None:
+                    self._polyanya = PolyanyaSearch(self._vertices, self._get_active_polygons())
+                path: List[Tuple[float, float, float]] = self._polyanya.search(start, start_index, finish, finish_index)
+                self._last_search_stats = (0, self._polyanya.get_last_expanded_count())
+                return path
+            elif group_index > -1:
+                graph_collects: List[List[int]] = self._get_graph_pathes(group_index, start_index, finish_index, length_limit_coefficient)
+                to_return: List[Tuple[float, float, float]] = []
+                min_length: float = float("inf")
                 for graph_path in graph_collects:
-                    # next create non-optimal path throw portals
-                    raw_path: List[Tuple[float, float, float]] = [start, start]
-                    for p_i in range(1, len(graph_path)):
-                        # extend raw path by portal points between p_i-th node and p_i+1-th
-                        portal: Tuple[Tuple[float, float, float], Tuple[float, float, float]] = self._nodes[graph_path[p_i - 1]].get_portal(graph_path[p_i])
-                        raw_path.extend(portal)
-                    raw_path.extend([finish, finish])
-
-                    # finally, simplify the raw_path, by using pull the rope algorithm
-                    # get it from https://github.com/donmccurdy/three-pathfinding
-                    portal_apex: Tuple[float, float, float] = raw_path[0]
-                    portal_left: Tuple[float, float, float] = raw_path[0]
-                    portal_right: Tuple[float, float, float] = raw_path[1]
-
-                    apex_index: int = 0
-                    left_index: int = 0
-                    right_index: int = 0
-
-                    finall_path: List[Tuple[float, float, float]] = [portal_apex]
-                    i: int = 1
-                    while i < len(raw_path) // 2:
-                        left: Tuple[float, float, float] = raw_path[2 * i]
-                        right: Tuple[float, float, float] = raw_path[2 * i + 1]
-
-                        skip_next: bool = False
-                        # update right vertex
-                        if self._triangle_area_2(portal_apex, portal_right, right) <= 0.0:
-                            if self._v_equal(portal_apex, portal_right) or self._triangle_area_2(portal_apex, portal_left, right) > 0.0:
-                                portal_right = right
-                                right_index = i
-                            else:
-                                if not self._v_equal(portal_left, finall_path[-1]):
-                                    finall_path.append(portal_left)
-                                # make current left the new apex
-                                portal_apex = portal_left
-                                apex_index = left_index
-                                # reset portal
-                                portal_left = portal_apex
-                                portal_right = portal_apex
-                                left_index = apex_index
-                                right_index = apex_index
-                                # restart scan
-                                i = apex_index
-                                skip_next = True
-                        if not skip_next:
-                            # update left vertex
-                            if self._triangle_area_2(portal_apex, portal_left, left) >= 0.0:
-                                if self._v_equal(portal_apex, portal_left) or self._triangle_area_2(portal_apex, portal_right, left) < 0.0:
-                                    portal_left = left
-                                    left_index = i
-                                else:
-                                    finall_path.append(portal_right)
-                                    # make current right the new apex
-                                    portal_apex = portal_right
-                                    apex_index = right_index
-                                    # reset portal
-                                    portal_left = portal_apex
-                                    portal_right = portal_apex
-                                    left_index = apex_index
-                                    right_index = apex_index
-                                    # restart scan
-                                    i = apex_index
-                        i += 1
-                    if (len(finall_path) == 0 or not self._v_equal(finall_path[len(finall_path) - 1], raw_path[len(raw_path) - 2])):
-                        # append last point to path
-                        finall_path.append(raw_path[len(raw_path) - 2])
+                    finall_path: List[Tuple[float, float, float]] = self._funnel(start, finish, graph_path)
                     # calculate the length of the finall path in this iteration
-                    path_length = self._get_path_length(finall_path)
+                    path_length: float = self._get_path_length(finall_path)
                     if path_length < min_length:
                         to_return = finall_path
                         min_length = path_length
@@ -249,6 +1485,264 @@ class Navmesh:
             # start or finish node is None, so, no path
             return []
 
+    def search_paths(self, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[List[Tuple[float, float, float]]]:
+        '''Search pathes for several pairs of start and finish points at once
+
+        Pairs with finish points in the same polygon share one Dijkstra search over the graph from this polygon,
+        so each start point requires only the walk in the shortest tree and the funnel pass
+
+        Input:
+            pairs - array of 2-tuples (start, finish), each point is a 3-tuple (x, y, z)
+
+        Return:
+            array of pathes in the same order as input pairs, each path in the same format as in search_path method
+        '''
+        to_return: List[List[Tuple[float, float, float]]] = [[] for i in range(len(pairs))]
+        # group pairs by finish polygon
+        targets: Dict[int, List[Tuple[int, int]]] = {}  # key - finish polygon index, value - array of pairs (pair index, start polygon index)
+        for pair_index, (start, finish) in enumerate(pairs):
+            start_index: int = self._bvh.sample(start)
+            finish_index: int = self._bvh.sample(finish)
+            if start_index > -1 and finish_index > -1:
+                if finish_index not in targets:
+                    targets[finish_index] = []
+                targets[finish_index].append((pair_index, start_index))
+
+        for finish_index, starts in targets.items():
+            group_index: int = self._get_node_group_index(finish_index)
+            group_starts: List[Tuple[int, int]] = [(pair_index, start_index) for pair_index, start_index in starts if self._get_node_group_index(start_index) == group_index]
+            if len(group_starts) == 1:
+                # for one start point ordinary A* is faster than the search from the target to all polygons
+                pair_index, start_index = group_starts[0]
+                to_return[pair_index] = self._funnel(pairs[pair_index][0], pairs[pair_index][1], self._get_graph_pathes(group_index, start_index, finish_index, None)[0])
+            elif len(group_starts) > 1:
+                graph: NavmeshGraph = self._get_graph(group_index)
+                _, next_vertices = graph.shortest_tree(finish_index, [start_index for _, start_index in group_starts])
+                for pair_index, start_index in group_starts:
+                    graph_path: List[int] = graph.tree_path(next_vertices, start_index)
+                    to_return[pair_index] = self._funnel(pairs[pair_index][0], pairs[pair_index][1], graph_path)
+        return to_return
+
+    def are_reachable(self, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[bool]:
+        '''Check for several pairs of points, is there a path between them
+
+        Input:
+            pairs - array of 2-tuples (start, finish), each point is a 3-tuple (x, y, z)
+
+        Output:
+            array of boolean values in the same order as input pairs
+            the value is True if both points are inside polygons from the same group
+        '''
+        to_return: List[bool] = []
+        for start, finish in pairs:
+            start_index: int = self._bvh.sample(start)
+            finish_index: int = self._bvh.sample(finish)
+            to_return.append(start_index > -1 and finish_index > -1 and self._data.get_group(start_index) == self._data.get_group(finish_index))
+        return to_return
+
+    def create_flow_field(self, target_polygon: int) -> Optional[FlowField]:
+        '''Calculate the flow field to the target polygon over all polygons of it group
+
+        Input:
+            target_polygon - index of the target polygon
+
+        Output:
+            FlowField object or None, if the polygon index is invalid
+        '''
+        group_index: int = self._get_node_group_index(target_polygon) if 0 <= target_polygon < self._data.get_polygons_count() else -1
+        if group_index > -1:
+            return FlowField(self._get_graph(group_index), group_index, target_polygon)
+        return None
+
+    def search_path_in_field(self,
+                             field: FlowField,
+                             start: Tuple[float, float, float],
+                             finish: Tuple[float, float, float]) -> List[Tuple[float, float, float]]:
+        '''Search the path between start and finish points by using precalculated flow field
+        finish point should be inside the target polygon of the field
+
+        Return:
+            array of path corners in the same format as in search_path method
+            if the start point is outside of the navmesh or the target is unreachable from it, then return empty array
+        '''
+        start_index: int = self._bvh.sample(start)
+        if start_index > -1:
+            graph_path: List[int] = field.get_corridor(start_index)
+            if len(graph_path) > 0:
+                return self._funnel(start, finish, graph_path)
+        return []
+
+    def _funnel(self, start: Tuple[float, float, float], finish: Tuple[float, float, float], graph_path: List[int]) -> List[Tuple[float, float, float]]:
+        '''Form the path from start to finish point throw the corridor of polygons
+
+        Input:
+            start - 3-tuple with start point, it should be inside the first polygon of the corridor
+            finish - 3-tuple with finish point, it should be inside the last polygon of the corridor
+            graph_path - array of polygon indexes
+
+        Output:
+            array of path corners, include start and finish points
+        '''
+        return self.straighten_path(start, finish, self.get_corridor_portals(graph_path))
+
+    def get_corridor_portals(self, corridor: List[int]) -> List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]:
+        '''Return portals (pairs of edge points in the orientation of the previous polygon) between consecutive polygons of the corridor
+        '''
+        return [self._data.get_portal(corridor[p_i - 1], corridor[p_i]) for p_i in range(1, len(corridor))]
+
+    def straighten_path(self,
+                        start: Tuple[float, float, float],
+                        finish: Tuple[float, float, float],
+                        portals: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[Tuple[float, float, float]]:
+        '''Simplify the path throw portals by using pull the rope algorithm
+
+        Input:
+            start, finish - 3-tuples with start and finish points
+            portals - pairs of points (left, right) for each portal from start to finish, for example, returned by get_corridor_portals
+                      portals can be from several navigation meshes (like tiles), the method uses only it coordinates
+
+        Output:
+            array of path corners, include start and finish points
+        '''
+        # next create non-optimal path throw portals
+        raw_path: List[Tuple[float, float, float]] = [start, start]
+        for portal in portals:
+            raw_path.extend(portal)
+        raw_path.extend([finish, finish])
+        # get it from https://github.com/donmccurdy/three-pathfinding
+        portal_apex: Tuple[float, float, float] = raw_path[0]
+        portal_left: Tuple[float, float, float] = raw_path[0]
+        portal_right: Tuple[float, float, float] = raw_path[1]
+
+        apex_index: int = 0
+        left_index: int = 0
+        right_index: int = 0
+
+        finall_path: List[Tuple[float, float, float]] = [portal_apex]
+        i: int = 1
+        while i < len(raw_path) // 2:
+            left: Tuple[float, float, float] = raw_path[2 * i]
+            right: Tuple[float, float, float] = raw_path[2 * i + 1]
+
+            skip_next: bool = False
+            # update right vertex
+            if self._triangle_area_2(portal_apex, portal_right, right) <= 0.0:
+                if self._v_equal(portal_apex, portal_right) or self._triangle_area_2(portal_apex, portal_left, right) > 0.0:
+                    portal_right = right
+                    right_index = i
+                else:
+                    if not self._v_equal(portal_left, finall_path[-1]):
+                        finall_path.append(portal_left)
+                    # make current left the new apex
+                    portal_apex = portal_left
+                    apex_index = left_index
+                    # reset portal
+                    portal_left = portal_apex
+                    portal_right = portal_apex
+                    left_index = apex_index
+                    right_index = apex_index
+                    # restart scan
+                    i = apex_index
+                    skip_next = True
+            if not skip_next:
+                # update left vertex
+                if self._triangle_area_2(portal_apex, portal_left, left) >= 0.0:
+                    if self._v_equal(portal_apex, portal_left) or self._triangle_area_2(portal_apex, portal_right, left) < 0.0:
+                        portal_left = left
+                        left_index = i
+                    else:
+                        finall_path.append(portal_right)
+                        # make current right the new apex
+                        portal_apex = portal_right
+                        apex_index = right_index
+                        # reset portal
+                        portal_left = portal_apex
+                        portal_right = portal_apex
+                        left_index = apex_index
+                        right_index = apex_index
+                        # restart scan
+                        i = apex_index
+            i += 1
+        if (len(finall_path) == 0 or not self._v_equal(finall_path[len(finall_path) - 1], raw_path[len(raw_path) - 2])):
+            # append last point to path
+            finall_path.append(raw_path[len(raw_path) - 2])
+        return finall_path
+
+    def search_corridor(self, start: Tuple[float, float, float], finish: Tuple[float, float, float]) -> List[int]:
+        '''Return the shortest polygon corridor between start and finish points, or empty array, if there is no path
+        it is used by TiledNavmesh for stitching corridors of several tiles
+        '''
+        self._last_search_stats = (0, 0)
+        start_index: int = self._bvh.sample(start)
+        finish_index: int = self._bvh.sample(finish)
+        if start_index == -1 or finish_index == -1:
+            return []
+        group_index: int = self._get_nodes_group_index(start_index, finish_index)
+        if group_index == -1:
+            return []
+        return self._get_graph_pathes(group_index, start_index, finish_index, None)[0]
+
+    def _get_graph_pathes(self, group_index: int, start_index: int, finish_index: int, length_limit_coefficient: Optional[float]) -> List[List[int]]:
+        '''Return array of polygon corridors between two polygons from the same group
+
+        If the path cache is enabled, then corridors are taken from the cache (or stored in it after the search)
+        '''
+        if self._path_cache_size > 0:
+            key: Tuple[int, int, Optional[float]] = (start_index, finish_index, length_limit_coefficient)
+            if key in self._path_cache:
+                self._path_cache_hits += 1
+                self._path_cache.move_to_end(key)
+                return self._path_cache[key]
+            self._path_cache_misses += 1
+        graph: NavmeshGraph = self._get_graph(group_index)
+        # find path between nodes in the graph
+        graph_min_path: List[int]
+        hierarchy: Optional[NavmeshHierarchy] = self._get_hierarchy()
+        if hierarchy is not None and graph.get_vertex_count() > 0:
+            graph_min_path = hierarchy.search(graph, start_index, finish_index)
+            self._last_search_stats = hierarchy.get_last_search_stats()
+        else:
+            graph_min_path = graph.search(start_index, finish_index)
+            self._last_search_stats = (0, graph.get_last_expanded_count())
+        # next all pathes in the graph with allowed length
+        graph_collects: List[List[int]] = [graph_min_path] if length_limit_coefficient is None else graph.collect_pathes(graph_min_path, length_limit_coefficient)
+        if self._path_cache_size > 0:
+            self._path_cache[key] = graph_collects
+            if len(self._path_cache) > self._path_cache_size:
+                # remove the least recently used corridor
+                self._path_cache.popitem(last=False)
+        return graph_collects
+
+    def get_last_search_stats(self) -> Tuple[int, int]:
+        '''Return 2-tuple (abstract, refined) with the number of expanded nodes during the last graph search
+        abstract is the number of nodes in the hierarchical abstract graph (0 if the hierarchy is not used)
+        refined is the number of polygons, expanded in the polygons graph
+        '''
+        return self._last_search_stats
+
+    def set_path_cache_size(self, size: int):
+        '''Set maximum number of corridors in the path cache. 0 disables the cache
+        '''
+        self._path_cache_size = size
+        while len(self._path_cache) > max(size, 0):
+            self._path_cache.popitem(last=False)
+
+    def get_path_cache_stats(self) -> Tuple[int, int]:
+        '''Return 2-tuple (hits, misses) with the number of search queries, which use cached corridor and which calculate it from scratch
+        '''
+        return (self._path_cache_hits, self._path_cache_misses)
+
+    def clear_path_cache(self, reset_stats: bool = False):
+        '''Remove all corridors from the path cache. Call it when the navigation mesh is changed
+
+        Input:
+            reset_stats - if True, then also set hits and misses counters to zero
+        '''
+        self._path_cache.clear()
+        if reset_stats:
+            self._path_cache_hits = 0
+            self._path_cache_misses = 0
+
     def _get_path_length(self, path: List[Tuple[float, float, float]]) -> float:
         if len(path) == 0:
             return 0.0
@@ -273,26 +1767,48 @@ class Navmesh:
         '''
         return (c[0] - a[0]) * (b[2] - a[2]) - (b[0] - a[0]) * (c[2] - a[2])
 
-    def _check_nodes_in_one_group(self, index_01: int, index_02: int) -> bool:
-        for group in self._groups:
-            if index_01 in group and index_02 in group:
-                return True
-        return False
+    def _get_node_group_index(self, index: int) -> int:
+        '''return index of the group with the node index, -1 if there are no such group
+        '''
+        return self._data.get_group(index)
 
     def _get_nodes_group_index(self, index_01: int, index_02: int) -> int:
         '''return index of the group with indexes index_01 and index_02, -1 if these values are in different groups
         '''
-        for i in range(len(self._groups)):
-            group: List[int] = self._groups[i]
-            if index_01 in group and index_02 in group:
-                return i
-        return -1
+        group: int = self._data.get_group(index_01)
+        return group if group == self._data.get_group(index_02) else -1
 
-    def _get_intersection(self, array_a: List[int], array_b: List[int]) -> List[int]:
-        '''return intersection of two arrays
-        '''
-        to_return: List[int] = []
-        for a in array_a:
-            if a in array_b:
-                to_return.append(a)
-        return to_return
+
+def _get_sections(sections: Dict[str, Any], prefix: str) -> Dict[str, Any]:
+    '''Return sections of the snapshot with the given prefix, prefix is removed from names
+    '''
+    return {name[len(prefix):]: values for name, values in sections.items() if name.startswith(prefix)}
+
+
+def _get_object_size(root: object, exclude: Tuple[object, ...] = ()) -> int:
+    '''Return approximate memory size (in bytes) of the object and all objects it refers to
+    Memory views are counted without the memory they refer to (it belongs to mapped file or other buffer)
+
+    Input:
+        root - the object to measure
+        exclude - objects which should not be counted (for example, shared navmesh data, referenced by bvh)
+    '''
+    visited: Set[int] = set(id(obj) for obj in exclude)
+    size: int = 0
+    stack: List[object] = [root]
+    while len(stack) > 0:
+        obj = stack.pop()
+        if obj is None or id(obj) in visited:
+            continue
+        visited.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        elif hasattr(obj, "__slots__"):
+            stack.extend(getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name))
+    return size
@@ -0,0 +1,183 @@
+from typing import List, Tuple, Optional, Any
+
+try:
+    import numpy as np  # type: ignore
+except ImportError:
+    np = None  # batch queries use scalar calls without numpy
+
+BATCH_MIN_SIZE = 64  # smaller batches are processed by scalar queries, because numpy calls have constant overhead
+
+
+def is_numpy_available() -> bool:
+    '''Return True, if numpy is installed, so batch queries are vectorized and return numpy arrays
+    '''
+    return np is not None
+
+
+def to_points_list(values: Any) -> List[Tuple[float, float, float]]:
+    '''Convert array of points (numpy array with the shape (n, 3) or any sequence of 3-tuples) into the list of 3-tuples
+    '''
+    if np is not None and isinstance(values, np.ndarray):
+        return [(float(v[0]), float(v[1]), float(v[2])) for v in values.reshape(-1, 3).tolist()]
+    return [(float(v[0]), float(v[1]), float(v[2])) for v in values]
+
+
+def to_pairs_list(values: Any) -> List[Tuple[float, float]]:
+    '''Convert array of pairs (numpy array with the shape (n, 2) or any sequence of 2-tuples) into the list of 2-tuples
+    '''
+    if np is not None and isinstance(values, np.ndarray):
+        return [(float(v[0]), float(v[1])) for v in values.reshape(-1, 2).tolist()]
+    return [(float(v[0]), float(v[1])) for v in values]
+
+
+def to_points_array(values: Any) -> Any:
+    '''Convert array of points into numpy array with the shape (n, 3) and float64 values
+    '''
+    return np.asarray(values, dtype=np.float64).reshape(-1, 3)
+
+
+def get_points_count(values: Any) -> int:
+    if np is not None and isinstance(values, np.ndarray):
+        return values.size // 3
+    return len(values)
+
+
+def pack_points(points: List[Optional[Tuple[float, float, float]]]) -> Tuple[Any, Any]:
+    '''Convert results of scalar queries into the output of batch queries
+
+    Output:
+        2-tuple (points, mask), missed points are (0.0, 0.0, 0.0) and mask is False for them
+        if numpy is installed, then points is the array with the shape (n, 3) and mask is the boolean array with the shape (n, )
+        in other case these are lists of 3-tuples and bools
+    '''
+    mask: List[bool] = [p is not None for p in points]
+    values: List[Tuple[float, float, float]] = [p if p is not None else (0.0, 0.0, 0.0) for p in points]
+    if np is not None:
+        return (np.array(values, dtype=np.float64).reshape(-1, 3), np.array(mask, dtype=bool))
+    return (values, mask)
+
+
+
+def pack_heights(heights: List[float], polygons: List[int]) -> Tuple[Any, Any]:
+    '''Convert results of scalar height queries into the output of batch queries: numpy arrays, if numpy is installed, or lists in other case
+    '''
+    if np is not None:
+        return (np.array(heights, dtype=np.float64), np.array(polygons, dtype=np.int64))
+    return (heights, polygons)
+
+def get_closest_points(points: Any, a: Any, b: Any, c: Any) -> Any:
+    '''Return closest points on triangles (a, b, c) for each point, all arrays have the shape (n, 3)
+
+    Voronoi regions of vertices, edges and the inner part are checked for all triangles at once,
+    the region with the higher priority overrides the result of the region with the lower one
+    '''
+    ab = b - a
+    ac = c - a
+    ap = points - a
+    d1 = np.einsum("ij,ij->i", ab, ap)
+    d2 = np.einsum("ij,ij->i", ac, ap)
+    bp = points - b
+    d3 = np.einsum("ij,ij->i", ab, bp)
+    d4 = np.einsum("ij,ij->i", ac, bp)
+    cp = points - c
+    d5 = np.einsum("ij,ij->i", ab, cp)
+    d6 = np.einsum("ij,ij->i", ac, cp)
+    va = d3 * d6 - d5 * d4
+    vb = d5 * d2 - d1 * d6
+    vc = d1 * d4 - d3 * d2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = va + vb + vc
+        result = a + ab * (vb / denom)[:, None] + ac * (vc / denom)[:, None]
+        # edge bc
+        w = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        result = np.where(((va <= 0.0) & (d4 - d3 >= 0.0) & (d5 - d6 >= 0.0))[:, None], b + (c - b) * w[:, None], result)
+        # edge ac
+        w = d2 / (d2 - d6)
+        result = np.where(((vb <= 0.0) & (d2 >= 0.0) & (d6 <= 0.0))[:, None], a + ac * w[:, None], result)
+        # vertex c
+        result = np.where(((d6 >= 0.0) & (d5 <= d6))[:, None], c, result)
+        # edge ab
+        v = d1 / (d1 - d3)
+        result = np.where(((vc <= 0.0) & (d1 >= 0.0) & (d3 <= 0.0))[:, None], a + ab * v[:, None], result)
+    # vertices b and a
+    result = np.where(((d3 >= 0.0) & (d4 <= d3))[:, None], b, result)
+    result = np.where(((d1 <= 0.0) & (d2 <= 0.0))[:, None], a, result)
+    return result
+
+
+def get_ray_parameters(origins: Any, directions: Any, v0: Any, e1: Any, e2: Any) -> Any:
+    '''Return parameters t of intersections of rays with triangles (v0, v0 + e1, v0 + e2), all arrays have the shape (n, 3)
+    t is inf for rays without intersection, the calculation is the same as in Triangle.get_ray_parameter
+    '''
+    p_vec = np.cross(e2, directions)
+    det = np.einsum("ij,ij->i", p_vec, e1)
+    valid = np.abs(det) >= 0.001
+    inv_det = 1.0 / np.where(valid, det, 1.0)
+    t_vec = origins - v0
+    u = np.einsum("ij,ij->i", t_vec, p_vec) * inv_det
+    q_vec = np.cross(e1, t_vec)
+    v = np.einsum("ij,ij->i", directions, q_vec) * inv_det
+    t = np.einsum("ij,ij->i", e2, q_vec) * inv_det
+    valid &= (u >= 0.0) & (u <= 1.0) & (v >= 0.0) & (u + v <= 1.0) & (t >= 0.0)
+    return np.where(valid, t, np.inf)
+
+
+def get_boxes_distances(points: Any, boxes: Any) -> Any:
+    '''Return squared distances from points to boxes, boxes have the shape (n, 6)
+    '''
+    delta = np.maximum(np.maximum(boxes[:, :3] - points, points - boxes[:, 3:]), 0.0)
+    return np.einsum("ij,ij->i", delta, delta)
+
+
+def is_inside_boxes(points: Any, boxes: Any) -> Any:
+    '''Return boolean array, True if the point is strictly inside the box
+    '''
+    return np.all(boxes[:, :3] < points, axis=1) & np.all(boxes[:, 3:] > points, axis=1)
+
+
+def get_rays_enters(origins: Any, directions: Any, boxes: Any, t_max: Any) -> Any:
+    '''Return parameters t, where rays enter boxes, clamped by 0.0, the same as BVHTree._get_ray_enter
+    -1.0 for rays, which do not intersect boxes at parameters from 0.0 to t_max
+    '''
+    small = np.abs(directions) < 0.000000001
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1 = (boxes[:, :3] - origins) / directions
+        t2 = (boxes[:, 3:] - origins) / directions
+    t_near = np.where(small, -np.inf, np.minimum(t1, t2))
+    t_far = np.where(small, np.inf, np.maximum(t1, t2))
+    outside = np.any(small & ((origins < boxes[:, :3]) | (origins > boxes[:, 3:])), axis=1)
+    t_enter = np.maximum(t_near.max(axis=1), 0.0)
+    t_exit = np.minimum(t_far.min(axis=1), t_max)
+    return np.where(~outside & (t_enter <= t_exit), t_enter, -1.0)
+
+
+def get_leaf_positions(queries: Any, firsts: Any, counts: Any) -> Tuple[Any, Any]:
+    '''Expand pairs (query, leaf) into pairs (query, position of the leaf item in the items array)
+    '''
+    repeated_queries = np.repeat(queries, counts)
+    starts = np.repeat(firsts, counts)
+    offsets = np.arange(repeated_queries.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    return (repeated_queries, starts + offsets)
+
+
+def update_best(best_values: Any, queries: Any, values: Any) -> Any:
+    '''Update minimal values for queries by candidate values
+
+    Output:
+        boolean array for candidates, True if the candidate becomes the best value of the query
+    '''
+    candidates = np.full(best_values.size, np.inf)
+    np.minimum.at(candidates, queries, values)
+    improved = candidates < best_values
+    selected = improved[queries] & (values == candidates[queries])
+    best_values[improved] = candidates[improved]
+    return selected
+
+
+def get_planes_heights(xs: Any, zs: Any, centers: Any, normals: Any) -> Any:
+    '''Return y-coordinates of points (x, z) on planes, defined by centers and normals, all arrays have the same length
+    for vertical planes (and for zero normals) return the height of the center
+    '''
+    valid = np.abs(normals[:, 1]) >= 0.000001
+    offsets = ((xs - centers[:, 0]) * normals[:, 0] + (zs - centers[:, 2]) * normals[:, 2]) / np.where(valid, normals[:, 1], 1.0)
+    return np.where(valid, centers[:, 1] - offsets, centers[:, 1])
@@ -1,100 +1,486 @@
-from typing import List, Tuple, Optional
-from pathfinder.navmesh.navmesh_node import NavmeshNode
+from array import array
+from typing import List, Tuple, Optional, Dict, Any, Callable, Sequence
+from pathfinder.navmesh.navmesh_data import NavmeshData
 
 BVH_AABB_DELTA = 0.5
+BVH_EMPTY_AABB = (float("inf"), float("inf"), float("inf"), -float("inf"), -float("inf"), -float("inf"))
+BVH_BUILDERS = ("median", "sah")
+BVH_SAH_BINS = 12  # the number of bins along each axis for the surface area heuristic
+BVH_LEAF_SIZE = 4
 
 
-class NavmeshBVH:
-    '''Class for the node int bvh-tree
+class BVHTree:
+    '''Base class for bounding volume hierarchies, stored in plain arrays, this class is for internal use only
+
+    Each item of the tree is an integer with the aabb. Nodes are indexes in arrays, the root is the node 0:
+        -) bounds - 6 values (x_min, y_min, z_min, x_max, y_max, z_max) for each node
+        -) lefts, rights - indexes of children nodes, -1 for leafs
+        -) firsts, counts - items of the leaf node are in the interval [firsts[node], firsts[node] + counts[node]) of the items array, counts is 0 for inner nodes
+        -) parents - index of the parent node, -1 for the root
+        -) items, item_bounds - items of all leafs and 6 values of the aabb for each of them
+    The root of the empty tree is the leaf without items
+    All queries traverse the tree by explicit stack, so there are no recursive calls and no objects per node
+
+    The tree can be built by two methods:
+        -) median - split items by the mean of centers along the longest axis (x or z), each leaf contains one item
+        -) sah - binned surface area heuristic along all three axes, leafs contain up to leaf_size items
+                 it is better for layered navmeshes, where different floors are overlapped in XZ-plane
     '''
 
-    def __init__(self, nodes: List[NavmeshNode]):
-        '''Create one node (and call recursive building all children nodes) from array of NavmeshNodes
+    def __init__(self):
+        self._bounds: array = array("d")
+        self._lefts: array = array("i")
+        self._rights: array = array("i")
+        self._firsts: array = array("i")
+        self._counts: array = array("i")
+        self._parents: array = array("i")
+        self._items: array = array("i")
+        self._item_bounds: array = array("d")
+        self._free: Optional[List[int]] = []  # nodes, released by remove method
+        self._axis_bounds: Optional[List[Any]] = None  # bounds, split by coordinates, created at the first point query after the change
+        self._add_node(-1)
+
+    def _build(self, items: List[int],
+               aabbs: Dict[int, Tuple[float, float, float, float, float, float]],
+               centers: Dict[int, Tuple[float, float, float]],
+               builder: str,
+               leaf_size: int):
+        '''Build the tree from items
 
         Input:
-            nodes - array of NavmeshNode objects
+            items - array of items
+            aabbs, centers - dictionaries, key - item, value - aabb and the center of the item
+            builder - median or sah
+            leaf_size - the maximum number of items in the leaf for sah builder
         '''
-        self._node: Optional[NavmeshNode] = None
-        self._left: Optional[NavmeshBVH] = None
-        self._right: Optional[NavmeshBVH] = None
+        if builder not in BVH_BUILDERS:
+            raise ValueError("unknown bvh builder " + str(builder) + ", it should be one of " + str(BVH_BUILDERS))
+        if leaf_size < 1:
+            raise ValueError("bvh leaf size should be positive")
+        # nodes are created in the depth-first order, so children always have greater indexes than the parent
+        stack: List[Tuple[int, List[int]]] = [(0, items)]
+        while len(stack) > 0:
+            node, node_items = stack.pop()
+            split: Optional[Tuple[List[int], List[int]]] = None
+            if len(node_items) > 1:
+                split = self._split_median(node_items, centers) if builder == "median" else self._split_sah(node_items, aabbs, centers, leaf_size)
+            if split is None:
+                self._firsts[node] = len(self._items)
+                self._counts[node] = len(node_items)
+                node_aabb: Tuple[float, float, float, float, float, float] = BVH_EMPTY_AABB
+                for item in node_items:
+                    self._items.append(item)
+                    self._item_bounds.extend(aabbs[item])
+                    node_aabb = self._union_aabbs(node_aabb, aabbs[item])
+                self._set_bounds(node, node_aabb)
+            else:
+                left_node: int = self._add_node(node)
+                right_node: int = self._add_node(node)
+                self._lefts[node] = left_node
+                self._rights[node] = right_node
+                stack.append((right_node, split[1]))
+                stack.append((left_node, split[0]))
+        # so, bounds of inner nodes can be calculated in the reverse order
+        for node in range(len(self._lefts) - 1, -1, -1):
+            if self._lefts[node] > -1:
+                self._set_bounds(node, self._union_aabbs(self._get_bounds(self._lefts[node]), self._get_bounds(self._rights[node])))
 
+    def _split_median(self, items: List[int], centers: Dict[int, Tuple[float, float, float]]) -> Tuple[List[int], List[int]]:
+        '''Split items by the mean of centers along the longest axis (x or z)
+        '''
         x_min: float = float("inf")
         x_max: float = -float("inf")
-        y_min: float = float("inf")
-        y_max: float = -float("inf")
         z_min: float = float("inf")
         z_max: float = -float("inf")
-        self._aabb: Tuple[float, float, float, float, float, float]
-
-        if len(nodes) == 1:
-            self._node = nodes[0]
-            # build aabb
-            verts: List[Tuple[float, float, float]] = self._node.get_vertex_coordinates()
-            for v in verts:
-                if v[0] < x_min:
-                    x_min = v[0]
-                if v[0] > x_max:
-                    x_max = v[0]
-                if v[1] < y_min:
-                    y_min = v[1]
-                if v[1] > y_max:
-                    y_max = v[1]
-                if v[2] < z_min:
-                    z_min = v[2]
-                if v[2] > z_max:
-                    z_max = v[2]
-            self._aabb = (x_min - BVH_AABB_DELTA, y_min - BVH_AABB_DELTA, z_min - BVH_AABB_DELTA, x_max + BVH_AABB_DELTA, y_max + BVH_AABB_DELTA, z_max + BVH_AABB_DELTA)
+        x_median: float = 0.0
+        z_median: float = 0.0
+        for item in items:
+            c: Tuple[float, float, float] = centers[item]
+            x_median += c[0]
+            z_median += c[2]
+            if c[0] < x_min:
+                x_min = c[0]
+            if c[0] > x_max:
+                x_max = c[0]
+            if c[2] < z_min:
+                z_min = c[2]
+            if c[2] > z_max:
+                z_max = c[2]
+        split_axis: int = 0 if (x_max - x_min) > (z_max - z_min) else 2
+        median: float = x_median / len(items) if (x_max - x_min) > (z_max - z_min) else z_median / len(items)
+        left: List[int] = []
+        right: List[int] = []
+        for item in items:
+            if centers[item][split_axis] < median:
+                left.append(item)
+            else:
+                right.append(item)
+        if len(left) == 0:
+            # move last right item to the left array
+            left.append(right.pop())
         else:
-            # find the axis (x or z) to split the space
-            x_median: float = 0.0
-            z_median: float = 0.0
-            for node in nodes:
-                c: Tuple[float, float, float] = node.get_center()
-                x_median += c[0]
-                z_median += c[2]
-                if c[0] < x_min:
-                    x_min = c[0]
-                if c[0] > x_max:
-                    x_max = c[0]
-                if c[2] < z_min:
-                    z_min = c[2]
-                if c[2] > z_max:
-                    z_max = c[2]
-            split_axis: int = 0 if (x_max - x_min) > (z_max - z_min) else 2
-            median: float = x_median / len(nodes) if (x_max - x_min) > (z_max - z_min) else z_median / len(nodes)
-            left: List[NavmeshNode] = []
-            right: List[NavmeshNode] = []
-            for node in nodes:
-                if node.get_center()[split_axis] < median:
-                    left.append(node)
-                else:
-                    right.append(node)
-            if len(left) == 0:
-                # move last right node to the left array
-                left.append(right.pop())
+            # left array is not empty, but may be empty right array
+            if len(right) == 0:
+                right.append(left.pop())
+        return (left, right)
+
+    def _split_sah(self, items: List[int],
+                   aabbs: Dict[int, Tuple[float, float, float, float, float, float]],
+                   centers: Dict[int, Tuple[float, float, float]],
+                   leaf_size: int) -> Optional[Tuple[List[int], List[int]]]:
+        '''Split items by the binned surface area heuristic
+
+        Centers are distributed into BVH_SAH_BINS bins along each axis, and all borders between bins are checked
+        The cost of the split is 1 + (area(left) * len(left) + area(right) * len(right)) / area(node), the cost of the leaf is len(items)
+
+        Output:
+            None, if it is better to create the leaf, and 2-tuple (left items, right items) otherwise
+        '''
+        count: int = len(items)
+        node_aabb: Tuple[float, float, float, float, float, float] = BVH_EMPTY_AABB
+        c_min: List[float] = [float("inf")] * 3
+        c_max: List[float] = [-float("inf")] * 3
+        for item in items:
+            node_aabb = self._union_aabbs(node_aabb, aabbs[item])
+            c: Tuple[float, float, float] = centers[item]
+            for axis in range(3):
+                if c[axis] < c_min[axis]:
+                    c_min[axis] = c[axis]
+                if c[axis] > c_max[axis]:
+                    c_max[axis] = c[axis]
+        node_area: float = self._get_aabb_area(node_aabb)
+        if node_area <= 0.0:
+            node_area = 1.0
+        best_cost: float = float("inf")
+        best_axis: int = -1
+        best_bin: int = 0
+        for axis in range(3):
+            extent: float = c_max[axis] - c_min[axis]
+            if extent <= 0.000001:
+                continue
+            bin_aabbs: List[Tuple[float, float, float, float, float, float]] = [BVH_EMPTY_AABB] * BVH_SAH_BINS
+            bin_counts: List[int] = [0] * BVH_SAH_BINS
+            for item in items:
+                b: int = min(int((centers[item][axis] - c_min[axis]) / extent * BVH_SAH_BINS), BVH_SAH_BINS - 1)
+                bin_counts[b] += 1
+                bin_aabbs[b] = self._union_aabbs(bin_aabbs[b], aabbs[item])
+            # accumulate areas and counts of right parts from the end, then sweep from the start
+            right_areas: List[float] = [0.0] * BVH_SAH_BINS
+            right_counts: List[int] = [0] * BVH_SAH_BINS
+            right_aabb: Tuple[float, float, float, float, float, float] = BVH_EMPTY_AABB
+            right_count: int = 0
+            for b in range(BVH_SAH_BINS - 1, 0, -1):
+                right_aabb = self._union_aabbs(right_aabb, bin_aabbs[b])
+                right_count += bin_counts[b]
+                right_areas[b] = self._get_aabb_area(right_aabb)
+                right_counts[b] = right_count
+            left_aabb: Tuple[float, float, float, float, float, float] = BVH_EMPTY_AABB
+            left_count: int = 0
+            for b in range(1, BVH_SAH_BINS):
+                # split between bins b - 1 and b
+                left_aabb = self._union_aabbs(left_aabb, bin_aabbs[b - 1])
+                left_count += bin_counts[b - 1]
+                if left_count > 0 and right_counts[b] > 0:
+                    cost: float = 1.0 + (self._get_aabb_area(left_aabb) * left_count + right_areas[b] * right_counts[b]) / node_area
+                    if cost < best_cost:
+                        best_cost = cost
+                        best_axis = axis
+                        best_bin = b
+        if best_axis == -1:
+            # all centers are the same, split items into two halves, if there are too many items for one leaf
+            if count <= leaf_size:
+                return None
+            return (items[:count // 2], items[count // 2:])
+        if count <= leaf_size and count <= best_cost:
+            return None
+        left: List[int] = []
+        right: List[int] = []
+        for item in items:
+            if min(int((centers[item][best_axis] - c_min[best_axis]) / (c_max[best_axis] - c_min[best_axis]) * BVH_SAH_BINS), BVH_SAH_BINS - 1) < best_bin:
+                left.append(item)
             else:
-                # left array is not empty, but may be empty right array
-                if len(right) == 0:
-                    right.append(left.pop())
-            self._left = NavmeshBVH(left)
-            self._right = NavmeshBVH(right)
-            l_aabb: Tuple[float, float, float, float, float, float] = self._left.get_aabb()
-            r_aabb: Tuple[float, float, float, float, float, float] = self._right.get_aabb()
-            self._aabb = self._union_aabbs(l_aabb, r_aabb)
+                right.append(item)
+        return (left, right)
+
+    def _add_node(self, parent: int) -> int:
+        '''Add empty node and return it index, released nodes are used at first
+        '''
+        self._axis_bounds = None
+        if len(self._free) > 0:
+            node: int = self._free.pop()
+            self._lefts[node] = -1
+            self._rights[node] = -1
+            self._firsts[node] = 0
+            self._counts[node] = 0
+            self._parents[node] = parent
+            self._set_bounds(node, BVH_EMPTY_AABB)
+            return node
+        self._bounds.extend(BVH_EMPTY_AABB)
+        self._lefts.append(-1)
+        self._rights.append(-1)
+        self._firsts.append(0)
+        self._counts.append(0)
+        self._parents.append(parent)
+        return len(self._lefts) - 1
+
+    def _get_bounds(self, node: int) -> Tuple[float, float, float, float, float, float]:
+        i: int = 6 * node
+        bounds: array = self._bounds
+        return (bounds[i], bounds[i + 1], bounds[i + 2], bounds[i + 3], bounds[i + 4], bounds[i + 5])
+
+    def _set_bounds(self, node: int, aabb: Tuple[float, float, float, float, float, float]):
+        self._bounds[6 * node:6 * node + 6] = array("d", aabb)
+        self._axis_bounds = None
+
+    def _get_axis_bounds(self) -> List[Any]:
+        '''Return 6 arrays (x_min, y_min, z_min, x_max, y_max, z_max) with coordinates of node bounds
+        the point query indexes these arrays by the node without the offset arithmetic, it is faster than the access to the plain bounds array
+        '''
+        axis_bounds: Optional[List[Any]] = self._axis_bounds
+        if axis_bounds is None:
+            axis_bounds = [self._bounds[axis::6] for axis in range(6)]
+            self._axis_bounds = axis_bounds
+        return axis_bounds
+
+    def _get_item_bounds(self, position: int) -> Tuple[float, float, float, float, float, float]:
+        '''Return aabb of the item at the given position of the items array
+        '''
+        i: int = 6 * position
+        bounds: array = self._item_bounds
+        return (bounds[i], bounds[i + 1], bounds[i + 2], bounds[i + 3], bounds[i + 4], bounds[i + 5])
+
+    def get_arrays(self) -> Dict[str, Any]:
+        '''Return all plain arrays of the tree, key - the name of the array
+        '''
+        return {"bounds": self._bounds,
+                "lefts": self._lefts,
+                "rights": self._rights,
+                "firsts": self._firsts,
+                "counts": self._counts,
+                "parents": self._parents,
+                "items": self._items,
+                "item_bounds": self._item_bounds}
+
+    def _set_arrays(self, arrays: Dict[str, Any]):
+        '''Use arrays, returned by get_arrays method, without copy
+        '''
+        for name in ("bounds", "lefts", "rights", "firsts", "counts", "parents", "items", "item_bounds"):
+            setattr(self, "_" + name, arrays[name])
+        self._axis_bounds = None
+        self._free = None  # released nodes are found at the first edit
+
+    def _get_free_nodes(self) -> List[int]:
+        '''Return released nodes, for the tree from arrays they are nodes, which are not reachable from the root
+        '''
+        if self._free is None:
+            reachable: List[bool] = [False] * len(self._lefts)
+            stack: List[int] = [0]
+            while len(stack) > 0:
+                node: int = stack.pop()
+                reachable[node] = True
+                if self._lefts[node] > -1:
+                    stack.append(self._lefts[node])
+                    stack.append(self._rights[node])
+            self._free = [node for node in range(len(reachable)) if not reachable[node]]
+        return self._free
+
+    def _make_editable(self):
+        '''Copy arrays, which are not instances of array (for example, memory views of the snapshot file), into arrays
+        '''
+        self._get_free_nodes()
+        for name, values in BVHTree.get_arrays(self).items():
+            if not isinstance(values, array):
+                copy: array = array(values.format)
+                copy.frombytes(values.tobytes())
+                setattr(self, "_" + name, copy)
+
+    def _get_aabb_area(self, aabb: Tuple[float, float, float, float, float, float]) -> float:
+        '''Return the half of the surface area of the aabb, 0.0 for the empty aabb
+        '''
+        x: float = aabb[3] - aabb[0]
+        y: float = aabb[4] - aabb[1]
+        z: float = aabb[5] - aabb[2]
+        if x < 0.0 or y < 0.0 or z < 0.0:
+            return 0.0
+        return x * y + y * z + z * x
 
     def _union_aabbs(self, b1: Tuple[float, float, float, float, float, float], b2: Tuple[float, float, float, float, float, float]) -> Tuple[float, float, float, float, float, float]:
         return (min(b1[0], b2[0]), min(b1[1], b2[1]), min(b1[2], b2[2]),
                 max(b1[3], b2[3]), max(b1[4], b2[4]), max(b1[5], b2[5]))
 
+    def _is_empty(self) -> bool:
+        return self._counts[0] == 0 and self._lefts[0] == -1
+
+    def _refit(self, node: int):
+        '''Recalculate bounds of the node and all it parents from bounds of children
+        '''
+        while node > -1:
+            self._set_bounds(node, self._union_aabbs(self._get_bounds(self._lefts[node]), self._get_bounds(self._rights[node])))
+            node = self._parents[node]
+
+    def _insert_item(self, item: int, item_aabb: Tuple[float, float, float, float, float, float]):
+        '''Add the item to the tree
+        the tree is not rebuilt, the leaf, which aabb increase less other, is converted to the node with two leafs: old items and the new one
+        aabbs of all parent nodes are refitted, so, the time is proportional to the depth of the tree
+        '''
+        self._make_editable()
+        node: int = 0
+        if not self._is_empty():
+            while self._lefts[node] > -1:
+                # select the child with the minimal increase of the area
+                l_aabb: Tuple[float, float, float, float, float, float] = self._get_bounds(self._lefts[node])
+                r_aabb: Tuple[float, float, float, float, float, float] = self._get_bounds(self._rights[node])
+                l_increase: float = self._get_aabb_area(self._union_aabbs(l_aabb, item_aabb)) - self._get_aabb_area(l_aabb)
+                r_increase: float = self._get_aabb_area(self._union_aabbs(r_aabb, item_aabb)) - self._get_aabb_area(r_aabb)
+                node = self._lefts[node] if l_increase < r_increase else self._rights[node]
+            old_leaf: int = self._add_node(node)
+            self._firsts[old_leaf] = self._firsts[node]
+            self._counts[old_leaf] = self._counts[node]
+            self._set_bounds(old_leaf, self._get_bounds(node))
+            new_leaf: int = self._add_node(node)
+            self._counts[node] = 0
+            self._lefts[node] = old_leaf
+            self._rights[node] = new_leaf
+            node = new_leaf
+        self._firsts[node] = len(self._items)
+        self._counts[node] = 1
+        self._items.append(item)
+        self._item_bounds.extend(item_aabb)
+        self._set_bounds(node, item_aabb)
+        if self._parents[node] > -1:
+            self._refit(self._parents[node])
+
+    def _remove_item(self, center: Tuple[float, float, float], is_item: Callable[[int], bool]) -> int:
+        '''Remove the item from the tree
+        the item is found in leafs, which contain the center point, is_item function should return True for the removed item
+        empty leaf is replaced by it sibling and aabbs of all parent nodes are refitted
+
+        Output:
+            removed item or -1, if it is not found
+        '''
+        leaf: int = -1
+        position: int = -1
+        stack: List[int] = [0]
+        while len(stack) > 0 and leaf == -1:
+            node: int = stack.pop()
+            if self._is_inside_node(node, center, True):
+                if self._lefts[node] > -1:
+                    stack.append(self._rights[node])
+                    stack.append(self._lefts[node])
+                else:
+                    for k in range(self._firsts[node], self._firsts[node] + self._counts[node]):
+                        if is_item(self._items[k]):
+                            leaf = node
+                            position = k
+                            break
+        if leaf == -1:
+            return -1
+        self._make_editable()
+        item: int = self._items[position]
+        last: int = self._firsts[leaf] + self._counts[leaf] - 1
+        # keep the order of other items in the leaf
+        for k in range(position, last):
+            self._items[k] = self._items[k + 1]
+            self._item_bounds[6 * k:6 * k + 6] = self._item_bounds[6 * k + 6:6 * k + 12]
+        self._counts[leaf] -= 1
+        if self._counts[leaf] > 0:
+            leaf_aabb: Tuple[float, float, float, float, float, float] = BVH_EMPTY_AABB
+            for k in range(self._firsts[leaf], last):
+                leaf_aabb = self._union_aabbs(leaf_aabb, self._get_item_bounds(k))
+            self._set_bounds(leaf, leaf_aabb)
+            if self._parents[leaf] > -1:
+                self._refit(self._parents[leaf])
+            return item
+        parent: int = self._parents[leaf]
+        if parent == -1:
+            # the tree contains only this item
+            self._set_bounds(0, BVH_EMPTY_AABB)
+            return item
+        sibling: int = self._rights[parent] if self._lefts[parent] == leaf else self._lefts[parent]
+        # move the sibling to the place of the parent
+        self._firsts[parent] = self._firsts[sibling]
+        self._counts[parent] = self._counts[sibling]
+        self._lefts[parent] = self._lefts[sibling]
+        self._rights[parent] = self._rights[sibling]
+        self._set_bounds(parent, self._get_bounds(sibling))
+        if self._lefts[parent] > -1:
+            self._parents[self._lefts[parent]] = parent
+            self._parents[self._rights[parent]] = parent
+        for node in (leaf, sibling):
+            self._counts[node] = 0
+            self._lefts[node] = -1
+            self._rights[node] = -1
+            self._free.append(node)
+        if self._parents[parent] > -1:
+            self._refit(self._parents[parent])
+        return item
+
     def get_aabb(self) -> Tuple[float, float, float, float, float, float]:
-        '''Return 6-tuple of the aabb (axis align bounding box) of the current node
+        '''Return 6-tuple of the aabb (axis align bounding box) of the whole tree
 
         this 6-tuple is (x_min, y_min, z_min, x_max, y_max, z_max)
         '''
-        return self._aabb
+        return self._get_bounds(0)
+
+    def get_nodes_count(self) -> int:
+        '''Return the number of nodes in the tree (without released nodes)
+        '''
+        return len(self._lefts) - len(self._get_free_nodes())
+
+    def _is_inside_node(self, node: int, point: Tuple[float, float, float], is_closed: bool = False) -> bool:
+        i: int = 6 * node
+        bounds: array = self._bounds
+        if is_closed:
+            return bounds[i] <= point[0] and bounds[i + 1] <= point[1] and bounds[i + 2] <= point[2] and\
+                bounds[i + 3] >= point[0] and bounds[i + 4] >= point[1] and bounds[i + 5] >= point[2]
+        return bounds[i] < point[0] and bounds[i + 1] < point[1] and bounds[i + 2] < point[2] and\
+            bounds[i + 3] > point[0] and bounds[i + 4] > point[1] and bounds[i + 5] > point[2]
+
+    def _is_inside_item(self, position: int, point: Tuple[float, float, float]) -> bool:
+        i: int = 6 * position
+        bounds: array = self._item_bounds
+        return bounds[i] < point[0] and bounds[i + 1] < point[1] and bounds[i + 2] < point[2] and\
+            bounds[i + 3] > point[0] and bounds[i + 4] > point[1] and bounds[i + 5] > point[2]
+
+    def _get_box_distance(self, bounds: Any, index: int, point: Tuple[float, float, float]) -> float:
+        '''Return squared distance from the point to the aabb with the given index in bounds array (nodes or items), 0.0 if the point is inside
+        '''
+        i: int = 6 * index
+        distance: float = 0.0
+        for axis in range(3):
+            if point[axis] < bounds[i + axis]:
+                distance += (bounds[i + axis] - point[axis])**2
+            elif point[axis] > bounds[i + axis + 3]:
+                distance += (point[axis] - bounds[i + axis + 3])**2
+        return distance
+
+    def _get_ray_enter(self, bounds: Any, index: int, origin: Tuple[float, float, float], direction: Tuple[float, float, float], t_max: float) -> float:
+        '''Return the parameter t of the point origin + t * direction, where the ray enters the aabb with the given index in bounds array (nodes or items)
+        t is clamped by 0.0, if the origin is inside the aabb
+        return -1.0, if the ray does not intersect the aabb at parameters from 0.0 to t_max
+        '''
+        i: int = 6 * index
+        t_min: float = 0.0
+        for axis in range(3):
+            d: float = direction[axis]
+            if abs(d) < 0.000000001:
+                if origin[axis] < bounds[i + axis] or origin[axis] > bounds[i + axis + 3]:
+                    return -1.0
+            else:
+                t1: float = (bounds[i + axis] - origin[axis]) / d
+                t2: float = (bounds[i + axis + 3] - origin[axis]) / d
+                if t1 > t2:
+                    t1, t2 = t2, t1
+                if t1 > t_min:
+                    t_min = t1
+                if t2 < t_max:
+                    t_max = t2
+                if t_min > t_max:
+                    return -1.0
+        return t_min
 
     def is_inside_aabb(self, point: Tuple[float, float, float]) -> bool:
-        '''Return True, if the point is inside the current aabb, and False otherwise
+        '''Return True, if the point is inside the aabb of the whole tree, and False otherwise
 
         Input:
             point - 3-triple (x, y, z)
@@ -102,54 +488,225 @@ class NavmeshBVH:
         Output:
             True or False
         '''
-        return self._aabb[0] < point[0] and self._aabb[1] < point[1] and self._aabb[2] < point[2] and\
-               self._aabb[3] > point[0] and self._aabb[4] > point[1] and self._aabb[5] > point[2]
+        return self._is_inside_node(0, point)
 
-    def sample(self, point: Tuple[float, float, float]) -> Optional[NavmeshNode]:
-        '''Return node, which contains the point
-        If there are no nodes near the point, then return None
+    def get_quality_report(self, points: Sequence[Tuple[float, float, float]]) -> Dict[str, float]:
+        '''Return the dictionary with values, which describe the quality of the tree
+
+        Keys are:
+            nodes - the number of nodes
+            leafs - the number of leafs
+            max_depth - the maximum depth of leafs (the root has depth 0)
+            average_depth - the average depth of leafs
+            average_leaf_size - the average number of items in leafs
+            average_overlap - the average ratio between the area of children aabbs intersection and the area of the node aabb for inner nodes
+            visited_nodes - the average number of nodes with the point inside, which are visited by point query
+            visited_items - the average number of items, checked by point query
 
         Input:
-            point - 3-triple (x, y, z)
+            points - array of points for point queries, visited values are 0.0 for the empty array
+        '''
+        leafs: int = 0
+        depth_sum: int = 0
+        max_depth: int = 0
+        items_sum: int = 0
+        inner_nodes: int = 0
+        overlap_sum: float = 0.0
+        stack: List[Tuple[int, int]] = [(0, 0)]
+        while len(stack) > 0:
+            node, depth = stack.pop()
+            left: int = self._lefts[node]
+            if left > -1:
+                right: int = self._rights[node]
+                l_aabb: Tuple[float, float, float, float, float, float] = self._get_bounds(left)
+                r_aabb: Tuple[float, float, float, float, float, float] = self._get_bounds(right)
+                overlap: Tuple[float, float, float, float, float, float] = (max(l_aabb[0], r_aabb[0]), max(l_aabb[1], r_aabb[1]), max(l_aabb[2], r_aabb[2]),
+                                                                             min(l_aabb[3], r_aabb[3]), min(l_aabb[4], r_aabb[4]), min(l_aabb[5], r_aabb[5]))
+                node_area: float = self._get_aabb_area(self._get_bounds(node))
+                inner_nodes += 1
+                overlap_sum += self._get_aabb_area(overlap) / node_area if node_area > 0.0 else 0.0
+                stack.append((right, depth + 1))
+                stack.append((left, depth + 1))
+            else:
+                leafs += 1
+                depth_sum += depth
+                max_depth = max(max_depth, depth)
+                items_sum += self._counts[node]
+        visited_nodes: int = 0
+        visited_items: int = 0
+        for point in points:
+            point_stack: List[int] = [0]
+            while len(point_stack) > 0:
+                node = point_stack.pop()
+                if self._is_inside_node(node, point):
+                    visited_nodes += 1
+                    if self._lefts[node] > -1:
+                        point_stack.append(self._rights[node])
+                        point_stack.append(self._lefts[node])
+                    else:
+                        visited_items += self._counts[node]
+        return {"nodes": float(self.get_nodes_count()),
+                "leafs": float(leafs),
+                "max_depth": float(max_depth),
+                "average_depth": depth_sum / leafs,
+                "average_leaf_size": items_sum / leafs,
+                "average_overlap": overlap_sum / inner_nodes if inner_nodes > 0 else 0.0,
+                "visited_nodes": visited_nodes / len(points) if len(points) > 0 else 0.0,
+                "visited_items": visited_items / len(points) if len(points) > 0 else 0.0}
+
+
+class NavmeshBVH(BVHTree):
+    '''Bounding volume hierarchy of navmesh polygons, items of the tree are polygon indexes
+    '''
+
+    def __init__(self, data: NavmeshData, polygons: Optional[List[int]] = None, builder: str = "median", leaf_size: int = BVH_LEAF_SIZE):
+        '''Build the tree from array of polygons
+
+        Input:
+            data - navmesh arrays
+            polygons - array of polygon indexes, if None, then use all polygons of the navmesh
+            builder - median or sah, see BVHTree class for the description
+            leaf_size - the maximum number of polygons in the leaf for sah builder
+        '''
+        super().__init__()
+        if polygons is None:
+            polygons = list(range(data.get_polygons_count()))
+        self._data: NavmeshData = data
+        self._build(polygons, {polygon: self._get_polygon_aabb(polygon) for polygon in polygons}, {polygon: data.get_center(polygon) for polygon in polygons}, builder, leaf_size)
+
+    @staticmethod
+    def from_arrays(data: NavmeshData, arrays: Dict[str, Any]) -> "NavmeshBVH":
+        '''Create the tree from arrays, returned by get_arrays method
+        values can be any objects with array interface, they are used without copy
+        '''
+        bvh: NavmeshBVH = NavmeshBVH.__new__(NavmeshBVH)
+        bvh._data = data
+        bvh._set_arrays(arrays)
+        return bvh
+
+    def _get_polygon_aabb(self, polygon: int) -> Tuple[float, float, float, float, float, float]:
+        '''Return aabb of the polygon, extended by BVH_AABB_DELTA
+        '''
+        verts: List[Tuple[float, float, float]] = self._data.get_polygon_coordinates(polygon)
+        x_min: float = min(v[0] for v in verts)
+        y_min: float = min(v[1] for v in verts)
+        z_min: float = min(v[2] for v in verts)
+        x_max: float = max(v[0] for v in verts)
+        y_max: float = max(v[1] for v in verts)
+        z_max: float = max(v[2] for v in verts)
+        return (x_min - BVH_AABB_DELTA, y_min - BVH_AABB_DELTA, z_min - BVH_AABB_DELTA, x_max + BVH_AABB_DELTA, y_max + BVH_AABB_DELTA, z_max + BVH_AABB_DELTA)
+
+    def insert(self, polygon: int):
+        '''Add the polygon to the tree
+        the tree is not rebuilt, the polygon is added near the leaf, which aabb increase less other, and aabbs of all parent nodes are refitted
+        so, the time is proportional to the depth of the tree
+        '''
+        self._insert_item(polygon, self._get_polygon_aabb(polygon))
+
+    def remove(self, polygon: int) -> bool:
+        '''Remove the polygon from the tree
+        the empty leaf is replaced by it sibling and aabbs of all parent nodes are refitted
 
         Output:
-            NavmeshNode or None
-        '''
-        if self.is_inside_aabb(point):
-            if self._node is None and self._left is not None and self._right is not None:
-                # this bvh node contains left and right children, go deeper
-                left_sample: Optional[NavmeshNode] = self._left.sample(point)
-                right_sample: Optional[NavmeshNode] = self._right.sample(point)
-                if left_sample is None:
-                    return right_sample
-                else:
-                    if right_sample is None:
-                        return left_sample
-                    else:
-                        # we should choose from left and right sample the closest to the point
-                        l_c: Tuple[float, float, float] = left_sample.get_center()
-                        l_n: Tuple[float, float, float] = left_sample.get_normal()
-                        l_dist: float = abs((point[0] - l_c[0]) * l_n[0] + (point[1] - l_c[1]) * l_n[1] + (point[2] - l_c[2]) * l_n[2])
+            True if the polygon was in the tree, False otherwise
+        '''
+        return self._remove_item(self._data.get_center(polygon), lambda item: item == polygon) > -1
+
+    def sample(self, point: Tuple[float, float, float]) -> int:
+        '''Return index of the polygon, which contains the point
+        If there are no polygons near the point, then return -1
+        If several polygons contain the point (in XZ-plane), then return the closest one (by the distance to the polygon plane),
+        from polygons with equal distances select the last one in the depth-first order
 
-                        r_c: Tuple[float, float, float] = right_sample.get_center()
-                        r_n: Tuple[float, float, float] = right_sample.get_normal()
-                        r_dist: float = abs((point[0] - r_c[0]) * r_n[0] + (point[1] - r_c[1]) * r_n[1] + (point[2] - r_c[2]) * r_n[2])
+        Input:
+            point - 3-triple (x, y, z)
 
-                        if l_dist < r_dist:
-                            return left_sample
+        Output:
+            polygon index or -1
+        '''
+        x: float = point[0]
+        y: float = point[1]
+        z: float = point[2]
+        x_mins, y_mins, z_mins, x_maxs, y_maxs, z_maxs = self._get_axis_bounds()
+        if not (x_mins[0] < x < x_maxs[0] and z_mins[0] < z < z_maxs[0] and y_mins[0] < y < y_maxs[0]):
+            return -1
+        lefts: array = self._lefts
+        rights: array = self._rights
+        firsts: array = self._firsts
+        counts: array = self._counts
+        items: array = self._items
+        item_bounds: array = self._item_bounds
+        # this method is called for each new agent and each path search, so the point inside polygon test
+        # and the distance to the polygon plane are inlined, it saves several calls for each visited leaf
+        data_arrays: Dict[str, Any] = self._data.get_arrays()
+        vertices: Any = data_arrays["vertices"]
+        offsets: Any = data_arrays["polygon_offsets"]
+        corners: Any = data_arrays["polygon_corners"]
+        corner_normals: Any = data_arrays["corner_normals"]
+        centers: Any = data_arrays["centers"]
+        normals: Any = data_arrays["normals"]
+        to_return: int = -1
+        min_distance: float = -1.0  # calculated only when the second polygon is found
+        # children are checked before the visit, so the stack contains only nodes with the point inside
+        # the traversal goes to the left child without pushing it into the stack
+        stack: List[int] = []
+        node: int = 0
+        while node > -1:
+            left: int = lefts[node]
+            if left == -1:
+                first: int = firsts[node]
+                count: int = counts[node]
+                for k in range(first, first + count):
+                    if count > 1:
+                        # aabb of the single item is the same as aabb of the leaf
+                        i: int = 6 * k
+                        if not (item_bounds[i] < x < item_bounds[i + 3] and item_bounds[i + 2] < z < item_bounds[i + 5] and item_bounds[i + 1] < y < item_bounds[i + 4]):
+                            continue
+                    polygon: int = items[k]
+                    # the same test as in NavmeshData.is_point_inside
+                    start: int = offsets[polygon]
+                    end: int = offsets[polygon + 1]
+                    is_inside: bool = True
+                    for corner in range(start, end):
+                        u: int = 3 * corners[corner]
+                        v: int = 3 * corners[corner + 1 if corner < end - 1 else start]
+                        ux: float = vertices[u]
+                        uy: float = vertices[u + 1]
+                        uz: float = vertices[u + 2]
+                        ax: float = vertices[v] - ux
+                        ay: float = vertices[v + 1] - uy
+                        az: float = vertices[v + 2] - uz
+                        bx: float = x - ux
+                        by: float = y - uy
+                        bz: float = z - uz
+                        c: int = 3 * corner
+                        if (ay * bz - az * by) * corner_normals[c] + (az * bx - ax * bz) * corner_normals[c + 1] + (ax * by - ay * bx) * corner_normals[c + 2] < -0.00001:
+                            is_inside = False
+                            break
+                    if is_inside:
+                        if to_return == -1:
+                            to_return = polygon
                         else:
-                            return right_sample
+                            p: int = 3 * to_return
+                            if min_distance < 0.0:
+                                min_distance = abs((x - centers[p]) * normals[p] + (y - centers[p + 1]) * normals[p + 1] + (z - centers[p + 2]) * normals[p + 2])
+                            p = 3 * polygon
+                            distance: float = abs((x - centers[p]) * normals[p] + (y - centers[p + 1]) * normals[p + 1] + (z - centers[p + 2]) * normals[p + 2])
+                            if distance <= min_distance:
+                                to_return = polygon
+                                min_distance = distance
+                node = stack.pop() if stack else -1
             else:
-                # bvh node contains polygon
-                if self._node is not None:
-                    if self._node.is_point_inside(point):
-                        return self._node
-                    else:
-                        return None
+                right: int = rights[node]
+                if x_mins[left] < x < x_maxs[left] and z_mins[left] < z < z_maxs[left] and y_mins[left] < y < y_maxs[left]:
+                    if x_mins[right] < x < x_maxs[right] and z_mins[right] < z < z_maxs[right] and y_mins[right] < y < y_maxs[right]:
+                        stack.append(right)
+                    node = left
+                elif x_mins[right] < x < x_maxs[right] and z_mins[right] < z < z_maxs[right] and y_mins[right] < y < y_maxs[right]:
+                    node = right
                 else:
-                    return None
-        else:
-            return None
+                    node = stack.pop() if stack else -1
+        return to_return
 
     def __repr__(self) -> str:
-        return "<object: " + str(self._node if self._node is None else self._node.get_index()) + ", left: " + str(self._left) + ", right: " + str(self._right) + ">"
+        return "<bvh nodes: " + str(self.get_nodes_count()) + ", aabb: " + str(self.get_aabb()) + ">"
@@ -0,0 +1,275 @@
+import math
+from bisect import bisect_right
+from array import array
+from typing import List, Tuple, Dict, Any
+
+
+class NavmeshData:
+    '''Compact description of the navigation mesh in the form of plain arrays (struct of arrays)
+
+    All values are stored in typed arrays from array module:
+        -) vertices - coordinates of vertices (x1, y1, z1, x2, y2, z2, ...)
+        -) polygon offsets and polygon corners - CSR form of polygons, corners of the i-th polygon are in the interval [offsets[i], offsets[i + 1])
+        -) neighbors - for each polygon corner store the index of the polygon, incident to the edge from this corner to the next one (or -1)
+                       so, the portal between two polygons is defined by the corner index and does not require separate storage
+        -) corner normals - for each corner u (and next v, w) normalized [uv, uw], used for point inside polygon test
+        -) centers and normals of polygons
+        -) groups - index of the connected component for each polygon (-1 if it is not defined yet)
+
+    polygons are convex, it's important for calculation it normal
+
+    this class is for internal use only
+    '''
+    def __init__(self, vertices: List[Tuple[float, float, float]], polygons: List[List[int]]):
+        self._vertices: array = array("d")
+        for vertex in vertices:
+            self._vertices.extend(vertex)
+        self._polygon_offsets: array = array("i", [0])
+        self._polygon_corners: array = array("i")
+        for polygon in polygons:
+            self._polygon_corners.extend(polygon)
+            self._polygon_offsets.append(len(self._polygon_corners))
+        self._polygons_count: int = len(polygons)
+        self._neighbors: array = array("i", [-1]) * len(self._polygon_corners)
+        self._groups: array = array("i", [-1]) * self._polygons_count
+
+        self._centers: array = array("d")
+        self._normals: array = array("d")
+        self._corner_normals: array = array("d")
+        for p in range(self._polygons_count):
+            self._add_polygon_geometry(p)
+
+    def _add_polygon_geometry(self, polygon: int):
+        '''Calculate center, normal and corner normals of the polygon and add it to the end of arrays
+        '''
+        points: List[Tuple[float, float, float]] = self.get_polygon_coordinates(polygon)
+        center: Tuple[float, float, float] = self._calc_center(points)
+        self._centers.extend(center)
+        self._normals.extend(self._calc_average_normal(center, points))
+        for normal in self._calc_vertex_normals(points):
+            self._corner_normals.extend(normal)
+
+    def get_arrays(self) -> Dict[str, Any]:
+        '''Return all plain arrays of the data, key - the name of the array
+        '''
+        return {"vertices": self._vertices,
+                "polygon_offsets": self._polygon_offsets,
+                "polygon_corners": self._polygon_corners,
+                "neighbors": self._neighbors,
+                "groups": self._groups,
+                "centers": self._centers,
+                "normals": self._normals,
+                "corner_normals": self._corner_normals}
+
+    @staticmethod
+    def from_arrays(arrays: Dict[str, Any]) -> "NavmeshData":
+        '''Create the data from arrays, returned by get_arrays method
+        values can be any objects with array interface (array, memoryview and so on), they are used without copy
+        '''
+        data: NavmeshData = NavmeshData.__new__(NavmeshData)
+        data._vertices = arrays["vertices"]
+        data._polygon_offsets = arrays["polygon_offsets"]
+        data._polygon_corners = arrays["polygon_corners"]
+        data._polygons_count = len(data._polygon_offsets) - 1
+        data._neighbors = arrays["neighbors"]
+        data._groups = arrays["groups"]
+        data._centers = arrays["centers"]
+        data._normals = arrays["normals"]
+        data._corner_normals = arrays["corner_normals"]
+        return data
+
+    def make_editable(self):
+        '''Copy all arrays, which are not instances of array (for example, memory views of the snapshot file), into arrays
+        after this call new vertices and polygons can be added
+        '''
+        arrays: Dict[str, Any] = self.get_arrays()
+        for name, values in arrays.items():
+            if not isinstance(values, array):
+                copy: array = array(values.format)
+                copy.frombytes(values.tobytes())
+                setattr(self, "_" + name, copy)
+
+    def add_vertex(self, vertex: Tuple[float, float, float]) -> int:
+        '''Add new vertex to the end of vertices array and return it index
+        '''
+        self._vertices.extend(vertex)
+        return len(self._vertices) // 3 - 1
+
+    def add_polygon(self, polygon: List[int]) -> int:
+        '''Add new polygon (without neighbors and group) to the end of polygons arrays and return it index
+        all vertices of the polygon should be already added
+        '''
+        self._polygon_corners.extend(polygon)
+        self._polygon_offsets.append(len(self._polygon_corners))
+        self._neighbors.extend([-1] * len(polygon))
+        self._groups.append(-1)
+        self._polygons_count += 1
+        self._add_polygon_geometry(self._polygons_count - 1)
+        return self._polygons_count - 1
+
+    def get_polygons_count(self) -> int:
+        return self._polygons_count
+
+    def get_vertices_count(self) -> int:
+        return len(self._vertices) // 3
+
+    def get_vertices(self) -> List[Tuple[float, float, float]]:
+        '''Return coordinates of all vertices in the form [(x1, y1, z1), (x2, y2, z2), ...]
+        '''
+        coordinates: List[float] = self._vertices.tolist()
+        return [(coordinates[3 * i], coordinates[3 * i + 1], coordinates[3 * i + 2]) for i in range(len(coordinates) // 3)]
+
+    def get_polygons(self) -> List[List[int]]:
+        '''Return all polygons in the form [[i11, i12, ..., i1n], [i21, i22, ...], ...]
+        '''
+        corners: List[int] = self._polygon_corners.tolist()
+        offsets: List[int] = self._polygon_offsets.tolist()
+        return [corners[offsets[i]:offsets[i + 1]] for i in range(self._polygons_count)]
+
+    def get_vertex(self, vertex: int) -> Tuple[float, float, float]:
+        return (self._vertices[3 * vertex], self._vertices[3 * vertex + 1], self._vertices[3 * vertex + 2])
+
+    def get_polygon(self, polygon: int) -> List[int]:
+        '''Return array of vertex indexes of the polygon
+        '''
+        return self._polygon_corners[self._polygon_offsets[polygon]:self._polygon_offsets[polygon + 1]].tolist()
+
+    def get_polygon_range(self, polygon: int) -> Tuple[int, int]:
+        '''Return 2-tuple (start, end) with the interval of the polygon corners in the plain arrays of corners and neighbors
+        '''
+        return (self._polygon_offsets[polygon], self._polygon_offsets[polygon + 1])
+
+    def get_corner_vertex(self, corner: int) -> int:
+        return self._polygon_corners[corner]
+
+    def get_corner_polygon(self, corner: int) -> int:
+        '''Return the index of the polygon, which contains the corner
+        '''
+        return bisect_right(self._polygon_offsets, corner) - 1
+
+    def get_polygon_coordinates(self, polygon: int) -> List[Tuple[float, float, float]]:
+        return [self.get_vertex(self._polygon_corners[c]) for c in range(self._polygon_offsets[polygon], self._polygon_offsets[polygon + 1])]
+
+    def get_center(self, polygon: int) -> Tuple[float, float, float]:
+        return (self._centers[3 * polygon], self._centers[3 * polygon + 1], self._centers[3 * polygon + 2])
+
+    def get_centers_array(self) -> Any:
+        '''Return plain array of polygon centers (x1, y1, z1, x2, y2, z2, ...) without copy
+        '''
+        return self._centers
+
+    def get_normal(self, polygon: int) -> Tuple[float, float, float]:
+        return (self._normals[3 * polygon], self._normals[3 * polygon + 1], self._normals[3 * polygon + 2])
+
+    def get_group(self, polygon: int) -> int:
+        return self._groups[polygon]
+
+    def set_group(self, polygon: int, group: int):
+        self._groups[polygon] = group
+
+    def get_corner_neighbor(self, corner: int) -> int:
+        return self._neighbors[corner]
+
+    def set_corner_neighbor(self, corner: int, polygon: int):
+        self._neighbors[corner] = polygon
+
+    def get_neighbors(self, polygon: int) -> List[int]:
+        '''Return indexes of polygons, incident to the given one, in the order of polygon edges
+        '''
+        return [n for n in self._neighbors[self._polygon_offsets[polygon]:self._polygon_offsets[polygon + 1]] if n > -1]
+
+    def get_portal(self, polygon: int, other: int) -> Tuple[Tuple[float, float, float], Tuple[float, float, float]]:
+        '''Return pair of 3-tuples with coordinates of the edge, which separate the polygon from the other one
+        vertices are ordered in orientation, induced from the polygon orientation
+        '''
+        start: int = self._polygon_offsets[polygon]
+        end: int = self._polygon_offsets[polygon + 1]
+        for corner in range(start, end):
+            if self._neighbors[corner] == other:
+                return (self.get_vertex(self._polygon_corners[corner]), self.get_vertex(self._polygon_corners[corner + 1 if corner < end - 1 else start]))
+        raise KeyError(other)
+
+    def is_point_inside(self, polygon: int, point: Tuple[float, float, float]) -> bool:
+        '''return true, if the point inside the polygon
+        '''
+        start: int = self._polygon_offsets[polygon]
+        end: int = self._polygon_offsets[polygon + 1]
+        vertices: array = self._vertices
+        normals: array = self._corner_normals
+        for corner in range(start, end):
+            u: int = 3 * self._polygon_corners[corner]
+            v: int = 3 * self._polygon_corners[corner + 1 if corner < end - 1 else start]
+            # we should calculate cross product [uv, up]
+            # if dot-product with normal in the vertex < 0, then point outside the polygon
+            vector: Tuple[float, float, float] = self._cross(vertices[v] - vertices[u], vertices[v + 1] - vertices[u + 1], vertices[v + 2] - vertices[u + 2],
+                                                             point[0] - vertices[u], point[1] - vertices[u + 1], point[2] - vertices[u + 2])
+            d: float = vector[0] * normals[3 * corner] + vector[1] * normals[3 * corner + 1] + vector[2] * normals[3 * corner + 2]
+            if d < -0.00001:
+                return False
+        return True
+
+    def get_exit_corner(self, polygon: int, point: Tuple[float, float, float]) -> int:
+        '''Return the corner of the polygon edge, the point is most far outside of, or -1 if the point inside the polygon
+        the test is the same as in is_point_inside, so the neighbor of the returned corner is the next polygon in the direction to the point
+        '''
+        start: int = self._polygon_offsets[polygon]
+        end: int = self._polygon_offsets[polygon + 1]
+        vertices: array = self._vertices
+        normals: array = self._corner_normals
+        to_return: int = -1
+        min_d: float = -0.00001
+        for corner in range(start, end):
+            u: int = 3 * self._polygon_corners[corner]
+            v: int = 3 * self._polygon_corners[corner + 1 if corner < end - 1 else start]
+            vector: Tuple[float, float, float] = self._cross(vertices[v] - vertices[u], vertices[v + 1] - vertices[u + 1], vertices[v + 2] - vertices[u + 2],
+                                                             point[0] - vertices[u], point[1] - vertices[u + 1], point[2] - vertices[u + 2])
+            d: float = vector[0] * normals[3 * corner] + vector[1] * normals[3 * corner + 1] + vector[2] * normals[3 * corner + 2]
+            if d < min_d:
+                to_return = corner
+                min_d = d
+        return to_return
+
+    def get_memory_size(self) -> int:
+        '''Return the number of bytes in all arrays
+        '''
+        return sum(a.itemsize * len(a) for a in self.get_arrays().values())
+
+    def _calc_vertex_normals(self, vertices: List[Tuple[float, float, float]]) -> List[Tuple[float, float, float]]:
+        '''for each vertex u (and next v, w) calculate normalized [uv, uw]
+        '''
+        size: int = len(vertices)
+        to_return: List[Tuple[float, float, float]] = []
+        for i in range(size):
+            u: Tuple[float, float, float] = vertices[i]
+            v: Tuple[float, float, float] = vertices[(i + 1) % size]
+            w: Tuple[float, float, float] = vertices[(i + 2) % size]
+            vector: Tuple[float, float, float] = self._cross(v[0] - u[0], v[1] - u[1], v[2] - u[2], w[0] - u[0], w[1] - u[1], w[2] - u[2])
+            d: float = math.sqrt(vector[0]**2 + vector[1]**2 + vector[2]**2)
+            to_return.append((vector[0] / d, vector[1] / d, vector[2] / d))
+        return to_return
+
+    def _calc_center(self, points: List[Tuple[float, float, float]]) -> Tuple[float, float, float]:
+        '''Find center of the array
+        '''
+        s = [0.0] * 3
+        for a in points:
+            for i in range(len(a)):
+                s[i] += a[i]
+        for i in range(len(s)):
+            s[i] = s[i] / len(points)
+        return (s[0], s[1], s[2])
+
+    def _cross(self, a_x: float, a_y: float, a_z: float, b_x: float, b_y: float, b_z: float) -> Tuple[float, float, float]:
+        return (a_y*b_z - a_z*b_y, a_z*b_x - a_x*b_z, a_x*b_y - a_y*b_x)
+
+    def _calc_average_normal(self, center: Tuple[float, float, float], points: List[Tuple[float, float, float]]) -> Tuple[float, float, float]:
+        normal: List[float] = [0.0, 0.0, 0.0]
+        for p_index in range(len(points)):
+            p0: Tuple[float, float, float] = points[p_index]
+            p1: Tuple[float, float, float] = points[p_index + 1 if p_index < len(points) - 1 else 0]
+            c: Tuple[float, float, float] = self._cross(p0[0] - center[0], p0[1] - center[1], p0[2] - center[2], p1[0] - center[0], p1[1] - center[1], p1[2] - center[2])
+            normal[0] += c[0]
+            normal[1] += c[1]
+            normal[2] += c[2]
+        d: float = math.sqrt(normal[0]**2 + normal[1]**2 + normal[2]**2)
+        return (normal[0] / d, normal[1] / d, normal[2] / d)
@@ -0,0 +1,67 @@
+from typing import List
+from pathfinder.navmesh.navmesh_graph import NavmeshGraph
+
+
+class FlowField:
+    '''Polygon-level flow field to one target polygon
+
+    For each polygon of the group it stores the length of the shortest path in the graph to the target
+    and the next polygon in this path. The next portal is the common edge of the polygon and the next polygon
+
+    this class is for internal use only
+    '''
+    def __init__(self, graph: NavmeshGraph, group_index: int, target_polygon: int):
+        '''Calculate the flow field over the graph of the group
+
+        Input:
+            graph - the graph of the group, which contains target polygon
+            group_index - index of the group
+            target_polygon - index of the target polygon
+        '''
+        self._graph: NavmeshGraph = graph
+        self._group: int = group_index
+        self._target: int = target_polygon
+        distances, next_vertices = graph.shortest_tree(target_polygon)
+        self._distances: List[float] = distances
+        self._next: List[int] = next_vertices
+
+    def get_target(self) -> int:
+        return self._target
+
+    def get_group(self) -> int:
+        return self._group
+
+    def is_reachable(self, polygon: int) -> bool:
+        '''return True if the target is reachable from the polygon
+        '''
+        if polygon == self._target:
+            return True
+        index: int = self._graph.get_vertex_index(polygon)
+        return index > -1 and self._next[index] > -1
+
+    def get_distance(self, polygon: int) -> float:
+        '''return the length of the shortest path in the graph from the polygon to the target, infinity for unreachable polygon
+        '''
+        if polygon == self._target:
+            return 0.0
+        index: int = self._graph.get_vertex_index(polygon)
+        return self._distances[index] if index > -1 else float("inf")
+
+    def get_next(self, polygon: int) -> int:
+        '''return the index of the next polygon in the path to the target, -1 for the target and unreachable polygons
+        '''
+        index: int = self._graph.get_vertex_index(polygon)
+        if index > -1 and self._next[index] > -1:
+            return self._graph.get_vertices()[self._next[index]]
+        return -1
+
+    def get_corridor(self, polygon: int) -> List[int]:
+        '''return array of polygon indexes from the input polygon to the target
+        if the target is unreachable, then return empty array
+        '''
+        if polygon == self._target:
+            # the graph of the group with one polygon is empty
+            return [polygon]
+        if not self.is_reachable(polygon):
+            return []
+        return self._graph.tree_path(self._next, polygon)
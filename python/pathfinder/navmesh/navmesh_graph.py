@@ -1,5 +1,7 @@
 import math
-from typing import List, Tuple, Dict
+import heapq
+from array import array
+from typing import List, Tuple, Dict, Optional, Set, Any
 
 
 class NavmeshGraph:
@@ -15,125 +17,354 @@ class NavmeshGraph:
             edges - array of 2-tuple [(a, b), ...], where a and b are names of vertices, incident to the same edge
         '''
         self._is_empty = len(vertex_positions) == 0
-        self._positions: List[Tuple[float, float, float]] = vertex_positions
+        self._positions: array = array("d")  # plain array (x1, y1, z1, x2, y2, z2, ...)
+        for position in vertex_positions:
+            self._positions.extend(position)
         self._vertex_names: List[int] = vertices  # names are not from 0 to n-1
         self._vertex_count: int = len(self._vertex_names)
         # we need oppisit map from vertex name to it index
         self._index_map: Dict[int, int] = {}
         for i in range(len(self._vertex_names)):
             self._index_map[self._vertex_names[i]] = i
-        self._edges: List[Tuple[int, int]] = edges
-
-        # create map from vertex to all incident vertices
-        self._incident_map: Dict[int, List[int]] = {}  # key - vertex index, value - array of indexes of incident vertices
-        for e in self._edges:
-            for i in range(2):
-                v = self._index_map[e[i]]
-                if v in self._incident_map:
-                    self._incident_map[v].append(self._index_map[e[i - 1]])
-                else:
-                    self._incident_map[v] = [self._index_map[e[i - 1]]]
+        self._edges: array = array("i")  # plain array of edge ends (a1, b1, a2, b2, ...)
+        for e in edges:
+            self._edges.extend(e)
+
+        # incident vertices in CSR form: vertices, incident to the i-th one, are in the interval [offsets[i], offsets[i + 1])
+        # for each incident vertex store also the length of the edge, so searches does not recalculate it
+        incident_lists: List[List[int]] = [[] for i in range(self._vertex_count)]
+        for e in edges:
+            a: int = self._index_map[e[0]]
+            b: int = self._index_map[e[1]]
+            incident_lists[a].append(b)
+            incident_lists[b].append(a)
+        self._incident_offsets: array = array("i", [0])
+        self._incident_vertices: array = array("i")
+        self._incident_lengths: array = array("d")
+        for v in range(self._vertex_count):
+            for other in incident_lists[v]:
+                self._incident_vertices.append(other)
+                self._incident_lengths.append(self._get_vertex_distance(v, other))
+            self._incident_offsets.append(len(self._incident_vertices))
+
+        # landmarks for ALT heuristic, for each landmark store the array with distances from it to all vertices
+        self._landmarks: List[int] = []  # indexes of landmark vertices
+        self._landmark_distances: List[array] = []
+        self._init_search_buffers()
 
-    def _pre_start(self, target: int):
+    def _init_search_buffers(self):
+        '''Allocate arrays, used by search algorithms
+        '''
+        # search buffers are allocated once and reused by all queries
+        # each value is valid only if the corresponding generation stamp is equal to the current search generation
+        self._generation: int = 0
         self._vertices_g: List[float] = [0.0] * self._vertex_count
-        self._vertices_h: List[float] = [self._get_distance(self._positions[i], self._positions[target]) for i in range(self._vertex_count)]  # calculate distance from each vertex to the target
-        self._vertices_f: List[float] = [0.0] * self._vertex_count
-        self._vertices_close: List[bool] = [False] * self._vertex_count
+        self._vertices_h: List[float] = [0.0] * self._vertex_count
         self._vertices_parent: List[int] = [-1] * self._vertex_count  # store here the index of the vertex, from we come here with minimum g
+        self._vertices_visit: List[int] = [0] * self._vertex_count  # generation, when the vertex was reached at first time
+        self._vertices_close: List[int] = [0] * self._vertex_count  # generation, when the vertex was closed
+        self._last_expanded: int = 0  # the number of closed vertices in the last search
+        self._target_landmark_distances: List[float] = []  # distances from landmarks to the target of the current search
+
+    def _pre_start(self):
+        '''Start new search generation. All previous g, h and parent values become invalid without clearing the buffers
+        '''
+        self._generation += 1
 
-    def _get_distance(self, a: Tuple[float, float, float], b: Tuple[float, float, float]) -> float:
-        return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2 + (a[2] - b[2])**2)
+    def _visit(self, vertex: int, target: int):
+        '''Mark the vertex as reached in the current search and calculate the heuristic for it
+        '''
+        self._vertices_visit[vertex] = self._generation
+        self._vertices_parent[vertex] = -1
+        h: float = self._get_vertex_distance(vertex, target)
+        # use triangle inequality for each landmark: |d(L, target) - d(L, vertex)| <= d(vertex, target)
+        for landmark_index in range(len(self._landmarks)):
+            landmark_h: float = abs(self._target_landmark_distances[landmark_index] - self._landmark_distances[landmark_index][vertex])
+            if landmark_h > h:
+                h = landmark_h
+        self._vertices_h[vertex] = h
+
+    def _get_vertex_distance(self, a: int, b: int) -> float:
+        '''Return the distance between two vertices with given indexes
+        '''
+        p: array = self._positions
+        return math.sqrt((p[3 * a] - p[3 * b])**2 + (p[3 * a + 1] - p[3 * b + 1])**2 + (p[3 * a + 2] - p[3 * b + 2])**2)
+
+    def _select_next(self, vertex: int, distances: List[float], root: int) -> int:
+        '''Return the closed neighbor of the vertex, which is the next step of the shortest path from the vertex to the root
+        distances - distances from the root, valid for closed vertices
+
+        All neighbors on shortest pathes are closed before the vertex, so the choice does not depend on the order of the search
+        from several equal neighbors select the closest to the root in straight line, so corridors are near to straight lines
+        and A* search and Dijkstra tree return the same corridor for the same pair of vertices
+        '''
+        generation: int = self._generation
+        close: List[int] = self._vertices_close
+        lengths: array = self._incident_lengths
+        distance: float = distances[vertex]
+        tolerance: float = 1e-9 * (1.0 + distance)
+        to_return: int = -1
+        to_return_key: float = -1.0  # distance to the root is calculated only when there are several neighbors
+        for incident in range(self._incident_offsets[vertex], self._incident_offsets[vertex + 1]):
+            other: int = self._incident_vertices[incident]
+            if close[other] == generation and abs(distances[other] + lengths[incident] - distance) <= tolerance:
+                if to_return == -1:
+                    to_return = other
+                else:
+                    if to_return_key < 0.0:
+                        to_return_key = self._get_vertex_distance(to_return, root)
+                    key: float = self._get_vertex_distance(other, root)
+                    if key < to_return_key:
+                        to_return = other
+                        to_return_key = key
+        return to_return
 
     def get_vertex_count(self):
         return self._vertex_count
 
+    def get_vertex_index(self, vertex: int) -> int:
+        '''Return index of the vertex with a given name in the array of vertices, -1 if there is no such vertex
+        '''
+        return self._index_map.get(vertex, -1)
+
     def get_vertices(self):
         '''Return graph vertex names
         '''
         return self._vertex_names
 
-    def get_positions(self):
+    def get_positions(self) -> List[Tuple[float, float, float]]:
         '''Return the array of graph vertex positions
         '''
-        return self._positions
+        p: array = self._positions
+        return [(p[3 * i], p[3 * i + 1], p[3 * i + 2]) for i in range(self._vertex_count)]
 
-    def get_edges(self):
+    def get_edges(self) -> List[Tuple[int, int]]:
         '''Return array of graph edges
         '''
-        return self._edges
+        return [(self._edges[2 * i], self._edges[2 * i + 1]) for i in range(len(self._edges) // 2)]
+
+    def get_arrays(self) -> Dict[str, Any]:
+        '''Return all plain arrays of the graph (with landmarks), key - the name of the array
+        '''
+        return {"names": array("i", self._vertex_names),
+                "positions": self._positions,
+                "edges": self._edges,
+                "incident_offsets": self._incident_offsets,
+                "incident_vertices": self._incident_vertices,
+                "incident_lengths": self._incident_lengths,
+                "landmarks": array("i", self._landmarks),
+                "landmark_distances": array("d", [d for distances in self._landmark_distances for d in distances])}
 
-    def search(self, start_vertex: int, end_vertex: int) -> List[int]:
+    @staticmethod
+    def from_arrays(arrays: Dict[str, Any]) -> "NavmeshGraph":
+        '''Create the graph from arrays, returned by get_arrays method
+        values can be any objects with array interface (array, memoryview and so on), plain arrays are used without copy
+        '''
+        graph: NavmeshGraph = NavmeshGraph.__new__(NavmeshGraph)
+        graph._vertex_names = arrays["names"].tolist()
+        graph._vertex_count = len(graph._vertex_names)
+        graph._is_empty = graph._vertex_count == 0
+        graph._index_map = {name: index for index, name in enumerate(graph._vertex_names)}
+        graph._positions = arrays["positions"]
+        graph._edges = arrays["edges"]
+        graph._incident_offsets = arrays["incident_offsets"]
+        graph._incident_vertices = arrays["incident_vertices"]
+        graph._incident_lengths = arrays["incident_lengths"]
+        graph._landmarks = arrays["landmarks"].tolist()
+        distances = arrays["landmark_distances"]
+        graph._landmark_distances = [distances[i * graph._vertex_count:(i + 1) * graph._vertex_count] for i in range(len(graph._landmarks))]
+        graph._init_search_buffers()
+        return graph
+
+    def get_last_expanded_count(self) -> int:
+        '''Return the number of vertices, expanded during the last call of the search method
+        '''
+        return self._last_expanded
+
+    def search(self, start_vertex: int, end_vertex: int, allowed_vertices: Optional[Set[int]] = None) -> List[int]:
         '''Calculate the shortes path between two input vertices, by using A* algorithm
 
         Input:
             start_vertex - the name of the start vertex
             end_vertex - the name of the end vertex
+            allowed_vertices - set of vertex names, if it defined, then the path can contains only these vertices
 
         Output:
             array of vertex names, which form the shortest path between start end end vertices
+            if there are several shortest pathes, then at each step the path goes to the vertex, closest to the end in straight line
             if there are no path between input vertices, then return empty array []
         '''
         if self._is_empty:
             return []
-        # clear data structures
-        start: int = self._index_map[start_vertex]
-        end: int = self._index_map[end_vertex]
-        self._pre_start(end)
-        # create open list
-        open_list: List[int] = [start]
-        # set f and g for the start_vertex
+        # the search goes from the end vertex to the start one, so parents form the path from the start in the same way
+        # as next vertices in the shortest tree to the end vertex (see _select_next)
+        start: int = self._index_map[end_vertex]
+        end: int = self._index_map[start_vertex]
+        self._pre_start()
+        self._last_expanded = 0
+        self._target_landmark_distances = [distances[end] for distances in self._landmark_distances]
+        generation: int = self._generation
+        # set g and h for the start_vertex
+        self._visit(start, end)
         self._vertices_g[start] = 0.0
-        self._vertices_f[start] = self._vertices_g[start] + self._vertices_h[start]
+        # open list is a binary heap of tuples (f, g, order, vertex)
+        # vertices with equal f are extracted in the order of increasing g, so all parents on shortest pathes are closed before the vertex
+        # order is an increasing counter, so vertices with equal f and g are extracted in the order of addition
+        # when g-value of the vertex decreases, we simply push the new tuple, and skip the old one when it extracted
+        order: int = 0
+        open_list: List[Tuple[float, float, int, int]] = [(self._vertices_h[start], 0.0, order, start)]
 
         while len(open_list) > 0:
-            # find in the open list vertex with the minimum value of f
-            min_f: float = self._vertices_f[open_list[0]]
-            min_vertex: int = open_list[0]
-            min_index: int = 0
-            v: int
-            for i in range(1, len(open_list)):
-                v = open_list[i]
-                v_f: float = self._vertices_f[v]
-                if v_f < min_f:
-                    min_f = v_f
-                    min_vertex = v
-                    min_index = i
-            open_list.pop(min_index)  # remove vertex with minimal f from the open list
-            self._vertices_close[min_vertex] = True  # and set it close
+            # extract from the open list vertex with the minimum value of f
+            min_vertex: int = heapq.heappop(open_list)[3]
+            if self._vertices_close[min_vertex] == generation:
+                # this is outdated record for already closed vertex
+                continue
+            self._vertices_parent[min_vertex] = self._select_next(min_vertex, self._vertices_g, start)
+            self._vertices_close[min_vertex] = generation  # set it close
+            self._last_expanded += 1
             if min_vertex == end:
-                # we find the closest path
+                # we find the closest path, parents lead from the start vertex of the query to the end one
                 path: List[int] = []  # put to the path indexes of vertices
-                v = min_vertex
+                v: int = min_vertex
                 while self._vertices_parent[v] > -1:
                     path.append(v)
                     v = self._vertices_parent[v]
                 path.append(v)
                 # return array of vertices names
-                l: int = len(path)
-                return [self._vertex_names[path[l - 1 - i]] for i in range(l)]
-            # next we should enumerate all vertex edges and add all non-initial vertices to the open list
-            if min_vertex in self._incident_map:
-                for child_index in self._incident_map[min_vertex]:
-                    if self._vertices_close[child_index] is False:
-                        v_g: float = self._get_distance(self._positions[min_vertex], self._positions[child_index]) + self._vertices_g[min_vertex]
-                        if self._vertices_parent[child_index] == -1:
-                            # we come to this vertex at first time, so, set parent and g-value
-                            self._vertices_parent[child_index] = min_vertex
-                            self._vertices_g[child_index] = v_g
-                            self._vertices_f[child_index] = v_g + self._vertices_h[child_index]
-                            # add it to the open list
-                            open_list.append(child_index)
-                        else:
-                            # we already come to this vertex, so, this vertex in the open list
-                            # check, may be g-value is less, than existing one
-                            if self._vertices_g[child_index] > v_g:
-                                # redefine parent
-                                self._vertices_parent[child_index] = min_vertex
-                                self._vertices_g[child_index] = v_g
-                                self._vertices_f[child_index] = v_g + self._vertices_h[child_index]
+                return [self._vertex_names[i] for i in path]
+            # next we should enumerate all vertex edges and add all non-closed vertices to the open list
+            min_g: float = self._vertices_g[min_vertex]
+            for incident in range(self._incident_offsets[min_vertex], self._incident_offsets[min_vertex + 1]):
+                child_index: int = self._incident_vertices[incident]
+                if allowed_vertices is not None and self._vertex_names[child_index] not in allowed_vertices:
+                    continue
+                if self._vertices_close[child_index] != generation:
+                    v_g: float = self._incident_lengths[incident] + min_g
+                    if self._vertices_visit[child_index] != generation:
+                        # we come to this vertex at first time, so, calculate heuristic, set parent and g-value
+                        self._visit(child_index, end)
+                    elif self._vertices_g[child_index] <= v_g:
+                        # we already come to this vertex with better g-value
+                        continue
+                    self._vertices_g[child_index] = v_g
+                    # add it to the open list
+                    order += 1
+                    heapq.heappush(open_list, (v_g + self._vertices_h[child_index], v_g, order, child_index))
         # empty array means, that there are no path between vertices in the graph
         return []
 
+    def shortest_tree(self, target_vertex: int, stop_vertices: Optional[List[int]] = None) -> Tuple[List[float], List[int]]:
+        '''Calculate shortest pathes from all vertices to the target vertex, by using Dijkstra algorithm
+
+        Input:
+            target_vertex - the name of the target vertex
+            stop_vertices - array of vertex names, if it defined, then the algorithm stops when all these vertices are reached
+                            pathes from other vertices may be not calculated in this case
+
+        Output:
+            2-tuple (distances, next), both arrays have the same order as vertex names in get_vertices()
+            distances contains the length of the shortest path to the target (or infinity, if it is not calculated)
+            next contains index of the next vertex in the shortest path to the target (or -1 for the target and not processed vertices)
+            from several shortest pathes the next vertex is selected in the same way as in the search method, so tree pathes are equal to searched ones
+        '''
+        distances: List[float] = [float("inf")] * self._vertex_count
+        next_vertices: List[int] = [-1] * self._vertex_count
+        if self._is_empty:
+            return (distances, next_vertices)
+        target: int = self._index_map[target_vertex]
+        wait_count: int = -1  # how many stop vertices are not closed yet, -1 means that we should process all vertices
+        wait_vertices: Dict[int, bool] = {}
+        if stop_vertices is not None:
+            for name in stop_vertices:
+                wait_vertices[self._index_map[name]] = True
+            wait_count = len(wait_vertices)
+        self._pre_start()
+        generation: int = self._generation
+        distances[target] = 0.0
+        open_list: List[Tuple[float, int]] = [(0.0, target)]
+        while len(open_list) > 0 and wait_count != 0:
+            vertex_distance, vertex = heapq.heappop(open_list)
+            if self._vertices_close[vertex] == generation:
+                continue
+            next_vertices[vertex] = self._select_next(vertex, distances, target)
+            self._vertices_close[vertex] = generation
+            if vertex in wait_vertices:
+                wait_count -= 1
+            for incident in range(self._incident_offsets[vertex], self._incident_offsets[vertex + 1]):
+                child_index: int = self._incident_vertices[incident]
+                if self._vertices_close[child_index] != generation:
+                    child_distance: float = vertex_distance + self._incident_lengths[incident]
+                    if child_distance < distances[child_index]:
+                        distances[child_index] = child_distance
+                        heapq.heappush(open_list, (child_distance, child_index))
+        return (distances, next_vertices)
+
+    def tree_path(self, next_vertices: List[int], start_vertex: int) -> List[int]:
+        '''Return the path from the start vertex to the target of the shortest tree
+
+        Input:
+            next_vertices - the second array, returned by shortest_tree method
+            start_vertex - the name of the start vertex
+
+        Output:
+            array of vertex names from the start to the target vertex
+            if the start vertex is not connected with the target in the tree, then return the array only with start vertex
+        '''
+        v: int = self._index_map[start_vertex]
+        path: List[int] = [self._vertex_names[v]]
+        while next_vertices[v] > -1:
+            v = next_vertices[v]
+            path.append(self._vertex_names[v])
+        return path
+
+    def build_landmarks(self, count: int):
+        '''Select landmarks and calculate distances from them to all vertices for ALT heuristic
+
+        Landmarks are selected by the farthest point rule: the first landmark is the vertex, farthest from the first graph vertex,
+        each next landmark is the vertex with the maximal distance to the closest already selected landmark
+
+        Input:
+            count - the number of landmarks, if it is greater than the number of vertices, then all vertices become landmarks
+        '''
+        self._landmarks = []
+        self._landmark_distances = []
+        if self._is_empty or count <= 0:
+            return
+        distances, _ = self.shortest_tree(self._vertex_names[0])
+        # minimal distance from each vertex to selected landmarks, unreachable vertices are ignored
+        closest: List[float] = [d if d < float("inf") else -1.0 for d in distances]
+        for i in range(min(count, self._vertex_count)):
+            landmark: int = max(range(self._vertex_count), key=lambda v: closest[v])
+            if closest[landmark] <= 0.0 and i > 0:
+                # all vertices are already landmarks
+                break
+            landmark_distances, _ = self.shortest_tree(self._vertex_names[landmark])
+            self._landmarks.append(landmark)
+            self._landmark_distances.append(array("d", landmark_distances))
+            for v in range(self._vertex_count):
+                if landmark_distances[v] < closest[v]:
+                    closest[v] = landmark_distances[v]
+
+    def get_landmarks(self) -> Tuple[List[int], List[array]]:
+        '''Return 2-tuple (landmarks, distances)
+
+        landmarks is array of landmark vertex names
+        distances is array of float arrays, i-th array contains distances from i-th landmark to all vertices in the order of get_vertices()
+        '''
+        return ([self._vertex_names[v] for v in self._landmarks], self._landmark_distances)
+
+    def set_landmarks(self, landmarks: List[int], distances: List[array]):
+        '''Set precalculated landmarks, returned by get_landmarks method
+        '''
+        if len(landmarks) != len(distances):
+            raise ValueError("the number of landmarks " + str(len(landmarks)) + " is not equal to the number of distance arrays " + str(len(distances)))
+        for d in distances:
+            if len(d) != self._vertex_count:
+                raise ValueError("landmark distances array contains " + str(len(d)) + " values, but the graph contains " + str(self._vertex_count) + " vertices")
+        self._landmarks = [self._index_map[name] for name in landmarks]
+        self._landmark_distances = [array("d", d) for d in distances]
+
     def collect_pathes(self, original_path: List[int], multiplier: float = 1.0) -> List[List[int]]:
         '''Find all pathes in the graph which starts and ends at the same vertices as original path
         the length of the result should be between the length of the original path and multipled to the coefficient
@@ -152,13 +383,13 @@ class NavmeshGraph:
         start_index: int = self._index_map[start_name]
         end_name: int = original_path[-1]
         end_index: int = self._index_map[end_name]
-        last_position: Tuple[float, float, float] = self._positions[start_index]
+        last_index: int = start_index
         min_distance: float = 0.0
         for i in range(1, len(original_path)):
             v = original_path[i]  # vertex name
             v_index = self._index_map[v]  # index in positions array
-            min_distance += self._get_distance(last_position, self._positions[v_index])
-            last_position = self._positions[v_index]
+            min_distance += self._get_vertex_distance(last_index, v_index)
+            last_index = v_index
         max_distance: float = min_distance * multiplier
 
         current_pathes = [[start_index]]  # array contains pathes (each path is array)
@@ -180,10 +411,10 @@ class NavmeshGraph:
                     memory_lengths.append(length)
                 if length < max_distance:
                     last_vertex_index = path[-1]
-                    incident_to_last = self._incident_map[last_vertex_index]
-                    for incident_index in incident_to_last:
+                    for incident in range(self._incident_offsets[last_vertex_index], self._incident_offsets[last_vertex_index + 1]):
+                        incident_index = self._incident_vertices[incident]
                         if incident_index not in path:
-                            add_length = self._get_distance(self._positions[last_vertex_index], self._positions[incident_index])
+                            add_length = self._incident_lengths[incident]
                             combo_length = length + add_length
                             if combo_length <= max_distance:
                                 new_pathes.append(path + [incident_index])
@@ -208,4 +439,4 @@ class NavmeshGraph:
         return to_return
 
     def __repr__(self):
-        return "<graph " + str(self._vertex_names) + ", edges: " + str(self._edges) + ", map: " + str(self._index_map) + ", positions: " + str(self._positions) + ">"
+        return "<graph " + str(self._vertex_names) + ", edges: " + str(self.get_edges()) + ", map: " + str(self._index_map) + ", positions: " + str(self.get_positions()) + ">"
@@ -0,0 +1,310 @@
+import math
+from array import array
+from bisect import bisect_right
+from typing import List, Tuple, Optional, Dict, Any, Sequence
+from pathfinder.navmesh.navmesh_data import NavmeshData
+from pathfinder.navmesh.navmesh_bvh import BVH_AABB_DELTA
+
+GRID_MAX_CELLS_RATIO = 4  # the automatic cell size gives at most this number of cells per polygon
+
+
+class NavmeshGrid:
+    '''Uniform grid of square cells in XZ-plane, each cell stores indexes of polygons, which aabbs overlap the cell
+    It is the alternative to NavmeshBVH for nearly planar navmeshes: point query checks only polygons of one cell without tree traversal
+
+    Aabbs of polygons are the same as in NavmeshBVH (extended by BVH_AABB_DELTA), so both structures find the same polygons
+    Cells are stored in plain arrays (CSR form):
+        -) grid - 5 values (x_min, z_min, cell_size, columns, rows)
+        -) cell offsets and cell items - polygons of the cell with index (column * rows + row) are in the interval [offsets[c], offsets[c + 1]) of items array
+        -) cell levels - minimal y-coordinate of the aabb for each item, items of each cell are sorted by this value
+        -) polygon bounds - 6 values of the aabb for each polygon index
+    For overlapped floors the cell contains polygons of all floors, sorted by levels, so the query skips floors above the point by binary search
+    and checks only polygons with the point inside aabbs
+
+    After the first edit (insert or remove) cells are converted to lists, if the inserted polygon is outside of the grid, then the grid is rebuilt
+    this class is for internal use only
+    '''
+
+    def __init__(self, data: NavmeshData, polygons: Optional[List[int]] = None, cell_size: Optional[float] = None):
+        '''Build the grid from array of polygons
+
+        Input:
+            data - navmesh arrays
+            polygons - array of polygon indexes, if None, then use all polygons of the navmesh
+            cell_size - the size of the square cell, if None, then it is calculated by get_auto_cell_size method
+        '''
+        if polygons is None:
+            polygons = list(range(data.get_polygons_count()))
+        self._data: NavmeshData = data
+        self._polygon_bounds: array = array("d")
+        self._cells_items: Optional[List[List[int]]] = None  # editable cells, created at the first edit
+        self._cells_levels: Optional[List[List[float]]] = None
+        self._build(polygons, cell_size)
+
+    @staticmethod
+    def from_arrays(data: NavmeshData, arrays: Dict[str, Any]) -> "NavmeshGrid":
+        '''Create the grid from arrays, returned by get_arrays method
+        values can be any objects with array interface, they are used without copy
+        '''
+        grid: NavmeshGrid = NavmeshGrid.__new__(NavmeshGrid)
+        grid._data = data
+        grid._cells_items = None
+        grid._cells_levels = None
+        grid._set_arrays(arrays)
+        return grid
+
+    def get_arrays(self) -> Dict[str, Any]:
+        '''Return all plain arrays of the grid, key - the name of the array
+        '''
+        if self._cells_items is not None:
+            self._pack_cells()
+        return {"grid": array("d", [self._x_min, self._z_min, self._cell_size, float(self._columns), float(self._rows)]),
+                "cell_offsets": self._cell_offsets,
+                "cell_items": self._cell_items,
+                "cell_levels": self._cell_levels,
+                "polygon_bounds": self._polygon_bounds}
+
+    def _set_arrays(self, arrays: Dict[str, Any]):
+        grid: Sequence[float] = arrays["grid"]
+        self._x_min: float = grid[0]
+        self._z_min: float = grid[1]
+        self._cell_size: float = grid[2]
+        self._columns: int = int(grid[3])
+        self._rows: int = int(grid[4])
+        self._cell_offsets: Any = arrays["cell_offsets"]
+        self._cell_items: Any = arrays["cell_items"]
+        self._cell_levels: Any = arrays["cell_levels"]
+        self._polygon_bounds: Any = arrays["polygon_bounds"]
+
+    @staticmethod
+    def get_auto_cell_size(aabbs: List[Tuple[float, float, float, float, float, float]]) -> float:
+        '''Return the cell size for polygons with given aabbs
+
+        The cell is equal to the average size of polygons in XZ-plane (aabbs without BVH_AABB_DELTA), so each cell contains several polygons
+        For navmeshes with very different polygons the cell is increased, so the number of cells is at most GRID_MAX_CELLS_RATIO per polygon
+        '''
+        if len(aabbs) == 0:
+            return 1.0
+        average_size: float = sum((aabb[3] - aabb[0] + aabb[5] - aabb[2]) / 2.0 - 2.0 * BVH_AABB_DELTA for aabb in aabbs) / len(aabbs)
+        x_size: float = max(aabb[3] for aabb in aabbs) - min(aabb[0] for aabb in aabbs)
+        z_size: float = max(aabb[5] for aabb in aabbs) - min(aabb[2] for aabb in aabbs)
+        return max(average_size, math.sqrt(x_size * z_size / (GRID_MAX_CELLS_RATIO * len(aabbs))))
+
+    def _build(self, polygons: List[int], cell_size: Optional[float]):
+        aabbs: List[Tuple[float, float, float, float, float, float]] = [self._get_polygon_aabb(polygon) for polygon in polygons]
+        for polygon, aabb in zip(polygons, aabbs):
+            self._set_polygon_bounds(polygon, aabb)
+        if cell_size is None:
+            cell_size = self.get_auto_cell_size(aabbs)
+        if cell_size <= 0.0:
+            raise ValueError("grid cell size should be positive")
+        self._cell_size = cell_size
+        if len(aabbs) > 0:
+            self._x_min = min(aabb[0] for aabb in aabbs)
+            self._z_min = min(aabb[2] for aabb in aabbs)
+            self._columns = max(1, int(math.ceil((max(aabb[3] for aabb in aabbs) - self._x_min) / cell_size)))
+            self._rows = max(1, int(math.ceil((max(aabb[5] for aabb in aabbs) - self._z_min) / cell_size)))
+        else:
+            self._x_min = 0.0
+            self._z_min = 0.0
+            self._columns = 1
+            self._rows = 1
+        cells: List[List[Tuple[float, int]]] = [[] for _ in range(self._columns * self._rows)]
+        for polygon, aabb in zip(polygons, aabbs):
+            for cell in self._get_aabb_cells(aabb):
+                cells[cell].append((aabb[1], polygon))
+        self._cell_offsets = array("i", [0])
+        self._cell_items = array("i")
+        self._cell_levels = array("d")
+        for cell_items in cells:
+            cell_items.sort()
+            self._cell_items.extend(polygon for _, polygon in cell_items)
+            self._cell_levels.extend(level for level, _ in cell_items)
+            self._cell_offsets.append(len(self._cell_items))
+
+    def _get_polygon_aabb(self, polygon: int) -> Tuple[float, float, float, float, float, float]:
+        '''Return aabb of the polygon, extended by BVH_AABB_DELTA
+        '''
+        verts: List[Tuple[float, float, float]] = self._data.get_polygon_coordinates(polygon)
+        return (min(v[0] for v in verts) - BVH_AABB_DELTA, min(v[1] for v in verts) - BVH_AABB_DELTA, min(v[2] for v in verts) - BVH_AABB_DELTA,
+                max(v[0] for v in verts) + BVH_AABB_DELTA, max(v[1] for v in verts) + BVH_AABB_DELTA, max(v[2] for v in verts) + BVH_AABB_DELTA)
+
+    def _set_polygon_bounds(self, polygon: int, aabb: Tuple[float, float, float, float, float, float]):
+        if 6 * polygon >= len(self._polygon_bounds):
+            self._polygon_bounds.extend([0.0] * (6 * polygon + 6 - len(self._polygon_bounds)))
+        self._polygon_bounds[6 * polygon:6 * polygon + 6] = array("d", aabb)
+
+    def _get_aabb_cells(self, aabb: Tuple[float, float, float, float, float, float]) -> List[int]:
+        '''Return indexes of cells, overlapped by the aabb, the aabb should be inside the grid
+        '''
+        c_min: int = max(0, int((aabb[0] - self._x_min) / self._cell_size))
+        c_max: int = min(self._columns - 1, int((aabb[3] - self._x_min) / self._cell_size))
+        r_min: int = max(0, int((aabb[2] - self._z_min) / self._cell_size))
+        r_max: int = min(self._rows - 1, int((aabb[5] - self._z_min) / self._cell_size))
+        return [c * self._rows + r for c in range(c_min, c_max + 1) for r in range(r_min, r_max + 1)]
+
+    def _is_inside_grid(self, aabb: Tuple[float, float, float, float, float, float]) -> bool:
+        return aabb[0] >= self._x_min and aabb[2] >= self._z_min and aabb[3] <= self._x_min + self._columns * self._cell_size and aabb[5] <= self._z_min + self._rows * self._cell_size
+
+    def _make_editable(self):
+        '''Convert cells from plain arrays into lists and copy polygon bounds into array
+        '''
+        if self._cells_items is None:
+            offsets: List[int] = list(self._cell_offsets)
+            items: List[int] = list(self._cell_items)
+            levels: List[float] = list(self._cell_levels)
+            self._cells_items = [items[offsets[c]:offsets[c + 1]] for c in range(len(offsets) - 1)]
+            self._cells_levels = [levels[offsets[c]:offsets[c + 1]] for c in range(len(offsets) - 1)]
+            if not isinstance(self._polygon_bounds, array):
+                self._polygon_bounds = array("d", self._polygon_bounds)
+
+    def _pack_cells(self):
+        '''Convert editable cells back into plain arrays
+        '''
+        self._cell_offsets = array("i", [0])
+        self._cell_items = array("i")
+        self._cell_levels = array("d")
+        for cell_items, cell_levels in zip(self._cells_items, self._cells_levels):
+            self._cell_items.extend(cell_items)
+            self._cell_levels.extend(cell_levels)
+            self._cell_offsets.append(len(self._cell_items))
+        self._cells_items = None
+        self._cells_levels = None
+
+    def get_polygons(self) -> List[int]:
+        '''Return sorted indexes of all polygons in the grid
+        '''
+        if self._cells_items is not None:
+            return sorted(set(polygon for cell_items in self._cells_items for polygon in cell_items))
+        return sorted(set(self._cell_items))
+
+    def insert(self, polygon: int):
+        '''Add the polygon to cells, overlapped by it aabb
+        if the polygon is outside of the grid, then the grid is rebuilt with the same cell size
+        '''
+        aabb: Tuple[float, float, float, float, float, float] = self._get_polygon_aabb(polygon)
+        self._make_editable()
+        if not self._is_inside_grid(aabb):
+            polygons: List[int] = self.get_polygons()
+            polygons.append(polygon)
+            self._cells_items = None
+            self._cells_levels = None
+            self._build(polygons, self._cell_size)
+            return
+        self._set_polygon_bounds(polygon, aabb)
+        for cell in self._get_aabb_cells(aabb):
+            cell_levels: List[float] = self._cells_levels[cell]
+            position: int = bisect_right(cell_levels, aabb[1])
+            cell_levels.insert(position, aabb[1])
+            self._cells_items[cell].insert(position, polygon)
+
+    def remove(self, polygon: int) -> bool:
+        '''Remove the polygon from all cells
+
+        Output:
+            True if the polygon was in the grid, False otherwise
+        '''
+        if 6 * polygon >= len(self._polygon_bounds):
+            return False
+        self._make_editable()
+        aabb: Tuple[float, float, float, float, float, float] = tuple(self._polygon_bounds[6 * polygon:6 * polygon + 6])
+        is_removed: bool = False
+        for cell in self._get_aabb_cells(aabb):
+            cell_items: List[int] = self._cells_items[cell]
+            if polygon in cell_items:
+                position: int = cell_items.index(polygon)
+                cell_items.pop(position)
+                self._cells_levels[cell].pop(position)
+                is_removed = True
+        return is_removed
+
+    def _get_cell(self, x: float, z: float) -> int:
+        '''Return index of the cell with the point, or -1, if the point is outside of the grid
+        '''
+        column: int = int(math.floor((x - self._x_min) / self._cell_size))
+        row: int = int(math.floor((z - self._z_min) / self._cell_size))
+        if column < 0 or column >= self._columns or row < 0 or row >= self._rows:
+            return -1
+        return column * self._rows + row
+
+    def _get_cell_candidates(self, cell: int, y: float) -> Sequence[int]:
+        '''Return polygons of the cell, which aabbs start below the point (so, polygons of floors above are skipped)
+        '''
+        if self._cells_items is not None:
+            return self._cells_items[cell][:bisect_right(self._cells_levels[cell], y)]
+        start: int = self._cell_offsets[cell]
+        return self._cell_items[start:bisect_right(self._cell_levels, y, start, self._cell_offsets[cell + 1])]
+
+    def sample(self, point: Tuple[float, float, float]) -> int:
+        '''Return index of the polygon, which contains the point
+        If there are no polygons near the point, then return -1
+        If several polygons contain the point (in XZ-plane), then return the closest one (by the distance to the polygon plane),
+        from polygons with equal distances select the last one in the cell (with the greatest aabb level)
+
+        Input:
+            point - 3-triple (x, y, z)
+
+        Output:
+            polygon index or -1
+        '''
+        x: float = point[0]
+        y: float = point[1]
+        z: float = point[2]
+        cell: int = self._get_cell(x, z)
+        if cell == -1:
+            return -1
+        bounds: Any = self._polygon_bounds
+        to_return: int = -1
+        min_distance: Optional[float] = None  # calculated only when the second polygon is found
+        for polygon in self._get_cell_candidates(cell, y):
+            i: int = 6 * polygon
+            if bounds[i] < x and bounds[i + 3] > x and bounds[i + 2] < z and bounds[i + 5] > z and bounds[i + 1] < y and bounds[i + 4] > y and self._data.is_point_inside(polygon, point):
+                if to_return == -1:
+                    to_return = polygon
+                else:
+                    if min_distance is None:
+                        min_distance = self._get_plane_distance(to_return, point)
+                    distance: float = self._get_plane_distance(polygon, point)
+                    if distance <= min_distance:
+                        to_return = polygon
+                        min_distance = distance
+        return to_return
+
+    def _get_plane_distance(self, polygon: int, point: Tuple[float, float, float]) -> float:
+        c: Tuple[float, float, float] = self._data.get_center(polygon)
+        n: Tuple[float, float, float] = self._data.get_normal(polygon)
+        return abs((point[0] - c[0]) * n[0] + (point[1] - c[1]) * n[1] + (point[2] - c[2]) * n[2])
+
+    def get_quality_report(self, points: Sequence[Tuple[float, float, float]]) -> Dict[str, float]:
+        '''Return the dictionary with values, which describe the quality of the grid
+
+        Keys are:
+            cells - the number of cells
+            cell_size - the size of the cell
+            empty_cells - the number of cells without polygons
+            average_cell_items - the average number of polygons in non-empty cells
+            max_cell_items - the maximum number of polygons in one cell
+            visited_items - the average number of polygons, checked by point query (after skipping floors above the point)
+
+        Input:
+            points - array of points for point queries, visited values are 0.0 for the empty array
+        '''
+        if self._cells_items is not None:
+            sizes: List[int] = [len(cell_items) for cell_items in self._cells_items]
+        else:
+            sizes = [self._cell_offsets[c + 1] - self._cell_offsets[c] for c in range(self._columns * self._rows)]
+        filled: List[int] = [size for size in sizes if size > 0]
+        visited_items: int = 0
+        for point in points:
+            cell: int = self._get_cell(point[0], point[2])
+            if cell > -1:
+                visited_items += len(self._get_cell_candidates(cell, point[1]))
+        return {"cells": float(len(sizes)),
+                "cell_size": self._cell_size,
+                "empty_cells": float(len(sizes) - len(filled)),
+                "average_cell_items": sum(filled) / len(filled) if len(filled) > 0 else 0.0,
+                "max_cell_items": float(max(sizes)),
+                "visited_items": visited_items / len(points) if len(points) > 0 else 0.0}
+
+    def __repr__(self) -> str:
+        return "<grid cells: " + str(self._columns) + " x " + str(self._rows) + ", cell size: " + str(self._cell_size) + ">"
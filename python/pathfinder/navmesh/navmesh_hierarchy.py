@@ -0,0 +1,241 @@
+import math
+import heapq
+from array import array
+from typing import List, Tuple, Dict, Set, Any
+from pathfinder.navmesh.navmesh_data import NavmeshData
+from pathfinder.navmesh.navmesh_graph import NavmeshGraph
+
+
+class NavmeshHierarchy:
+    '''Two-level abstraction of the polygons graph for long-distance path queries
+
+    Polygons are partitioned into clusters by the square grid in XZ-plane (polygons from different groups are always in different clusters)
+    Polygons with a neighbor in other cluster are entrances. Abstract graph contains only entrances:
+        -) two entrances from the same cluster are connected by the edge with the length of the shortest path inside the cluster
+        -) two incident entrances from different clusters are connected by the edge with the distance between polygon centers
+    The query at first find the path in the abstract graph, and then refine it in the graph, restricted by clusters of the abstract path
+
+    this class is for internal use only
+    '''
+    def __init__(self, data: NavmeshData, cluster_size: float):
+        '''Build clusters and abstract graph
+
+        Input:
+            data - navmesh arrays, groups of polygons should be already defined
+            cluster_size - the size of the square cell in XZ-plane, which defines one cluster
+        '''
+        self._cluster_size: float = cluster_size
+        polygons_count: int = data.get_polygons_count()
+        self._data: NavmeshData = data
+        self._centers: List[Tuple[float, float, float]] = self._get_centers(data)
+        self._clusters: List[int] = []  # for each polygon store the index of it cluster
+        self._cluster_polygons: List[List[int]] = []  # for each cluster store indexes of it polygons
+        self._cluster_entrances: List[List[int]] = []  # for each cluster store indexes of polygons, incident to other clusters
+        cluster_keys: Dict[Tuple[int, int, int], int] = {}
+        for polygon in range(polygons_count):
+            c: Tuple[float, float, float] = self._centers[polygon]
+            key: Tuple[int, int, int] = (data.get_group(polygon), int(math.floor(c[0] / cluster_size)), int(math.floor(c[2] / cluster_size)))
+            if key not in cluster_keys:
+                cluster_keys[key] = len(self._cluster_polygons)
+                self._cluster_polygons.append([])
+                self._cluster_entrances.append([])
+            cluster_index: int = cluster_keys[key]
+            self._clusters.append(cluster_index)
+            self._cluster_polygons[cluster_index].append(polygon)
+
+        # abstract graph, key - entrance polygon, value - array of pairs (other entrance, edge length)
+        self._abstract_edges: Dict[int, List[Tuple[int, float]]] = {}
+        for polygon in range(polygons_count):
+            for other in data.get_neighbors(polygon):
+                if self._clusters[other] != self._clusters[polygon]:
+                    if polygon not in self._abstract_edges:
+                        self._abstract_edges[polygon] = []
+                        self._cluster_entrances[self._clusters[polygon]].append(polygon)
+                    self._abstract_edges[polygon].append((other, self._get_distance(self._centers[polygon], self._centers[other])))
+        # precalculate pathes between entrances inside each cluster
+        for entrances in self._cluster_entrances:
+            for entrance in entrances:
+                distances: Dict[int, float] = self._cluster_distances(entrance)
+                for other in entrances:
+                    if other != entrance and other in distances:
+                        self._abstract_edges[entrance].append((other, distances[other]))
+
+        self._last_abstract_expanded: int = 0
+        self._last_refined_expanded: int = 0
+
+    @staticmethod
+    def from_arrays(data: NavmeshData, arrays: Dict[str, Any]) -> "NavmeshHierarchy":
+        '''Create the hierarchy from arrays, returned by get_arrays method, the data should be the same as for the saved hierarchy
+        '''
+        hierarchy: NavmeshHierarchy = NavmeshHierarchy.__new__(NavmeshHierarchy)
+        hierarchy._cluster_size = arrays["cluster_size"][0]
+        hierarchy._data = data
+        hierarchy._centers = NavmeshHierarchy._get_centers(data)
+        hierarchy._clusters = arrays["clusters"].tolist()
+        hierarchy._cluster_polygons = _from_csr(arrays["cluster_offsets"].tolist(), arrays["cluster_polygons"].tolist())
+        hierarchy._cluster_entrances = _from_csr(arrays["entrance_offsets"].tolist(), arrays["entrances"].tolist())
+        edge_offsets: List[int] = arrays["edge_offsets"].tolist()
+        edge_others: List[int] = arrays["edge_others"].tolist()
+        edge_lengths: List[float] = arrays["edge_lengths"].tolist()
+        hierarchy._abstract_edges = {entrance: list(zip(edge_others[edge_offsets[i]:edge_offsets[i + 1]], edge_lengths[edge_offsets[i]:edge_offsets[i + 1]]))
+                                     for i, entrance in enumerate(arrays["edge_entrances"].tolist())}
+        hierarchy._last_abstract_expanded = 0
+        hierarchy._last_refined_expanded = 0
+        return hierarchy
+
+    def get_arrays(self) -> Dict[str, array]:
+        '''Return clusters and the abstract graph in plain arrays, key - the name of the array
+        lists of clusters and edges are in CSR form: items of the i-th list are in the interval [offsets[i], offsets[i + 1])
+        '''
+        arrays: Dict[str, array] = {"cluster_size": array("d", [self._cluster_size]),
+                                    "clusters": array("i", self._clusters)}
+        arrays["cluster_offsets"], arrays["cluster_polygons"] = _to_csr(self._cluster_polygons)
+        arrays["entrance_offsets"], arrays["entrances"] = _to_csr(self._cluster_entrances)
+        arrays["edge_entrances"] = array("i", self._abstract_edges.keys())
+        arrays["edge_offsets"], arrays["edge_others"] = _to_csr([[edge[0] for edge in edges] for edges in self._abstract_edges.values()])
+        arrays["edge_lengths"] = array("d", [edge[1] for edges in self._abstract_edges.values() for edge in edges])
+        return arrays
+
+    @staticmethod
+    def _get_centers(data: NavmeshData) -> List[Tuple[float, float, float]]:
+        coordinates: List[float] = data.get_centers_array().tolist()
+        return list(zip(coordinates[0::3], coordinates[1::3], coordinates[2::3]))
+
+    def _get_distance(self, a: Tuple[float, float, float], b: Tuple[float, float, float]) -> float:
+        return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2 + (a[2] - b[2])**2)
+
+    def _cluster_distances(self, source: int) -> Dict[int, float]:
+        '''Calculate shortest distances from the source polygon to all other polygons in the same cluster (by using only polygons of this cluster)
+
+        Output:
+            dictionary, key - polygon index, value - the length of the path from the source
+        '''
+        cluster: int = self._clusters[source]
+        distances: Dict[int, float] = {source: 0.0}
+        closed: Set[int] = set()
+        open_list: List[Tuple[float, int]] = [(0.0, source)]
+        while len(open_list) > 0:
+            distance, polygon = heapq.heappop(open_list)
+            if polygon in closed:
+                continue
+            closed.add(polygon)
+            for other in self._data.get_neighbors(polygon):
+                if self._clusters[other] == cluster and other not in closed:
+                    other_distance: float = distance + self._get_distance(self._centers[polygon], self._centers[other])
+                    if other_distance < distances.get(other, float("inf")):
+                        distances[other] = other_distance
+                        heapq.heappush(open_list, (other_distance, other))
+        return distances
+
+    def get_cluster_size(self) -> float:
+        return self._cluster_size
+
+    def get_clusters_count(self) -> int:
+        return len(self._cluster_polygons)
+
+    def get_polygon_cluster(self, polygon: int) -> int:
+        return self._clusters[polygon]
+
+    def get_abstract_nodes_count(self) -> int:
+        '''Return the number of entrances in the abstract graph
+        '''
+        return len(self._abstract_edges)
+
+    def get_last_search_stats(self) -> Tuple[int, int]:
+        '''Return 2-tuple (abstract, refined) with the number of expanded nodes in the abstract graph and in the polygons graph during the last search
+        '''
+        return (self._last_abstract_expanded, self._last_refined_expanded)
+
+    def search_abstract(self, start: int, finish: int) -> List[int]:
+        '''Find the path in the abstract graph between two polygons from the same group
+
+        Output:
+            array of polygon indexes, the first is start and the last is finish polygon, intermediate polygons are entrances
+            if there is no path, then return empty array
+        '''
+        # connect start and finish with entrances of it clusters
+        start_distances: Dict[int, float] = self._cluster_distances(start)
+        start_edges: List[Tuple[int, float]] = [(entrance, start_distances[entrance]) for entrance in self._cluster_entrances[self._clusters[start]] if entrance in start_distances]
+        if finish in start_distances:
+            # the finish is in the same cluster and reachable inside it
+            start_edges.append((finish, start_distances[finish]))
+        finish_distances: Dict[int, float] = self._cluster_distances(finish)
+        finish_center: Tuple[float, float, float] = self._centers[finish]
+
+        g_values: Dict[int, float] = {start: 0.0}
+        parents: Dict[int, int] = {start: -1}
+        closed: Set[int] = set()
+        order: int = 0
+        open_list: List[Tuple[float, int, int]] = [(self._get_distance(self._centers[start], finish_center), order, start)]
+        self._last_abstract_expanded = 0
+        while len(open_list) > 0:
+            vertex: int = heapq.heappop(open_list)[2]
+            if vertex in closed:
+                continue
+            closed.add(vertex)
+            self._last_abstract_expanded += 1
+            if vertex == finish:
+                path: List[int] = []
+                while vertex > -1:
+                    path.append(vertex)
+                    vertex = parents[vertex]
+                path.reverse()
+                return path
+            edges: List[Tuple[int, float]] = start_edges + self._abstract_edges.get(vertex, []) if vertex == start else self._abstract_edges.get(vertex, [])
+            if vertex != start and vertex in finish_distances and self._clusters[vertex] == self._clusters[finish]:
+                edges = edges + [(finish, finish_distances[vertex])]
+            for other, length in edges:
+                if other in closed:
+                    continue
+                other_g: float = g_values[vertex] + length
+                if other_g < g_values.get(other, float("inf")):
+                    g_values[other] = other_g
+                    parents[other] = vertex
+                    order += 1
+                    heapq.heappush(open_list, (other_g + self._get_distance(self._centers[other], finish_center), order, other))
+        return []
+
+    def get_corridor_polygons(self, abstract_path: List[int]) -> Set[int]:
+        '''Return the set of all polygons from clusters, visited by the abstract path
+        '''
+        clusters: Set[int] = set(self._clusters[polygon] for polygon in abstract_path)
+        polygons: Set[int] = set()
+        for cluster in clusters:
+            polygons.update(self._cluster_polygons[cluster])
+        return polygons
+
+    def search(self, graph: NavmeshGraph, start: int, finish: int) -> List[int]:
+        '''Find the path between two polygons by using the abstract graph and then refine it in the polygons graph
+
+        Input:
+            graph - the graph of the group, which contains start and finish polygons
+            start - index of the start polygon
+            finish - index of the finish polygon
+
+        Output:
+            array of polygon indexes in the same format as in NavmeshGraph.search
+        '''
+        self._last_refined_expanded = 0
+        abstract_path: List[int] = self.search_abstract(start, finish)
+        path: List[int] = []
+        if len(abstract_path) > 0:
+            path = graph.search(start, finish, self.get_corridor_polygons(abstract_path))
+            self._last_refined_expanded = graph.get_last_expanded_count()
+        if len(path) == 0:
+            # restricted search fails, use the whole graph
+            path = graph.search(start, finish)
+            self._last_refined_expanded += graph.get_last_expanded_count()
+        return path
+
+
+def _to_csr(lists: List[List[int]]) -> Tuple[array, array]:
+    offsets: array = array("i", [0])
+    items: array = array("i")
+    for values in lists:
+        items.extend(values)
+        offsets.append(len(items))
+    return (offsets, items)
+
+
+def _from_csr(offsets: List[int], items: List[int]) -> List[List[int]]:
+    return [items[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
@@ -0,0 +1,264 @@
+import math
+import heapq
+from typing import List, Tuple, Dict, Optional
+
+# tolerance for orientation tests
+POLYANYA_EPSILON = 1e-9
+
+
+def cross_2d(a: Tuple[float, float], b: Tuple[float, float], c: Tuple[float, float]) -> float:
+    '''return z-component of the cross product [ab, ac] for points in the plane
+    positive value means that c is on the left side of the directed line from a to b
+    '''
+    return (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+
+
+def distance_2d(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2)
+
+
+def _clip(f_0: float, f_1: float, positive: bool) -> Optional[Tuple[float, float]]:
+    '''return the range [t0, t1] inside [0, 1], where linear function f(t) = f_0 + t * (f_1 - f_0) is >= 0 (or <= 0 if positive is False)
+    return None if the range is empty
+    '''
+    if not positive:
+        f_0 = -f_0
+        f_1 = -f_1
+    if f_0 >= -POLYANYA_EPSILON and f_1 >= -POLYANYA_EPSILON:
+        return (0.0, 1.0)
+    if f_0 < -POLYANYA_EPSILON and f_1 < -POLYANYA_EPSILON:
+        return None
+    t: float = min(max(f_0 / (f_0 - f_1), 0.0), 1.0)
+    return (0.0, t) if f_0 >= -POLYANYA_EPSILON else (t, 1.0)
+
+
+class PolyanyaSearch:
+    '''Optimal any-angle path search in the navigation mesh (Polyanya algorithm, D. Harabor, A. Grastien, 2017)
+
+    Search nodes are pairs (root, interval), where the interval is a part of the polygon edge, visible from the root point
+    Nodes expand across polygons directly, so the algorithm returns the Euclidean-shortest path without enumeration of polygon corridors
+    All calculations use XZ-projection of the navigation mesh, Y-coordinates of path corners are taken from the mesh vertices
+
+    this class is for internal use only
+    '''
+    def __init__(self, vertices: List[Tuple[float, float, float]], polygons: List[List[int]]):
+        '''Build the adjacency of polygon edges
+
+        Input:
+            vertices - array of vertex coordinates
+            polygons - array of polygon vertex indexes, polygons should be convex in XZ-plane
+        '''
+        self._vertices: List[Tuple[float, float, float]] = vertices
+        self._points: List[Tuple[float, float]] = [(v[0], v[2]) for v in vertices]
+        # all polygons are stored in counter-clockwise order in XZ-plane
+        self._polygons: List[List[int]] = []
+        for polygon in polygons:
+            area: float = 0.0
+            for i in range(len(polygon)):
+                a: Tuple[float, float] = self._points[polygon[i]]
+                b: Tuple[float, float] = self._points[polygon[(i + 1) % len(polygon)]]
+                area += a[0] * b[1] - a[1] * b[0]
+            self._polygons.append(list(polygon) if area >= 0.0 else list(reversed(polygon)))
+        # for each polygon and each edge slot i (from vertex i to vertex i + 1) store the neighbor polygon and the slot of the same edge in it
+        self._neighbors: List[List[int]] = [[-1] * len(p) for p in self._polygons]
+        self._neighbor_slots: List[List[int]] = [[-1] * len(p) for p in self._polygons]
+        edges_map: Dict[Tuple[int, int], Tuple[int, int]] = {}  # key - directed edge, value - (polygon, slot)
+        for p_index, polygon in enumerate(self._polygons):
+            for slot in range(len(polygon)):
+                edges_map[(polygon[slot], polygon[(slot + 1) % len(polygon)])] = (p_index, slot)
+        for p_index, polygon in enumerate(self._polygons):
+            for slot in range(len(polygon)):
+                other: Optional[Tuple[int, int]] = edges_map.get((polygon[(slot + 1) % len(polygon)], polygon[slot]))
+                if other is not None:
+                    self._neighbors[p_index][slot] = other[0]
+                    self._neighbor_slots[p_index][slot] = other[1]
+        # corner is a vertex, incident to the boundary edge, only in these vertices the shortest path can turn
+        self._corners: List[bool] = [False] * len(vertices)
+        for p_index, polygon in enumerate(self._polygons):
+            for slot in range(len(polygon)):
+                if self._neighbors[p_index][slot] == -1:
+                    self._corners[polygon[slot]] = True
+                    self._corners[polygon[(slot + 1) % len(polygon)]] = True
+        self._last_expanded: int = 0
+
+    def get_last_expanded_count(self) -> int:
+        '''Return the number of search nodes, expanded during the last search
+        '''
+        return self._last_expanded
+
+    def _heuristic(self,
+                   root: Tuple[float, float],
+                   left: Tuple[float, float],
+                   right: Tuple[float, float],
+                   target: Tuple[float, float]) -> float:
+        '''Return the length of the shortest path from the root to the target throw the interval [left, right]
+        '''
+        if cross_2d(left, right, root) > -POLYANYA_EPSILON:
+            # root is on the line of the interval, so we can not say anything more accurate
+            return distance_2d(root, target)
+        if cross_2d(left, right, target) < 0.0:
+            # the target is on the same side of the interval as the root, mirror it
+            dx: float = right[0] - left[0]
+            dy: float = right[1] - left[1]
+            length_sq: float = dx * dx + dy * dy
+            s: float = ((target[0] - left[0]) * dx + (target[1] - left[1]) * dy) / length_sq if length_sq > 0.0 else 0.0
+            projection: Tuple[float, float] = (left[0] + s * dx, left[1] + s * dy)
+            target = (2.0 * projection[0] - target[0], 2.0 * projection[1] - target[1])
+        if cross_2d(root, left, target) > 0.0:
+            return distance_2d(root, left) + distance_2d(left, target)
+        if cross_2d(root, right, target) < 0.0:
+            return distance_2d(root, right) + distance_2d(right, target)
+        return distance_2d(root, target)
+
+    def search(self, start: Tuple[float, float, float], start_polygon: int, finish: Tuple[float, float, float], finish_polygon: int) -> List[Tuple[float, float, float]]:
+        '''Find the shortest path between two points
+
+        Input:
+            start - start point, it should be inside start polygon
+            start_polygon - index of the start polygon
+            finish - finish point, it should be inside finish polygon
+            finish_polygon - index of the finish polygon
+
+        Output:
+            array of path corners, include start and finish points
+            if there is no path, then return empty array
+        '''
+        self._last_expanded = 0
+        if start_polygon == finish_polygon:
+            return [start, finish]
+        start_2d: Tuple[float, float] = (start[0], start[2])
+        target: Tuple[float, float] = (finish[0], finish[2])
+
+        # best g-values for each root, -1 is the key of the start point
+        roots_g: Dict[int, float] = {-1: 0.0}
+        # each root record is a 2-tuple (vertex index, parent record), the record of the start point is (-1, None)
+        start_record: tuple = (-1, None)
+        order: int = 0
+        # each search node is a tuple (root index, root record, g, left point, right point, is left a vertex, is right a vertex, polygon, slot)
+        # slot is the index of the entry edge in the polygon, the left point is closer to the vertex slot, the right point to the vertex slot + 1
+        # final nodes have polygon = -1, the record of the final node contains all corners of the path
+        open_list: List[Tuple[float, int, tuple]] = []
+        polygon: List[int] = self._polygons[start_polygon]
+        for slot in range(len(polygon)):
+            next_polygon: int = self._neighbors[start_polygon][slot]
+            if next_polygon > -1:
+                right: Tuple[float, float] = self._points[polygon[slot]]
+                left: Tuple[float, float] = self._points[polygon[(slot + 1) % len(polygon)]]
+                order += 1
+                heapq.heappush(open_list, (self._heuristic(start_2d, left, right, target), order,
+                                           (-1, start_record, 0.0, left, right, True, True, next_polygon, self._neighbor_slots[start_polygon][slot])))
+
+        while len(open_list) > 0:
+            f, _, node = heapq.heappop(open_list)
+            root_index, root_record, g, left, right, left_vertex, right_vertex, p_index, slot = node
+            if g > roots_g.get(root_index, float("inf")) + POLYANYA_EPSILON:
+                # there is better path to the root of the node
+                continue
+            self._last_expanded += 1
+            root: Tuple[float, float] = start_2d if root_index == -1 else self._points[root_index]
+            if p_index == -1:
+                # this is the final node, collect the path
+                path: List[Tuple[float, float, float]] = [finish]
+                record: Optional[tuple] = root_record
+                while record is not None:
+                    path.append(self._vertices[record[0]] if record[0] > -1 else start)
+                    record = record[1]
+                path.reverse()
+                return path
+
+            polygon = self._polygons[p_index]
+            size: int = len(polygon)
+            left_index: int = polygon[slot]
+            right_index: int = polygon[(slot + 1) % size]
+            is_collinear: bool = cross_2d(left, right, root) > -POLYANYA_EPSILON
+            if is_collinear and (min(left[0], right[0]) - POLYANYA_EPSILON > root[0] or max(left[0], right[0]) + POLYANYA_EPSILON < root[0] or
+                                 min(left[1], right[1]) - POLYANYA_EPSILON > root[1] or max(left[1], right[1]) + POLYANYA_EPSILON < root[1]):
+                # degenerate node, the root is on the line of the interval, but outside of it
+                continue
+
+            if p_index == finish_polygon:
+                # generate the final node
+                if is_collinear or (cross_2d(root, left, target) <= POLYANYA_EPSILON and cross_2d(root, right, target) >= -POLYANYA_EPSILON):
+                    order += 1
+                    heapq.heappush(open_list, (g + distance_2d(root, target), order, (root_index, root_record, g, target, target, False, False, -1, -1)))
+                elif cross_2d(root, left, target) > 0.0 and left_vertex:
+                    turn_g: float = g + distance_2d(root, left)
+                    order += 1
+                    heapq.heappush(open_list, (turn_g + distance_2d(left, target), order, (root_index, (left_index, root_record), g, target, target, False, False, -1, -1)))
+                elif cross_2d(root, right, target) < 0.0 and right_vertex:
+                    turn_g = g + distance_2d(root, right)
+                    order += 1
+                    heapq.heappush(open_list, (turn_g + distance_2d(right, target), order, (root_index, (right_index, root_record), g, target, target, False, False, -1, -1)))
+
+            # turns are possible only around corners, which are endpoints of the interval
+            left_turn: bool = left_vertex and self._corners[left_index] and not is_collinear
+            right_turn: bool = right_vertex and self._corners[right_index] and not is_collinear
+            left_g: float = g + distance_2d(root, left)
+            right_g: float = g + distance_2d(root, right)
+            if left_turn and left_g > roots_g.get(left_index, float("inf")) + POLYANYA_EPSILON:
+                left_turn = False
+            if right_turn and right_g > roots_g.get(right_index, float("inf")) + POLYANYA_EPSILON:
+                right_turn = False
+            if left_turn:
+                roots_g[left_index] = min(left_g, roots_g.get(left_index, float("inf")))
+            if right_turn:
+                roots_g[right_index] = min(right_g, roots_g.get(right_index, float("inf")))
+
+            # enumerate all other edges of the polygon, from the right endpoint of the entry edge to the left one
+            for j in range(1, size):
+                edge_slot: int = (slot + j) % size
+                next_polygon = self._neighbors[p_index][edge_slot]
+                if next_polygon == -1:
+                    continue
+                next_slot: int = self._neighbor_slots[p_index][edge_slot]
+                a_index: int = polygon[edge_slot]  # right end of the edge
+                b_index: int = polygon[(edge_slot + 1) % size]  # left end of the edge
+                a: Tuple[float, float] = self._points[a_index]
+                b: Tuple[float, float] = self._points[b_index]
+                # observable part of the edge
+                observable: Optional[Tuple[float, float]] = (0.0, 1.0)
+                if not is_collinear:
+                    right_range: Optional[Tuple[float, float]] = _clip(cross_2d(root, right, a), cross_2d(root, right, b), True)
+                    left_range: Optional[Tuple[float, float]] = _clip(cross_2d(root, left, a), cross_2d(root, left, b), False)
+                    if right_range is None or left_range is None:
+                        observable = None
+                    else:
+                        observable = (max(right_range[0], left_range[0]), min(right_range[1], left_range[1]))
+                        if observable[1] - observable[0] < POLYANYA_EPSILON:
+                            observable = None
+                if observable is not None:
+                    self._push_interval(open_list, order, root_index, root_record, g, root, a, b, observable, next_polygon, next_slot, target)
+                    order += 1
+                if right_turn:
+                    hidden: Optional[Tuple[float, float]] = _clip(cross_2d(root, right, a), cross_2d(root, right, b), False)
+                    if hidden is not None and hidden[1] - hidden[0] > POLYANYA_EPSILON:
+                        self._push_interval(open_list, order, right_index, (right_index, root_record), right_g, right, a, b, hidden, next_polygon, next_slot, target)
+                        order += 1
+                if left_turn:
+                    hidden = _clip(cross_2d(root, left, a), cross_2d(root, left, b), True)
+                    if hidden is not None and hidden[1] - hidden[0] > POLYANYA_EPSILON:
+                        self._push_interval(open_list, order, left_index, (left_index, root_record), left_g, left, a, b, hidden, next_polygon, next_slot, target)
+                        order += 1
+        return []
+
+    def _push_interval(self,
+                       open_list: List[Tuple[float, int, tuple]],
+                       order: int,
+                       root_index: int,
+                       root_record: Optional[tuple],
+                       g: float,
+                       root: Tuple[float, float],
+                       a: Tuple[float, float],
+                       b: Tuple[float, float],
+                       interval: Tuple[float, float],
+                       next_polygon: int,
+                       next_slot: int,
+                       target: Tuple[float, float]):
+        '''Add to the open list the node for the part [t0, t1] of the edge from a to b
+        a is the right end of the edge (as it seen from the root), b is the left one
+        '''
+        t_0, t_1 = interval
+        right: Tuple[float, float] = (a[0] + t_0 * (b[0] - a[0]), a[1] + t_0 * (b[1] - a[1]))
+        left: Tuple[float, float] = (a[0] + t_1 * (b[0] - a[0]), a[1] + t_1 * (b[1] - a[1]))
+        heapq.heappush(open_list, (g + self._heuristic(root, left, right, target), order,
+                                   (root_index, root_record, g, left, right, t_1 >= 1.0, t_0 <= 0.0, next_polygon, next_slot)))
@@ -0,0 +1,123 @@
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import List, Tuple, Optional, Any
+from pathfinder.navmesh import Navmesh
+from pathfinder.navmesh.navmesh_snapshot import pack_snapshot, read_snapshot_buffer
+
+# navmesh object of the current worker process, created once by the pool initializer
+_worker_navmesh: Optional[Navmesh] = None
+
+
+def _worker_init(memory_name: str, path_cache_size: int, cluster_size: Optional[float]):
+    '''Initialize the worker process: create navmesh object from the snapshot in the shared memory block
+
+    Arrays of the navmesh are read-only views of the block, so they are not copied into the process
+    the block stays attached while the worker is alive
+    '''
+    global _worker_navmesh
+    phase_time: float = time.time()
+    memory = shared_memory.SharedMemory(name=memory_name)
+    sections = read_snapshot_buffer(memory.buf.toreadonly())
+    _worker_navmesh = Navmesh._from_snapshot_sections(sections, memory, phase_time, path_cache_size, cluster_size)
+
+
+def _worker_search_path(query: Tuple[Tuple[float, float, float], Tuple[float, float, float], Optional[float], bool]) -> List[Tuple[float, float, float]]:
+    return _worker_navmesh.search_path(query[0], query[1], query[2], query[3])
+
+
+def _worker_sample(query: Tuple[Tuple[float, float, float], bool]) -> Optional[Tuple[float, float, float]]:
+    return _worker_navmesh.sample(query[0], query[1])
+
+
+def _worker_raycast(query: Tuple[Tuple[float, float, float], Tuple[float, float, float]]) -> Optional[Tuple[float, float, float]]:
+    return _worker_navmesh.raycast(query[0], query[1])
+
+
+class PathQueryPool:
+    def __init__(self,
+                 vertices: List[Tuple[float, float, float]],
+                 polygons: List[List[int]],
+                 processes: Optional[int] = None,
+                 chunk_size: int = 16,
+                 path_cache_size: int = 0,
+                 cluster_size: Optional[float] = None,
+                 landmarks_count: int = 0):
+        '''Create the pool of worker processes, each of them contains the same navigation mesh
+
+        Path searches are pure python, so threads does not help. The pool process batches of queries in parallel.
+        The navmesh is built once in the main process and it snapshot (see Navmesh.save_snapshot) is placed into one shared memory block.
+        Each worker creates the navmesh object from views of this block without copying arrays and without building graphs, BVH and so on
+
+        Input:
+            vertices, polygons - navigation mesh description in the same form as for Navmesh
+            processes - the number of worker processes, if None then use the number of cpu cores
+            chunk_size - the number of queries, sended to the worker at once
+            path_cache_size, cluster_size, landmarks_count - parameters of navmesh in each worker (see Navmesh)
+        '''
+        self._chunk_size: int = max(1, chunk_size)
+        navmesh: Navmesh = Navmesh(vertices, polygons, cluster_size=cluster_size, landmarks_count=landmarks_count)
+        snapshot: bytes = pack_snapshot(navmesh._get_snapshot_sections())
+        del navmesh
+        self._memory: Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(create=True, size=len(snapshot))
+        self._memory.buf[:len(snapshot)] = snapshot
+
+        self._processes: int = processes if processes is not None else multiprocessing.cpu_count()
+        self._pool: Optional[Any] = multiprocessing.Pool(self._processes,
+                                                         initializer=_worker_init,
+                                                         initargs=(self._memory.name, path_cache_size, cluster_size))
+
+    def get_processes_count(self) -> int:
+        return self._processes
+
+    def search_paths(self,
+                     pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]],
+                     length_limit_coefficient: Optional[float] = None,
+                     any_angle: bool = False) -> List[List[Tuple[float, float, float]]]:
+        '''Find pathes for all pairs (start, finish) in worker processes
+
+        Output:
+            array of pathes in the same order as input pairs, each path is the same as the output of Navmesh.search_path
+        '''
+        return self._map(_worker_search_path, [(pair[0], pair[1], length_limit_coefficient, any_angle) for pair in pairs])
+
+    def sample_points(self, points: List[Tuple[float, float, float]], is_slow: bool = False) -> List[Optional[Tuple[float, float, float]]]:
+        '''Find closest points on the navmesh for all input points in worker processes
+
+        Output:
+            array of the same length as input, each value is the same as the output of Navmesh.sample
+        '''
+        return self._map(_worker_sample, [(point, is_slow) for point in points])
+
+    def raycast_rays(self, rays: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[Optional[Tuple[float, float, float]]]:
+        '''Intersect all rays (origin, direction) with the navmesh in worker processes
+
+        Output:
+            array of the same length as input, each value is the same as the output of Navmesh.raycast
+        '''
+        return self._map(_worker_raycast, rays)
+
+    def _map(self, function: Any, queries: List[Any]) -> List[Any]:
+        if self._pool is None:
+            raise RuntimeError("The pool is closed")
+        if len(queries) == 0:
+            return []
+        return self._pool.map(function, queries, self._chunk_size)
+
+    def close(self):
+        '''Stop worker processes and release the shared memory block
+        '''
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._memory is not None:
+            self._memory.close()
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
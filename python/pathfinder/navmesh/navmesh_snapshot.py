@@ -0,0 +1,121 @@
+import io
+import sys
+import mmap
+import struct
+from array import array
+from typing import Dict, Tuple, Any
+
+SNAPSHOT_MAGIC = b"NMSS"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_ALIGNMENT = 8
+
+
+def write_snapshot(file_path: str, sections: Dict[str, Any]):
+    '''Write arrays into binary container
+
+    The file starts from the header: 4 bytes "NMSS", 32 bit unsigned integers with format version and the number of sections
+    Then the section table follows, for each section it contains:
+        16 bit unsigned integer with the length of the name, name in utf-8
+        1 byte with array type code ("i" or "d"), 64 bit unsigned integers with data offset (from the file start) and the number of items
+    Section data are aligned by 8 bytes, so each section can be used as memory view of the mapped file without copy
+
+    Byte order is little-endian
+
+    Input:
+        file_path - path to the output file
+        sections - dictionary, key - section name, value - array with type code "i" (32 bit integers) or "d" (64 bit floats)
+    '''
+    with open(file_path, "wb") as file:
+        _write_sections(file, sections)
+
+
+def pack_snapshot(sections: Dict[str, Any]) -> bytes:
+    '''Return bytes of the container with arrays in the same format as write_snapshot function
+    '''
+    stream = io.BytesIO()
+    _write_sections(stream, sections)
+    return stream.getvalue()
+
+
+def _write_sections(file: Any, sections: Dict[str, Any]):
+    names = list(sections.keys())
+    table_size: int = 12
+    for name in names:
+        table_size += 2 + len(name.encode("utf-8")) + 1 + 16
+    offsets: Dict[str, int] = {}
+    data_offset: int = _align(table_size)
+    for name in names:
+        offsets[name] = data_offset
+        data_offset = _align(data_offset + len(sections[name]) * struct.calcsize(_get_typecode(sections[name])))
+    file.write(SNAPSHOT_MAGIC)
+    file.write(struct.pack("<II", SNAPSHOT_VERSION, len(names)))
+    for name in names:
+        name_bytes: bytes = name.encode("utf-8")
+        values = sections[name]
+        file.write(struct.pack("<H", len(name_bytes)))
+        file.write(name_bytes)
+        file.write(struct.pack("<cQQ", _get_typecode(values).encode("ascii"), offsets[name], len(values)))
+    position: int = table_size
+    for name in names:
+        file.write(b"\x00" * (offsets[name] - position))
+        values = array(_get_typecode(sections[name]), sections[name])
+        if sys.byteorder != "little":
+            values.byteswap()
+        file.write(values.tobytes())
+        position = offsets[name] + len(values) * values.itemsize
+    file.write(b"\x00" * (data_offset - position))
+
+
+def read_snapshot(file_path: str) -> Tuple[Dict[str, Any], Any]:
+    '''Map the file, created by write_snapshot function, into memory
+
+    Output:
+        2-tuple (sections, map)
+        sections is a dictionary, key - section name, value - memory view of the mapped file, casted to the type of the section
+        pages of the map are copied only when they are changed, so views are writable, but changes are not saved into the file
+        map is the mapped file object, it should be alive while views are used
+        on big-endian machines section values are copied into arrays
+    '''
+    with open(file_path, "rb") as file:
+        file_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+    if file_map[0:4] != SNAPSHOT_MAGIC:
+        raise ValueError("file " + file_path + " does not contain navmesh snapshot")
+    return (read_snapshot_buffer(memoryview(file_map)), file_map)
+
+
+def read_snapshot_buffer(view: memoryview) -> Dict[str, Any]:
+    '''Return sections of the container, placed in the memory buffer (for example, in the shared memory block)
+    values are memory views of the buffer in the same form as in read_snapshot function, they are read-only, if the buffer is read-only
+    the buffer can be longer than the container
+    '''
+    if bytes(view[0:4]) != SNAPSHOT_MAGIC:
+        raise ValueError("the buffer does not contain navmesh snapshot")
+    version, sections_count = struct.unpack_from("<II", view, 4)
+    if version != SNAPSHOT_VERSION:
+        raise ValueError("unsupported navmesh snapshot version " + str(version))
+    sections: Dict[str, Any] = {}
+    position: int = 12
+    for i in range(sections_count):
+        name_length: int = struct.unpack_from("<H", view, position)[0]
+        name: str = bytes(view[position + 2:position + 2 + name_length]).decode("utf-8")
+        position += 2 + name_length
+        typecode, offset, count = struct.unpack_from("<cQQ", view, position)
+        position += 17
+        code: str = typecode.decode("ascii")
+        size: int = struct.calcsize(code)
+        values = view[offset:offset + count * size].cast("B").cast(code)
+        if sys.byteorder != "little":
+            values = array(code, values.tobytes())
+            values.byteswap()
+        sections[name] = values
+    return sections
+
+
+def _get_typecode(values: Any) -> str:
+    '''Return type code of array or memory view
+    '''
+    return values.typecode if isinstance(values, array) else values.format
+
+
+def _align(value: int) -> int:
+    return (value + SNAPSHOT_ALIGNMENT - 1) // SNAPSHOT_ALIGNMENT * SNAPSHOT_ALIGNMENT
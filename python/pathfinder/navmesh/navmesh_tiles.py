@@ -0,0 +1,634 @@
+import os
+import math
+import time
+import heapq
+from array import array
+from collections import OrderedDict
+from typing import List, Tuple, Dict, Optional, Any
+from pathfinder.navmesh import Navmesh
+from pathfinder.navmesh.navmesh_data import NavmeshData
+from pathfinder.navmesh.navmesh_node import NavmeshNode
+from pathfinder.navmesh.navmesh_snapshot import write_snapshot, read_snapshot
+from pathfinder.navmesh.navmesh_batch import pack_points, to_points_list
+
+TILES_INDEX_NAME = "tiles.nmss"
+PORTAL_ANCHOR_SHIFT = 0.01  # portal anchors are shifted from the middle of the edge to polygon centers by this part of the distance
+
+
+def get_tile_file_name(tile_x: int, tile_z: int) -> str:
+    return "tile_" + str(tile_x) + "_" + str(tile_z) + ".nmss"
+
+
+def _get_path_length(path: List[Tuple[float, float, float]]) -> float:
+    return sum(math.sqrt((path[i][0] - path[i - 1][0])**2 + (path[i][1] - path[i - 1][1])**2 + (path[i][2] - path[i - 1][2])**2) for i in range(1, len(path)))
+
+
+def _get_paths_lengths(navmesh: Navmesh, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[float]:
+    '''Return lengths of pathes between points of each pair inside one navmesh
+    if the path is not found (it is possible only for points on the polygon border), then use the straight distance
+    '''
+    lengths: List[float] = []
+    for (start, finish), path in zip(pairs, navmesh.search_paths(pairs)):
+        lengths.append(_get_path_length(path) if len(path) > 0 else _get_path_length([start, finish]))
+    return lengths
+
+
+def write_tiles(vertices: List[Tuple[float, float, float]],
+                polygons: List[List[int]],
+                tile_size: float,
+                directory: str,
+                cluster_size: Optional[float] = None,
+                landmarks_count: int = 0) -> int:
+    '''Split the navigation mesh into square tiles in XZ-plane and save it into the directory for TiledNavmesh
+
+    Each polygon belongs to the tile with it center, polygons are not clipped. Each tile is saved as separate navmesh snapshot.
+    The index file contains small data, required without loaded tiles:
+        -) coordinates and bounding boxes of tiles
+        -) global group index (connected component of the whole navmesh) for each group of each tile
+        -) portals - edges between polygons from different tiles, for each side of the portal it stores the tile, the group in the tile
+           and the anchor point (the middle of the edge, a bit shifted into the polygon), and also coordinates of the edge
+           in the orientation of the polygon with smaller index
+        -) portal costs - for each portal side the lengths of pathes inside the tile to all other sides in the same group of the tile
+           in CSR form (offsets, other sides, lengths), like costs between entrances of clusters in NavmeshHierarchy
+        -) boundary chains of global groups (for rvo obstacles)
+
+    This is offline step, it creates the navmesh for all polygons at once
+
+    Input:
+        vertices, polygons - navigation mesh description in the same form as for Navmesh
+        tile_size - the size of the square tile
+        directory - existing directory for output files
+        cluster_size, landmarks_count - parameters of navmesh in each tile (see Navmesh)
+
+    Output:
+        the number of created tiles
+    '''
+    navmesh: Navmesh = Navmesh(vertices, polygons)
+    data: NavmeshData = navmesh.get_data()
+    polygon_tiles: List[Tuple[int, int]] = []
+    tile_indexes: Dict[Tuple[int, int], int] = {}
+    tile_polygons: List[List[int]] = []
+    for polygon_index in range(len(polygons)):
+        center: Tuple[float, float, float] = data.get_center(polygon_index)
+        tile: Tuple[int, int] = (int(math.floor(center[0] / tile_size)), int(math.floor(center[2] / tile_size)))
+        polygon_tiles.append(tile)
+        if tile not in tile_indexes:
+            tile_indexes[tile] = len(tile_polygons)
+            tile_polygons.append([])
+        tile_polygons[tile_indexes[tile]].append(polygon_index)
+
+    tile_coordinates: array = array("i")
+    tile_bounds: array = array("d")
+    tile_group_offsets: array = array("i", [0])
+    tile_groups: array = array("i")
+    local_groups: Dict[int, int] = {}  # key - global polygon index, value - group of the polygon in it tile
+    tile_navmeshes: List[Navmesh] = []  # used for portal costs
+    for tile, tile_index in tile_indexes.items():
+        local_vertices: Dict[int, int] = {}
+        local_polygons: List[List[int]] = []
+        for polygon_index in tile_polygons[tile_index]:
+            local_polygon: List[int] = []
+            for vertex in polygons[polygon_index]:
+                if vertex not in local_vertices:
+                    local_vertices[vertex] = len(local_vertices)
+                local_polygon.append(local_vertices[vertex])
+            local_polygons.append(local_polygon)
+        tile_navmesh: Navmesh = Navmesh([vertices[v] for v in local_vertices], local_polygons, cluster_size=cluster_size, landmarks_count=landmarks_count)
+        tile_navmesh.save_snapshot(os.path.join(directory, get_tile_file_name(tile[0], tile[1])))
+        tile_navmeshes.append(tile_navmesh)
+        tile_coordinates.extend(tile)
+        for axis in range(3):
+            tile_bounds.append(min(vertices[v][axis] for v in local_vertices))
+        for axis in range(3):
+            tile_bounds.append(max(vertices[v][axis] for v in local_vertices))
+        tile_data: NavmeshData = tile_navmesh.get_data()
+        group_start: int = len(tile_groups)
+        tile_groups.extend([-1] * tile_navmesh.get_groups_count())
+        for local_index, polygon_index in enumerate(tile_polygons[tile_index]):
+            local_groups[polygon_index] = tile_data.get_group(local_index)
+            tile_groups[group_start + local_groups[polygon_index]] = data.get_group(polygon_index)
+        tile_group_offsets.append(len(tile_groups))
+
+    # each portal is stored once, from the polygon with smaller index
+    portal_tiles: array = array("i")
+    portal_points: array = array("d")
+    portal_edges: array = array("d")
+    for polygon_index in range(len(polygons)):
+        corners_start, corners_end = data.get_polygon_range(polygon_index)
+        for corner in range(corners_start, corners_end):
+            other: int = data.get_corner_neighbor(corner)
+            if other > polygon_index and polygon_tiles[other] != polygon_tiles[polygon_index]:
+                u: Tuple[float, float, float] = vertices[data.get_corner_vertex(corner)]
+                v: Tuple[float, float, float] = vertices[data.get_corner_vertex(corner + 1 if corner < corners_end - 1 else corners_start)]
+                middle: Tuple[float, float, float] = ((u[0] + v[0]) / 2.0, (u[1] + v[1]) / 2.0, (u[2] + v[2]) / 2.0)
+                portal_edges.extend(u + v)
+                for side_polygon in (polygon_index, other):
+                    center = data.get_center(side_polygon)
+                    portal_tiles.append(tile_indexes[polygon_tiles[side_polygon]])
+                    portal_tiles.append(local_groups[side_polygon])
+                    portal_points.extend([middle[axis] + (center[axis] - middle[axis]) * PORTAL_ANCHOR_SHIFT for axis in range(3)])
+
+    # costs between portal sides inside tiles, the path search in the tile is symmetric, so each pair is searched once
+    sides_count: int = len(portal_tiles) // 2
+    side_costs: List[List[Tuple[int, float]]] = [[] for side in range(sides_count)]
+    tile_sides: List[List[int]] = [[] for tile_index in range(len(tile_polygons))]
+    for side in range(sides_count):
+        tile_sides[portal_tiles[2 * side]].append(side)
+    for tile_index, sides in enumerate(tile_sides):
+        side_pairs: List[Tuple[int, int]] = [(sides[i], sides[j]) for i in range(len(sides)) for j in range(i + 1, len(sides)) if portal_tiles[2 * sides[i] + 1] == portal_tiles[2 * sides[j] + 1]]
+        lengths: List[float] = _get_paths_lengths(tile_navmeshes[tile_index], [(tuple(portal_points[3 * a:3 * a + 3]), tuple(portal_points[3 * b:3 * b + 3])) for a, b in side_pairs])
+        for (a, b), length in zip(side_pairs, lengths):
+            side_costs[a].append((b, length))
+            side_costs[b].append((a, length))
+    portal_cost_offsets: array = array("i", [0])
+    portal_cost_sides: array = array("i")
+    portal_costs: array = array("d")
+    for costs in side_costs:
+        for other, length in costs:
+            portal_cost_sides.append(other)
+            portal_costs.append(length)
+        portal_cost_offsets.append(len(portal_cost_sides))
+    del tile_navmeshes
+
+    # boundary of global groups, vertices are renumbered, because only boundary vertices are stored
+    boundary_vertices: Dict[int, int] = {}
+    boundary_group_offsets: array = array("i", [0])
+    boundary_chain_offsets: array = array("i", [0])
+    boundary_edges: array = array("i")
+    for group_index in range(navmesh.get_groups_count()):
+        for chain in navmesh.get_group_boundary(group_index):
+            for edge in chain:
+                for vertex in edge:
+                    if vertex not in boundary_vertices:
+                        boundary_vertices[vertex] = len(boundary_vertices)
+                    boundary_edges.append(boundary_vertices[vertex])
+            boundary_chain_offsets.append(len(boundary_edges) // 2)
+        boundary_group_offsets.append(len(boundary_chain_offsets) - 1)
+    boundary_coordinates: array = array("d")
+    for vertex in boundary_vertices:
+        boundary_coordinates.extend(vertices[vertex])
+
+    write_snapshot(os.path.join(directory, TILES_INDEX_NAME), {
+        "settings": array("d", [tile_size]),
+        "tiles.coordinates": tile_coordinates,
+        "tiles.bounds": tile_bounds,
+        "tiles.group_offsets": tile_group_offsets,
+        "tiles.groups": tile_groups,
+        "portals.tiles": portal_tiles,
+        "portals.points": portal_points,
+        "portals.edges": portal_edges,
+        "portals.cost_offsets": portal_cost_offsets,
+        "portals.cost_sides": portal_cost_sides,
+        "portals.costs": portal_costs,
+        "boundary.vertices": boundary_coordinates,
+        "boundary.group_offsets": boundary_group_offsets,
+        "boundary.chain_offsets": boundary_chain_offsets,
+        "boundary.edges": boundary_edges})
+    return len(tile_polygons)
+
+
+class TiledNavmeshNode(NavmeshNode):
+    '''Polygon of one tile of the tiled navmesh, the group of the node is the global group index
+    '''
+    def __init__(self, data: NavmeshData, index: int, tile: Tuple[int, int], group: int):
+        super().__init__(data, index)
+        self._tile: Tuple[int, int] = tile
+        self._group: int = group
+
+    def get_tile(self) -> Tuple[int, int]:
+        return self._tile
+
+    def get_group(self) -> int:
+        return self._group
+
+
+class TiledNavmesh:
+    def __init__(self,
+                 directory: str,
+                 memory_budget: int = 0,
+                 path_cache_size: int = 0,
+                 cluster_size: Optional[float] = None):
+        '''Navigation mesh, splitted into tiles by write_tiles function
+
+        Only the small index is loaded at the start. Tiles are loaded from snapshots, when queries need it.
+        Loaded tiles are stored in LRU order, if the total memory of tiles is greater than the budget, then least recently used tiles are unloaded
+
+        Path search at first find the sequence of portals between tiles by A* over portal anchors
+        (only portals, which are connected inside tiles, are used, costs between them are lengths of pathes inside tiles from the index,
+        so only tiles of start and finish points are loaded),
+        and then find polygon corridors between portal anchors inside tiles. So, only tiles along the path are loaded.
+        Corridors of tiles are stitched by portal edges and the path is straightened over the whole corridor,
+        so portals are not crossed at anchors, but the sequence of portals can be different from the shortest path in the whole navmesh
+
+        Input:
+            directory - directory with files, created by write_tiles
+            memory_budget - maximum memory (in bytes) for loaded tiles, 0 disables the limit
+                            the memory of the tile is the size of the snapshot file and approximate size of created structures
+                            the last used tile is never unloaded
+            path_cache_size, cluster_size - parameters of navmesh in each tile (see Navmesh)
+        '''
+        phase_time: float = time.time()
+        self._directory: str = directory
+        self._memory_budget: int = memory_budget
+        self._path_cache_size: int = path_cache_size
+        self._cluster_size: Optional[float] = cluster_size
+        sections, file_map = read_snapshot(os.path.join(directory, TILES_INDEX_NAME))
+        self._tile_size: float = sections["settings"][0]
+        coordinates: List[int] = sections["tiles.coordinates"].tolist()
+        bounds: List[float] = sections["tiles.bounds"].tolist()
+        group_offsets: List[int] = sections["tiles.group_offsets"].tolist()
+        groups: List[int] = sections["tiles.groups"].tolist()
+        self._tile_coordinates: List[Tuple[int, int]] = [(coordinates[2 * i], coordinates[2 * i + 1]) for i in range(len(coordinates) // 2)]
+        self._tile_indexes: Dict[Tuple[int, int], int] = {tile: i for i, tile in enumerate(self._tile_coordinates)}
+        self._tile_bounds: List[Tuple[float, float, float, float, float, float]] = [tuple(bounds[6 * i:6 * i + 6]) for i in range(len(self._tile_coordinates))]
+        self._tile_groups: List[List[int]] = [groups[group_offsets[i]:group_offsets[i + 1]] for i in range(len(self._tile_coordinates))]
+        # polygons can go out of the tile square, so point queries should check neighbor tiles in this radius
+        self._tile_reach: int = 0
+        for tile, tile_bounds in zip(self._tile_coordinates, self._tile_bounds):
+            self._tile_reach = max(self._tile_reach,
+                                   tile[0] - int(math.floor(tile_bounds[0] / self._tile_size)),
+                                   int(math.floor(tile_bounds[3] / self._tile_size)) - tile[0],
+                                   tile[1] - int(math.floor(tile_bounds[2] / self._tile_size)),
+                                   int(math.floor(tile_bounds[5] / self._tile_size)) - tile[1])
+
+        # for each portal store two sides (tile index, group in the tile, anchor point)
+        portal_tiles: List[int] = sections["portals.tiles"].tolist()
+        portal_points: List[float] = sections["portals.points"].tolist()
+        self._portal_sides: List[Tuple[int, int, Tuple[float, float, float]]] = [(portal_tiles[2 * i], portal_tiles[2 * i + 1], tuple(portal_points[3 * i:3 * i + 3])) for i in range(len(portal_tiles) // 2)]
+        # side indexes are 2 * portal + (0 or 1), so the opposite side is side ^ 1
+        self._tile_sides: List[List[int]] = [[] for i in range(len(self._tile_coordinates))]  # for each tile store portal sides in this tile
+        for side, (tile_index, group, anchor) in enumerate(self._portal_sides):
+            self._tile_sides[tile_index].append(side)
+        # for each portal store the edge in the orientation of the first side polygon
+        portal_edges: List[float] = sections["portals.edges"].tolist()
+        self._portal_edges: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]] = [(tuple(portal_edges[6 * i:6 * i + 3]), tuple(portal_edges[6 * i + 3:6 * i + 6])) for i in range(len(portal_edges) // 6)]
+        # for each side store pairs (other side in the same group of the tile, length of the path between anchors inside the tile)
+        cost_offsets: List[int] = sections["portals.cost_offsets"].tolist()
+        cost_sides: List[int] = sections["portals.cost_sides"].tolist()
+        costs: List[float] = sections["portals.costs"].tolist()
+        self._portal_costs: List[List[Tuple[int, float]]] = [list(zip(cost_sides[cost_offsets[i]:cost_offsets[i + 1]], costs[cost_offsets[i]:cost_offsets[i + 1]])) for i in range(len(cost_offsets) - 1)]
+
+        boundary_coordinates: List[float] = sections["boundary.vertices"].tolist()
+        self._vertices: List[Tuple[float, float, float]] = [tuple(boundary_coordinates[3 * i:3 * i + 3]) for i in range(len(boundary_coordinates) // 3)]
+        boundary_group_offsets: List[int] = sections["boundary.group_offsets"].tolist()
+        boundary_chain_offsets: List[int] = sections["boundary.chain_offsets"].tolist()
+        boundary_edges: List[int] = sections["boundary.edges"].tolist()
+        self._boundary: List[List[List[Tuple[int, int]]]] = []
+        for group_index in range(len(boundary_group_offsets) - 1):
+            chains: List[List[Tuple[int, int]]] = []
+            for chain_index in range(boundary_group_offsets[group_index], boundary_group_offsets[group_index + 1]):
+                chains.append([(boundary_edges[2 * e], boundary_edges[2 * e + 1]) for e in range(boundary_chain_offsets[chain_index], boundary_chain_offsets[chain_index + 1])])
+            self._boundary.append(chains)
+        # all index data is copied, so the map can be closed
+        del sections
+        file_map.close()
+
+        self._tiles: OrderedDict = OrderedDict()  # key - tile index, value - loaded navmesh, the last used tile is at the end
+        self._tiles_memory: Dict[int, int] = {}  # key - tile index, value - memory of the loaded tile
+        self._memory_usage: int = 0
+        self._tile_hits: int = 0
+        self._tile_misses: int = 0
+        self._tile_evictions: int = 0
+        self._last_search_stats: Tuple[int, int] = (0, 0)
+        self._build_timings: Dict[str, float] = {"index": time.time() - phase_time}
+
+    def get_tiles_count(self) -> int:
+        return len(self._tile_coordinates)
+
+    def get_tile_size(self) -> float:
+        return self._tile_size
+
+    def get_loaded_tiles(self) -> List[Tuple[int, int]]:
+        '''Return coordinates of loaded tiles, from the least recently used to the last used
+        '''
+        return [self._tile_coordinates[tile_index] for tile_index in self._tiles]
+
+    def get_memory_usage(self) -> int:
+        return self._memory_usage
+
+    def set_memory_budget(self, memory_budget: int):
+        '''Set the maximum memory of loaded tiles (in bytes), 0 disables the limit
+        '''
+        self._memory_budget = memory_budget
+        self._evict_tiles()
+
+    def get_tile_stats(self) -> Tuple[int, int, int]:
+        '''Return 3-tuple (hits, misses, evictions): the number of tile requests to already loaded tiles,
+        the number of tile loads and the number of unloaded tiles
+        '''
+        return (self._tile_hits, self._tile_misses, self._tile_evictions)
+
+    def unload_tiles(self):
+        '''Unload all tiles
+        '''
+        self._tiles.clear()
+        self._tiles_memory.clear()
+        self._memory_usage = 0
+
+    def _get_tile(self, tile_index: int) -> Navmesh:
+        '''Return navmesh of the tile, load it if it is not loaded yet
+        '''
+        navmesh: Optional[Navmesh] = self._tiles.get(tile_index)
+        if navmesh is not None:
+            self._tile_hits += 1
+            self._tiles.move_to_end(tile_index)
+            return navmesh
+        self._tile_misses += 1
+        tile: Tuple[int, int] = self._tile_coordinates[tile_index]
+        file_path: str = os.path.join(self._directory, get_tile_file_name(tile[0], tile[1]))
+        navmesh = Navmesh.load_snapshot(file_path, path_cache_size=self._path_cache_size, cluster_size=self._cluster_size)
+        # create lazy structures at once, so the memory of the tile does not changed after loading
+        navmesh.prewarm(in_background=False)
+        memory: int = os.path.getsize(file_path) + sum(value[1] for value in navmesh.get_memory_report().values())
+        self._tiles[tile_index] = navmesh
+        self._tiles_memory[tile_index] = memory
+        self._memory_usage += memory
+        self._evict_tiles()
+        return navmesh
+
+    def _evict_tiles(self):
+        while self._memory_budget > 0 and self._memory_usage > self._memory_budget and len(self._tiles) > 1:
+            tile_index, navmesh = self._tiles.popitem(last=False)
+            self._memory_usage -= self._tiles_memory.pop(tile_index)
+            self._tile_evictions += 1
+
+    def _get_point_tiles(self, point: Tuple[float, float, float]) -> List[int]:
+        '''Return indexes of tiles, which bounding boxes (in XZ-plane) contain the point, the tile of the point is the first
+        '''
+        tile_x: int = int(math.floor(point[0] / self._tile_size))
+        tile_z: int = int(math.floor(point[2] / self._tile_size))
+        to_return: List[int] = []
+        for dx in range(-self._tile_reach, self._tile_reach + 1):
+            for dz in range(-self._tile_reach, self._tile_reach + 1):
+                tile_index: Optional[int] = self._tile_indexes.get((tile_x + dx, tile_z + dz))
+                if tile_index is not None:
+                    bounds = self._tile_bounds[tile_index]
+                    if bounds[0] <= point[0] <= bounds[3] and bounds[2] <= point[2] <= bounds[5]:
+                        if dx == 0 and dz == 0:
+                            to_return.insert(0, tile_index)
+                        else:
+                            to_return.append(tile_index)
+        return to_return
+
+    def _locate(self, point: Tuple[float, float, float]) -> Optional[Tuple[int, NavmeshNode]]:
+        '''Return pair (tile index, node of the tile navmesh) for the polygon with the point, or None
+        '''
+        for tile_index in self._get_point_tiles(point):
+            node: Optional[NavmeshNode] = self._get_tile(tile_index).sample_polygon(point)
+            if node is not None:
+                return (tile_index, node)
+        return None
+
+    def get_groups_count(self) -> int:
+        return len(self._boundary)
+
+    def get_group_boundary(self, group_index: int) -> List[List[Tuple[int, int]]]:
+        '''Return boundary of the global group as array of chains, vertex indexes refer to the array from get_vertices method
+        '''
+        return self._boundary[group_index] if group_index < len(self._boundary) else []
+
+    def get_vertices(self) -> List[Tuple[float, float, float]]:
+        '''Return vertices of the navmesh boundary (but not all vertices of tiles)
+        '''
+        return self._vertices
+
+    def sample_polygon(self, position: Tuple[float, float, float]) -> Optional[TiledNavmeshNode]:
+        '''return node, close to the given point, or None, if it outside of the navmesh
+        the group of the node is the global group
+        '''
+        location: Optional[Tuple[int, NavmeshNode]] = self._locate(position)
+        if location is None:
+            return None
+        tile_index, node = location
+        return TiledNavmeshNode(node.get_data(), node.get_index(), self._tile_coordinates[tile_index], self._tile_groups[tile_index][node.get_group()])
+
+    def sample(self, point: Tuple[float, float, float], is_slow: bool = False, max_distance: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
+        '''return coordinates of the point inside navmesh, closest to the input one, or None
+        only tiles near the point are checked, is_slow and max_distance parameters are the same as in Navmesh.sample
+        '''
+        tiles: List[int] = self._get_point_tiles(point)
+        if len(tiles) == 0:
+            # the point is outside of all tiles, so use tiles in the neighborhood
+            tile_x: int = int(math.floor(point[0] / self._tile_size))
+            tile_z: int = int(math.floor(point[2] / self._tile_size))
+            reach: int = self._tile_reach + 1
+            tiles = [self._tile_indexes[(tile_x + dx, tile_z + dz)] for dx in range(-reach, reach + 1) for dz in range(-reach, reach + 1) if (tile_x + dx, tile_z + dz) in self._tile_indexes]
+        to_return: Optional[Tuple[float, float, float]] = None
+        min_distance: float = float("inf")
+        for tile_index in tiles:
+            sample: Optional[Tuple[float, float, float]] = self._get_tile(tile_index).sample(point, is_slow, max_distance)
+            if sample is not None:
+                distance: float = (sample[0] - point[0])**2 + (sample[1] - point[1])**2 + (sample[2] - point[2])**2
+                if distance < min_distance:
+                    min_distance = distance
+                    to_return = sample
+        return to_return
+
+    def raycast(self, origin: Tuple[float, float, float], direction: Tuple[float, float, float]) -> Optional[Tuple[float, float, float]]:
+        '''return the closest intersection point of the ray with the navigation mesh, or None
+        tiles are loaded in the order of intersection with it bounding boxes, until the intersection is found
+        '''
+        hit: Optional[Tuple[Tuple[float, float, float], float, int]] = self.raycast_hit(origin, direction)
+        return hit[0] if hit is not None else None
+
+    def raycast_hit(self, origin: Tuple[float, float, float],
+                    direction: Tuple[float, float, float],
+                    max_distance: Optional[float] = None,
+                    any_hit: bool = False) -> Optional[Tuple[Tuple[float, float, float], float, int]]:
+        '''return 3-tuple (intersection point, distance from the origin, polygon index inside the tile) or None
+        parameters are the same as in Navmesh.raycast_hit, use sample_polygon to get the tile of the intersection point
+        '''
+        tiles: List[Tuple[float, int]] = []
+        for tile_index, bounds in enumerate(self._tile_bounds):
+            t_min: float = 0.0
+            t_max: float = float("inf")
+            for axis in range(3):
+                if abs(direction[axis]) < 0.000001:
+                    if origin[axis] < bounds[axis] or origin[axis] > bounds[axis + 3]:
+                        t_min = float("inf")
+                else:
+                    t1: float = (bounds[axis] - origin[axis]) / direction[axis]
+                    t2: float = (bounds[axis + 3] - origin[axis]) / direction[axis]
+                    t_min = max(t_min, min(t1, t2))
+                    t_max = min(t_max, max(t1, t2))
+            if t_min <= t_max:
+                tiles.append((t_min, tile_index))
+        tiles.sort()
+        direction_length: float = math.sqrt(direction[0]**2 + direction[1]**2 + direction[2]**2)
+        to_return: Optional[Tuple[Tuple[float, float, float], float, int]] = None
+        for t_enter, tile_index in tiles:
+            if to_return is not None and t_enter * direction_length > to_return[1]:
+                break
+            hit: Optional[Tuple[Tuple[float, float, float], float, int]] = self._get_tile(tile_index).raycast_hit(origin, direction, to_return[1] if to_return is not None else max_distance, any_hit)
+            if hit is not None:
+                to_return = hit
+                if any_hit:
+                    break
+        return to_return
+
+    def sample_many(self, points: Any, is_slow: bool = False, max_distance: Optional[float] = None) -> Tuple[Any, Any]:
+        '''return closest points for all input points in the same form as Navmesh.sample_many
+        tiles are streamed for each point separately, so queries are not vectorized
+        '''
+        return pack_points([self.sample(point, is_slow, max_distance) for point in to_points_list(points)])
+
+    def raycast_many(self, origins: Any, directions: Any) -> Tuple[Any, Any]:
+        '''return closest intersections of rays in the same form as Navmesh.raycast_many, rays are processed one by one
+        '''
+        return pack_points([self.raycast(origin, direction) for origin, direction in zip(to_points_list(origins), to_points_list(directions))])
+
+    def are_reachable(self, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[bool]:
+        '''Return for each pair (start, finish) True, if points are in the same global group
+        '''
+        to_return: List[bool] = []
+        for start, finish in pairs:
+            start_node: Optional[TiledNavmeshNode] = self.sample_polygon(start)
+            finish_node: Optional[TiledNavmeshNode] = self.sample_polygon(finish)
+            to_return.append(start_node is not None and finish_node is not None and start_node.get_group() == finish_node.get_group())
+        return to_return
+
+    def search_path(self,
+                    start: Tuple[float, float, float],
+                    finish: Tuple[float, float, float],
+                    length_limit_coefficient: Optional[float] = None,
+                    any_angle: bool = False) -> List[Tuple[float, float, float]]:
+        '''Search the path between start and finish points, parameters and output are the same as in Navmesh.search_path
+        if points are in different tiles, then the path is straightened over stitched corridors of tiles,
+        length_limit_coefficient and any_angle are used only for pathes inside one tile
+        '''
+        self._last_search_stats = (0, 0)
+        start_location: Optional[Tuple[int, NavmeshNode]] = self._locate(start)
+        finish_location: Optional[Tuple[int, NavmeshNode]] = self._locate(finish)
+        if start_location is None or finish_location is None:
+            return []
+        start_tile, start_node = start_location
+        finish_tile, finish_node = finish_location
+        start_group: int = start_node.get_group()
+        finish_group: int = finish_node.get_group()
+        if self._tile_groups[start_tile][start_group] != self._tile_groups[finish_tile][finish_group]:
+            return []
+        if start_tile == finish_tile and start_group == finish_group:
+            path: List[Tuple[float, float, float]] = self._get_tile(start_tile).search_path(start, finish, length_limit_coefficient, any_angle)
+            self._last_search_stats = self._get_tile(start_tile).get_last_search_stats()
+            return path
+
+        sides: Optional[List[int]] = self._search_portals(start, start_tile, start_group, finish, finish_tile, finish_group)
+        if sides is None:
+            return []
+        # sides are pairs (exit from the tile, enter into the next tile), so the corridor is splitted into segments inside tiles
+        # segments are found between portal anchors, and then portals of all segments are joined by portal edges
+        portals: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]] = []
+        refined_count: int = 0
+        segment_start: Tuple[float, float, float] = start
+        segment_tile: int = start_tile
+        for i in range(0, len(sides) + 1, 2):
+            navmesh: Navmesh = self._get_tile(segment_tile)
+            corridor: List[int] = navmesh.search_corridor(segment_start, self._portal_sides[sides[i]][2] if i < len(sides) else finish)
+            refined_count += navmesh.get_last_search_stats()[1]
+            if len(corridor) == 0:
+                return []
+            portals.extend(navmesh.get_corridor_portals(corridor))
+            if i < len(sides):
+                portals.append(self._get_portal_edge(sides[i]))
+                segment_tile, _, segment_start = self._portal_sides[sides[i + 1]]
+        self._last_search_stats = (self._last_search_stats[0], refined_count)
+        return navmesh.straighten_path(start, finish, portals)
+
+    def _get_portal_edge(self, side: int) -> Tuple[Tuple[float, float, float], Tuple[float, float, float]]:
+        '''Return the edge of the portal in the orientation of the polygon at the given side (in the same form as NavmeshData.get_portal)
+        '''
+        edge: Tuple[Tuple[float, float, float], Tuple[float, float, float]] = self._portal_edges[side >> 1]
+        return edge if side & 1 == 0 else (edge[1], edge[0])
+
+    def _search_portals(self,
+                        start: Tuple[float, float, float],
+                        start_tile: int,
+                        start_group: int,
+                        finish: Tuple[float, float, float],
+                        finish_tile: int,
+                        finish_group: int) -> Optional[List[int]]:
+        '''A* search over portal sides. Two sides in one tile are connected, if they are in the same group of the tile
+        the cost between such sides is the length of the path inside the tile, it is stored in the index
+        costs from the start point to exits from the start tile and from enters into the finish tile to the finish point are found in these tiles
+        (they are already loaded for locating points)
+
+        Output:
+            array of portal sides [exit, enter, exit, enter, ...] from the start to the finish tile, or None, if there is no path
+        '''
+        def distance(a: Tuple[float, float, float], b: Tuple[float, float, float]) -> float:
+            return math.sqrt((a[0] - b[0])**2 + (a[1] - b[1])**2 + (a[2] - b[2])**2)
+
+        # pathes inside the tile are symmetric, so pathes from all anchors to the point share one search from the polygon of the point
+        start_exits: List[int] = [side for side in self._tile_sides[start_tile] if self._portal_sides[side][1] == start_group]
+        start_costs: List[float] = _get_paths_lengths(self._get_tile(start_tile), [(self._portal_sides[side][2], start) for side in start_exits])
+        finish_enters: List[int] = [side for side in self._tile_sides[finish_tile] if self._portal_sides[side][1] == finish_group]
+        finish_costs: Dict[int, float] = dict(zip(finish_enters, _get_paths_lengths(self._get_tile(finish_tile), [(self._portal_sides[side][2], finish) for side in finish_enters])))
+
+        # states are enter sides, -1 is the finish
+        costs: Dict[int, float] = {}
+        parents: Dict[int, int] = {}  # key - enter side, value - previous enter side (-2 for the start)
+        queue: List[Tuple[float, float, int, int]] = []  # (estimation, cost, enter side, previous enter side)
+
+        def push(side: int, cost: float, parent: int):
+            if cost < costs.get(side, float("inf")):
+                costs[side] = cost
+                heapq.heappush(queue, (cost + (distance(self._portal_sides[side][2], finish) if side > -1 else 0.0), cost, side, parent))
+
+        for exit_side, exit_cost in zip(start_exits, start_costs):
+            push(exit_side ^ 1, exit_cost + distance(self._portal_sides[exit_side][2], self._portal_sides[exit_side ^ 1][2]), -2)
+        expanded: int = 0
+        while len(queue) > 0:
+            estimation, cost, side, parent = heapq.heappop(queue)
+            if side in parents or cost > costs[side]:
+                continue
+            parents[side] = parent
+            if side == -1:
+                sides: List[int] = []
+                side = parent
+                while side != -2:
+                    sides.append(side)
+                    sides.append(side ^ 1)
+                    side = parents[side]
+                sides.reverse()
+                self._last_search_stats = (expanded, 0)
+                return sides
+            expanded += 1
+            if side in finish_costs:
+                push(-1, cost + finish_costs[side], side)
+            for exit_side, exit_cost in self._portal_costs[side]:
+                push(exit_side ^ 1, cost + exit_cost + distance(self._portal_sides[exit_side][2], self._portal_sides[exit_side ^ 1][2]), side)
+        self._last_search_stats = (expanded, 0)
+        return None
+
+    def search_paths(self, pairs: List[Tuple[Tuple[float, float, float], Tuple[float, float, float]]]) -> List[List[Tuple[float, float, float]]]:
+        return [self.search_path(start, finish) for start, finish in pairs]
+
+    def get_last_search_stats(self) -> Tuple[int, int]:
+        '''Return 2-tuple (abstract, refined) with the number of portals, expanded by the search between tiles, and the number of nodes, expanded in graphs of tiles during the last path search
+        '''
+        return self._last_search_stats
+
+    def clear_path_cache(self, reset_stats: bool = False):
+        for navmesh in self._tiles.values():
+            navmesh.clear_path_cache(reset_stats)
+
+    def get_path_cache_stats(self) -> Tuple[int, int]:
+        '''Return total path cache stats of all loaded tiles
+        '''
+        hits: int = 0
+        misses: int = 0
+        for navmesh in self._tiles.values():
+            tile_hits, tile_misses = navmesh.get_path_cache_stats()
+            hits += tile_hits
+            misses += tile_misses
+        return (hits, misses)
+
+    def get_build_timings(self) -> Dict[str, float]:
+        '''Return dictionary with the time of the index loading, tiles are loaded later
+        '''
+        return self._build_timings
+
+    def get_memory_report(self) -> Dict[str, Tuple[int, int]]:
+        '''Return dictionary with one key "tiles", the value is pair (the number of loaded tiles, approximate memory of these tiles)
+        '''
+        return {"tiles": (len(self._tiles), self._memory_usage)}
@@ -1,4 +1,8 @@
-from typing import List, Tuple, Optional
+import math
+from array import array
+from typing import List, Tuple, Optional, Dict, Any
+from pathfinder.navmesh.navmesh_bvh import BVHTree, BVH_LEAF_SIZE
+from pathfinder.navmesh.navmesh_batch import np, BATCH_MIN_SIZE, to_points_list, to_points_array, get_points_count, pack_points, get_closest_points, get_ray_parameters, get_boxes_distances, is_inside_boxes, get_rays_enters, get_leaf_positions, update_best
 
 
 def clamp(a: float, min: float = 0.0, max: float = 1.0) -> float:
@@ -41,7 +45,8 @@ def is_intersect_aabb(origin: Tuple[float, float, float],
 
 
 class Triangle:
-    def __init__(self, vertices: List[Tuple[float, float, float]]):
+    def __init__(self, vertices: List[Tuple[float, float, float]], polygon: int = -1):
+        self._polygon: int = polygon  # index of the navmesh polygon, which contains the triangle
         self._v0: Tuple[float, float, float] = vertices[0]
         self._v1: Tuple[float, float, float] = vertices[1]
         self._v2: Tuple[float, float, float] = vertices[2]
@@ -78,12 +83,26 @@ class Triangle:
         '''
         return self._center
 
+    def get_polygon(self) -> int:
+        return self._polygon
+
     def raycast(self, origin: Tuple[float, float, float], direction: Tuple[float, float, float]) -> Optional[Tuple[float, float, float]]:
         '''Check is the ray intersects with the triangles
 
         return None if there is no intersection
         return (x, y, z) - coordinates of the intersection, if it non-empty
         '''
+        t: Optional[float] = self.get_ray_parameter(origin, direction)
+        if t is None:
+            return None
+        return (origin[0] + t * direction[0],
+                origin[1] + t * direction[1],
+                origin[2] + t * direction[2])
+
+    def get_ray_parameter(self, origin: Tuple[float, float, float], direction: Tuple[float, float, float]) -> Optional[float]:
+        '''Return the parameter t of the intersection point origin + t * direction of the ray and the triangle
+        or None if there is no intersection
+        '''
         p_vec = cross(self._e2, direction)
         det = dot(p_vec, self._e1)
         if abs(det) < 0.001:
@@ -103,10 +122,7 @@ class Triangle:
         t = dot(self._e2, q_vec) * inv_det
         if t < 0.0:
             return None
-
-        return (origin[0] + t * direction[0],
-                origin[1] + t * direction[1],
-                origin[2] + t * direction[2])
+        return t
 
     def get_closest_point(self, point: Tuple[float, float, float]) -> Tuple[float, float, float]:
         '''Return coordinates of the point inside triangle, closest to the input one
@@ -181,164 +197,553 @@ class Triangle:
         return "[" + str(self._v0) + ", " + str(self._v1) + ", " + str(self._v2) + "]"
 
 
-class TrianglesBVH:
-    def __init__(self, triangles: List[Triangle], aabb_delta=0.5):
-        self._triangle: Optional[Triangle] = None
-        self._left: Optional[TrianglesBVH] = None
-        self._right: Optional[TrianglesBVH] = None
+class TrianglesView:
+    '''Sequence of triangles, stored in plain arrays (for example, memory views of the snapshot file)
+    Triangle objects are created at the first access to the corresponding index
 
-        self._aabb: Tuple[float, float, float, float, float, float]
-        if len(triangles) == 1:
-            # this is a leaf node
-            # get triangle aabb and add delta
-            t = triangles[0]
-            t_aabb = t.get_aabb()
-            self._aabb = (t_aabb[0] - aabb_delta, t_aabb[1] - aabb_delta, t_aabb[2] - aabb_delta,
-                          t_aabb[3] + aabb_delta, t_aabb[4] + aabb_delta, t_aabb[5] + aabb_delta)
+    this class is for internal use only
+    '''
+    def __init__(self, coordinates: Any, polygons: Any):
+        '''Input:
+            coordinates - 9 values for each triangle (coordinates of three vertices)
+            polygons - index of the navmesh polygon for each triangle, -1 for removed triangles
+        '''
+        self._coordinates: Any = coordinates
+        self._polygons: Any = polygons
+        self._triangles: List[Optional[Triangle]] = [None] * len(polygons)
 
-            # set node data
-            self._triangle = t
-        else:
-            # find the axis to split triangles array
-            x_min: float = float("inf")
-            x_max: float = -float("inf")
-            z_min: float = float("inf")
-            z_max: float = -float("inf")
-            x_median: float = 0.0
-            z_median: float = 0.0
-            for t in triangles:
-                t_center: Tuple[float, float, float] = t.get_center()
-                x_median += t_center[0]
-                z_median += t_center[2]
-                if t_center[0] < x_min:
-                    x_min = t_center[0]
-                if t_center[0] > x_max:
-                    x_max = t_center[0]
-                if t_center[2] < z_min:
-                    z_min = t_center[2]
-                if t_center[2] > z_max:
-                    z_max = t_center[2]
-            split_axis: int = 0 if (x_max - x_min) > (z_max - z_min) else 2
-            median: float = x_median / len(triangles) if (x_max - x_min) > (z_max - z_min) else z_median / len(triangles)
-
-            left: List[Triangle] = []
-            right: List[Triangle] = []
-            for t in triangles:
-                if t.get_center()[split_axis] < median:
-                    left.append(t)
-                else:
-                    right.append(t)
-            if len(left) == 0:
-                left.append(right.pop())
-            else:
-                if len(right) == 0:
-                    right.append(left.pop())
-            # setup left and right nodes
-            self._left = TrianglesBVH(left, aabb_delta)
-            self._right = TrianglesBVH(right, aabb_delta)
-            l_aabb: Tuple[float, float, float, float, float, float] = self._left.get_aabb()
-            r_aabb: Tuple[float, float, float, float, float, float] = self._right.get_aabb()
-            self._aabb = self._union_aabbs(l_aabb, r_aabb)
+    def __len__(self) -> int:
+        return len(self._polygons)
 
-    def get_aabb(self) -> Tuple[float, float, float, float, float, float]:
-        '''Return 6-tuple of the aabb (axis align bounding box) of the current node
+    def __getitem__(self, index: int) -> Optional[Triangle]:
+        triangle: Optional[Triangle] = self._triangles[index]
+        if triangle is None and self._polygons[index] > -1:
+            c = self._coordinates
+            i: int = 9 * index
+            triangle = Triangle([(c[i], c[i + 1], c[i + 2]), (c[i + 3], c[i + 4], c[i + 5]), (c[i + 6], c[i + 7], c[i + 8])], self._polygons[index])
+            self._triangles[index] = triangle
+        return triangle
 
-        this 6-tuple is (x_min, y_min, z_min, x_max, y_max, z_max)
-        '''
-        return self._aabb
+    def __iter__(self):
+        for index in range(len(self._polygons)):
+            yield self[index]
+
+    def get_arrays(self) -> Tuple[Any, Any]:
+        return (self._coordinates, self._polygons)
 
-    def is_inside_aabb(self, point: Tuple[float, float, float]) -> bool:
-        '''Return True, if the point is inside the current aabb, and False otherwise
+
+class TrianglesBVH(BVHTree):
+    '''Bounding volume hierarchy of triangles, items of the tree are indexes in the array of triangles
+    '''
+
+    def __init__(self, triangles: List[Triangle], aabb_delta=0.5, builder: str = "median", leaf_size: int = BVH_LEAF_SIZE):
+        '''Build the tree from array of triangles
 
         Input:
-            point - 3-triple (x, y, z)
+            triangles - array of Triangle objects
+            aabb_delta - aabbs of triangles are extended by this value
+            builder - median or sah, see BVHTree class for the description
+            leaf_size - the maximum number of triangles in the leaf for sah builder
+        '''
+        super().__init__()
+        self._triangles: List[Optional[Triangle]] = list(triangles)
+        self._free_triangles: List[int] = []  # indexes of removed triangles, used for new triangles
+        self._aabb_delta: float = aabb_delta
+        self._batch_arrays: Optional[Dict[str, Any]] = None  # numpy copies of arrays for batch queries, created at the first batch query
+        self._polygon_triangles: Optional[Dict[int, List[int]]] = None  # for each polygon indexes of it triangles, created at the first use
+        indexes: List[int] = list(range(len(self._triangles)))
+        self._build(indexes, {i: self._get_triangle_aabb(triangles[i]) for i in indexes}, {i: triangles[i].get_center() for i in indexes}, builder, leaf_size)
+
+    @staticmethod
+    def from_arrays(arrays: Dict[str, Any], aabb_delta=0.5) -> "TrianglesBVH":
+        '''Create the tree from arrays, returned by get_arrays method
+        values can be any objects with array interface, they are used without copy, Triangle objects are created at the first use
+        '''
+        bvh: TrianglesBVH = TrianglesBVH.__new__(TrianglesBVH)
+        BVHTree.__init__(bvh)
+        bvh._set_arrays(arrays)
+        bvh._triangles = TrianglesView(arrays["triangles"], arrays["triangle_polygons"])
+        bvh._free_triangles = []
+        bvh._aabb_delta = aabb_delta
+        bvh._batch_arrays = None
+        bvh._polygon_triangles = None
+        return bvh
+
+    def get_arrays(self) -> Dict[str, Any]:
+        '''Return plain arrays of the tree and also coordinates (9 values for each triangle) and polygons of triangles (-1 for removed triangles)
+        '''
+        arrays: Dict[str, Any] = super().get_arrays()
+        arrays["triangles"], arrays["triangle_polygons"] = self._get_triangles_arrays()
+        return arrays
+
+    def _get_triangles_arrays(self) -> Tuple[Any, Any]:
+        '''Return plain arrays with coordinates and polygons of triangles, coordinates of removed triangles are zeros
+        '''
+        if isinstance(self._triangles, TrianglesView):
+            return self._triangles.get_arrays()
+        coordinates: array = array("d")
+        polygons: array = array("i")
+        for triangle in self._triangles:
+            if triangle is None:
+                coordinates.extend((0.0,) * 9)
+                polygons.append(-1)
+            else:
+                coordinates.extend(triangle._v0 + triangle._v1 + triangle._v2)
+                polygons.append(triangle._polygon)
+        return (coordinates, polygons)
+
+    def _make_triangles_editable(self):
+        '''Replace the view of triangles, loaded from arrays, by the array of Triangle objects
+        '''
+        if isinstance(self._triangles, TrianglesView):
+            self._triangles = list(self._triangles)
+            self._free_triangles = [index for index, triangle in enumerate(self._triangles) if triangle is None]
+
+    def _get_triangle_aabb(self, triangle: Triangle) -> Tuple[float, float, float, float, float, float]:
+        '''Return aabb of the triangle, extended by aabb delta
+        '''
+        t_aabb = triangle.get_aabb()
+        delta: float = self._aabb_delta
+        return (t_aabb[0] - delta, t_aabb[1] - delta, t_aabb[2] - delta,
+                t_aabb[3] + delta, t_aabb[4] + delta, t_aabb[5] + delta)
+
+    def insert(self, triangle: Triangle):
+        '''Add the triangle to the tree without rebuilding
+        the triangle is placed near the leaf with minimal increase of the aabb area, aabbs of parent nodes are refitted
+        '''
+        self._make_triangles_editable()
+        if len(self._free_triangles) > 0:
+            index: int = self._free_triangles.pop()
+            self._triangles[index] = triangle
+        else:
+            index = len(self._triangles)
+            self._triangles.append(triangle)
+        self._insert_item(index, self._get_triangle_aabb(triangle))
+        self._batch_arrays = None
+        self._polygon_triangles = None
+
+    def remove(self, triangle: Triangle) -> bool:
+        '''Remove the triangle of the same polygon and with the same center
+        the empty leaf is replaced by it sibling, aabbs of parent nodes are refitted
 
         Output:
-            True or False
+            True if the triangle was found, False otherwise
         '''
-        return self._aabb[0] < point[0] and self._aabb[1] < point[1] and self._aabb[2] < point[2] and\
-            self._aabb[3] > point[0] and self._aabb[4] > point[1] and self._aabb[5] > point[2]
+        center: Tuple[float, float, float] = triangle.get_center()
 
-    def _union_aabbs(self, b1: Tuple[float, float, float, float, float, float],
-                     b2: Tuple[float, float, float, float, float, float]) -> Tuple[float, float, float, float, float, float]:
-        return (min(b1[0], b2[0]), min(b1[1], b2[1]), min(b1[2], b2[2]),
-                max(b1[3], b2[3]), max(b1[4], b2[4]), max(b1[5], b2[5]))
+        def is_triangle(index: int) -> bool:
+            other: Optional[Triangle] = self._triangles[index]
+            if other is None or other.get_polygon() != triangle.get_polygon():
+                return False
+            other_center: Tuple[float, float, float] = other.get_center()
+            return abs(other_center[0] - center[0]) + abs(other_center[1] - center[1]) + abs(other_center[2] - center[2]) < 0.00001
+        index: int = self._remove_item(center, is_triangle)
+        if index == -1:
+            return False
+        self._make_triangles_editable()
+        self._triangles[index] = None
+        self._free_triangles.append(index)
+        self._batch_arrays = None
+        self._polygon_triangles = None
+        return True
 
     def raycast(self, origin: Tuple[float, float, float], direction: Tuple[float, float, float]) -> Optional[Tuple[float, float, float]]:
-        if is_intersect_aabb(origin, direction, self._aabb):
-            if self._triangle is not None:
-                return self._triangle.raycast(origin, direction)
+        '''Return the closest to the origin intersection point of the ray with triangles or None, if there is no intersection
+        '''
+        hit: Optional[Tuple[Tuple[float, float, float], float, int]] = self.raycast_hit(origin, direction)
+        return hit[0] if hit is not None else None
+
+    def raycast_hit(self, origin: Tuple[float, float, float],
+                    direction: Tuple[float, float, float],
+                    max_distance: Optional[float] = None,
+                    any_hit: bool = False) -> Optional[Tuple[Tuple[float, float, float], float, int]]:
+        '''Find the intersection of the ray with triangles
+
+        Nodes are visited in the front-to-back order: the child with the smaller ray parameter at the aabb enter is visited at first,
+        and nodes, which the ray enters after the closest found intersection, are skipped
+
+        Input:
+            origin - the start point of the ray
+            direction - the direction of the ray, it can be non-normalized
+            max_distance - if defined, then only intersections closer than this distance to the origin are found
+            any_hit - if True, then return the first found intersection (not necessarily the closest one), it is enough for occlusion tests
+
+        Output:
+            3-tuple (intersection point, distance from the origin, polygon index of the triangle) or None, if there is no intersection
+        '''
+        direction_length: float = math.sqrt(direction[0]**2 + direction[1]**2 + direction[2]**2)
+        if direction_length < 0.000001:
+            return None
+        bounds: array = self._bounds
+        item_bounds: array = self._item_bounds
+        lefts: array = self._lefts
+        rights: array = self._rights
+        firsts: array = self._firsts
+        counts: array = self._counts
+        items: array = self._items
+        triangles: List[Optional[Triangle]] = self._triangles
+        best_t: float = float("inf") if max_distance is None else max_distance / direction_length
+        best_triangle: Optional[Triangle] = None
+        # the stack contains pairs (ray parameter at the node aabb enter, node)
+        stack: List[Tuple[float, int]] = []
+        root_t: float = self._get_ray_enter(bounds, 0, origin, direction, best_t)
+        if root_t >= 0.0 and not self._is_empty():
+            stack.append((root_t, 0))
+        while stack:
+            node_t, node = stack.pop()
+            if node_t > best_t:
+                continue
+            left: int = lefts[node]
+            if left == -1:
+                count: int = counts[node]
+                for k in range(firsts[node], firsts[node] + count):
+                    if count > 1 and self._get_ray_enter(item_bounds, k, origin, direction, best_t) < 0.0:
+                        continue
+                    triangle: Triangle = triangles[items[k]]
+                    t: Optional[float] = triangle.get_ray_parameter(origin, direction)
+                    if t is not None and t < best_t:
+                        best_t = t
+                        best_triangle = triangle
+                        if any_hit:
+                            stack.clear()
+                            break
             else:
-                if self._left is not None and self._right is not None:
-                    left_raycast: Optional[Tuple[float, float, float]] = self._left.raycast(origin, direction)
-                    right_raycast: Optional[Tuple[float, float, float]] = self._right.raycast(origin, direction)
-                    if left_raycast is None:
-                        return right_raycast
+                right: int = rights[node]
+                l_t: float = self._get_ray_enter(bounds, left, origin, direction, best_t)
+                r_t: float = self._get_ray_enter(bounds, right, origin, direction, best_t)
+                # the nearer child should be at the top of the stack
+                if l_t >= 0.0 and r_t >= 0.0:
+                    if l_t < r_t:
+                        stack.append((r_t, right))
+                        stack.append((l_t, left))
                     else:
-                        if right_raycast is None:
-                            return left_raycast
-                        else:
-                            # get distance from left and right points to the ray line
-                            left_dist_cross = cross((origin[0] - left_raycast[0], origin[1] - left_raycast[1], origin[2] - left_raycast[2]), direction)
-                            left_dist_sq = (left_dist_cross[0] * left_dist_cross[0] + left_dist_cross[1] * left_dist_cross[1] + left_dist_cross[2] * left_dist_cross[2]) / (direction[0] * direction[0] + direction[1] * direction[1] + direction[2] * direction[2])
-
-                            right_dist_cross = cross((origin[0] - right_raycast[0], origin[1] - right_raycast[1], origin[2] - right_raycast[2]), direction)
-                            right_dist_sq = (right_dist_cross[0] * right_dist_cross[0] + right_dist_cross[1] * right_dist_cross[1] + right_dist_cross[2] * right_dist_cross[2]) / (direction[0] * direction[0] + direction[1] * direction[1] + direction[2] * direction[2])
-
-                            if left_dist_sq < right_dist_sq:
-                                return left_raycast
-                            else:
-                                return right_raycast
-                else:
-                    if self._right is None:
-                        return self._left.raycast(origin, direction)
-                    else:
-                        return self._right.raycast(origin, direction)
-        else:
+                        stack.append((l_t, left))
+                        stack.append((r_t, right))
+                elif l_t >= 0.0:
+                    stack.append((l_t, left))
+                elif r_t >= 0.0:
+                    stack.append((r_t, right))
+        if best_triangle is None:
             return None
+        return ((origin[0] + best_t * direction[0], origin[1] + best_t * direction[1], origin[2] + best_t * direction[2]),
+                best_t * direction_length,
+                best_triangle.get_polygon())
 
-    def sample(self, point: Tuple[float, float, float], is_slow=False) -> Optional[Tuple[float, float, float]]:
+    def sample(self, point: Tuple[float, float, float], is_slow=False, max_distance: Optional[float] = None) -> Optional[Tuple[float, float, float]]:
         '''Return coordinates of the point, closest to the input one
         return None if it fails to find the closest point
 
         Input:
             point - 3-triple (x, y, z)
-            is_slow - True/Flase, if True then check all triangles, is False use aabb to skip tree branches
+            is_slow - True/Flase, if True then find the nearest point on all triangles (see get_nearest method),
+                      if False then check only triangles with aabb, which contains the point
+            max_distance - if defined, then find the nearest point on triangles closer than this distance, is_slow is ignored in this case
 
         Output:
             3-tuple or None
         '''
-        if self.is_inside_aabb(point) or is_slow:
-            if self._triangle is not None:
-                return self._triangle.get_closest_point(point)
+        if is_slow or max_distance is not None:
+            nearest: Optional[Tuple[Tuple[float, float, float], float, int]] = self.get_nearest(point, max_distance)
+            return nearest[0] if nearest is not None else None
+        x: float = point[0]
+        y: float = point[1]
+        z: float = point[2]
+        bounds: array = self._bounds
+        lefts: array = self._lefts
+        rights: array = self._rights
+        firsts: array = self._firsts
+        counts: array = self._counts
+        items: array = self._items
+        triangles: List[Optional[Triangle]] = self._triangles
+        to_return: Optional[Tuple[float, float, float]] = None
+        min_distance: float = 0.0
+        # children are checked before pushing into the stack, so the stack contains only nodes with the point inside
+        stack: List[int] = [0] if self._is_inside_node(0, point) else []
+        while stack:
+            node: int = stack.pop()
+            left: int = lefts[node]
+            if left == -1:
+                count: int = counts[node]
+                for k in range(firsts[node], firsts[node] + count):
+                    # aabb of the single item is the same as aabb of the leaf
+                    if count > 1 and not self._is_inside_item(k, point):
+                        continue
+                    closest: Tuple[float, float, float] = triangles[items[k]].get_closest_point(point)
+                    distance: float = (closest[0] - x)**2 + (closest[1] - y)**2 + (closest[2] - z)**2
+                    if to_return is None or distance <= min_distance:
+                        to_return = closest
+                        min_distance = distance
             else:
-                if self._left is not None and self._right is not None:
-                    left_sample: Optional[Tuple[float, float, float]] = self._left.sample(point, is_slow)
-                    right_sample: Optional[Tuple[float, float, float]] = self._right.sample(point, is_slow)
-                    if left_sample is None:
-                        return right_sample
-                    else:
-                        if right_sample is None:
-                            return left_sample
-                        else:
-                            # left and right samples are not None
-                            # choose the closest to the inupt point
-                            left_sq_distant = (left_sample[0] - point[0])**2 + (left_sample[1] - point[1])**2 + (left_sample[2] - point[2])**2
-                            right_sq_distant = (right_sample[0] - point[0])**2 + (right_sample[1] - point[1])**2 + (right_sample[2] - point[2])**2
-
-                            if left_sq_distant < right_sq_distant:
-                                return left_sample
-                            else:
-                                return right_sample
+                right: int = rights[node]
+                i: int = 6 * right
+                if bounds[i] < x and bounds[i + 3] > x and bounds[i + 2] < z and bounds[i + 5] > z and bounds[i + 1] < y and bounds[i + 4] > y:
+                    stack.append(right)
+                i = 6 * left
+                if bounds[i] < x and bounds[i + 3] > x and bounds[i + 2] < z and bounds[i + 5] > z and bounds[i + 1] < y and bounds[i + 4] > y:
+                    stack.append(left)
+        return to_return
+
+    def get_polygon_closest_point(self, point: Tuple[float, float, float], polygon: int) -> Optional[Tuple[float, float, float]]:
+        '''Return the point on triangles of the polygon, closest to the input one, or None, if there are no triangles of this polygon
+        '''
+        polygon_triangles: Optional[Dict[int, List[int]]] = self._polygon_triangles
+        if polygon_triangles is None:
+            polygon_triangles = {}
+            for index, triangle_polygon in enumerate(self._get_triangles_arrays()[1]):
+                if triangle_polygon > -1:
+                    polygon_triangles.setdefault(triangle_polygon, []).append(index)
+            self._polygon_triangles = polygon_triangles
+        to_return: Optional[Tuple[float, float, float]] = None
+        min_distance: float = 0.0
+        for index in polygon_triangles.get(polygon, []):
+            closest: Tuple[float, float, float] = self._triangles[index].get_closest_point(point)
+            distance: float = (closest[0] - point[0])**2 + (closest[1] - point[1])**2 + (closest[2] - point[2])**2
+            if to_return is None or distance < min_distance:
+                to_return = closest
+                min_distance = distance
+        return to_return
+
+    def get_nearest(self, point: Tuple[float, float, float], max_distance: Optional[float] = None) -> Optional[Tuple[Tuple[float, float, float], float, int]]:
+        '''Find the point on triangles, nearest to the input one
+
+        The tree is traversed by branch and bound: the nearer child is visited at first,
+        and nodes with the distance to aabb greater than the distance to the best found point are skipped
+        So, the time is close to logarithmic for any point, even far away from triangles
+
+        Input:
+            point - 3-triple (x, y, z)
+            max_distance - if defined, then only points closer than this distance are found
+
+        Output:
+            3-tuple (nearest point, distance, polygon index of the triangle) or None, if the tree is empty or there are no triangles closer than max_distance
+        '''
+        x: float = point[0]
+        y: float = point[1]
+        z: float = point[2]
+        bounds: array = self._bounds
+        item_bounds: array = self._item_bounds
+        lefts: array = self._lefts
+        rights: array = self._rights
+        firsts: array = self._firsts
+        counts: array = self._counts
+        items: array = self._items
+        triangles: List[Optional[Triangle]] = self._triangles
+        best_distance: float = float("inf") if max_distance is None else max_distance * max_distance
+        best_point: Optional[Tuple[float, float, float]] = None
+        best_triangle: Optional[Triangle] = None
+        # the stack contains pairs (squared distance to the node aabb, node)
+        stack: List[Tuple[float, int]] = [] if self._is_empty() else [(self._get_box_distance(bounds, 0, point), 0)]
+        while stack:
+            node_distance, node = stack.pop()
+            if node_distance >= best_distance:
+                continue
+            left: int = lefts[node]
+            if left == -1:
+                count: int = counts[node]
+                for k in range(firsts[node], firsts[node] + count):
+                    if count > 1 and self._get_box_distance(item_bounds, k, point) >= best_distance:
+                        continue
+                    triangle: Triangle = triangles[items[k]]
+                    closest: Tuple[float, float, float] = triangle.get_closest_point(point)
+                    distance: float = (closest[0] - x)**2 + (closest[1] - y)**2 + (closest[2] - z)**2
+                    if distance < best_distance:
+                        best_distance = distance
+                        best_point = closest
+                        best_triangle = triangle
+            else:
+                right: int = rights[node]
+                l_distance: float = self._get_box_distance(bounds, left, point)
+                r_distance: float = self._get_box_distance(bounds, right, point)
+                # the nearer child should be at the top of the stack
+                if l_distance < r_distance:
+                    if r_distance < best_distance:
+                        stack.append((r_distance, right))
+                    if l_distance < best_distance:
+                        stack.append((l_distance, left))
                 else:
-                    if self._right is None:
-                        # use left subtree
-                        return self._left.sample(point)
-                    else:
-                        # use right subtree
-                        return self._right.sample(point)
-        else:
+                    if l_distance < best_distance:
+                        stack.append((l_distance, left))
+                    if r_distance < best_distance:
+                        stack.append((r_distance, right))
+        if best_point is None or best_triangle is None:
             return None
+        return (best_point, math.sqrt(best_distance), best_triangle.get_polygon())
+
+    def sample_many(self, points: Any, is_slow: bool = False, max_distance: Optional[float] = None) -> Tuple[Any, Any]:
+        '''Find closest points for all input points, parameters are the same as in sample method
+
+        If numpy is installed, then all queries traverse the tree together: at each step the array of pairs (query, node) is filtered by aabbs
+        and replaced by pairs with children nodes, triangles of leafs are processed by vectorized calculations
+        Small batches (and all batches without numpy) are processed by scalar queries
+
+        Input:
+            points - numpy array with the shape (n, 3) or any sequence of 3-tuples
+
+        Output:
+            2-tuple (closest points, mask), mask is False for points without the answer (these points are (0.0, 0.0, 0.0))
+            with numpy these are arrays with shapes (n, 3) and (n, ), without numpy - lists of 3-tuples and bools
+        '''
+        if np is None or get_points_count(points) < BATCH_MIN_SIZE:
+            return pack_points([self.sample(point, is_slow, max_distance) for point in to_points_list(points)])
+        return self._sample_many_vectorized(to_points_array(points), is_slow or max_distance is not None, max_distance)
+
+    def raycast_many(self, origins: Any, directions: Any) -> Tuple[Any, Any]:
+        '''Find the closest intersections for all rays, each ray is the same as in raycast method
+
+        Input:
+            origins, directions - numpy arrays with the shape (n, 3) or any sequences of 3-tuples with the same length
+
+        Output:
+            2-tuple (intersection points, mask) in the same form as the output of sample_many method
+        '''
+        if np is None or get_points_count(origins) < BATCH_MIN_SIZE:
+            return pack_points([self.raycast(origin, direction) for origin, direction in zip(to_points_list(origins), to_points_list(directions))])
+        points, mask, _ = self._raycast_many_vectorized(to_points_array(origins), to_points_array(directions))
+        return (points, mask)
+
+    def raycast_hit_many(self, origins: Any, directions: Any) -> Tuple[Any, Any, Any]:
+        '''Find the closest intersections for all rays together with polygon indexes of intersected triangles
+
+        Output:
+            3-tuple (intersection points, mask, polygons), points and mask are the same as in raycast_many method,
+            polygons are -1 for rays without intersection
+            if numpy is installed, then polygons is the integer array with the shape (n, ), in other case it is the list
+        '''
+        if np is None or get_points_count(origins) < BATCH_MIN_SIZE:
+            hits: List[Optional[Tuple[Tuple[float, float, float], float, int]]] = [self.raycast_hit(origin, direction) for origin, direction in zip(to_points_list(origins), to_points_list(directions))]
+            points, mask = pack_points([hit[0] if hit is not None else None for hit in hits])
+            polygons: List[int] = [hit[2] if hit is not None else -1 for hit in hits]
+            return (points, mask, np.array(polygons, dtype=np.int64) if np is not None else polygons)
+        return self._raycast_many_vectorized(to_points_array(origins), to_points_array(directions))
+
+    def _get_batch_arrays(self) -> Dict[str, Any]:
+        '''Return numpy copies of tree arrays and vertices of triangles (rows of removed triangles are zeros)
+        '''
+        arrays: Optional[Dict[str, Any]] = self._batch_arrays
+        if arrays is None:
+            coordinates, polygons = self._get_triangles_arrays()
+            vertices = np.array(coordinates, dtype=np.float64).reshape(-1, 9)
+            arrays = {"bounds": np.array(self._bounds, dtype=np.float64).reshape(-1, 6),
+                      "item_bounds": np.array(self._item_bounds, dtype=np.float64).reshape(-1, 6),
+                      "lefts": np.array(self._lefts, dtype=np.int64),
+                      "rights": np.array(self._rights, dtype=np.int64),
+                      "firsts": np.array(self._firsts, dtype=np.int64),
+                      "counts": np.array(self._counts, dtype=np.int64),
+                      "items": np.array(self._items, dtype=np.int64),
+                      "v0": vertices[:, 0:3],
+                      "v1": vertices[:, 3:6],
+                      "v2": vertices[:, 6:9],
+                      "polygons": np.array(polygons, dtype=np.int64)}
+            arrays["e1"] = arrays["v1"] - arrays["v0"]
+            arrays["e2"] = arrays["v2"] - arrays["v0"]
+            self._batch_arrays = arrays
+        return arrays
+
+    def _sample_many_vectorized(self, points: Any, is_nearest: bool, max_distance: Optional[float]) -> Tuple[Any, Any]:
+        arrays: Dict[str, Any] = self._get_batch_arrays()
+        bounds = arrays["bounds"]
+        lefts = arrays["lefts"]
+        rights = arrays["rights"]
+        count: int = len(points)
+        best_distances = np.full(count, np.inf if max_distance is None else max_distance * max_distance)
+        best_points = np.zeros((count, 3))
+        found = np.zeros(count, dtype=bool)
+
+        def process_leafs(queries, leafs):
+            item_queries, positions = get_leaf_positions(queries, arrays["firsts"][leafs], arrays["counts"][leafs])
+            item_points = points[item_queries]
+            item_bounds = arrays["item_bounds"][positions]
+            valid = get_boxes_distances(item_points, item_bounds) < best_distances[item_queries] if is_nearest else is_inside_boxes(item_points, item_bounds)
+            item_queries = item_queries[valid]
+            triangles = arrays["items"][positions[valid]]
+            closest = get_closest_points(item_points[valid], arrays["v0"][triangles], arrays["v1"][triangles], arrays["v2"][triangles])
+            delta = closest - points[item_queries]
+            selected = update_best(best_distances, item_queries, np.einsum("ij,ij->i", delta, delta))
+            best_points[item_queries[selected]] = closest[selected]
+            found[item_queries[selected]] = True
+
+        queries = np.arange(count)
+        if is_nearest and not self._is_empty():
+            # at first descend to the nearest leaf for each query, it gives the upper bound of the distance for pruning
+            nodes = np.zeros(count, dtype=np.int64)
+            inner = np.nonzero(lefts[nodes] > -1)[0]
+            while inner.size > 0:
+                inner_lefts = lefts[nodes[inner]]
+                inner_rights = rights[nodes[inner]]
+                inner_points = points[inner]
+                nodes[inner] = np.where(get_boxes_distances(inner_points, bounds[inner_lefts]) <= get_boxes_distances(inner_points, bounds[inner_rights]), inner_lefts, inner_rights)
+                inner = inner[lefts[nodes[inner]] > -1]
+            process_leafs(queries, nodes)
+        nodes = np.zeros(count, dtype=np.int64)
+        while queries.size > 0:
+            valid = get_boxes_distances(points[queries], bounds[nodes]) < best_distances[queries] if is_nearest else is_inside_boxes(points[queries], bounds[nodes])
+            queries = queries[valid]
+            nodes = nodes[valid]
+            is_leaf = lefts[nodes] == -1
+            if is_leaf.any():
+                process_leafs(queries[is_leaf], nodes[is_leaf])
+            queries = queries[~is_leaf]
+            nodes = nodes[~is_leaf]
+            queries = np.concatenate((queries, queries))
+            nodes = np.concatenate((lefts[nodes], rights[nodes]))
+        return (best_points, found)
+
+    def _raycast_many_vectorized(self, origins: Any, directions: Any) -> Tuple[Any, Any, Any]:
+        arrays: Dict[str, Any] = self._get_batch_arrays()
+        bounds = arrays["bounds"]
+        lefts = arrays["lefts"]
+        rights = arrays["rights"]
+        count: int = len(origins)
+        best_t = np.full(count, np.inf)
+        best_triangles = np.full(count, -1, dtype=np.int64)
+
+        def process_leafs(queries, leafs):
+            item_queries, positions = get_leaf_positions(queries, arrays["firsts"][leafs], arrays["counts"][leafs])
+            valid = get_rays_enters(origins[item_queries], directions[item_queries], arrays["item_bounds"][positions], best_t[item_queries]) >= 0.0
+            item_queries = item_queries[valid]
+            triangles = arrays["items"][positions[valid]]
+            selected = update_best(best_t, item_queries, get_ray_parameters(origins[item_queries], directions[item_queries], arrays["v0"][triangles], arrays["e1"][triangles], arrays["e2"][triangles]))
+            best_triangles[item_queries[selected]] = triangles[selected]
+
+        queries = np.arange(count)
+        if not self._is_empty():
+            # at first descend to the leaf with the nearest aabb along each ray, it gives the upper bound of the ray parameter
+            nodes = np.zeros(count, dtype=np.int64)
+            active = np.nonzero((get_rays_enters(origins, directions, bounds[nodes], best_t) >= 0.0) & (lefts[nodes] > -1))[0]
+            while active.size > 0:
+                active_lefts = lefts[nodes[active]]
+                active_rights = rights[nodes[active]]
+                l_t = get_rays_enters(origins[active], directions[active], bounds[active_lefts], best_t[active])
+                r_t = get_rays_enters(origins[active], directions[active], bounds[active_rights], best_t[active])
+                is_left = (l_t >= 0.0) & ((r_t < 0.0) | (l_t <= r_t))
+                is_hit = is_left | (r_t >= 0.0)
+                nodes[active] = np.where(is_left, active_lefts, active_rights)
+                # rays, which miss both children, do not have the leaf
+                nodes[active[~is_hit]] = -1
+                active = active[is_hit]
+                active = active[lefts[nodes[active]] > -1]
+            is_leaf = nodes > -1
+            leaf_queries = queries[is_leaf]
+            leaf_queries = leaf_queries[lefts[nodes[leaf_queries]] == -1]
+            process_leafs(leaf_queries, nodes[leaf_queries])
+        nodes = np.zeros(count, dtype=np.int64)
+        while queries.size > 0:
+            valid = get_rays_enters(origins[queries], directions[queries], bounds[nodes], best_t[queries]) >= 0.0
+            queries = queries[valid]
+            nodes = nodes[valid]
+            is_leaf = lefts[nodes] == -1
+            if is_leaf.any():
+                process_leafs(queries[is_leaf], nodes[is_leaf])
+            queries = queries[~is_leaf]
+            nodes = nodes[~is_leaf]
+            queries = np.concatenate((queries, queries))
+            nodes = np.concatenate((lefts[nodes], rights[nodes]))
+        found = np.isfinite(best_t)
+        polygons = np.where(found, arrays["polygons"][np.maximum(best_triangles, 0)], -1)
+        return (np.where(found[:, None], origins + directions * np.where(found, best_t, 0.0)[:, None], 0.0), found, polygons)
+
+    def __repr__(self) -> str:
+        return "<triangles bvh nodes: " + str(self.get_nodes_count()) + ", aabb: " + str(self.get_aabb()) + ">"
 
 
 def polygons_to_triangles(vertices: List[Tuple[float, float, float]], polygons: List[List[int]]) -> List[Triangle]:
@@ -352,10 +757,10 @@ def polygons_to_triangles(vertices: List[Tuple[float, float, float]], polygons:
         array of Triangle objects
     '''
     triangles = []
-    for polygon in polygons:
+    for polygon_index, polygon in enumerate(polygons):
         size = len(polygon)
         if size >= 3:
             for i in range(1, size - 1):
-                triangles.append(Triangle([vertices[polygon[0]], vertices[polygon[i]], vertices[polygon[i + 1]]]))
+                triangles.append(Triangle([vertices[polygon[0]], vertices[polygon[i]], vertices[polygon[i + 1]]], polygon_index))
 
     return triangles
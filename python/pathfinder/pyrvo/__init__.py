@@ -78,6 +78,15 @@ def add_obstacle(simulator,
     else:
         return simulator.add_obstacle(vertices)
 
+def remove_obstacle(simulator, obstacle_index: int):
+    '''remove the obstacle from the simulation, obstacle_index is the value, returned by add_obstacle
+    after adding and removing obstacles process_obstacles should be called
+    '''
+    if IMPORT_BINARY:
+        raise NotImplementedError("remove obstacle is not implemented in binary RVO2 library")
+    else:
+        simulator.remove_obstacle(obstacle_index)
+
 def process_obstacles(simulator):
     if IMPORT_BINARY:
         simulator.processObstacles()
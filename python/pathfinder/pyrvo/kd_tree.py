@@ -53,6 +53,11 @@ class KDTree:
         self._agents = []
         self._agent_tree = []
         self._obstacle_tree = None
+        # obstacles are inserted into the built tree and removed from it without rebuilding
+        # removed obstacles are only deactivated, the tree is rebuilt when the half of it nodes are removed
+        self._obstacle_nodes_count: int = 0
+        self._removed_nodes_count: int = 0
+        self._new_obstacles: List[Obstacle] = []
 
     def build_agent_tree(self, force_update: bool):
         if force_update:
@@ -109,11 +114,98 @@ class KDTree:
     def build_obstacle_tree(self):
         self._delete_obstacle_tree(self._obstacle_tree)
         obstacles_count = self._sim.get_obstacles_count()
-        obstacles = [None] * obstacles_count
+        obstacles = []
         for i in range(obstacles_count):
-            obstacles[i] = self._sim.get_obstacle(i)
+            if self._sim.get_obstacle(i).get_is_active():
+                obstacles.append(self._sim.get_obstacle(i))
 
         self._obstacle_tree = self._build_obstacle_tree_recursive(obstacles)
+        # split obstacles are also added to the simulator
+        self._obstacle_nodes_count = len(obstacles) + self._sim.get_obstacles_count() - obstacles_count
+        self._removed_nodes_count = 0
+        self._new_obstacles = []
+
+    def add_obstacles(self, obstacles: List[Obstacle]):
+        '''Store obstacles, added to the simulator, they are inserted into the tree by update_obstacle_tree method
+        '''
+        self._new_obstacles.extend(obstacles)
+
+    def remove_obstacle(self, obstacle: Obstacle):
+        '''Deactivate all obstacles in the closed chain, started from the given obstacle (including obstacles, created by splits)
+        '''
+        new_ids = set(id(o) for o in self._new_obstacles)
+        current = obstacle
+        while True:
+            if current.get_is_active():
+                current.set_is_active(False)
+                if id(current) not in new_ids:
+                    self._removed_nodes_count += 1
+            current = current.get_next_obstacle()
+            if current is obstacle:
+                break
+
+    def update_obstacle_tree(self):
+        '''Insert new obstacles into the tree, the tree is built from scratch only at the first call and when there are too many removed obstacles
+        '''
+        if self._obstacle_tree is None or 2 * self._removed_nodes_count > self._obstacle_nodes_count:
+            self.build_obstacle_tree()
+        else:
+            for obstacle in self._new_obstacles:
+                if obstacle.get_is_active():
+                    self._obstacle_tree = self._insert_obstacle_recursive(self._obstacle_tree, obstacle)
+            self._new_obstacles = []
+
+    def _insert_obstacle_recursive(self, node: Optional[ObstacleTreeNode], obstacle: Obstacle) -> ObstacleTreeNode:
+        if node is None:
+            node = ObstacleTreeNode()
+            node.set_obstacle(obstacle)
+            self._obstacle_nodes_count += 1
+            return node
+        obstacle_i1 = node.get_obstacle()
+        obstacle_i2 = obstacle_i1.get_next_obstacle()
+        obstacle_j2 = obstacle.get_next_obstacle()
+        j1_left_of_i = left_of(obstacle_i1.get_point(), obstacle_i2.get_point(), obstacle.get_point())
+        j2_left_of_i = left_of(obstacle_i1.get_point(), obstacle_i2.get_point(), obstacle_j2.get_point())
+        if j1_left_of_i >= -RVO_EPSILON and j2_left_of_i >= -RVO_EPSILON:
+            node.set_left(self._insert_obstacle_recursive(node.get_left(), obstacle))
+        elif j1_left_of_i <= RVO_EPSILON and j2_left_of_i <= RVO_EPSILON:
+            node.set_right(self._insert_obstacle_recursive(node.get_right(), obstacle))
+        else:
+            new_obstacle = self._split_obstacle(obstacle_i1, obstacle_i2, obstacle, obstacle_j2)
+            if j1_left_of_i > 0.0:
+                node.set_left(self._insert_obstacle_recursive(node.get_left(), obstacle))
+                node.set_right(self._insert_obstacle_recursive(node.get_right(), new_obstacle))
+            else:
+                node.set_right(self._insert_obstacle_recursive(node.get_right(), obstacle))
+                node.set_left(self._insert_obstacle_recursive(node.get_left(), new_obstacle))
+        return node
+
+    def _split_obstacle(self, obstacle_i1: Obstacle, obstacle_i2: Obstacle, obstacle_j1: Obstacle, obstacle_j2: Obstacle) -> Obstacle:
+        '''Split obstacle j by the line of obstacle i, return new obstacle, which starts at the split point
+        '''
+        pi1 = obstacle_i1.get_point()
+        pi2 = obstacle_i2.get_point()
+        pj1 = obstacle_j1.get_point()
+        pj2 = obstacle_j2.get_point()
+        v1 = (pi2[0] - pi1[0], pi2[1] - pi1[1])
+        v12 = (pj1[0] - pi1[0], pj1[1] - pi1[1])
+        v22 = (pj1[0] - pj2[0], pj1[1] - pj2[1])
+        t: float = (v1[0]*v12[1] - v1[1]*v12[0]) / (v1[0]*v22[1] - v1[1]*v22[0])
+        split_point = (pj1[0] + t * (pj2[0] - pj1[0]), pj1[1] + t * (pj2[1] - pj1[1]))
+
+        new_obstacle = Obstacle()
+        new_obstacle.set_point(split_point)
+        new_obstacle.set_prev_obstacle(obstacle_j1)
+        new_obstacle.set_next_obstacle(obstacle_j2)
+        new_obstacle.set_is_convex_value(True)
+        new_obstacle.set_unit_dir_value(obstacle_j1.get_unit_dir())
+        new_obstacle.set_id(self._sim.get_obstacles_count())
+
+        self._sim.add_obstacle_object(new_obstacle)
+
+        obstacle_j1.set_next_obstacle(new_obstacle)
+        obstacle_j2.set_prev_obstacle(new_obstacle)
+        return new_obstacle
 
 
     def _build_obstacle_tree_recursive(self, obstacles: List[Optional[Obstacle]]):
@@ -185,28 +277,7 @@ class KDTree:
                             right_counter += 1
                         else:
                             # Split obstacle j
-                            pi1 = obstacle_i1.get_point()
-                            pi2 = obstacle_i2.get_point()
-                            pj1 = obstacle_j1.get_point()
-                            pj2 = obstacle_j2.get_point()
-                            v1 = (pi2[0] - pi1[0], pi2[1] - pi1[1])
-                            v12 = (pj1[0] - pi1[0], pj1[1] - pi1[1])
-                            v22 = (pj1[0] - pj2[0], pj1[1] - pj2[1])
-                            t: float = (v1[0]*v12[1] - v1[1]*v12[0]) / (v1[0]*v22[1] - v1[1]*v22[0])
-                            split_point = (pj1[0] + t * (pj2[0] - pj1[0]), pj1[1] + t * (pj2[1] - pj1[1]))
-
-                            new_obstacle = Obstacle()
-                            new_obstacle.set_point(split_point)
-                            new_obstacle.set_prev_obstacle(obstacle_j1)
-                            new_obstacle.set_next_obstacle(obstacle_j2)
-                            new_obstacle.set_is_convex_value(True)
-                            new_obstacle.set_unit_dir_value(obstacle_j1.get_unit_dir())
-                            new_obstacle.set_id(self._sim.get_obstacles_count())
-
-                            self._sim.add_obstacle_object(new_obstacle)
-
-                            obstacle_j1.set_next_obstacle(new_obstacle)
-                            obstacle_j2.set_prev_obstacle(new_obstacle)
+                            new_obstacle = self._split_obstacle(obstacle_i1, obstacle_i2, obstacle_j1, obstacle_j2)
 
                             if j1_left_of_i > 0.0:
                                 left_obstacles[left_counter] = obstacle_j1
@@ -267,7 +338,7 @@ class KDTree:
             p2 = obstacle_02.get_point()
             dist_sq_line: float = (agent_left_of_line**2) / abs_sq((p2[0] - p1[0], p2[1] - p1[1]))
             if dist_sq_line < range_square:
-                if agent_left_of_line < 0.0:
+                if agent_left_of_line < 0.0 and obstacle_01.get_is_active():
                     agent.insert_obstacle_neighbor(node.get_obstacle(), range_square)
                 self._query_obstacle_tree_recursive(agent, range_square, node.get_right() if agent_left_of_line >= 0.0 else node.get_left())
 
@@ -292,7 +363,8 @@ class KDTree:
                 return self._query_visibility_recursive(q1, q2, radius, node.get_left()) and (((q1_left_of_i**2) * inv_length_i >= radius**2 and (q2_left_of_i**2) * inv_length_i >= radius**2) or self._query_visibility_recursive(q1, q2, radius, node.get_right()))
             elif q1_left_of_i <= 0.0 and q2_left_of_i <= 0.0:
                 return self._query_visibility_recursive(q1, q2, radius, node.get_right()) and (((q1_left_of_i**2) * inv_length_i >= radius**2 and (q2_left_of_i**2) * inv_length_i >= radius**2) or self._query_visibility_recursive(q1, q2, radius, node.get_left()))
-            elif q1_left_of_i >= 0.0 and q2_left_of_i <= 0.0:
+            elif (q1_left_of_i >= 0.0 and q2_left_of_i <= 0.0) or not obstacle_01.get_is_active():
+                # removed obstacle is only the splitting line of the tree
                 return self._query_visibility_recursive(q1, q2, radius, node.get_left()) and self._query_visibility_recursive(q1, q2, radius, node.get_right())
             else:
                 point_01_left_of_q: float = left_of(q1, q2, obstacle_01.get_point())
@@ -11,6 +11,7 @@ class Obstacle:
         self._unit_dir = (0.0, 0.0)
 
         self._id = 0
+        self._is_active = True  # removed obstacles stay in the tree as splitting lines, but they are not used by queries
 
     def set_point(self, point: Tuple[float, float]):
         self._point = point
@@ -50,6 +51,12 @@ class Obstacle:
     def get_is_convex(self) -> bool:
         return self._is_convex
 
+    def set_is_active(self, is_active: bool):
+        self._is_active = is_active
+
+    def get_is_active(self) -> bool:
+        return self._is_active
+
     def set_id(self, id: int):
         self._id = id
 
@@ -66,11 +66,18 @@ class RVOSimulator:
 
                 obstacle.set_id(len(self._obstacles))
                 self._obstacles.append(obstacle)
+            self._kd_tree.add_obstacles(self._obstacles[obstacle_no:])
             return obstacle_no
                 
         else:
             return -1
 
+    def remove_obstacle(self, obstacle_no: int):
+        '''remove the obstacle, added by add_obstacle method (obstacle_no is the returned index), process_obstacles should be called after it
+        obstacle objects are not deleted, so indexes of other obstacles are not changed
+        '''
+        self._kd_tree.remove_obstacle(self._obstacles[obstacle_no])
+
     def compute_agent_obstacles_neighbors(self, agent, range_square: float):
         self._kd_tree.compute_obstacle_neighbors(agent, range_square)
 
@@ -148,7 +155,9 @@ class RVOSimulator:
         return self._obstacles[vertex_index].get_prev_obstacle().get_id()
 
     def process_obstacles(self):
-        self._kd_tree.build_obstacle_tree()
+        '''update the obstacles tree after adding or removing obstacles
+        '''
+        self._kd_tree.update_obstacle_tree()
 
     def query_visibility(self, start: Tuple[float, float], end: Tuple[float, float], radius: float = 0.0) -> bool:
         return self._kd_tree.query_visibility(start, end, radius)
@@ -1,8 +1,17 @@
 import unittest
+import os
+import tempfile
+import struct
+from unittest import mock
 
 from pathfinder.navmesh.navmesh_triangle import Triangle, TrianglesBVH, polygons_to_triangles, cross, dot
 from pathfinder.navmesh import Navmesh
 from pathfinder.navmesh.navmesh_graph import NavmeshGraph
+from pathfinder.navmesh.navmesh_data import NavmeshData
+from pathfinder.navmesh.navmesh_bvh import NavmeshBVH
+from pathfinder.navmesh.navmesh_grid import NavmeshGrid
+from pathfinder import PathFinder, PathQueryPool, TiledNavmesh, write_tiles
+import pathfinder.pyrvo as rvo
 
 
 class TestTriangle(unittest.TestCase):
@@ -47,6 +56,24 @@ class TestTriangleBVH(unittest.TestCase):
         tree = TrianglesBVH(triangles, aabb_delta=1.0)
         self.assertEqual(tree.sample((1.5, 0.0, 0.5), is_slow=False), (1.0, 0.0, 0.5))
 
+    def test_nearest(self):
+        # two floors of triangles, compare with the closest point from all triangles
+        vertices = [(float(i), y, float(j)) for y in (0.0, 1.5) for i in range(6) for j in range(6)]
+        polygons = [[36 * k + 6 * i + j, 36 * k + 6 * i + j + 1, 36 * k + 6 * (i + 1) + j + 1, 36 * k + 6 * (i + 1) + j] for k in range(2) for i in range(5) for j in range(5) if (i * j + k) % 4 != 1]
+        triangles = polygons_to_triangles(vertices, polygons)
+        for builder in ("median", "sah"):
+            tree = TrianglesBVH(triangles, builder=builder)
+            for point in [(x * 1.7 - 3.0, y, z * 1.3 - 2.0) for x in range(7) for y in (-2.0, 0.7, 4.0) for z in range(8)]:
+                distances = [sum((a - b)**2 for a, b in zip(t.get_closest_point(point), point)) for t in triangles]
+                closest, distance, polygon = tree.get_nearest(point)
+                self.assertAlmostEqual(distance**2, min(distances))
+                self.assertAlmostEqual(sum((a - b)**2 for a, b in zip(closest, point)), min(distances))
+                self.assertIn(polygon, [t.get_polygon() for t, d in zip(triangles, distances) if abs(d - min(distances)) < 0.000001])
+                self.assertEqual(tree.sample(point, is_slow=True), closest)
+                self.assertIsNone(tree.get_nearest(point, max_distance=distance - 0.01))
+                self.assertEqual(tree.sample(point, max_distance=distance + 0.01), closest)
+        self.assertIsNone(TrianglesBVH([]).get_nearest((0.0, 0.0, 0.0)))
+
 
 class TestBuildTriangles(unittest.TestCase):
     def test_build_triangles_01(self):
@@ -150,6 +177,64 @@ class TestTrianglesBVHRaycast(unittest.TestCase):
         direction = (0.0, -1.0, 0.0)
         self.assertEqual(tree.raycast(origin, direction), None)
 
+    def test_raycast_hit(self):
+        # two floors, the ray from above hits the upper floor at first
+        vertices = [(float(i), y, float(j)) for y in (0.0, 1.5) for i in range(6) for j in range(6)]
+        polygons = [[36 * k + 6 * i + j, 36 * k + 6 * i + j + 1, 36 * k + 6 * (i + 1) + j + 1, 36 * k + 6 * (i + 1) + j] for k in range(2) for i in range(5) for j in range(5) if (i * j + k) % 4 != 1]
+        triangles = polygons_to_triangles(vertices, polygons)
+        for builder in ("median", "sah"):
+            tree = TrianglesBVH(triangles, builder=builder)
+            for origin, direction in [((x + 0.3, 4.0, z + 0.6), (0.1 * x - 0.2, -2.0, 0.3 - 0.1 * z)) for x in range(5) for z in range(5)] + [((-1.0, 0.7, 2.2), (1.0, 0.1, 0.0)), ((2.5, -1.0, 2.5), (0.0, 1.0, 0.0))]:
+                hits = [t.get_ray_parameter(origin, direction) for t in triangles]
+                ts = [t for t in hits if t is not None]
+                hit = tree.raycast_hit(origin, direction)
+                if len(ts) == 0:
+                    self.assertIsNone(hit)
+                    self.assertIsNone(tree.raycast_hit(origin, direction, any_hit=True))
+                    continue
+                length = sum(d * d for d in direction)**0.5
+                self.assertAlmostEqual(hit[1], min(ts) * length)
+                self.assertIn(hit[2], [t.get_polygon() for t, h in zip(triangles, hits) if h is not None and abs(h - min(ts)) < 0.000001])
+                self.assertEqual(tree.raycast(origin, direction), hit[0])
+                self.assertIsNotNone(tree.raycast_hit(origin, direction, any_hit=True))
+                self.assertIsNone(tree.raycast_hit(origin, direction, max_distance=hit[1] - 0.01))
+                self.assertEqual(tree.raycast_hit(origin, direction, max_distance=hit[1] + 0.01), hit)
+        self.assertIsNone(TrianglesBVH([]).raycast_hit((0.0, 1.0, 0.0), (0.0, -1.0, 0.0)))
+
+
+class TestBatchQueries(unittest.TestCase):
+    def test_batch_queries(self):
+        vertices = [(float(i), y, float(j)) for y in (0.0, 1.5) for i in range(6) for j in range(6)]
+        polygons = [[36 * k + 6 * i + j, 36 * k + 6 * i + j + 1, 36 * k + 6 * (i + 1) + j + 1, 36 * k + 6 * (i + 1) + j] for k in range(2) for i in range(5) for j in range(5) if (i * j + k) % 4 != 1]
+        triangles = polygons_to_triangles(vertices, polygons)
+        # batches are larger than the minimal size, so with numpy queries are vectorized
+        points = [(0.37 * i % 7.0 - 1.0, 0.23 * i % 3.0 - 0.5, 0.61 * i % 7.0 - 1.0) for i in range(120)]
+        directions = [(0.05 * (i % 5) - 0.1, -1.0 if i % 3 else 0.3, 0.1 - 0.04 * (i % 6)) for i in range(120)]
+        for builder in ("median", "sah"):
+            tree = TrianglesBVH(triangles, builder=builder)
+            for is_slow, max_distance in [(False, None), (True, None), (False, 0.4)]:
+                expected = [tree.sample(p, is_slow, max_distance) for p in points]
+                self._check_batch(tree.sample_many(points, is_slow, max_distance), expected)
+            self._check_batch(tree.raycast_many(points, directions), [tree.raycast(o, d) for o, d in zip(points, directions)])
+            hits = [tree.raycast_hit(o, d) for o, d in zip(points, directions)]
+            hit_points, mask, hit_polygons = tree.raycast_hit_many(points, directions)
+            self._check_batch((hit_points, mask), [h[0] if h is not None else None for h in hits])
+            self.assertEqual([int(p) for p in hit_polygons], [h[2] if h is not None else -1 for h in hits])
+            self._check_batch(tree.sample_many(points[:3]), [tree.sample(p) for p in points[:3]])
+        navmesh = Navmesh(vertices, polygons)
+        self._check_batch(navmesh.sample_many(points, True), [navmesh.sample(p, True) for p in points])
+        pathfinder = PathFinder(vertices, polygons)
+        self._check_batch(pathfinder.raycast_many(points, directions), [pathfinder.raycast(o, d) for o, d in zip(points, directions)])
+        self._check_batch(PathFinder().sample_many(points), [None] * len(points))
+
+    def _check_batch(self, batch, expected):
+        batch_points, mask = batch
+        self.assertEqual(len(batch_points), len(expected))
+        self.assertEqual([bool(m) for m in mask], [p is not None for p in expected])
+        for point, expected_point in zip(batch_points, expected):
+            for a, b in zip(point, expected_point if expected_point is not None else (0.0, 0.0, 0.0)):
+                self.assertAlmostEqual(float(a), b)
+
 
 class TestGraph(unittest.TestCase):
     def test_search_01(self):
@@ -198,6 +283,31 @@ class TestGraph(unittest.TestCase):
         self.assertEqual(graph.search(1, 3), [1, 0, 4, 3])
         self.assertEqual(graph.search(5, 3), [5, 2, 3])
 
+    def test_search_reuse(self):
+        vertices = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (2.0, 0.0, 0.0), (5.0, 0.0, 0.0), (6.0, 0.0, 0.0)]
+        names = [0, 1, 2, 3, 4]
+        edges = [(0, 1), (1, 2), (3, 4)]
+        graph = NavmeshGraph(vertices, names, edges)
+        self.assertEqual(graph.search(0, 2), [0, 1, 2])
+        self.assertEqual(graph.search(0, 4), [])
+        self.assertEqual(graph.search(2, 0), [2, 1, 0])
+        self.assertEqual(graph.search(4, 3), [4, 3])
+
+    def test_shortest_tree(self):
+        vertices = [(-2.0, 0.0, 0.0),
+                    (-1.0, 0.0, -1.0),
+                    (-1.0, 0.0, 1.0),
+                    (1.0, 0.0, -1.0),
+                    (1.0, 0.0, 1.0),
+                    (2.0, 0.0, 0.0)]
+        names = [1, 5, 0, 2, 4, 3]
+        edges = [(1, 0), (1, 5), (0, 4), (5, 2), (4, 3), (2, 3), (0, 2), (5, 4)]
+        graph = NavmeshGraph(vertices, names, edges)
+        distances, next_vertices = graph.shortest_tree(3)
+        self.assertEqual(graph.tree_path(next_vertices, 0), [0, 4, 3])
+        self.assertEqual(graph.tree_path(next_vertices, 5), [5, 2, 3])
+        self.assertAlmostEqual(distances[2], 2.0 + 2.0**0.5)  # distances use the order of vertex names
+
     def test_collect_01(self):
         vertices = [(-2.0, 0.0, 0.0),
                     (-1.0, 0.0, -1.0),
@@ -223,6 +333,152 @@ class TestGraph(unittest.TestCase):
         self.assertEqual(graph.collect_pathes(min_path, 1.1), [[0, 1, 3], [0, 2, 3]])
 
 
+class TestNavmeshData(unittest.TestCase):
+    def test_arrays(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6]]
+        navmesh = Navmesh(vertices, polygons)
+        data = navmesh._data
+        self.assertEqual(data.get_polygons_count(), 4)
+        self.assertEqual(data.get_polygon(2), [3, 5, 6, 2])
+        self.assertAlmostEqual(data.get_center(0)[2], -2.275)
+        self.assertEqual(data.get_neighbors(0), [1, 2])
+        self.assertEqual(data.get_portal(0, 2), ((1.4, 0.0, -1.6), (3.2, 0.0, -3.1)))
+        self.assertEqual(data.get_portal(2, 0), ((3.2, 0.0, -3.1), (1.4, 0.0, -1.6)))
+        self.assertEqual([data.get_group(i) for i in range(4)], [0, 0, 0, 0])
+        self.assertTrue(data.is_point_inside(0, (0.0, 0.0, -2.0)))
+        self.assertFalse(data.is_point_inside(0, (0.0, 0.0, 0.0)))
+        bvh = NavmeshBVH(data)
+        self.assertEqual(bvh.sample((0.0, 0.0, 2.0)), 3)
+        self.assertEqual(bvh.sample((0.0, 0.0, 0.0)), -1)
+        self.assertEqual(navmesh.sample_polygon((0.0, 0.0, 2.0)).get_polygon(), [7, 1, 2, 6])
+
+    def test_bvh(self):
+        # two layers of squares, the upper layer is close to the lower one, so points are inside aabbs of both layers
+        vertices = [(float(i), 0.0, float(j)) for i in range(4) for j in range(4)] + [(float(i), 0.2, float(j)) for i in range(4) for j in range(4)]
+        polygons = [[4 * i + j + k, 4 * i + j + k + 1, 4 * (i + 1) + j + k + 1, 4 * (i + 1) + j + k] for k in (0, 16) for i in range(3) for j in range(3)]
+        data = NavmeshData(vertices, polygons)
+        bvh = NavmeshBVH(data)
+        self.assertEqual(bvh.get_nodes_count(), 2 * len(polygons) - 1)
+        self.assertEqual(bvh.get_aabb(), (-0.5, -0.5, -0.5, 3.5, 0.7, 3.5))
+        self.assertEqual(bvh.sample((0.5, 0.05, 0.5)), 0)
+        self.assertEqual(bvh.sample((0.5, 0.15, 0.5)), 9)
+        self.assertEqual(bvh.sample((2.5, 0.15, 1.5)), 16)
+        self.assertEqual(bvh.sample((5.0, 0.0, 0.5)), -1)
+        # the tree from arrays is the same
+        copy = NavmeshBVH.from_arrays(data, {name: values[:] for name, values in bvh.get_arrays().items()})
+        self.assertEqual([copy.sample((x + 0.5, 0.15, z + 0.5)) for x in range(3) for z in range(3)], list(range(9, 18)))
+        # remove the upper layer and add it back
+        for polygon in range(9, 18):
+            self.assertTrue(copy.remove(polygon))
+        self.assertFalse(copy.remove(9))
+        self.assertEqual(copy.sample((0.5, 0.15, 0.5)), 0)
+        self.assertEqual(copy.get_nodes_count(), 17)
+        for polygon in range(9, 18):
+            copy.insert(polygon)
+        self.assertEqual(copy.get_nodes_count(), bvh.get_nodes_count())
+        self.assertEqual(len(copy.get_arrays()["lefts"]), len(bvh.get_arrays()["lefts"]))
+        self.assertEqual([copy.sample((x + 0.5, 0.15, z + 0.5)) for x in range(3) for z in range(3)], list(range(9, 18)))
+        empty = NavmeshBVH(data, [])
+        self.assertEqual(empty.sample((0.5, 0.0, 0.5)), -1)
+        empty.insert(4)
+        self.assertEqual(empty.sample((1.5, 0.0, 1.5)), 4)
+
+    def test_bvh_sah(self):
+        # three floors of squares with holes
+        vertices = [(float(i), y, float(j)) for y in (0.0, 0.3, 2.0) for i in range(9) for j in range(9)]
+        polygons = [[81 * k + 9 * i + j, 81 * k + 9 * i + j + 1, 81 * k + 9 * (i + 1) + j + 1, 81 * k + 9 * (i + 1) + j] for k in range(3) for i in range(8) for j in range(8) if (i + j + k) % 5 != 0]
+        data = NavmeshData(vertices, polygons)
+        median = NavmeshBVH(data)
+        sah = NavmeshBVH(data, builder="sah", leaf_size=4)
+        self.assertEqual(sah.get_aabb(), median.get_aabb())
+        points = [(x + 0.25 * t, y, z + 0.5) for x in range(8) for z in range(8) for y in (0.01, 0.31, 2.01) for t in (1, 3)]
+        self.assertEqual([sah.sample(p) for p in points], [median.sample(p) for p in points])
+        # the same as the brute force search of the closest polygon by the plane distance
+        for p in points:
+            inside = [(abs(sum((p[a] - data.get_center(i)[a]) * data.get_normal(i)[a] for a in range(3))), i) for i in range(len(polygons)) if data.is_point_inside(i, p) and abs(p[1] - data.get_center(i)[1]) < 0.5]
+            self.assertEqual(median.sample(p), min(inside)[1] if len(inside) > 0 else -1)
+        median_report = median.get_quality_report(points)
+        sah_report = sah.get_quality_report(points)
+        self.assertEqual(median_report["average_leaf_size"], 1.0)
+        self.assertLessEqual(sah_report["average_leaf_size"], 4.0)
+        self.assertLess(sah_report["nodes"], median_report["nodes"])
+        self.assertLess(sah_report["visited_nodes"], median_report["visited_nodes"])
+        # edits of the tree with several polygons in leafs
+        for polygon in range(0, len(polygons), 3):
+            self.assertTrue(sah.remove(polygon))
+            median.remove(polygon)
+        self.assertEqual([sah.sample(p) for p in points], [median.sample(p) for p in points])
+        for polygon in range(0, len(polygons), 3):
+            sah.insert(polygon)
+        expected = [NavmeshBVH(data).sample(p) for p in points]
+        self.assertEqual([sah.sample(p) for p in points], expected)
+        # triangles tree returns the same points
+        triangles = polygons_to_triangles(vertices, polygons)
+        triangles_median = TrianglesBVH(triangles)
+        triangles_sah = TrianglesBVH(triangles, builder="sah")
+        for point in points:
+            a = triangles_median.sample(point)
+            b = triangles_sah.sample(point)
+            self.assertEqual(a is None, b is None)
+            if a is not None:
+                self.assertAlmostEqual(sum((a[i] - point[i])**2 for i in range(3)), sum((b[i] - point[i])**2 for i in range(3)))
+            self.assertIsNotNone(triangles_sah.raycast((point[0], 3.0, point[2]), (0.0, -1.0, 0.0)))
+        self.assertLess(triangles_sah.get_quality_report(points)["visited_nodes"], triangles_median.get_quality_report(points)["visited_nodes"])
+        with self.assertRaises(ValueError):
+            NavmeshBVH(data, builder="octree")
+        # the tree is stored in the snapshot with leafs
+        navmesh = Navmesh(vertices, polygons, bvh_builder="sah")
+        report = navmesh.get_bvh_quality_report(points)
+        self.assertEqual(set(report.keys()), set(["bvh", "triangles_bvh"]))
+        self.assertEqual(report["bvh"]["nodes"], sah_report["nodes"])
+        file_path = os.path.join(tempfile.mkdtemp(), "navmesh.snapshot")
+        navmesh.save_snapshot(file_path)
+        loaded = Navmesh.load_snapshot(file_path)
+        self.assertEqual(loaded.get_bvh_quality_report(points)["bvh"], report["bvh"])
+        self.assertEqual([loaded._bvh.sample(p) for p in points], expected)
+        del loaded
+
+
+    def test_grid(self):
+        # three floors of squares with holes, the grid returns the same polygons as the bvh
+        vertices = [(float(i), y, float(j)) for y in (0.0, 0.3, 2.0) for i in range(9) for j in range(9)]
+        polygons = [[81 * k + 9 * i + j, 81 * k + 9 * i + j + 1, 81 * k + 9 * (i + 1) + j + 1, 81 * k + 9 * (i + 1) + j] for k in range(3) for i in range(8) for j in range(8) if (i + j + k) % 5 != 0]
+        data = NavmeshData(vertices, polygons)
+        tree = NavmeshBVH(data)
+        grid = NavmeshGrid(data)
+        self.assertEqual(grid.get_quality_report([])["cell_size"], 1.0)
+        points = [(x + 0.25 * t, y, z + 0.5) for x in range(-1, 9) for z in range(8) for y in (0.01, 0.31, 2.01, 5.0) for t in (1, 3)]
+        self.assertEqual([grid.sample(p) for p in points], [tree.sample(p) for p in points])
+        # floors above the point are skipped
+        self.assertLess(grid.get_quality_report([(4.5, 0.01, 4.5)])["visited_items"], grid.get_quality_report([(4.5, 2.01, 4.5)])["visited_items"])
+        for polygon in range(0, len(polygons), 3):
+            self.assertTrue(grid.remove(polygon))
+            tree.remove(polygon)
+        self.assertFalse(grid.remove(0))
+        self.assertEqual([grid.sample(p) for p in points], [tree.sample(p) for p in points])
+        for polygon in range(0, len(polygons), 3):
+            grid.insert(polygon)
+        tree = NavmeshBVH(data)
+        self.assertEqual([grid.sample(p) for p in points], [tree.sample(p) for p in points])
+        self.assertEqual([NavmeshGrid.from_arrays(data, grid.get_arrays()).sample(p) for p in points], [grid.sample(p) for p in points])
+        with self.assertRaises(ValueError):
+            NavmeshGrid(data, cell_size=0.0)
+        # the navmesh with the grid, the new polygon outside of the grid and the snapshot
+        navmesh = Navmesh(vertices, polygons, polygons_index="grid")
+        self.assertEqual(navmesh.sample_polygon((0.5, 0.01, 1.5)).get_index(), Navmesh(vertices, polygons).sample_polygon((0.5, 0.01, 1.5)).get_index())
+        new_polygon = navmesh.add_polygons([(8.0, 0.0, 0.0), (10.0, 0.0, 0.0), (10.0, 0.0, 1.0)], [[243, 8, 245, 244]])[0]
+        self.assertEqual(navmesh.sample_polygon((9.0, 0.0, 0.5)).get_index(), new_polygon)
+        file_path = os.path.join(tempfile.mkdtemp(), "navmesh.snapshot")
+        navmesh.save_snapshot(file_path)
+        loaded = Navmesh.load_snapshot(file_path)
+        self.assertIsInstance(loaded._bvh, NavmeshGrid)
+        self.assertEqual([loaded._bvh.sample(p) for p in points], [navmesh._bvh.sample(p) for p in points])
+        del loaded
+        with self.assertRaises(ValueError):
+            Navmesh(vertices, polygons, polygons_index="octree")
+
+
 class TestNavmesh(unittest.TestCase):
     def test_search_path(self):
         vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
@@ -232,6 +488,562 @@ class TestNavmesh(unittest.TestCase):
         self.assertEqual(navmesh.search_path((-2.0, 0.0, -2.5), (-2.0, 0.0, 2.5), 1.1), [(-2.0, 0.0, -2.5), (-2.0, 0.0, 2.5)])
         self.assertEqual(navmesh.search_path((-2.0, 0.0, -2.5), (-2.0, 0.0, 2.5)), [(-2.0, 0.0, -2.5), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-2.0, 0.0, 2.5)])
 
+    def test_locate_from_hint(self):
+        # grid 8 x 8 with the wall in the middle, so some walks come to the boundary and use the bvh
+        n = 9
+        vertices = [(float(i), 0.0, float(j)) for i in range(n) for j in range(n)]
+        polygons = [[n * i + j, n * i + j + 1, n * (i + 1) + j + 1, n * (i + 1) + j] for i in range(n - 1) for j in range(n - 1) if i != 4 or j == 7]
+        navmesh = Navmesh(vertices, polygons)
+        points = [(0.35 + 0.9 * i, 0.0, 0.45 + 0.7 * j) for i in range(9) for j in range(11)]
+        for hint in [-1, 0, 20, len(polygons) - 1]:
+            for point in points:
+                node = navmesh.sample_polygon(point)
+                self.assertEqual(navmesh.locate_from_hint(point, hint), node.get_index() if node is not None else -1)
+        # the walk is limited, but the bvh finds the polygon
+        self.assertEqual(navmesh.locate_from_hint((7.5, 0.0, 7.5), 0, max_steps=2), navmesh.sample_polygon((7.5, 0.0, 7.5)).get_index())
+        self.assertEqual(navmesh.sample_from_hint((0.5, 0.3, 0.5), 1), ((0.5, 0.0, 0.5), 0))
+        self.assertEqual(navmesh.sample_from_hint((-0.2, 0.0, 0.5), 0), ((0.0, 0.0, 0.5), -1))
+        navmesh.disable_polygons([0])
+        self.assertEqual(navmesh.locate_from_hint((0.5, 0.0, 0.5), 0), -1)
+        self.assertEqual(navmesh.locate_from_hint((1.5, 0.0, 0.5), 0), navmesh.sample_polygon((1.5, 0.0, 0.5)).get_index())
+
+    def test_move_along_surface(self):
+        # sloped grid 8 x 8 with the wall in the middle
+        n = 9
+        vertices = [(float(i), 0.1 * i, float(j)) for i in range(n) for j in range(n)]
+        polygons = [[n * i + j, n * i + j + 1, n * (i + 1) + j + 1, n * (i + 1) + j] for i in range(n - 1) for j in range(n - 1) if i != 4 or j == 7]
+        navmesh = Navmesh(vertices, polygons)
+        start = (3.5, 0.0, 3.5)
+        polygon = navmesh.sample_polygon(start).get_index()
+        position, end_polygon = navmesh.move_along_surface(polygon, start, (2.5, 0.0, 2.7))
+        self.assertEqual(end_polygon, navmesh.sample_polygon((2.5, 0.25, 2.7)).get_index())
+        self.assertAlmostEqual(position[0], 2.5)
+        self.assertAlmostEqual(position[1], 0.25)
+        self.assertAlmostEqual(position[2], 2.7)
+        # the move to the wall slides along it
+        position, end_polygon = navmesh.move_along_surface(polygon, start, (4.6, 0.0, 3.9))
+        self.assertEqual(end_polygon, polygon)
+        self.assertAlmostEqual(position[0], 4.0)
+        self.assertAlmostEqual(position[1], 0.4)
+        self.assertAlmostEqual(position[2], 3.9)
+        position, end_polygon = navmesh.move_along_surface(0, (0.5, 0.0, 0.5), (-1.0, 0.0, 0.5))
+        self.assertEqual((position, end_polygon), ((0.0, 0.0, 0.5), 0))
+        # the number of visited polygons is limited
+        self.assertEqual(navmesh.move_along_surface(0, (0.5, 0.0, 0.5), (0.5, 0.0, 5.5)), ((0.5, 0.05, 5.5), 5))
+        self.assertEqual(navmesh.move_along_surface(0, (0.5, 0.0, 0.5), (0.5, 0.0, 5.5), max_polygons=3), ((0.0, 0.0, 2.0), 1))
+        self.assertIsNone(navmesh.move_along_surface(-1, start, start))
+
+    def test_walkability_raycast(self):
+        # sloped grid 8 x 8 with the wall in the middle and the passage at the top
+        n = 9
+        vertices = [(float(i), 0.1 * i, float(j)) for i in range(n) for j in range(n)]
+        polygons = [[n * i + j, n * i + j + 1, n * (i + 1) + j + 1, n * (i + 1) + j] for i in range(n - 1) for j in range(n - 1) if i != 4 or j == 7]
+        navmesh = Navmesh(vertices, polygons)
+        start = (3.5, 0.35, 3.5)
+        polygon = navmesh.sample_polygon(start).get_index()
+        is_hit, t, edge, hit_polygon = navmesh.walkability_raycast(start, (5.5, 0.0, 3.5))
+        self.assertTrue(is_hit)
+        self.assertAlmostEqual(t, 0.25)
+        self.assertEqual(sorted(edge), [(4.0, 0.4, 3.0), (4.0, 0.4, 4.0)])
+        self.assertEqual(hit_polygon, polygon)
+        # the segment through the passage
+        end = (5.5, 0.55, 7.5)
+        self.assertEqual(navmesh.walkability_raycast((3.5, 0.35, 7.5), end), (False, 1.0, None, navmesh.sample_polygon(end).get_index()))
+        self.assertFalse(navmesh.walkability_raycast(start, (0.5, 0.0, 7.2), polygon)[0])
+        self.assertEqual(navmesh.walkability_raycast((0.5, 0.05, 0.5), (-1.0, 0.0, 0.5), 0), (True, 1.0 / 3.0, ((0.0, 0.0, 0.0), (0.0, 0.0, 1.0)), 0))
+        self.assertIsNone(navmesh.walkability_raycast((10.5, 0.0, 0.5), (1.0, 0.0, 0.5)))
+        # with the clearance the segment should be far from wall corners, but not from inner vertices
+        self.assertFalse(navmesh.walkability_raycast((3.5, 0.35, 7.5), end, clearance=0.4)[0])
+        self.assertTrue(navmesh.walkability_raycast((3.5, 0.35, 7.5), end, clearance=0.6)[0])
+        self.assertFalse(navmesh.walkability_raycast((0.5, 0.05, 2.5), (3.5, 0.0, 2.5), clearance=0.6)[0])
+
+    def test_get_height(self):
+        # sloped grid 8 x 8 and the flat floor 2 x 2 above it
+        n = 9
+        vertices = [(float(i), 0.1 * i, float(j)) for i in range(n) for j in range(n)] + [(0.0, 5.0, 0.0), (0.0, 5.0, 2.0), (2.0, 5.0, 2.0), (2.0, 5.0, 0.0)]
+        polygons = [[n * i + j, n * i + j + 1, n * (i + 1) + j + 1, n * (i + 1) + j] for i in range(n - 1) for j in range(n - 1)] + [[n * n, n * n + 1, n * n + 2, n * n + 3]]
+        navmesh = Navmesh(vertices, polygons)
+        self.assertAlmostEqual(navmesh.get_height(2.3, 4.6), 0.23)
+        self.assertAlmostEqual(navmesh.get_height(7.9, 0.1, hint_polygon=0), 0.79)
+        self.assertIsNone(navmesh.get_height(9.5, 4.0))
+        # without the hint the upper level is used
+        self.assertAlmostEqual(navmesh.get_height(1.5, 1.5), 5.0)
+        self.assertAlmostEqual(navmesh.get_height(1.5, 1.5, hint_polygon=0), 0.15)
+        # batch variant returns the same heights and polygons, which can be used as hints
+        points = [(0.13 + 0.79 * i, 0.07 + 0.71 * j) for i in range(12) for j in range(12)]
+        heights, found = navmesh.get_heights(points)
+        for (x, z), height, polygon in zip(points, heights, found):
+            expected = navmesh.get_height(x, z)
+            if expected is None:
+                self.assertEqual(polygon, -1)
+            else:
+                self.assertAlmostEqual(height, expected)
+        heights, found = navmesh.get_heights([(1.5, 1.5), (1.7, 0.5)], hint_polygons=[0, int(found[1])])
+        self.assertAlmostEqual(heights[0], 0.15)
+        self.assertAlmostEqual(heights[1], 5.0)
+        with self.assertRaises(ValueError):
+            navmesh.get_heights(points, hint_polygons=[0])
+
+    def test_hierarchy(self):
+        # grid 8 x 8 with the wall in the middle
+        n = 9
+        vertices = [(float(i), 0.0, float(j)) for i in range(n) for j in range(n)]
+        polygons = [[n * i + j, n * i + j + 1, n * (i + 1) + j + 1, n * (i + 1) + j] for i in range(n - 1) for j in range(n - 1) if i != 4 or j == 7]
+        flat = Navmesh(vertices, polygons)
+        clustered = Navmesh(vertices, polygons, cluster_size=2.0)
+        start = (0.5, 0.0, 0.5)
+        finish = (7.5, 0.0, 0.5)
+        path = clustered.search_path(start, finish)
+        self.assertEqual(path, flat.search_path(start, finish))
+        abstract, refined = clustered.get_last_search_stats()
+        self.assertGreater(abstract, 0)
+        self.assertGreater(refined, 0)
+        self.assertEqual(flat.get_last_search_stats()[0], 0)
+        # if the abstract path is not found, then only the fallback search is counted
+        hierarchy = clustered._get_hierarchy()
+        graph = clustered._get_graph(0)
+        hierarchy.search_abstract = lambda start_polygon, finish_polygon: []
+        for _ in range(2):
+            hierarchy.search(graph, 0, 1)
+            self.assertEqual(hierarchy.get_last_search_stats()[1], graph.get_last_expanded_count())
+
+    def test_landmarks(self):
+        n = 9
+        vertices = [(float(i), 0.0, float(j)) for i in range(n) for j in range(n)]
+        polygons = [[n * i + j, n * i + j + 1, n * (i + 1) + j + 1, n * (i + 1) + j] for i in range(n - 1) for j in range(n - 1) if i != 4 or j == 7]
+        flat = Navmesh(vertices, polygons)
+        alt = Navmesh(vertices, polygons, landmarks_count=4)
+        start = (3.5, 0.0, 0.5)
+        finish = (5.5, 0.0, 0.5)
+        path = flat.search_path(start, finish)
+        self.assertEqual(alt.search_path(start, finish), path)
+        self.assertLess(alt.get_last_search_stats()[1], flat.get_last_search_stats()[1])
+        # save and load landmarks
+        file_path = os.path.join(tempfile.mkdtemp(), "landmarks.bin")
+        alt.save_landmarks(file_path)
+        flat.load_landmarks(file_path)
+        self.assertEqual(flat.search_path(start, finish), path)
+        self.assertEqual(flat.get_last_search_stats(), alt.get_last_search_stats())
+        os.remove(file_path)
+
+    def test_search_paths(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6]]
+        navmesh = Navmesh(vertices, polygons)
+        pairs = [((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)),
+                 ((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0)),
+                 ((2.5, 0.0, 0.0), (0.5, 0.0, 2.5)),
+                 ((0.0, 0.0, 0.0), (0.0, 0.0, 2.0))]
+        paths = navmesh.search_paths(pairs)
+        self.assertEqual(paths[0], [(0.0, 0.0, -2.0), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (0.0, 0.0, 2.0)])
+        self.assertEqual(paths[1], navmesh.search_path(pairs[1][0], pairs[1][1]))
+        self.assertEqual(paths[2], navmesh.search_path(pairs[2][0], pairs[2][1]))
+        self.assertEqual(paths[3], [])
+        # regular grid with holes has many shortest corridors, batch and single searches should select the same one
+        size = 12
+        vertices = [(float(i), 0.0, float(j)) for i in range(size + 1) for j in range(size + 1)]
+        polygons = [[i * (size + 1) + j, i * (size + 1) + j + 1, (i + 1) * (size + 1) + j + 1, (i + 1) * (size + 1) + j] for i in range(size) for j in range(size) if i % 4 != 2 or j % 4 != 2]
+        navmesh = Navmesh(vertices, polygons)
+        finishes = [(0.3, 0.0, 11.6), (6.7, 0.0, 5.2), (11.4, 0.0, 0.8)]
+        pairs = [((0.5 + 1.1 * i, 0.0, 0.2 + 1.3 * j), finish) for finish in finishes for i in range(10) for j in range(9)]
+        paths = navmesh.search_paths(pairs)
+        for i in range(len(pairs)):
+            self.assertEqual(paths[i], navmesh.search_path(*pairs[i]))
+
+    def test_any_angle(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6]]
+        navmesh = Navmesh(vertices, polygons)
+        # graph search selects the right side, but the path around the left side is shorter
+        self.assertEqual(navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)), [(0.0, 0.0, -2.0), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (0.0, 0.0, 2.0)])
+        self.assertEqual(navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0), any_angle=True), [(0.0, 0.0, -2.0), (-1.6, 0.0, -1.3), (-1.3, 0.0, 1.7), (0.0, 0.0, 2.0)])
+        self.assertEqual(navmesh.search_path((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0), any_angle=True), navmesh.search_path((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0)))
+        self.assertEqual(navmesh.search_path((0.5, 0.0, -2.5), (2.5, 0.0, -2.0), any_angle=True), [(0.5, 0.0, -2.5), (2.5, 0.0, -2.0)])
+        self.assertEqual(navmesh.search_path((0.0, 0.0, 0.0), (0.0, 0.0, 2.0), any_angle=True), [])
+
+    def test_adjacency(self):
+        # 3x1 strip of squares, the middle one is splitted into two triangles
+        vertices = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (2.0, 0.0, 0.0), (3.0, 0.0, 0.0), (0.0, 0.0, 1.0), (1.0, 0.0, 1.0), (2.0, 0.0, 1.0), (3.0, 0.0, 1.0)]
+        polygons = [[0, 4, 5, 1], [1, 5, 6], [1, 6, 2], [2, 6, 7, 3]]
+        navmesh = Navmesh(vertices, polygons)
+        self.assertEqual([navmesh._data.get_neighbors(i) for i in range(4)], [[1], [0, 2], [1, 3], [2]])
+        self.assertEqual(navmesh.get_groups_count(), 1)
+        self.assertEqual(navmesh._get_graph(0).get_edges(), [(0, 1), (1, 2), (2, 3)])
+        self.assertEqual(set(navmesh.get_build_timings().keys()), set(["data", "adjacency", "groups", "graphs", "boundary", "hierarchy", "bvh"]))
+
+    def test_lazy_structures(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7),
+                    (5.0, 0.0, 0.0), (6.0, 0.0, 0.0), (6.0, 0.0, 1.0)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6], [8, 10, 9]]
+        navmesh = Navmesh(vertices, polygons)
+        report = navmesh.get_memory_report()
+        self.assertEqual(report["graphs"], (0, 0))
+        self.assertEqual(report["triangles_bvh"], (0, 0))
+        self.assertGreater(report["data"][1], 0)
+        # the search creates the graph only for one group
+        self.assertEqual(navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)), [(0.0, 0.0, -2.0), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (0.0, 0.0, 2.0)])
+        self.assertEqual(navmesh.get_memory_report()["graphs"][0], 1)
+        self.assertNotIn("triangles_bvh", navmesh.get_build_timings())
+        navmesh.prewarm().join()
+        report = navmesh.get_memory_report()
+        self.assertEqual(report["graphs"][0], 2)
+        self.assertEqual(report["triangles_bvh"][0], 1)
+        self.assertIn("triangles_bvh", navmesh.get_build_timings())
+        self.assertEqual(navmesh.raycast((0.0, 1.0, -2.0), (0.0, -1.0, 0.0)), (0.0, 0.0, -2.0))
+
+    def test_edit_polygons(self):
+        vertices = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (2.0, 0.0, 0.0), (3.0, 0.0, 0.0), (0.0, 0.0, 1.0), (1.0, 0.0, 1.0), (2.0, 0.0, 1.0), (3.0, 0.0, 1.0)]
+        polygons = [[0, 4, 5, 1], [1, 5, 6], [1, 6, 2], [2, 6, 7, 3]]
+        navmesh = Navmesh(vertices, polygons)
+        start = (0.5, 0.0, 0.5)
+        finish = (2.5, 0.0, 0.5)
+        path = navmesh.search_path(start, finish)
+        self.assertEqual(navmesh.raycast((1.7, 1.0, 0.25), (0.0, -1.0, 0.0)), (1.7, 0.0, 0.25))
+        navmesh.disable_polygons([2])
+        self.assertEqual(navmesh.get_last_edit_groups(), [0, 1])
+        self.assertEqual([navmesh._data.get_neighbors(i) for i in range(4)], [[1], [0], [], []])
+        self.assertEqual(navmesh.get_group_polygons(1), [[2, 6, 7, 3]])
+        self.assertEqual(navmesh.search_path(start, finish), [])
+        self.assertIsNone(navmesh.sample_polygon((1.7, 0.0, 0.2)))
+        self.assertIsNone(navmesh.raycast((1.7, 1.0, 0.25), (0.0, -1.0, 0.0)))
+        navmesh.enable_polygons([2])
+        self.assertEqual(navmesh.get_groups_count(), 2)
+        self.assertEqual(navmesh.get_group_polygons(1), [])
+        self.assertEqual(navmesh.search_path(start, finish), path)
+        # boundary chain can start from other edge, so compare sets of edges (chains does not contain final edges)
+        chain = navmesh.get_group_boundary(0)[0]
+        original = Navmesh(vertices, polygons).get_group_boundary(0)[0]
+        self.assertEqual(set(chain + [(chain[-1][1], chain[0][0])]), set(original + [(original[-1][1], original[0][0])]))
+        # remove the triangle and add it again with other index
+        navmesh.remove_polygons([2])
+        navmesh.enable_polygons([2])
+        self.assertFalse(navmesh.is_polygon_active(2))
+        self.assertEqual(navmesh.add_polygons([], [[1, 6, 2]]), [4])
+        self.assertEqual(navmesh.search_path(start, finish), path)
+        # extend the strip by new square
+        self.assertEqual(navmesh.add_polygons([(4.0, 0.0, 0.0), (4.0, 0.0, 1.0)], [[3, 7, 9, 8]]), [5])
+        self.assertEqual(navmesh.get_vertices()[8], (4.0, 0.0, 0.0))
+        self.assertEqual(navmesh.search_path(start, (3.5, 0.0, 0.5)), [start, (3.5, 0.0, 0.5)])
+        self.assertEqual(len(vertices), 8)
+        self.assertEqual(len(polygons), 4)
+
+    def test_long_corridor_groups(self):
+        # the strip of 3000 squares, recursive labelling fails for it
+        count = 3000
+        vertices = [(float(i), 0.0, 0.0) for i in range(count + 1)] + [(float(i), 0.0, 1.0) for i in range(count + 1)]
+        polygons = [[i, count + 1 + i, count + 2 + i, i + 1] for i in range(count)]
+        # separate triangle
+        vertices.extend([(-5.0, 0.0, -5.0), (-4.0, 0.0, -5.0), (-4.0, 0.0, -4.0)])
+        polygons.append([len(vertices) - 3, len(vertices) - 1, len(vertices) - 2])
+        navmesh = Navmesh(vertices, polygons)
+        self.assertEqual(navmesh.get_groups_count(), 2)
+        self.assertEqual(navmesh.are_reachable([((0.5, 0.0, 0.5), (2999.5, 0.0, 0.5)),
+                                                ((0.5, 0.0, 0.5), (-4.2, 0.0, -4.8)),
+                                                ((0.5, 0.0, 0.5), (0.5, 0.0, 5.0))]), [True, False, False])
+
+    def test_snapshot(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7),
+                    (5.0, 0.0, 0.0), (6.0, 0.0, 0.0), (6.0, 0.0, 1.0)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6], [8, 10, 9]]
+        navmesh = Navmesh(vertices, polygons, landmarks_count=2)
+        file_path = os.path.join(tempfile.mkdtemp(), "navmesh.snapshot")
+        navmesh.save_snapshot(file_path)
+        loaded = Navmesh.load_snapshot(file_path)
+        # lists are created from arrays at the first use, triangles bvh is loaded from the snapshot
+        self.assertFalse(any(name in loaded.__dict__ for name in ("_vertices", "_polygons", "_groups", "_boundary")))
+        self.assertEqual(loaded.get_memory_report()["triangles_bvh"][0], 1)
+        self.assertEqual(loaded.get_groups_count(), 2)
+        self.assertEqual(loaded.get_vertices(), vertices)
+        self.assertEqual(loaded.get_group_polygons(0), navmesh.get_group_polygons(0))
+        self.assertEqual(loaded.get_group_boundary(0), navmesh.get_group_boundary(0))
+        self.assertEqual(loaded.get_group_boundary(1), [[(9, 8), (8, 10)]])
+        self.assertEqual(loaded._get_graph(0).get_landmarks()[0], navmesh._get_graph(0).get_landmarks()[0])
+        self.assertEqual(list(loaded.get_build_timings().keys())[0], "snapshot")
+        for start, finish in [((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)), ((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0)), ((0.0, 0.0, -2.0), (5.8, 0.0, 0.5))]:
+            self.assertEqual(loaded.search_path(start, finish), navmesh.search_path(start, finish))
+            self.assertEqual(loaded.search_path(start, finish, any_angle=True), navmesh.search_path(start, finish, any_angle=True))
+        self.assertEqual(loaded.sample((0.0, 1.0, -2.0)), navmesh.sample((0.0, 1.0, -2.0)))
+        # bvh is loaded from the snapshot
+        self.assertEqual(loaded._bvh.get_nodes_count(), navmesh._bvh.get_nodes_count())
+        self.assertEqual(loaded.sample_polygon((5.8, 0.0, 0.5)).get_index(), 4)
+        # save loaded navmesh once again
+        other_path = os.path.join(os.path.dirname(file_path), "other.snapshot")
+        loaded.save_snapshot(other_path)
+        with open(file_path, "rb") as file_a, open(other_path, "rb") as file_b:
+            self.assertEqual(file_a.read(), file_b.read())
+        with open(other_path, "wb") as file:
+            file.write(b"NMLM0000")
+        self.assertRaises(ValueError, Navmesh.load_snapshot, other_path)
+        with open(other_path, "wb") as file:
+            file.write(b"NMSS" + struct.pack("<II", 1, 0))
+        self.assertRaises(ValueError, Navmesh.load_snapshot, other_path)
+        # the hierarchy is stored in the snapshot
+        clustered = Navmesh(vertices, polygons, cluster_size=2.0)
+        clustered.save_snapshot(other_path)
+        loaded_clustered = Navmesh.load_snapshot(other_path, cluster_size=2.0)
+        self.assertEqual(loaded_clustered._hierarchy.get_arrays(), clustered._hierarchy.get_arrays())
+        self.assertEqual(loaded_clustered.search_path((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0)), clustered.search_path((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0)))
+        self.assertEqual(Navmesh.load_snapshot(other_path, cluster_size=1.0)._hierarchy.get_cluster_size(), 1.0)
+        # triangles, loaded from the snapshot, can be edited
+        loaded_clustered.disable_polygons([3])
+        self.assertIsNone(loaded_clustered.sample((0.0, 0.0, 2.5), max_distance=0.1))
+        loaded_clustered.enable_polygons([3])
+        self.assertIsNotNone(loaded_clustered.sample((0.0, 0.0, 2.5), max_distance=0.1))
+        del loaded_clustered
+        pathfinder = PathFinder(navmesh=loaded)
+        self.assertEqual(pathfinder.get_obstacles_points(), PathFinder(vertices, polygons).get_obstacles_points())
+        del loaded
+        del pathfinder
+
+    def test_path_cache(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6]]
+        navmesh = Navmesh(vertices, polygons, path_cache_size=1)
+        path = navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0))
+        self.assertEqual(navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)), path)
+        self.assertEqual(navmesh.search_path((0.5, 0.0, -2.5), (0.0, 0.0, 2.0)), [(0.5, 0.0, -2.5), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (0.0, 0.0, 2.0)])
+        self.assertEqual(navmesh.get_path_cache_stats(), (2, 1))
+        # other pair of polygons pushes out the first one
+        navmesh.search_path((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0))
+        navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0))
+        self.assertEqual(navmesh.get_path_cache_stats(), (2, 3))
+        navmesh.clear_path_cache(reset_stats=True)
+        self.assertEqual(navmesh.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)), path)
+        self.assertEqual(navmesh.get_path_cache_stats(), (0, 1))
+
+
+class TestPathFinder(unittest.TestCase):
+    def test_flow_fields(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6]]
+        pathfinder = PathFinder(vertices, polygons, use_flow_fields=True)
+        a = pathfinder.add_agent((0.0, 0.0, -2.0), 0.2, 1.0)
+        b = pathfinder.add_agent((2.5, 0.0, 0.0), 0.2, 1.0)
+        pathfinder.set_agent_destination(a, (0.0, 0.0, 2.0))
+        pathfinder.set_agent_destination(b, (0.5, 0.0, 2.5))
+        self.assertEqual(pathfinder.get_flow_fields_count(), 1)
+        self.assertEqual(pathfinder.get_agent_path(a), pathfinder.search_path((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)))
+        self.assertEqual(pathfinder.get_agent_path(b), pathfinder.search_path((2.5, 0.0, 0.0), (0.5, 0.0, 2.5)))
+        pathfinder.set_agent_destination(b, (-2.5, 0.0, 0.0))
+        self.assertEqual(pathfinder.get_flow_fields_count(), 2)
+        pathfinder.delete_agent(a)
+        pathfinder.update()
+        self.assertEqual(pathfinder.get_flow_fields_count(), 1)
+
+    def test_snap_to_navmesh(self):
+        # sloped strip, agents move along it and can not leave it
+        vertices = [(float(i), 0.2 * i, float(j)) for i in range(5) for j in range(2)]
+        polygons = [[2 * i, 2 * i + 1, 2 * i + 3, 2 * i + 2] for i in range(4)]
+        pathfinder = PathFinder(vertices, polygons, snap_to_navmesh=True)
+        a = pathfinder.add_agent((0.5, 0.1, 0.5), 0.2, 1.0)
+        pathfinder.set_agent_destination(a, (3.5, 0.7, 0.5))
+        for _ in range(4):
+            pathfinder._last_update_time -= 0.5
+            pathfinder.update()
+        x, z = pathfinder.get_agent_position(a)
+        self.assertGreater(x, 1.0)
+        self.assertAlmostEqual(pathfinder.get_agent_height(a), 0.2 * x)
+        self.assertEqual(pathfinder._agents_polygon[0], pathfinder.locate_from_hint((x, 0.2 * x, z), -1))
+        self.assertEqual(pathfinder.move_along_surface(0, (0.5, 0.0, 0.5), (0.5, 0.0, 3.0)), ((0.5, 0.1, 1.0), 0))
+
+    def test_snap_to_navmesh_floors(self):
+        # steep strip under the flat floor, heights of path corners are close to the floor, but the agent is on the strip
+        vertices = [(float(i), float(i), float(j)) for i in range(5) for j in range(2)] + [(float(i), 3.0, float(j)) for i in range(5) for j in range(2)]
+        polygons = [[2 * i, 2 * i + 1, 2 * i + 3, 2 * i + 2] for i in range(4)] + [[10 + 2 * i, 10 + 2 * i + 1, 10 + 2 * i + 3, 10 + 2 * i + 2] for i in range(4)]
+        pathfinder = PathFinder(vertices, polygons, snap_to_navmesh=True, update_path_find=0.0)
+        a = pathfinder.add_agent((0.5, 0.5, 0.5), 0.2, 1.0)
+        pathfinder.set_agent_destination(a, (2.9, 2.9, 0.5))
+        with mock.patch.object(pathfinder, "search_path", wraps=pathfinder.search_path) as search_path:
+            pathfinder._last_update_time -= 0.1
+            pathfinder.update()
+        # the path is updated from the snapped height of the agent
+        self.assertEqual(search_path.call_args.args[0][1], 0.5)
+        self.assertEqual(pathfinder.get_agent_path(a)[-1], (2.9, 2.9, 0.5))
+        # the edit of the strip relocates the agent from its polygon, so it stays on the strip
+        pathfinder.disable_polygons([3])
+        self.assertEqual(pathfinder._agents_polygon[0], 0)
+        self.assertEqual(pathfinder._agents_group[0], pathfinder._navmesh.get_polygon_group(0))
+        self.assertNotEqual(pathfinder._agents_group[0], pathfinder._navmesh.get_polygon_group(4))
+
+
+    def test_edit_polygons(self):
+        vertices = [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0), (2.0, 0.0, 0.0), (3.0, 0.0, 0.0), (0.0, 0.0, 1.0), (1.0, 0.0, 1.0), (2.0, 0.0, 1.0), (3.0, 0.0, 1.0)]
+        polygons = [[0, 4, 5, 1], [1, 5, 6], [1, 6, 2], [2, 6, 7, 3]]
+        pathfinder = PathFinder(vertices, polygons)
+        self.assertEqual(len(pathfinder.get_obstacles_points()), 1)
+        a = pathfinder.add_agent((0.5, 0.0, 0.5), 0.2, 1.0)
+        b = pathfinder.add_agent((2.5, 0.0, 0.5), 0.2, 1.0)
+        pathfinder.disable_polygons([1, 2])
+        # the strip is splitted into two groups, so each group has it own obstacles and simulator
+        self.assertEqual(len(pathfinder.get_obstacles_points()), 2)
+        self.assertEqual(pathfinder.search_path((0.5, 0.0, 0.5), (2.5, 0.0, 0.5)), [])
+        self.assertEqual(pathfinder.get_agent_position(a), (0.5, 0.5))
+        self.assertEqual(pathfinder.get_agent_position(b), (2.5, 0.5))
+        self.assertEqual(pathfinder._agents_group, [0, 1])
+        pathfinder.enable_polygons([1, 2])
+        self.assertEqual(len(pathfinder.get_obstacles_points()), 1)
+        self.assertEqual(pathfinder._agents_group, [0, 0])
+        self.assertEqual(pathfinder.get_agent_position(b), (2.5, 0.5))
+        pathfinder.set_agent_destination(a, (2.5, 0.0, 0.2))
+        self.assertEqual(pathfinder.get_agent_path(a), [(0.5, 0.0, 0.5), (2.5, 0.0, 0.2)])
+
+    def test_edit_obstacles(self):
+        # grid with holes, edits touch only obstacles near changed polygons, so the edit does not depend on the mesh size
+        def create_pathfinder(size, disabled):
+            vertices = [(float(i), 0.0, float(j)) for i in range(size + 1) for j in range(size + 1)]
+            polygons = [[i * (size + 1) + j, i * (size + 1) + j + 1, (i + 1) * (size + 1) + j + 1, (i + 1) * (size + 1) + j] for i in range(size) for j in range(size) if i % 4 != 2 or j % 4 != 2]
+            pathfinder = PathFinder(vertices, polygons)
+            pathfinder.disable_polygons(disabled)
+            return pathfinder
+
+        def edit_counts(pathfinder):
+            # count obstacles and its vertices, removed from the simulator and added to it by one edit
+            polygon = pathfinder.locate_from_hint((4.5, 0.0, 4.5), -1)
+            with mock.patch.object(rvo, "remove_obstacle", wraps=rvo.remove_obstacle) as remove_obstacle, mock.patch.object(rvo, "add_obstacle", wraps=rvo.add_obstacle) as add_obstacle:
+                pathfinder.disable_polygons([polygon])
+                pathfinder.enable_polygons([polygon])
+            return remove_obstacle.call_count, add_obstacle.call_count, sum(len(call.args[1]) for call in add_obstacle.call_args_list)
+
+        pathfinder = create_pathfinder(12, [])
+        pathfinder.disable_polygons([20, 21])
+        pathfinder.enable_polygons([20])
+        expected = create_pathfinder(12, [21])
+        self.assertEqual(sorted(map(sorted, pathfinder.get_obstacles_points())), sorted(map(sorted, expected.get_obstacles_points())))
+        points = [(0.5 + 1.5 * i, 0.5 + 1.1 * j) for i in range(8) for j in range(11)]
+        for a in points[::3]:
+            for b in points:
+                self.assertEqual(rvo.query_visibility(pathfinder._simulators[0], a, b), rvo.query_visibility(expected._simulators[0], a, b))
+
+        small_counts = edit_counts(create_pathfinder(12, []))
+        # disabled polygon far from holes and the outer boundary creates one new chain, enable removes it
+        self.assertEqual(small_counts[:2], (1, 1))
+        self.assertEqual(edit_counts(create_pathfinder(40, [])), small_counts)
+
+
+class TestTiledNavmesh(unittest.TestCase):
+    def setUp(self):
+        # 6x6 grid of squares with the wall at x = 3 (the passage is at z = 5) and one separate square
+        self.vertices = [(float(i), 0.0, float(j)) for i in range(7) for j in range(7)] + [(10.0, 0.0, 0.0), (10.0, 0.0, 1.0), (11.0, 0.0, 1.0), (11.0, 0.0, 0.0)]
+        self.polygons = [[7 * i + j, 7 * i + j + 1, 7 * (i + 1) + j + 1, 7 * (i + 1) + j] for i in range(6) for j in range(6) if i != 3 or j == 5] + [[49, 50, 51, 52]]
+        self.directory = tempfile.TemporaryDirectory()
+        self.assertEqual(write_tiles(self.vertices, self.polygons, 2.0, self.directory.name), 10)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_search_path(self):
+        navmesh = Navmesh(self.vertices, self.polygons)
+        tiled = TiledNavmesh(self.directory.name)
+        self.assertEqual(tiled.get_tiles_count(), 10)
+        self.assertEqual(tiled.get_groups_count(), 2)
+        self.assertEqual(tiled.get_loaded_tiles(), [])
+        start = (0.5, 0.0, 0.5)
+        finish = (5.5, 0.0, 0.5)
+        path = tiled.search_path(start, finish)
+        self.assertEqual((path[0], path[-1]), (start, finish))
+        # the path goes around the wall
+        self.assertGreaterEqual(max(p[2] for p in path), 5.0)
+        length = navmesh._get_path_length(navmesh.search_path(start, finish))
+        self.assertLess(navmesh._get_path_length(path), length * 1.2)
+        # corridors of tiles are stitched, so pathes do not go throw portal anchors and are close to pathes in the whole navmesh
+        centers = [(x + 0.5, 0.0, z + 0.5) for x in range(6) for z in range(6) if x != 3 or z == 5]
+        for a in centers[::3]:
+            for b in centers:
+                tiled_path = tiled.search_path(a, b)
+                self.assertTrue(all(tiled_path[i] != tiled_path[i + 1] for i in range(len(tiled_path) - 1)))
+                self.assertLessEqual(navmesh._get_path_length(tiled_path), navmesh._get_path_length(navmesh.search_path(a, b)) * 1.05 + 0.000001)
+        for point in path:
+            self.assertIsNotNone(navmesh.sample_polygon(point))
+        self.assertEqual(tiled.search_path((1.5, 0.0, 1.5), (1.2, 0.0, 0.2)), navmesh.search_path((1.5, 0.0, 1.5), (1.2, 0.0, 0.2)))
+        # the separate square is in other group, so the path does not exist and only the tile of the finish point is loaded
+        hits, misses, evictions = tiled.get_tile_stats()
+        self.assertEqual(tiled.search_path(start, (10.5, 0.0, 0.5)), [])
+        self.assertEqual(tiled.get_tile_stats()[1], misses + 1)
+        self.assertEqual(tiled.are_reachable([(start, finish), (start, (10.5, 0.0, 0.5))]), [True, False])
+        self.assertEqual(tiled.sample_polygon((10.5, 0.0, 0.5)).get_group(), 1)
+        self.assertEqual(tiled.sample((7.0, 0.0, 0.5), is_slow=True), (6.0, 0.0, 0.5))
+        self.assertEqual(tiled.raycast((10.5, 1.0, 0.5), (0.0, -1.0, 0.0)), (10.5, 0.0, 0.5))
+        self.assertEqual(tiled.raycast_hit((10.5, 1.0, 0.5), (0.0, -2.0, 0.0))[:2], ((10.5, 0.0, 0.5), 1.0))
+        self.assertIsNone(tiled.raycast_hit((10.5, 1.0, 0.5), (0.0, -1.0, 0.0), max_distance=0.5))
+        points, mask = tiled.sample_many([(7.0, 0.0, 0.5), (100.0, 0.0, 100.0)], is_slow=True)
+        self.assertEqual([bool(m) for m in mask], [True, False])
+        self.assertEqual(tuple(float(v) for v in points[0]), (6.0, 0.0, 0.5))
+
+    def test_portal_costs(self):
+        # grid with walls inside tiles, anchors of portals at different sides of the wall are close, but the path between them is long
+        size = 40
+        vertices = [(float(i), 0.0, float(j)) for i in range(size + 1) for j in range(size + 1)]
+        polygons = [[i * (size + 1) + j, i * (size + 1) + j + 1, (i + 1) * (size + 1) + j + 1, (i + 1) * (size + 1) + j] for i in range(size) for j in range(size)
+                    if not (i % 10 == 5 and 1 <= j % 10 <= 8) and not (j % 10 == 5 and 2 <= i % 10 <= 8 and (i // 10 + j // 10) % 2 == 0)]
+        navmesh = Navmesh(vertices, polygons)
+        with tempfile.TemporaryDirectory() as directory:
+            write_tiles(vertices, polygons, 10.0, directory)
+            tiled = TiledNavmesh(directory)
+            points = [(0.3 + 1.7 * i, 0.0, 0.6 + 1.9 * j) for i in range(23) for j in range(21)]
+            tiled_length = 0.0
+            full_length = 0.0
+            for a in points[14::42]:
+                for b in points[12::21]:
+                    length = navmesh._get_path_length(navmesh.search_path(a, b))
+                    path_length = navmesh._get_path_length(tiled.search_path(a, b))
+                    # costs between portals are lengths of pathes inside tiles, so the sequence of portals is close to the shortest one
+                    self.assertLessEqual(path_length, length * 1.1 + 0.000001)
+                    tiled_length += path_length
+                    full_length += length
+            self.assertLessEqual(tiled_length, full_length)
+
+    def test_memory_budget(self):
+        tiled = TiledNavmesh(self.directory.name)
+        path = tiled.search_path((0.5, 0.0, 0.5), (5.5, 0.0, 0.5))
+        self.assertEqual(tiled.get_memory_report()["tiles"], (len(tiled.get_loaded_tiles()), tiled.get_memory_usage()))
+        # the budget less than one tile, so only the last used tile stays loaded
+        tiled.set_memory_budget(1)
+        self.assertEqual(tiled.get_loaded_tiles(), [(2, 0)])
+        hits, misses, evictions = tiled.get_tile_stats()
+        self.assertGreater(evictions, 0)
+        self.assertEqual(tiled.search_path((0.5, 0.0, 0.5), (5.5, 0.0, 0.5)), path)
+        self.assertEqual(len(tiled.get_loaded_tiles()), 1)
+        self.assertGreater(tiled.get_tile_stats()[1], misses)
+        tiled.set_memory_budget(0)
+        tiled.search_path((0.5, 0.0, 0.5), (1.5, 0.0, 0.5))
+        hits, misses, evictions = tiled.get_tile_stats()
+        tiled.search_path((0.5, 0.0, 0.5), (1.5, 0.0, 0.5))
+        self.assertEqual(tiled.get_tile_stats()[1], misses)
+        self.assertGreater(tiled.get_tile_stats()[0], hits)
+
+    def test_pathfinder(self):
+        pathfinder = PathFinder(navmesh=TiledNavmesh(self.directory.name, memory_budget=1))
+        reference = PathFinder(self.vertices, self.polygons)
+        self.assertEqual(pathfinder.get_obstacles_points(), reference.get_obstacles_points())
+        a = pathfinder.add_agent((0.5, 0.0, 0.5), 0.2, 1.0)
+        b = pathfinder.add_agent((10.5, 0.0, 0.5), 0.2, 1.0)
+        self.assertEqual(pathfinder._agents_group, [0, 1])
+        pathfinder.set_agent_destination(a, (5.5, 0.0, 0.5))
+        path = pathfinder.get_agent_path(a)
+        self.assertEqual(path[-1], (5.5, 0.0, 0.5))
+        self.assertGreater(pathfinder.get_navmesh_tile_stats()[2], 0)
+
+
+class TestPathQueryPool(unittest.TestCase):
+    def test_batches(self):
+        vertices = [(-3.1, 0.0, -3.1), (-3.1, 0.0, 3.2), (3.2, 0.0, 3.2), (3.2, 0.0, -3.1), (-1.6, 0.0, -1.3), (1.4, 0.0, -1.6), (1.7, 0.0, 1.4), (-1.3, 0.0, 1.7)]
+        polygons = [[0, 4, 5, 3], [4, 0, 1, 7], [3, 5, 6, 2], [7, 1, 2, 6]]
+        navmesh = Navmesh(vertices, polygons)
+        pairs = [((0.0, 0.0, -2.0), (0.0, 0.0, 2.0)), ((-2.5, 0.0, 0.0), (2.5, 0.0, 0.0)), ((0.0, 0.0, 0.0), (0.0, 0.0, 2.0))] * 5
+        points = [(0.0, 1.0, -2.0), (0.0, 0.0, 0.0), (5.0, 0.0, 5.0)]
+        rays = [((0.0, 1.0, -2.0), (0.0, -1.0, 0.0)), ((0.0, 1.0, 0.0), (0.0, -1.0, 0.0))]
+        with PathQueryPool(vertices, polygons, processes=2, chunk_size=4) as pool:
+            self.assertEqual(pool.search_paths(pairs), [navmesh.search_path(pair[0], pair[1]) for pair in pairs])
+            self.assertEqual(pool.search_paths(pairs[:2], any_angle=True), [navmesh.search_path(pair[0], pair[1], any_angle=True) for pair in pairs[:2]])
+            self.assertEqual(pool.sample_points(points), [navmesh.sample(point) for point in points])
+            self.assertEqual(pool.raycast_rays(rays), [navmesh.raycast(ray[0], ray[1]) for ray in rays])
+            self.assertEqual(pool.search_paths([]), [])
+        self.assertRaises(RuntimeError, pool.search_paths, pairs)
+        # workers use the hierarchy and landmarks, built once in the main process
+        clustered = Navmesh(vertices, polygons, cluster_size=2.0, landmarks_count=2)
+        with PathQueryPool(vertices, polygons, processes=2, cluster_size=2.0, landmarks_count=2) as pool:
+            self.assertEqual(pool.search_paths(pairs), [clustered.search_path(pair[0], pair[1]) for pair in pairs])
+
 
 if __name__ == "__main__":
     unittest.main()